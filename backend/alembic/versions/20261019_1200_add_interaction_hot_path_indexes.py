@@ -0,0 +1,71 @@
+"""Add composite and partial indexes for interaction_events hot paths
+
+Revision ID: add_interaction_hot_path_indexes
+Revises: add_deleted_at_field
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_interaction_hot_path_indexes'
+down_revision: Union[str, None] = 'add_deleted_at_field'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONTEXT_SESSIONS_WHERE = "interaction_type = 'context_building' AND deleted_at IS NULL"
+ACTIVE_CONTEXT_SESSION_WHERE = (
+    "interaction_type = 'context_building' AND session_status = 'active' AND deleted_at IS NULL"
+)
+
+
+def upgrade() -> None:
+    """Create hot path indexes concurrently (no write lock on interaction_events)."""
+    with op.get_context().autocommit_block():
+        # Historial reciente por proyecto y usuario sin borrados, ya ordenado
+        op.create_index(
+            'ix_interaction_events_live_history',
+            'interaction_events',
+            ['project_id', 'user_id', sa.text('created_at DESC')],
+            postgresql_include=['id'],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Listado de sesiones de construcción de contexto
+        op.create_index(
+            'ix_interaction_events_context_sessions',
+            'interaction_events',
+            ['project_id', 'user_id', sa.text('updated_at DESC')],
+            postgresql_where=sa.text(CONTEXT_SESSIONS_WHERE),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Sesión activa de construcción de contexto
+        op.create_index(
+            'ix_interaction_events_active_context_session',
+            'interaction_events',
+            ['project_id', 'user_id', sa.text('updated_at DESC')],
+            postgresql_where=sa.text(ACTIVE_CONTEXT_SESSION_WHERE),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop hot path indexes."""
+    with op.get_context().autocommit_block():
+        for index_name in (
+            'ix_interaction_events_active_context_session',
+            'ix_interaction_events_context_sessions',
+            'ix_interaction_events_live_history',
+        ):
+            op.drop_index(
+                index_name,
+                table_name='interaction_events',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
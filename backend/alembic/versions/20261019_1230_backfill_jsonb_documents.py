@@ -0,0 +1,68 @@
+"""Backfill JSONB documents stored as json.dumps strings
+
+Revision ID: backfill_jsonb_documents
+Revises: add_interaction_hot_path_indexes
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'backfill_jsonb_documents'
+down_revision: Union[str, None] = 'add_interaction_hot_path_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+JSONB_COLUMNS = ('ai_responses_json', 'moderator_synthesis_json')
+BATCH_SIZE = 5000
+
+
+def _convert_in_batches(column: str, source_type_condition: str, converted_value: str) -> None:
+    """Update rows in batches, committing each one so long-running locks are avoided."""
+    statement = sa.text(f"""
+        UPDATE interaction_events
+        SET {column} = {converted_value}
+        WHERE id IN (
+            SELECT id FROM interaction_events
+            WHERE {source_type_condition}
+            LIMIT {BATCH_SIZE}
+        )
+    """)
+    context = op.get_context()
+    if context.as_sql:
+        # Offline (--sql) mode has no rowcount: emit a single full update
+        op.execute(f"UPDATE interaction_events SET {column} = {converted_value} WHERE {source_type_condition}")
+        return
+    with context.autocommit_block():
+        bind = op.get_bind()
+        while bind.execute(statement).rowcount:
+            pass
+
+
+def upgrade() -> None:
+    """Turn JSONB string scalars holding serialized JSON into real documents.
+
+    Only strings whose text is a serialized object or array are converted, so
+    every converted row stops matching and the batch loop terminates. Other
+    strings (double-encoded values, plain text) are left as they are: casting
+    them would yield another string or fail and abort the migration.
+    """
+    for column in JSONB_COLUMNS:
+        _convert_in_batches(
+            column,
+            f"jsonb_typeof({column}) = 'string' AND left(ltrim({column} #>> '{{}}'), 1) IN ('{{', '[')",
+            f"({column} #>> '{{}}')::jsonb",
+        )
+
+
+def downgrade() -> None:
+    """Store documents as JSON strings again (previous application format)."""
+    for column in JSONB_COLUMNS:
+        _convert_in_batches(
+            column,
+            f"jsonb_typeof({column}) IN ('object', 'array')",
+            f"to_jsonb({column}::text)",
+        )
@@ -0,0 +1,73 @@
+"""Add trigger-maintained per-project interaction counts
+
+Revision ID: add_project_interaction_counts
+Revises: backfill_jsonb_documents
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_project_interaction_counts'
+down_revision: Union[str, None] = 'backfill_jsonb_documents'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create project_interaction_counts, backfill it and keep it in sync with a trigger."""
+    op.create_table(
+        'project_interaction_counts',
+        sa.Column('project_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('interaction_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('project_id', 'user_id'),
+    )
+
+    # Only live (not soft-deleted) interactions are counted
+    op.execute("""
+        CREATE OR REPLACE FUNCTION maintain_project_interaction_counts() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.deleted_at IS NULL THEN
+                UPDATE project_interaction_counts
+                SET interaction_count = interaction_count - 1
+                WHERE project_id = OLD.project_id AND user_id = OLD.user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.deleted_at IS NULL THEN
+                INSERT INTO project_interaction_counts (project_id, user_id, interaction_count)
+                VALUES (NEW.project_id, NEW.user_id, 1)
+                ON CONFLICT (project_id, user_id)
+                DO UPDATE SET interaction_count = project_interaction_counts.interaction_count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_project_interaction_counts
+        AFTER INSERT OR DELETE OR UPDATE OF deleted_at, project_id, user_id ON interaction_events
+        FOR EACH ROW EXECUTE FUNCTION maintain_project_interaction_counts()
+    """)
+
+    # Backfill after the trigger exists so rows written meanwhile are not lost;
+    # the upsert overwrites whatever the trigger may have counted so far
+    op.execute("""
+        INSERT INTO project_interaction_counts (project_id, user_id, interaction_count)
+        SELECT project_id, user_id, count(*)
+        FROM interaction_events
+        WHERE deleted_at IS NULL
+        GROUP BY project_id, user_id
+        ON CONFLICT (project_id, user_id)
+        DO UPDATE SET interaction_count = EXCLUDED.interaction_count
+    """)
+
+
+def downgrade() -> None:
+    """Drop the trigger, its function and the counts table."""
+    op.execute("DROP TRIGGER IF EXISTS trg_project_interaction_counts ON interaction_events")
+    op.execute("DROP FUNCTION IF EXISTS maintain_project_interaction_counts()")
+    op.drop_table('project_interaction_counts')
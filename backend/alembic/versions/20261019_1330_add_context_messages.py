@@ -0,0 +1,89 @@
+"""Move context-building conversations to an append-only context_messages table
+
+Revision ID: add_context_messages
+Revises: add_project_interaction_counts
+Create Date: 2026-10-19 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_context_messages'
+down_revision: Union[str, None] = 'add_project_interaction_counts'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create context_messages and move the JSON conversation histories into it."""
+    # Adding a column with a constant default is a metadata-only change
+    op.add_column(
+        'interaction_events',
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'context_messages',
+        sa.Column('session_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('interaction_events.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(20), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('message_type', sa.String(20), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('session_id', 'seq'),
+    )
+
+    # One row per history entry, keeping the array order as seq
+    op.execute("""
+        INSERT INTO context_messages (session_id, seq, role, content, message_type, created_at)
+        SELECT
+            e.id,
+            m.seq,
+            left(coalesce(m.message->>'role', 'user'), 20),
+            coalesce(m.message->>'content', ''),
+            left(m.message->>'message_type', 20),
+            coalesce((m.message->>'timestamp')::timestamp AT TIME ZONE 'UTC', e.created_at)
+        FROM interaction_events e
+        CROSS JOIN LATERAL jsonb_array_elements(e.ai_responses_json) WITH ORDINALITY AS m(message, seq)
+        WHERE e.interaction_type = 'context_building'
+          AND jsonb_typeof(e.ai_responses_json) = 'array'
+          AND jsonb_typeof(m.message) = 'object'
+    """)
+    op.execute("""
+        UPDATE interaction_events e
+        SET message_count = counts.last_seq,
+            ai_responses_json = NULL
+        FROM (
+            SELECT session_id, max(seq) AS last_seq
+            FROM context_messages
+            GROUP BY session_id
+        ) counts
+        WHERE e.id = counts.session_id
+    """)
+
+
+def downgrade() -> None:
+    """Rebuild the JSON conversation histories and drop context_messages."""
+    op.execute("""
+        UPDATE interaction_events e
+        SET ai_responses_json = history.messages
+        FROM (
+            SELECT session_id, jsonb_agg(
+                jsonb_build_object(
+                    'role', role,
+                    'content', content,
+                    'timestamp', to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                    'message_type', message_type
+                ) ORDER BY seq
+            ) AS messages
+            FROM context_messages
+            GROUP BY session_id
+        ) history
+        WHERE e.id = history.session_id
+          AND (e.ai_responses_json IS NULL OR jsonb_typeof(e.ai_responses_json) = 'array')
+    """)
+    op.drop_table('context_messages')
+    op.drop_column('interaction_events', 'message_count')
@@ -0,0 +1,127 @@
+"""Populate ia_responses and moderated_syntheses and index them for analytics
+
+Revision ID: normalize_ia_responses_and_syntheses
+Revises: add_context_messages
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'normalize_ia_responses_and_syntheses'
+down_revision: Union[str, None] = 'add_context_messages'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Unnamed in the initial migration, so it carries PostgreSQL's default name
+IA_RESPONSES_INTERACTION_FK = 'ia_responses_interaction_event_id_fkey'
+
+
+def _replace_interaction_fk(ondelete: Union[str, None]) -> None:
+    op.drop_constraint(IA_RESPONSES_INTERACTION_FK, 'ia_responses', type_='foreignkey')
+    op.create_foreign_key(
+        IA_RESPONSES_INTERACTION_FK,
+        'ia_responses', 'interaction_events',
+        ['interaction_event_id'], ['id'],
+        ondelete=ondelete,
+    )
+
+
+def upgrade() -> None:
+    """Add status/quality columns, backfill rows from the JSONB documents and index them."""
+    # Provider responses are deleted together with their interaction
+    _replace_interaction_fk('CASCADE')
+    op.add_column(
+        'ia_responses',
+        sa.Column('status', sa.String(30), nullable=False, server_default='success'),
+    )
+    op.add_column(
+        'moderated_syntheses',
+        sa.Column('quality', sa.String(20), nullable=True),
+    )
+
+    # Backfilled syntheses reuse the interaction id, so linking them back is a join on id
+    op.execute("""
+        INSERT INTO moderated_syntheses (id, created_at, updated_at, synthesis_text, quality)
+        SELECT
+            id,
+            created_at,
+            created_at,
+            moderator_synthesis_json->>'synthesis_text',
+            left(moderator_synthesis_json->>'quality', 20)
+        FROM interaction_events
+        WHERE moderated_synthesis_id IS NULL
+          AND jsonb_typeof(moderator_synthesis_json) = 'object'
+          AND coalesce(moderator_synthesis_json->>'synthesis_text', '') <> ''
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute("""
+        UPDATE interaction_events e
+        SET moderated_synthesis_id = e.id
+        FROM moderated_syntheses s
+        WHERE s.id = e.id AND e.moderated_synthesis_id IS NULL
+    """)
+
+    # One row per provider response of every final query
+    op.execute("""
+        INSERT INTO ia_responses (
+            id, created_at, updated_at, interaction_event_id, ia_provider_name,
+            raw_response_text, latency_ms, status, error_message, received_at
+        )
+        SELECT
+            gen_random_uuid(),
+            e.created_at,
+            e.created_at,
+            e.id,
+            coalesce(r->>'ia_provider_name', 'unknown'),
+            coalesce(r->>'response_text', ''),
+            CASE WHEN jsonb_typeof(r->'latency_ms') = 'number' THEN (r->>'latency_ms')::numeric::int ELSE 0 END,
+            left(coalesce(r->>'status', 'success'), 30),
+            r->>'error_message',
+            e.created_at
+        FROM interaction_events e
+        CROSS JOIN LATERAL jsonb_array_elements(e.ai_responses_json) AS r
+        WHERE e.interaction_type = 'final_query'
+          AND jsonb_typeof(e.ai_responses_json) = 'array'
+          AND jsonb_typeof(r) = 'object'
+          AND NOT EXISTS (SELECT 1 FROM ia_responses x WHERE x.interaction_event_id = e.id)
+    """)
+
+    with op.get_context().autocommit_block():
+        # Per-provider latency and status over a time window (index-only scans)
+        op.create_index(
+            'ix_ia_responses_provider_received',
+            'ia_responses',
+            ['ia_provider_name', 'received_at'],
+            postgresql_include=['latency_ms', 'status'],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Per-provider errors (a small fraction of the rows)
+        op.create_index(
+            'ix_ia_responses_provider_errors',
+            'ia_responses',
+            ['ia_provider_name', 'received_at'],
+            postgresql_where=sa.text("status <> 'success' AND deleted_at IS NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop the analytics indexes, the new columns and the cascading FK (backfilled rows are kept)."""
+    with op.get_context().autocommit_block():
+        for index_name in ('ix_ia_responses_provider_errors', 'ix_ia_responses_provider_received'):
+            op.drop_index(
+                index_name,
+                table_name='ia_responses',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    op.drop_column('moderated_syntheses', 'quality')
+    op.drop_column('ia_responses', 'status')
+    _replace_interaction_fk(None)
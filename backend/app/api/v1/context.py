@@ -4,7 +4,7 @@ from sqlmodel import Session
 from uuid import UUID
 from pydantic import BaseModel, Field
 
-from app.core.database import get_db
+from app.core.database import get_db, read_session
 from app.services.context_manager import ContextManager, EmbeddingError
 from app.schemas.context import ChunkResponse, ChunkWithSimilarity, ContextBlock
 from app.crud.context import get_project_chunks, delete_project_chunks
@@ -161,18 +161,18 @@ async def process_text(
     """
 )
 async def search_context(
-    request: SearchRequest,
-    db: Session = Depends(get_db)
+    request: SearchRequest
 ) -> List[ChunkWithSimilarity]:
-    context_manager = ContextManager(db)
     try:
-        relevant_chunks = await context_manager.find_relevant_context(
-            query=request.query,
-            project_id=request.project_id,
-            user_id=request.user_id,
-            top_k=request.top_k,
-            similarity_threshold=request.similarity_threshold
-        )
+        # Solo lectura: réplica salvo que el usuario acabe de escribir
+        async with read_session(request.user_id) as db:
+            relevant_chunks = await ContextManager(db).find_relevant_context(
+                query=request.query,
+                project_id=request.project_id,
+                user_id=request.user_id,
+                top_k=request.top_k,
+                similarity_threshold=request.similarity_threshold
+            )
         return relevant_chunks
     except EmbeddingError as e:
         raise HTTPException(
@@ -232,19 +232,19 @@ async def delete_chunks(
     """
 )
 async def generate_context_block(
-    request: ContextBlockRequest,
-    db: Session = Depends(get_db)
+    request: ContextBlockRequest
 ) -> ContextBlock:
-    context_manager = ContextManager(db)
     try:
-        context_block = await context_manager.generate_context_block(
-            query=request.query,
-            project_id=request.project_id,
-            user_id=request.user_id,
-            max_tokens=request.max_tokens,
-            top_k=request.top_k,
-            similarity_threshold=request.similarity_threshold
-        )
+        # Solo lectura: réplica salvo que el usuario acabe de escribir
+        async with read_session(request.user_id) as db:
+            context_block = await ContextManager(db).generate_context_block(
+                query=request.query,
+                project_id=request.project_id,
+                user_id=request.user_id,
+                max_tokens=request.max_tokens,
+                top_k=request.top_k,
+                similarity_threshold=request.similarity_threshold
+            )
         return context_block
     except EmbeddingError as e:
         raise HTTPException(
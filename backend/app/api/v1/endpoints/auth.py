@@ -6,6 +6,7 @@ import logging
 from datetime import datetime
 
 from app.core.config import settings
+from app.core.read_routing import set_current_user
 from app.schemas.auth import (
     SessionResponse, 
     SessionUser, 
@@ -23,6 +24,13 @@ async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] =
     """
     Obtiene el usuario actual desde el token JWT de NextAuth.js
     """
+    user = await _user_from_credentials(credentials)
+    # Las lecturas enrutadas (get_read_db) respetan las escrituras recientes de este usuario
+    set_current_user(user.id if user else None)
+    return user
+
+
+async def _user_from_credentials(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[SessionUser]:
     if not credentials:
         return None
     
@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.fast_json import as_document
 from app.api.v1.endpoints.auth import get_current_user
 from app.schemas.auth import SessionUser
 from app.crud import context_session as context_crud
@@ -88,7 +89,7 @@ async def context_chat(
             )
         
         # Convertir a modelo Pydantic para trabajar con el servicio
-        session = context_crud.convert_interaction_to_context_session(db_session)
+        session = await context_crud.load_context_session(db, db_session)
         
         # Procesar mensaje con GPT-3.5
         response = await context_builder_service.process_user_message(
@@ -115,19 +116,11 @@ async def context_chat(
             message_type=response.message_type
         )
         
-        # Actualizar sesión con mensaje del usuario
-        await context_crud.update_context_session(
+        # Agregar el turno (mensaje del usuario y respuesta de la IA) a la sesión
+        await context_crud.append_context_messages(
             db=db,
             session=db_session,
-            new_message=user_message,
-            updated_context=response.accumulated_context
-        )
-        
-        # Actualizar sesión con respuesta de la IA
-        await context_crud.update_context_session(
-            db=db,
-            session=db_session,
-            new_message=ai_message,
+            new_messages=[user_message, ai_message],
             updated_context=response.accumulated_context
         )
         
@@ -197,7 +190,7 @@ async def get_context_session(
             )
         
         # Convertir a modelo Pydantic para acceder a los campos correctamente
-        session_model = context_crud.convert_interaction_to_context_session(db_session)
+        session_model = await context_crud.load_context_session(db, db_session)
         return session_model
         
     except HTTPException:
@@ -299,7 +292,7 @@ async def get_active_context_session(
                 detail="No hay sesión de contexto activa"
             )
         
-        session = context_crud.convert_interaction_to_context_session(db_session)
+        session = await context_crud.load_context_session(db, db_session)
         return session
         
     except HTTPException:
@@ -342,7 +335,8 @@ async def generate_ai_prompts(
             )
         
         # Convertir a modelo Pydantic para acceder a los campos correctamente
-        session_model = context_crud.convert_interaction_to_context_session(session)
+        # (solo se usa el contexto acumulado: el historial no se carga)
+        session_model = context_crud.convert_interaction_to_context_session(session, messages=[])
         
         # Importar los servicios correctos
         from app.services.query_service import QueryService
@@ -476,8 +470,9 @@ async def query_ais_individually(
                 detail="No tienes permiso para acceder a esta sesión"
             )
         
-        # Convertir a modelo Pydantic
-        session_model = context_crud.convert_interaction_to_context_session(session)
+        # Convertir a modelo Pydantic (solo se usa el contexto acumulado:
+        # el historial no se carga)
+        session_model = context_crud.convert_interaction_to_context_session(session, messages=[])
         
         # Importar servicios necesarios
         from app.services.ai_orchestrator import AIOrchestrator
@@ -573,7 +568,6 @@ Por favor, proporciona una respuesta detallada basada en el contexto proporciona
         
         # Guardar las respuestas en la base de datos para uso posterior del moderador
         try:
-            import json
             ai_responses_data = {
                 "responses": individual_responses,
                 "user_question": request.final_question,
@@ -582,7 +576,7 @@ Por favor, proporciona una respuesta detallada basada en el contexto proporciona
             }
             
             # Actualizar la sesión con las respuestas de IAs
-            session.ai_responses_json = json.dumps(ai_responses_data)
+            session.ai_responses_json = ai_responses_data
             await db.commit()
             logger.info(f"💾 Respuestas guardadas en BD para sesión: {session_id}")
             
@@ -769,9 +763,8 @@ async def generate_moderator_prompt(
                 detail="No hay respuestas de IAs disponibles para generar el prompt del moderador"
             )
         
-        # Parsear las respuestas de IAs desde JSON
-        import json
-        ai_responses_data = json.loads(db_session.ai_responses_json)
+        # Documento JSONB con las respuestas de IAs
+        ai_responses_data = as_document(db_session.ai_responses_json)
         
         # Manejar diferentes formatos de datos (puede ser lista o diccionario)
         if isinstance(ai_responses_data, list):
@@ -889,9 +882,8 @@ async def synthesize_ai_responses(
                 detail="No hay respuestas de IAs disponibles para sintetizar"
             )
         
-        # Parsear las respuestas de IAs desde JSON
-        import json
-        ai_responses_data = json.loads(db_session.ai_responses_json)
+        # Documento JSONB con las respuestas de IAs
+        ai_responses_data = as_document(db_session.ai_responses_json)
         
         # Manejar diferentes formatos de datos (puede ser lista o diccionario)
         if isinstance(ai_responses_data, list):
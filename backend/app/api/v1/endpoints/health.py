@@ -8,6 +8,8 @@ from fastapi import APIRouter, Depends
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.database import get_db
+from app.core.db_pool import pool_monitor, read_pool_monitor
+from app.core.read_routing import read_router
 from app.core.config import settings
 from app.schemas.health import (
     HealthResponse, 
@@ -20,6 +22,11 @@ from app.schemas.health import (
 from app.services.ai_adapters.openai_adapter import OpenAIAdapter
 from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
 from app.core.metrics import metrics_collector
+from app.core.loop_monitor import loop_lag_monitor
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.response_cache import response_cache
+from app.services.continuity_classifier import continuity_classifier
+from app.services.interaction_writer import interaction_writer
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -28,6 +35,15 @@ router = APIRouter()
 start_time = datetime.utcnow()
 
 
+def get_pool_stats() -> dict:
+    """Pool del primario y, si hay réplica de lectura, su pool y el enrutado"""
+    stats = pool_monitor.get_stats()
+    stats["read_routing"] = read_router.get_stats()
+    if read_router.replica_enabled:
+        stats["read_replica"] = read_pool_monitor.get_stats()
+    return stats
+
+
 async def check_database_health(db: AsyncSession) -> DatabaseHealth:
     """Verificar el estado de la base de datos"""
     try:
@@ -37,19 +53,22 @@ async def check_database_health(db: AsyncSession) -> DatabaseHealth:
         result = await db.exec("SELECT 1")
         
         response_time = int((time.time() - start) * 1000)
+        pool_stats = get_pool_stats()
         
         return DatabaseHealth(
             status="healthy",
             response_time_ms=response_time,
-            connection_pool_size=None,  # Se puede implementar según el pool usado
-            active_connections=None
+            connection_pool_size=pool_stats.get("pool_size"),
+            active_connections=pool_stats.get("in_use"),
+            pool=pool_stats
         )
         
     except Exception as e:
         logger.error(f"Error verificando BD: {e}")
         return DatabaseHealth(
             status="unhealthy",
-            response_time_ms=None
+            response_time_ms=None,
+            pool=get_pool_stats()
         )
 
 
@@ -169,6 +188,9 @@ async def detailed_health_check(
     elif (system_resources.memory_usage_percent and 
           system_resources.memory_usage_percent > 90):
         overall_status = "degraded"
+    elif db_health.pool and db_health.pool.get("timeouts"):
+        # Peticiones que no consiguieron conexión: el pool se queda corto
+        overall_status = "degraded"
     
     # Métricas adicionales (en un entorno real, se obtendrían de la BD)
     total_interactions_today = None  # TODO: Implementar consulta a BD
@@ -210,6 +232,75 @@ async def ai_providers_health_check() -> AIProviderHealth:
     return await check_ai_providers()
 
 
+@router.get("/outbound")
+async def outbound_scheduler_stats() -> dict:
+    """
+    GET /api/v1/health/outbound
+    
+    Estado del planificador de llamadas salientes: plazas ocupadas,
+    profundidad de cola por prioridad y tiempos de espera por proveedor.
+    """
+    return {
+        "providers": outbound_scheduler.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@router.get("/response-cache")
+async def response_cache_stats() -> dict:
+    """
+    GET /api/v1/health/response-cache
+    
+    Métricas de la caché de respuestas de proveedores (aciertos, fallos, evicciones).
+    """
+    return {
+        "enabled": settings.AI_RESPONSE_CACHE_ENABLED,
+        **response_cache.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@router.get("/followup")
+async def followup_classifier_stats() -> dict:
+    """
+    GET /api/v1/health/followup
+    
+    Clasificador de continuidad: resoluciones por etapa y tasa de consultas
+    resueltas sin llamar al LLM.
+    """
+    return {
+        **continuity_classifier.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@router.get("/write-behind")
+async def write_behind_stats() -> dict:
+    """
+    GET /api/v1/health/write-behind
+    
+    Persistencia write-behind: profundidad de la cola, latencia de volcado y
+    escrituras directas por cola saturada.
+    """
+    return {
+        **interaction_writer.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@router.get("/event-loop")
+async def event_loop_lag_stats() -> dict:
+    """
+    GET /api/v1/health/event-loop
+    
+    Lag del event loop: si alguna llamada bloquea el loop aparece aquí.
+    """
+    return {
+        **loop_lag_monitor.get_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
 @router.get("/system", response_model=SystemResources)
 async def system_resources_check() -> SystemResources:
     """
@@ -5,13 +5,15 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.fast_json import as_document
 from app.crud import interaction as interaction_crud
 from app.schemas.interaction import (
     InteractionHistoryResponse, 
     InteractionDetailResponse, 
     InteractionSummary,
-    InteractionEvent
+    InteractionEvent,
+    InteractionStatsResponse
 )
 from app.schemas.auth import SessionUser
 from app.api.v1.endpoints.auth import get_current_user
@@ -37,65 +39,73 @@ async def get_interaction_history(
     per_page: int = Query(20, ge=1, le=100, description="Elementos por página"),
     order_by: str = Query("created_at", description="Campo para ordenar"),
     order_direction: str = Query("desc", regex="^(asc|desc)$", description="Dirección del ordenamiento"),
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (sustituye a page)"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: SessionUser = Depends(require_auth),
 ) -> InteractionHistoryResponse:
     """
     GET /api/v1/projects/{project_id}/interaction_events
     
     Obtener historial paginado de interacciones del proyecto.
+    
+    Ordenando por created_at, la respuesta incluye `next_cursor`: pasarlo como
+    `cursor` pagina por clave y las páginas profundas cuestan lo mismo que la
+    primera. `page` se mantiene para compatibilidad (OFFSET).
     """
     user_id = UUID(current_user.id)
     
     try:
-        # Calcular skip para paginación
-        skip = (page - 1) * per_page
+        after = None
+        if cursor:
+            try:
+                after = interaction_crud.decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Cursor inválido")
         
-        # Obtener interacciones
-        interactions = await interaction_crud.get_project_interactions(
+        # Calcular skip para paginación (solo sin cursor)
+        skip = 0 if after else (page - 1) * per_page
+        
+        # Obtener resúmenes (proyección ligera calculada en el servidor);
+        # una fila extra indica si hay página siguiente
+        rows = await interaction_crud.get_project_interaction_summaries(
             db=db,
             project_id=project_id,
             user_id=user_id,
             skip=skip,
-            limit=per_page,
+            limit=per_page + 1,
             order_by=order_by,
-            order_direction=order_direction
+            order_direction=order_direction,
+            after=after
         )
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
         
-        # Obtener conteo total
+        # Conteo total desde el contador por proyecto
         total_count = await interaction_crud.count_project_interactions(
             db=db,
             project_id=project_id,
             user_id=user_id
         )
         
-        # Convertir a summaries
-        interaction_summaries = []
-        for interaction in interactions:
-            # Parsear síntesis para obtener preview
-            synthesis_preview = "Sin síntesis disponible"
-            if interaction.moderator_synthesis_json:
-                import json
-                synthesis_data = json.loads(interaction.moderator_synthesis_json)
-                synthesis_text = synthesis_data.get("synthesis_text", "")
-                synthesis_preview = synthesis_text[:300] + "..." if len(synthesis_text) > 300 else synthesis_text
-            
-            summary = InteractionSummary(
-                id=interaction.id,
-                user_prompt=interaction.user_prompt_text[:200] + "..." if len(interaction.user_prompt_text) > 200 else interaction.user_prompt_text,
-                synthesis_preview=synthesis_preview,
-                moderator_quality=synthesis_data.get("quality", "unknown") if interaction.moderator_synthesis_json else "unknown",
-                created_at=interaction.created_at,
-                processing_time_ms=interaction.processing_time_ms or 0
+        interaction_summaries = [
+            InteractionSummary(
+                id=row.id,
+                user_prompt=row.user_prompt,
+                synthesis_preview=row.synthesis_preview if row.synthesis_preview is not None else "Sin síntesis disponible",
+                moderator_quality=row.moderator_quality,
+                created_at=row.created_at,
+                processing_time_ms=row.processing_time_ms
             )
-            interaction_summaries.append(summary)
+            for row in rows
+        ]
+        
+        next_cursor = None
+        if has_next and order_by == "created_at":
+            next_cursor = interaction_crud.encode_cursor(rows[-1].created_at, rows[-1].id)
         
-        # Calcular metadatos de paginación
-        total_pages = (total_count + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_prev = page > 1
+        has_prev = after is not None or page > 1
         
-        logger.info(f"Historial obtenido: {len(interactions)} interacciones, página {page}")
+        logger.info(f"Historial obtenido: {len(interaction_summaries)} interacciones, página {page}")
         
         return InteractionHistoryResponse(
             interactions=interaction_summaries,
@@ -103,9 +113,12 @@ async def get_interaction_history(
             page=page,
             per_page=per_page,
             has_next=has_next,
-            has_prev=has_prev
+            has_prev=has_prev,
+            next_cursor=next_cursor
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo historial de proyecto {project_id}: {e}")
         raise HTTPException(
@@ -114,11 +127,42 @@ async def get_interaction_history(
         )
 
 
+@router.get("/{project_id}/interaction_events/stats", response_model=InteractionStatsResponse)
+async def get_interaction_stats(
+    project_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: SessionUser = Depends(require_auth),
+) -> InteractionStatsResponse:
+    """
+    GET /api/v1/projects/{project_id}/interaction_events/stats
+    
+    Estadísticas del proyecto: totales, calidad de las síntesis y latencia y
+    errores por proveedor, agregadas en SQL sobre moderated_syntheses e
+    ia_responses.
+    """
+    user_id = UUID(current_user.id)
+    
+    try:
+        stats = await interaction_crud.get_interaction_stats(
+            db=db,
+            project_id=project_id,
+            user_id=user_id
+        )
+        return InteractionStatsResponse(**stats)
+        
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas de proyecto {project_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error obteniendo estadísticas: {str(e)}"
+        )
+
+
 @router.get("/{project_id}/interaction_events/{interaction_id}", response_model=InteractionDetailResponse)
 async def get_interaction_detail(
     project_id: UUID,
     interaction_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: SessionUser = Depends(require_auth),
 ) -> InteractionDetailResponse:
     """
@@ -143,20 +187,10 @@ async def get_interaction_detail(
                 detail="Interacción no encontrada"
             )
         
-        # Convertir a formato de respuesta
-        import json
-        
-        # Parsear respuestas de IA
-        ai_responses = []
-        if interaction.ai_responses_json:
-            ai_responses_data = json.loads(interaction.ai_responses_json)
-            # Aquí podrías convertir a StandardAIResponse si es necesario
-            ai_responses = ai_responses_data
-        
-        # Parsear síntesis del moderador
-        moderator_synthesis = None
-        if interaction.moderator_synthesis_json:
-            moderator_synthesis = json.loads(interaction.moderator_synthesis_json)
+        # Documentos JSONB: respuestas de IA y síntesis del moderador
+        # Aquí podrías convertir a StandardAIResponse si es necesario
+        ai_responses = as_document(interaction.ai_responses_json, [])
+        moderator_synthesis = as_document(interaction.moderator_synthesis_json)
         
         # Crear evento de interacción
         interaction_event = InteractionEvent(
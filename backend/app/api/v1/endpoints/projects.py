@@ -1,15 +1,22 @@
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from uuid import UUID, uuid4
+import asyncio
 import logging
+import time
 from datetime import datetime
+from dataclasses import dataclass
 import json
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, async_session_factory, read_session
+from app.core.fast_json import as_document
+from app.core.single_flight import SingleFlight, make_flight_key, normalize_prompt
 from app.crud import project as project_crud
 from app.crud import interaction as interaction_crud
 from app.schemas.project import Project, ProjectCreate, ProjectUpdate
@@ -21,10 +28,12 @@ from app.api.v1.endpoints.auth import get_current_user
 
 # Servicios para orquestación
 from app.services.ai_orchestrator import AIOrchestrator
-from app.services.ai_moderator import AIModerator
+from app.services.ai_moderator import AIModerator, SynthesisStreamEvent
 from app.services.context_manager import ContextManager
 from app.services.pre_analyst import pre_analyst_service
 from app.services.followup_interpreter import create_followup_interpreter
+from app.services.interaction_writer import PendingInteraction, interaction_writer
+from app.services.query_pipeline import PipelineExecutor, PipelineStage, Speculation, prompt_similarity
 
 # Sistema de métricas
 from app.core.metrics import (
@@ -111,11 +120,6 @@ async def analyze_followup_continuity(
             
             if is_followup:
                 logger.info(f"✅ Continuidad detectada - prompt enriquecido con contexto histórico")
-                metrics_collector.add_info(
-                    interaction_id,
-                    f"Continuidad conversacional detectada - QueryType: {query_request.query_type.value}",
-                    "followup_analysis"
-                )
             else:
                 logger.info(f"ℹ️ Tema nuevo detectado - usando prompt original")
             
@@ -259,6 +263,28 @@ async def get_context_for_query(
         return None, None
 
 
+async def get_context_in_own_session(
+    query: str,
+    project_id: UUID,
+    user_id: UUID,
+    interaction_id: UUID
+) -> tuple[Optional[str], Optional[ContextInfo]]:
+    """
+    Variante de get_context_for_query con su propia sesión de base de datos,
+    para ejecutarse en paralelo con etapas que usan la sesión principal
+    (una AsyncSession no admite operaciones concurrentes). Es solo lectura:
+    va a la réplica si está configurada y el usuario no acaba de escribir.
+    """
+    async with read_session(user_id) as db:
+        return await get_context_for_query(
+            context_manager=ContextManager(db),
+            query=query,
+            project_id=project_id,
+            user_id=user_id,
+            interaction_id=interaction_id
+        )
+
+
 async def orchestrate_ai_responses(
     orchestrator: AIOrchestrator,
     user_prompt: str,
@@ -267,10 +293,14 @@ async def orchestrate_ai_responses(
     interaction_id: UUID,
     temperature: Optional[float] = None,
     max_tokens: Optional[int] = None,
-    context_info: Optional[ContextInfo] = None
+    context_info: Optional[ContextInfo] = None,
+    quorum: Optional[int] = None
 ):
     """
     Paso 2: Orquestar respuestas de múltiples proveedores de IA
+    
+    Con `quorum` se retorna en cuanto ese número de proveedores responde con
+    éxito; los rezagados quedan pendientes en `quorum_responses`.
     """
     try:
         with time_step(interaction_id, "ai_orchestration") as timer:
@@ -295,23 +325,39 @@ Por favor, responde considerando el contexto proporcionado cuando sea relevante.
                 max_tokens=max_tokens or 1000,
                 temperature=temperature or 0.7,
                 project_id=str(project_id),
-                user_id=str(interaction_id)  # Usar interaction_id como user_id temporal
+                user_id=str(interaction_id),  # Usar interaction_id como user_id temporal
+                # Los reintentos de cada proveedor no pueden superar el SLO de la consulta
+                deadline=time.monotonic() + settings.AI_REQUEST_DEADLINE_SECONDS
             )
             
-            # Ejecutar orquestación usando estrategia PARALLEL
+            # Ejecutar orquestación usando estrategia PARALLEL (o QUORUM en síntesis progresiva)
             from app.services.ai_orchestrator import AIOrchestrationStrategy
-            ai_responses = await orchestrator.orchestrate(
-                ai_request, 
-                strategy=AIOrchestrationStrategy.PARALLEL
-            )
+            quorum_responses = None
+            if quorum:
+                quorum_responses = await orchestrator.orchestrate(
+                    ai_request,
+                    strategy=AIOrchestrationStrategy.QUORUM,
+                    quorum=quorum
+                )
+                ai_responses = quorum_responses.responses
+            else:
+                ai_responses = await orchestrator.orchestrate(
+                    ai_request, 
+                    strategy=AIOrchestrationStrategy.PARALLEL
+                )
             
             # Crear objeto de resultado compatible
             class OrchestrationResult:
-                def __init__(self, ai_responses, context_info=None):
+                def __init__(self, ai_responses, context_info=None, quorum_responses=None):
                     self.ai_responses = ai_responses
                     self.context_info = context_info
+                    self.quorum_responses = quorum_responses
+                
+                def cancel_pending(self):
+                    if self.quorum_responses is not None:
+                        self.quorum_responses.cancel_pending()
             
-            orchestration_result = OrchestrationResult(ai_responses, context_info)
+            orchestration_result = OrchestrationResult(ai_responses, context_info, quorum_responses)
             
             if not orchestration_result.ai_responses:
                 raise HTTPException(
@@ -351,10 +397,14 @@ async def synthesize_responses(
     moderator: AIModerator,
     ai_responses: list,
     project_id: UUID,
-    interaction_id: UUID
+    interaction_id: UUID,
+    synthesis_listener: Optional[Callable[[SynthesisStreamEvent], Awaitable[None]]] = None
 ):
     """
     Paso 3: Sintetizar respuestas usando el Moderador IA v2.0
+    
+    Con `synthesis_listener` la síntesis se genera en streaming y cada token
+    y sección cerrada se entrega al listener según se produce.
     """
     try:
         with time_step(interaction_id, "moderator_synthesis") as timer:
@@ -368,7 +418,25 @@ async def synthesize_responses(
                 )
             
             # Ejecutar síntesis
-            synthesis_result = await moderator.synthesize_responses(ai_responses)
+            if synthesis_listener is None:
+                synthesis_result = await moderator.synthesize_responses(ai_responses)
+            else:
+                synthesis_result = None
+                synthesis_start = time.perf_counter()
+                async for event in moderator.stream_synthesis(ai_responses):
+                    if event.event == "final":
+                        synthesis_result = event.result
+                        continue
+                    if event.event == "section" and "first_insight_ms" not in timer.kwargs:
+                        timer.kwargs["first_insight_ms"] = int((time.perf_counter() - synthesis_start) * 1000)
+                        logger.info(f"💡 Primera sección de la síntesis en {timer.kwargs['first_insight_ms']}ms")
+                    await synthesis_listener(event)
+            
+            if synthesis_result is None:
+                raise HTTPException(
+                    status_code=500,
+                    detail="El moderador no pudo generar una síntesis válida"
+                )
             
             if not synthesis_result.synthesis_text:
                 raise HTTPException(
@@ -401,6 +469,50 @@ async def synthesize_responses(
         )
 
 
+async def merge_late_responses(
+    moderator: AIModerator,
+    orchestration_result,
+    synthesis_result,
+    project_id: UUID,
+    interaction_id: UUID
+):
+    """
+    Paso 3.5 (síntesis progresiva): incorporar las respuestas que llegaron
+    después de alcanzar el quórum, dentro de la ventana de gracia.
+    """
+    if orchestration_result.quorum_responses is None:
+        return synthesis_result
+    
+    late_responses = await orchestration_result.quorum_responses.collect_late(
+        settings.PROGRESSIVE_SYNTHESIS_GRACE_SECONDS
+    )
+    if not late_responses:
+        return synthesis_result
+    
+    orchestration_result.ai_responses.extend(late_responses)
+    successful_late = [r for r in late_responses if r.status == "success"]
+    discarded = len(late_responses) - len(successful_late)
+    if discarded:
+        metrics_collector.add_warning(
+            interaction_id,
+            f"{discarded} respuestas tardías descartadas (fallidas o fuera de la ventana de gracia)",
+            "late_merge"
+        )
+    if not successful_late:
+        return synthesis_result
+    
+    logger.info(f"🧩 Fusionando {len(successful_late)} respuestas tardías para proyecto {project_id}")
+    if synthesis_result.fallback_used or synthesis_result.successful_responses_count < 2:
+        # No había una síntesis real sobre la que fusionar: sintetizar con todas
+        return await synthesize_responses(
+            moderator=moderator,
+            ai_responses=orchestration_result.ai_responses,
+            project_id=project_id,
+            interaction_id=interaction_id
+        )
+    return await moderator.merge_late_responses(synthesis_result, late_responses)
+
+
 async def save_interaction_background(
     project_id: UUID,
     user_id: UUID,
@@ -415,85 +527,73 @@ async def save_interaction_background(
 ):
     """
     Paso 4: Guardar la interacción completa (ejecutado en background)
+    
+    La interacción se encola en la persistencia write-behind, que la guarda en
+    lote junto con los chunks de la síntesis.
     """
     try:
         logger.info(f"Guardando interacción {interaction_id} en background")
         
-        # Crear una nueva sesión de base de datos para el background task
-        from app.core.database import async_session_factory
-        
-        async with async_session_factory() as db:
-            # Preparar datos de la interacción con serialización segura
-            def serialize_ai_response(response):
-                """Serializar respuesta IA de manera segura"""
-                if hasattr(response, 'dict'):
-                    data = response.dict()
-                else:
-                    data = response
-                
-                # Convertir datetime a string si existe
-                if isinstance(data, dict):
-                    for key, value in data.items():
-                        if isinstance(value, datetime):
-                            data[key] = value.isoformat()
-                
-                return data
+        # Preparar datos de la interacción con serialización segura
+        def serialize_ai_response(response):
+            """Serializar respuesta IA de manera segura"""
+            if hasattr(response, 'dict'):
+                data = response.dict()
+            else:
+                data = response
             
-            interaction_data = {
-                "id": str(interaction_id),
-                "project_id": str(project_id),
-                "user_id": str(user_id),
-                "user_prompt": user_prompt,
-                "ai_responses": [serialize_ai_response(response) for response in ai_responses],
-                "moderator_synthesis": {
-                    "synthesis_text": synthesis_result.synthesis_text,
-                    "quality": synthesis_result.quality.value,
-                    "key_themes": synthesis_result.key_themes,
-                    "contradictions": synthesis_result.contradictions,
-                    "consensus_areas": synthesis_result.consensus_areas,
-                    "recommendations": synthesis_result.recommendations,
-                    "suggested_questions": synthesis_result.suggested_questions,
-                    "research_areas": synthesis_result.research_areas,
-                    "fallback_used": synthesis_result.fallback_used
-                },
-                "context_used": context_text is not None,
-                "context_preview": context_text[:200] + "..." if context_text and len(context_text) > 200 else context_text,
-                "processing_time_ms": processing_time_ms,
-                "created_at": datetime.utcnow().isoformat(),  # Convertir a string ISO
-                # ✅ Metadatos específicos para continuidad conversacional
-                "followup_metadata": {
-                    "is_followup": is_followup,
-                    "enriched_prompt": enriched_prompt,
-                    "prompt_enrichment_applied": enriched_prompt is not None and enriched_prompt != user_prompt
-                }
-            }
+            # Convertir datetime a string si existe
+            if isinstance(data, dict):
+                for key, value in data.items():
+                    if isinstance(value, datetime):
+                        data[key] = value.isoformat()
             
-            # ✅ Logging específico para tracking de continuidad conversacional
-            if is_followup:
-                logger.info(f"🔗 Continuidad conversacional detectada en interacción {interaction_id}")
-                logger.info(f"   - Prompt original: {user_prompt[:100]}...")
-                logger.info(f"   - Prompt enriquecido: {enriched_prompt[:100] if enriched_prompt else 'N/A'}...")
-            else:
-                logger.info(f"🆕 Tema nuevo detectado en interacción {interaction_id}")
-            
-            # Guardar en base de datos
-            await interaction_crud.create_interaction(db, interaction_data)
-            await db.commit()
-            
-        # Opcional: Guardar contexto generado por la respuesta para futuras consultas
-        if synthesis_result.synthesis_text:
-            async with async_session_factory() as db:
-                context_manager = ContextManager(db)
-                await context_manager.process_and_store_text(
-                    text=synthesis_result.synthesis_text,
-                    project_id=project_id,
-                    user_id=user_id,
-                    source_type="ai_synthesis",
-                    source_identifier=str(interaction_id)
-                )
-                await db.commit()
+            return data
         
-        logger.info(f"✅ Interacción {interaction_id} guardada exitosamente en base de datos")
+        interaction_data = {
+            "id": str(interaction_id),
+            "project_id": str(project_id),
+            "user_id": str(user_id),
+            "user_prompt": user_prompt,
+            "ai_responses": [serialize_ai_response(response) for response in ai_responses],
+            "moderator_synthesis": {
+                "synthesis_text": synthesis_result.synthesis_text,
+                "quality": synthesis_result.quality.value,
+                "key_themes": synthesis_result.key_themes,
+                "contradictions": synthesis_result.contradictions,
+                "consensus_areas": synthesis_result.consensus_areas,
+                "recommendations": synthesis_result.recommendations,
+                "suggested_questions": synthesis_result.suggested_questions,
+                "research_areas": synthesis_result.research_areas,
+                "fallback_used": synthesis_result.fallback_used
+            },
+            "context_used": context_text is not None,
+            "context_preview": context_text[:200] + "..." if context_text and len(context_text) > 200 else context_text,
+            "processing_time_ms": processing_time_ms,
+            "created_at": datetime.utcnow().isoformat(),  # Convertir a string ISO
+            # ✅ Metadatos específicos para continuidad conversacional
+            "followup_metadata": {
+                "is_followup": is_followup,
+                "enriched_prompt": enriched_prompt,
+                "prompt_enrichment_applied": enriched_prompt is not None and enriched_prompt != user_prompt
+            }
+        }
+        
+        # ✅ Logging específico para tracking de continuidad conversacional
+        if is_followup:
+            logger.info(f"🔗 Continuidad conversacional detectada en interacción {interaction_id}")
+            logger.info(f"   - Prompt original: {user_prompt[:100]}...")
+            logger.info(f"   - Prompt enriquecido: {enriched_prompt[:100] if enriched_prompt else 'N/A'}...")
+        else:
+            logger.info(f"🆕 Tema nuevo detectado en interacción {interaction_id}")
+        
+        # Encolar en la persistencia write-behind (guarda interacción y chunks en lote)
+        await interaction_writer.submit(PendingInteraction(
+            interaction=interaction_crud.build_interaction(interaction_data),
+            synthesis_text=synthesis_result.synthesis_text
+        ))
+        
+        logger.info(f"📥 Interacción {interaction_id} encolada para guardado")
         
     except Exception as e:
         logger.error(f"❌ Error guardando interacción {interaction_id}: {e}")
@@ -628,6 +728,27 @@ async def delete_project(
 # ENDPOINT PRINCIPAL DE ORQUESTACIÓN
 # ========================================
 
+@dataclass
+class QueryPipelineOutcome:
+    """Resultado compartido de una ejecución del pipeline de consulta"""
+    response: QueryResponse
+    save_kwargs: Dict[str, Any]
+    save_claimed: bool = False
+    
+    def claim_save(self) -> bool:
+        """Solo el primer receptor del resultado programa el guardado de la interacción"""
+        if self.save_claimed:
+            return False
+        self.save_claimed = True
+        return True
+
+
+# Deduplicación de consultas idénticas concurrentes (doble clic, reintentos del frontend)
+query_single_flight: SingleFlight[QueryPipelineOutcome] = SingleFlight(
+    retention_seconds=settings.QUERY_SINGLE_FLIGHT_RETENTION_SECONDS
+)
+
+
 @router.post("/{project_id}/query", response_model=QueryResponse)
 async def query_project(
     *,
@@ -653,11 +774,141 @@ async def query_project(
     El PreAnalyst mejora automáticamente consultas vagas o ambiguas,
     generando prompts refinados para mejor comprensión contextual.
     
+    Las consultas idénticas concurrentes (mismo proyecto, usuario, prompt
+    normalizado y opciones) comparten una única ejecución del pipeline.
+    
     Manejo robusto de errores en cada paso con rollback automático.
     Métricas completas de observabilidad y rendimiento.
     """
-    start_time = datetime.utcnow()
     user_id = UUID(current_user.id)
+    
+    # Verificar que el proyecto existe y pertenece al usuario
+    await require_queryable_project(db, project_id, user_id)
+    
+    flight_key = make_flight_key(
+        project_id,
+        user_id,
+        normalize_prompt(query_request.user_prompt_text),
+        include_context=query_request.include_context,
+        temperature=query_request.temperature,
+        max_tokens=query_request.max_tokens,
+        conversation_mode=query_request.conversation_mode
+    )
+    
+    outcome, shared = await query_single_flight.run(
+        flight_key,
+        lambda: execute_query_pipeline(project_id, user_id, query_request)
+    )
+    
+    if shared:
+        logger.info(
+            f"♻️ Consulta duplicada para proyecto {project_id}: "
+            f"reutilizando interacción {outcome.response.interaction_event_id}"
+        )
+    
+    # ========================================
+    # PASO 6: GUARDADO EN BACKGROUND
+    # ========================================
+    
+    # Solo una de las peticiones deduplicadas guarda la interacción
+    if outcome.claim_save():
+        background_tasks.add_task(save_interaction_background, **outcome.save_kwargs)
+    
+    return outcome.response
+
+
+@router.post("/{project_id}/query/stream")
+async def query_project_stream(
+    *,
+    db: AsyncSession = Depends(get_db),
+    project_id: UUID,
+    query_request: QueryRequest,
+    background_tasks: BackgroundTasks,
+    current_user: SessionUser = Depends(require_auth),
+) -> StreamingResponse:
+    """
+    POST /api/v1/projects/{project_id}/query/stream
+    
+    Mismo flujo que `/query`, pero la síntesis del moderador se entrega como
+    Server-Sent Events según se genera:
+    - `synthesis_token`: fragmento de texto de la síntesis
+    - `synthesis_section`: sección cerrada con sus componentes (key_themes,
+      contradictions, suggested_questions...)
+    - `final`: QueryResponse completa (igual que `/query`)
+    - `error`: fallo del pipeline, con status_code y detail
+    
+    No se deduplica con single-flight: cada cliente necesita su propio flujo.
+    """
+    user_id = UUID(current_user.id)
+    await require_queryable_project(db, project_id, user_id)
+    
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def forward_synthesis_event(event: SynthesisStreamEvent) -> None:
+        await events.put((
+            f"synthesis_{event.event}",
+            event.model_dump(mode="json", exclude={"event", "result"}, exclude_none=True)
+        ))
+    
+    async def run_pipeline() -> None:
+        try:
+            outcome = await execute_query_pipeline(
+                project_id, user_id, query_request, synthesis_listener=forward_synthesis_event
+            )
+            if outcome.claim_save():
+                background_tasks.add_task(save_interaction_background, **outcome.save_kwargs)
+            await events.put(("final", outcome.response.model_dump(mode="json")))
+        except HTTPException as e:
+            await events.put(("error", {"status_code": e.status_code, "detail": e.detail}))
+        except Exception as e:
+            logger.error(f"Error en consulta en streaming para proyecto {project_id}: {e}")
+            await events.put(("error", {"status_code": 500, "detail": "Error interno del servidor"}))
+    
+    async def event_stream():
+        pipeline_task = asyncio.create_task(run_pipeline())
+        try:
+            while True:
+                name, data = await events.get()
+                yield f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                if name in ("final", "error"):
+                    break
+        finally:
+            # Si el cliente se desconecta no se sigue generando la síntesis
+            if not pipeline_task.done():
+                pipeline_task.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
+
+
+async def require_queryable_project(db: AsyncSession, project_id: UUID, user_id: UUID) -> Project:
+    """Verifica que el proyecto existe y pertenece al usuario"""
+    project = await project_crud.get_project(db=db, id=project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    
+    if project.user_id != user_id:
+        raise HTTPException(status_code=403, detail="No tienes permisos para consultar este proyecto")
+    
+    return project
+
+
+async def execute_query_pipeline(
+    project_id: UUID,
+    user_id: UUID,
+    query_request: QueryRequest,
+    synthesis_listener: Optional[Callable[[SynthesisStreamEvent], Awaitable[None]]] = None
+) -> QueryPipelineOutcome:
+    """
+    Ejecuta los pasos 0.5-5 del flujo central para una consulta ya validada.
+    Usa su propia sesión de base de datos porque su resultado puede ser
+    compartido por varias peticiones HTTP (single-flight).
+    """
+    start_time = datetime.utcnow()
     interaction_id = uuid4()
     
     # Variables para cleanup
@@ -670,132 +921,252 @@ async def query_project(
     metrics = start_orchestration_metrics(interaction_id, project_id, user_id)
     
     try:
-        # ========================================
-        # PASO 0: VALIDACIÓN Y SETUP
-        # ========================================
-        
-        logger.info(f"🎯 Iniciando consulta {interaction_id} para proyecto {project_id}")
-        
-        # Verificar que el proyecto existe y pertenece al usuario
-        project = await project_crud.get_project(db=db, id=project_id)
-        if not project:
-            raise HTTPException(status_code=404, detail="Proyecto no encontrado")
-        
-        if project.user_id != user_id:
-            raise HTTPException(status_code=403, detail="No tienes permisos para consultar este proyecto")
-        
-        # Inicializar servicios
-        orchestrator = AIOrchestrator()
-        moderator = AIModerator()
-        context_manager = ContextManager(db)
-        
-        # ========================================
-        # PASO 0.5: ANÁLISIS DE CONTINUIDAD CONVERSACIONAL
-        # ========================================
-        
-        enriched_prompt, is_followup = await analyze_followup_continuity(
-            user_prompt=query_request.user_prompt_text,
-            project_id=project_id,
-            user_id=user_id,
-            db=db,
-            interaction_id=interaction_id,
-            conversation_mode=query_request.conversation_mode or "auto"
-        )
-        
-        # ========================================
-        # PASO 1: PRE-ANÁLISIS DE LA CONSULTA
-        # ========================================
-        
-        refined_prompt, needs_clarification = await pre_analyze_query(
-            user_prompt=enriched_prompt,  # Usar prompt enriquecido si hay continuidad
-            project_id=project_id,
-            interaction_id=interaction_id,
-            force_analyze=False  # Por ahora automático
-        )
-        
-        # Si necesita clarificación, por ahora continuamos con prompt original
-        # TODO: Implementar flujo de clarificación iterativo
-        effective_prompt = refined_prompt
-        
-        # ========================================
-        # PASO 2: OBTENER CONTEXTO RELEVANTE
-        # ========================================
-        
-        context_text, context_info = await get_context_for_query(
-            context_manager=context_manager,
-            query=effective_prompt,  # Usar prompt refinado para búsqueda de contexto
-            project_id=project_id,
-            user_id=user_id,
-            interaction_id=interaction_id,
-            include_context=query_request.include_context
-        )
-        
-        # ========================================
-        # PASO 3: ORQUESTACIÓN DE IAs
-        # ========================================
-        
-        orchestration_result = await orchestrate_ai_responses(
-            orchestrator=orchestrator,
-            user_prompt=effective_prompt,  # Usar prompt refinado para orquestación
-            context_text=context_text,
-            project_id=project_id,
-            interaction_id=interaction_id,
-            temperature=query_request.temperature,
-            max_tokens=query_request.max_tokens,
-            context_info=context_info
-        )
-        
-        # ========================================
-        # PASO 4: SÍNTESIS CON MODERADOR v2.0
-        # ========================================
-        
-        synthesis_result = await synthesize_responses(
-            moderator=moderator,
-            ai_responses=orchestration_result.ai_responses,
-            project_id=project_id,
-            interaction_id=interaction_id
-        )
-        
-        # ========================================
-        # PASO 5: CALCULAR MÉTRICAS Y RESPUESTA
-        # ========================================
-        
-        processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        async with async_session_factory() as db:
+            logger.info(f"🎯 Iniciando consulta {interaction_id} para proyecto {project_id}")
+            
+            # Inicializar servicios
+            orchestrator = AIOrchestrator()
+            moderator = AIModerator()
+            context_manager = ContextManager(db)
+            
+            # Los pasos se ejecutan como un grafo de dependencias: cada etapa
+            # arranca en cuanto tiene sus entradas, y las independientes se solapan
+            speculative_tasks: list[asyncio.Future] = []
+            # Síntesis progresiva: no esperar al proveedor más lento (3+ proveedores)
+            quorum = orchestrator.progressive_quorum()
+            
+            # ========================================
+            # PASO 0.5: ANÁLISIS DE CONTINUIDAD CONVERSACIONAL
+            # ========================================
+            
+            async def followup_stage(raw_prompt: str):
+                return await analyze_followup_continuity(
+                    user_prompt=raw_prompt,
+                    project_id=project_id,
+                    user_id=user_id,
+                    db=db,
+                    interaction_id=interaction_id,
+                    conversation_mode=query_request.conversation_mode or "auto"
+                )
+            
+            # ========================================
+            # PASO 1: PRE-ANÁLISIS DE LA CONSULTA
+            # ========================================
+            
+            async def pre_analysis_stage(enriched_prompt: str):
+                return await pre_analyze_query(
+                    user_prompt=enriched_prompt,  # Usar prompt enriquecido si hay continuidad
+                    project_id=project_id,
+                    interaction_id=interaction_id,
+                    force_analyze=False  # Por ahora automático
+                )
+            
+            # ========================================
+            # PASO 2: OBTENER CONTEXTO RELEVANTE
+            # ========================================
+            
+            async def speculative_retrieval_stage(raw_prompt: str):
+                # Búsqueda especulativa sobre el prompt original mientras se refina;
+                # se lanza sin esperar y la etapa de contexto decide si la usa
+                if not query_request.include_context:
+                    return None
+                task = asyncio.ensure_future(get_context_in_own_session(
+                    query=raw_prompt,
+                    project_id=project_id,
+                    user_id=user_id,
+                    interaction_id=interaction_id
+                ))
+                speculative_tasks.append(task)
+                return task
+            
+            async def retrieval_stage(raw_prompt: str, refined_prompt: str, speculative_retrieval):
+                try:
+                    similarity = prompt_similarity(raw_prompt, refined_prompt)
+                    if speculative_retrieval is not None and similarity >= settings.SPECULATIVE_RETRIEVAL_SIMILARITY:
+                        logger.info(f"🔮 Reutilizando contexto especulativo (similitud {similarity:.2f})")
+                        return await speculative_retrieval
+                    
+                    return await get_context_for_query(
+                        context_manager=context_manager,
+                        query=refined_prompt,  # Usar prompt refinado para búsqueda de contexto
+                        project_id=project_id,
+                        user_id=user_id,
+                        interaction_id=interaction_id,
+                        include_context=query_request.include_context
+                    )
+                finally:
+                    if speculative_retrieval is not None and not speculative_retrieval.done():
+                        speculative_retrieval.cancel()
+            
+            # ========================================
+            # PASO 3: ORQUESTACIÓN DE IAs
+            # ========================================
+            
+            async def speculative_dispatch_stage(raw_prompt: str, speculative_retrieval):
+                # Despacho a proveedores con el prompt original mientras el
+                # pre-análisis refina; la etapa de orquestación decide si se usa
+                if not settings.SPECULATIVE_DISPATCH_ENABLED:
+                    return None
+                context_text, context_info = None, None
+                if speculative_retrieval is not None:
+                    await asyncio.wait([speculative_retrieval])
+                    if speculative_retrieval.cancelled():
+                        return None  # El prompt refinado ya se alejó del original
+                    context_text, context_info = speculative_retrieval.result()
+                
+                speculation = Speculation(
+                    orchestrate_ai_responses(
+                        orchestrator=orchestrator,
+                        user_prompt=raw_prompt,
+                        context_text=context_text,
+                        project_id=project_id,
+                        interaction_id=interaction_id,
+                        temperature=query_request.temperature,
+                        max_tokens=query_request.max_tokens,
+                        context_info=context_info,
+                        quorum=quorum
+                    ),
+                    key=context_text
+                )
+                speculative_tasks.append(speculation.task)
+                return speculation
+            
+            async def orchestration_stage(
+                raw_prompt: str,
+                refined_prompt: str,
+                context_text,
+                context_info,
+                speculative_dispatch: Optional[Speculation]
+            ):
+                if speculative_dispatch is not None:
+                    similarity = prompt_similarity(raw_prompt, refined_prompt)
+                    if (similarity >= settings.SPECULATIVE_DISPATCH_SIMILARITY
+                            and speculative_dispatch.key == context_text):
+                        result = await speculative_dispatch.confirm()
+                        metrics_collector.record_speculation(
+                            interaction_id, hit=True, latency_saved_ms=speculative_dispatch.latency_saved_ms
+                        )
+                        logger.info(
+                            f"🔮 Despacho especulativo aprovechado (similitud {similarity:.2f}, "
+                            f"{int(speculative_dispatch.latency_saved_ms)}ms ahorrados)"
+                        )
+                        return result
+                    
+                    speculative_dispatch.discard()
+                    if speculative_dispatch.task.done() and not speculative_dispatch.task.cancelled() \
+                            and speculative_dispatch.task.exception() is None:
+                        speculative_dispatch.task.result().cancel_pending()
+                    metrics_collector.record_speculation(interaction_id, hit=False)
+                    logger.info(f"🔁 Despacho especulativo descartado (similitud {similarity:.2f}), redespachando")
+                
+                return await orchestrate_ai_responses(
+                    orchestrator=orchestrator,
+                    user_prompt=refined_prompt,  # Usar prompt refinado para orquestación
+                    context_text=context_text,
+                    project_id=project_id,
+                    interaction_id=interaction_id,
+                    temperature=query_request.temperature,
+                    max_tokens=query_request.max_tokens,
+                    context_info=context_info,
+                    quorum=quorum
+                )
+            
+            # ========================================
+            # PASO 4: SÍNTESIS CON MODERADOR v2.0
+            # ========================================
+            
+            async def synthesis_stage(orchestration_result):
+                try:
+                    synthesis_result = await synthesize_responses(
+                        moderator=moderator,
+                        ai_responses=orchestration_result.ai_responses,
+                        project_id=project_id,
+                        interaction_id=interaction_id,
+                        synthesis_listener=synthesis_listener
+                    )
+                    return await merge_late_responses(
+                        moderator=moderator,
+                        orchestration_result=orchestration_result,
+                        synthesis_result=synthesis_result,
+                        project_id=project_id,
+                        interaction_id=interaction_id
+                    )
+                finally:
+                    orchestration_result.cancel_pending()
+            
+            pipeline = PipelineExecutor([
+                PipelineStage("followup_analysis", followup_stage,
+                              inputs=("raw_prompt",), outputs=("enriched_prompt", "is_followup")),
+                PipelineStage("pre_analysis", pre_analysis_stage,
+                              inputs=("enriched_prompt",), outputs=("refined_prompt", "needs_clarification")),
+                PipelineStage("speculative_retrieval", speculative_retrieval_stage,
+                              inputs=("raw_prompt",), outputs=("speculative_retrieval",)),
+                PipelineStage("context_retrieval", retrieval_stage,
+                              inputs=("raw_prompt", "refined_prompt", "speculative_retrieval"),
+                              outputs=("context_text", "context_info")),
+                PipelineStage("speculative_dispatch", speculative_dispatch_stage,
+                              inputs=("raw_prompt", "speculative_retrieval"), outputs=("speculative_dispatch",)),
+                PipelineStage("ai_orchestration", orchestration_stage,
+                              inputs=("raw_prompt", "refined_prompt", "context_text", "context_info",
+                                      "speculative_dispatch"),
+                              outputs=("orchestration_result",)),
+                PipelineStage("moderator_synthesis", synthesis_stage,
+                              inputs=("orchestration_result",), outputs=("synthesis_result",)),
+            ])
+            
+            try:
+                pipeline_run = await pipeline.run({"raw_prompt": query_request.user_prompt_text})
+            finally:
+                # Ningún trabajo especulativo sobrevive a la consulta
+                for task in speculative_tasks:
+                    if not task.done():
+                        task.cancel()
+            metrics_collector.record_pipeline_run(interaction_id, pipeline_run.as_metrics())
+            logger.info(
+                f"🧭 Camino crítico {' → '.join(pipeline_run.critical_path)}: "
+                f"{int(pipeline_run.critical_path_ms)}ms ({int(pipeline_run.overlap_saved_ms)}ms solapados)"
+            )
+            
+            enriched_prompt = pipeline_run.values["enriched_prompt"]
+            is_followup = pipeline_run.values["is_followup"]
+            context_text = pipeline_run.values["context_text"]
+            orchestration_result = pipeline_run.values["orchestration_result"]
+            synthesis_result = pipeline_run.values["synthesis_result"]
+            
+            # ========================================
+            # PASO 5: CALCULAR MÉTRICAS Y RESPUESTA
+            # ========================================
         
-        # Construir respuesta completa
-        response = QueryResponse(
-            interaction_event_id=interaction_id,
-            synthesis_text=synthesis_result.synthesis_text,
-            moderator_quality=synthesis_result.quality.value,
-            
-            # Meta-análisis v2.0
-            key_themes=synthesis_result.key_themes,
-            contradictions=synthesis_result.contradictions,
-            consensus_areas=synthesis_result.consensus_areas,
-            recommendations=synthesis_result.recommendations,
-            suggested_questions=synthesis_result.suggested_questions,
-            research_areas=synthesis_result.research_areas,
-            
-            # ✅ AGREGAR ESTA LÍNEA:
-            context_info=orchestration_result.context_info,  # Información del contexto utilizado
-            
-            # Metadatos
-            individual_responses=orchestration_result.ai_responses,
-            processing_time_ms=processing_time,
-            created_at=start_time,
-            fallback_used=synthesis_result.fallback_used
-        )
+            processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
         
-        # Marcar como exitosa antes del background task
-        orchestration_success = True
+            # Construir respuesta completa
+            response = QueryResponse(
+                interaction_event_id=interaction_id,
+                synthesis_text=synthesis_result.synthesis_text,
+                moderator_quality=synthesis_result.quality.value,
+            
+                # Meta-análisis v2.0
+                key_themes=synthesis_result.key_themes,
+                contradictions=synthesis_result.contradictions,
+                consensus_areas=synthesis_result.consensus_areas,
+                recommendations=synthesis_result.recommendations,
+                suggested_questions=synthesis_result.suggested_questions,
+                research_areas=synthesis_result.research_areas,
+            
+                # ✅ AGREGAR ESTA LÍNEA:
+                context_info=orchestration_result.context_info,  # Información del contexto utilizado
+            
+                # Metadatos
+                individual_responses=orchestration_result.ai_responses,
+                processing_time_ms=processing_time,
+                created_at=start_time,
+                fallback_used=synthesis_result.fallback_used
+            )
         
-        # ========================================
-        # PASO 6: GUARDADO EN BACKGROUND
-        # ========================================
+            # Marcar como exitosa antes del background task
+            orchestration_success = True
         
-        # Programar guardado de la interacción como tarea de fondo
-        background_tasks.add_task(
-            save_interaction_background,
+        save_kwargs = dict(
             project_id=project_id,
             user_id=user_id,
             interaction_id=interaction_id,
@@ -810,7 +1181,7 @@ async def query_project(
         )
         
         logger.info(f"✅ Consulta {interaction_id} completada en {processing_time}ms")
-        return response
+        return QueryPipelineOutcome(response=response, save_kwargs=save_kwargs)
         
     except HTTPException as e:
         # Registrar error específico en métricas
@@ -918,7 +1289,7 @@ async def get_conversation_state(
             
             if interaction_event.ai_responses_json:
                 try:
-                    ai_responses_data = json.loads(interaction_event.ai_responses_json) if isinstance(interaction_event.ai_responses_json, str) else interaction_event.ai_responses_json
+                    ai_responses_data = as_document(interaction_event.ai_responses_json)
                     if isinstance(ai_responses_data, dict) and "followup_metadata" in ai_responses_data:
                         followup_metadata = ai_responses_data["followup_metadata"]
                 except:
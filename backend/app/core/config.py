@@ -26,6 +26,30 @@ class Settings(BaseSettings):
     JWT_PUBLIC_KEY: str = "clave_publica_de_nextauth"
     JWT_ALGORITHM: str = "RS256"
     
+    # Pool de conexiones a PostgreSQL (por proceso). Sin valores explícitos se
+    # usan los de ENVIRONMENT; con DB_MAX_CONNECTIONS (límite del plan de Render)
+    # pool + overflow de cada worker no supera su parte del límite
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_MAX_CONNECTIONS: Optional[int] = None
+    DB_RESERVED_CONNECTIONS: int = 5  # Alembic, psql y tareas de mantenimiento
+    WEB_CONCURRENCY: int = 1  # Workers de uvicorn que comparten el límite
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_SLOW_CHECKOUT_MS: float = 100.0
+    # Sentencias preparadas cacheadas por conexión (0 si se usa PgBouncer en modo transacción)
+    DB_STATEMENT_CACHE_SIZE: int = 500
+    
+    # Réplica de lectura opcional para búsqueda vectorial, historial y listados.
+    # Tras escribir, las lecturas del usuario van al primario durante la ventana.
+    # La ventana es por proceso: read-your-writes solo se garantiza con
+    # WEB_CONCURRENCY = 1 (o afinidad de sesión por usuario)
+    DATABASE_READ_URL: Optional[str] = None
+    DB_READ_POOL_SIZE: Optional[int] = None
+    DB_READ_MAX_OVERFLOW: Optional[int] = None
+    READ_YOUR_WRITES_WINDOW_SECONDS: float = 5.0
+    
     # Configuración de Context Manager
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"  # Modelo a usar para embeddings
     EMBEDDING_DIMENSION: int = 384  # Dimensión de los embeddings
@@ -56,6 +80,98 @@ class Settings(BaseSettings):
     DEFAULT_AI_TEMPERATURE: float = 0.7
     DEFAULT_AI_MAX_TOKENS: int = 1000
     
+    # Cliente LLM auxiliar (PreAnalyst, FollowUp, ContextBuilder)
+    LLM_CLIENT_TIMEOUT_SECONDS: float = 20.0
+    LLM_CLIENT_MAX_RETRIES: int = 1
+    
+    # Monitor de lag del event loop
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.25
+    EVENT_LOOP_LAG_WARN_MS: float = 100.0
+    
+    # Política de reintentos
+    AI_REQUEST_DEADLINE_SECONDS: float = 45.0  # SLO total por proveedor en una consulta
+    AI_RETRY_BUDGET_RATIO: float = 0.2  # Máxima fracción del tráfico gastada en reintentos
+    AI_RETRY_BUDGET_MIN_RETRIES: int = 3  # Reintentos siempre permitidos por ventana
+    AI_RETRY_MIN_ATTEMPT_SECONDS: float = 1.0  # No reintentar si no queda al menos esto
+    
+    # Planificador de llamadas salientes (límites por proveedor, 0 = sin límite)
+    OPENAI_MAX_CONCURRENCY: int = 8
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 200000
+    ANTHROPIC_MAX_CONCURRENCY: int = 5
+    ANTHROPIC_RPM_LIMIT: int = 50
+    ANTHROPIC_TPM_LIMIT: int = 50000
+    # Si la espera estimada por RPM/TPM supera este umbral se prefiere otro proveedor
+    PROVIDER_REROUTE_WAIT_SECONDS: float = 2.0
+    
+    # Caché de respuestas de proveedores
+    AI_RESPONSE_CACHE_ENABLED: bool = True
+    AI_RESPONSE_CACHE_TTL_SECONDS: int = 300
+    AI_RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    AI_RESPONSE_CACHE_SEMANTIC_ENABLED: bool = False
+    AI_RESPONSE_CACHE_SEMANTIC_THRESHOLD: float = 0.97
+    
+    # Deduplicación de consultas idénticas (single-flight)
+    QUERY_SINGLE_FLIGHT_RETENTION_SECONDS: float = 5.0
+    
+    # Pipeline de consulta: reutilizar el contexto buscado sobre el prompt original
+    # si el prompt refinado es al menos así de similar
+    SPECULATIVE_RETRIEVAL_SIMILARITY: float = 0.9
+    
+    # Despacho especulativo a proveedores con el prompt original durante el
+    # pre-análisis (si falla la especulación se paga una llamada extra)
+    SPECULATIVE_DISPATCH_ENABLED: bool = False
+    SPECULATIVE_DISPATCH_SIMILARITY: float = 0.9
+    
+    # Síntesis progresiva: empezar a sintetizar con las primeras N respuestas
+    # exitosas; las que lleguen dentro de la ventana de gracia se fusionan.
+    # Requiere tres o más proveedores activos: el quórum se acota a
+    # proveedores - 1 y con dos proveedores se espera siempre a ambos
+    PROGRESSIVE_SYNTHESIS_ENABLED: bool = False
+    PROGRESSIVE_SYNTHESIS_QUORUM: int = 2
+    PROGRESSIVE_SYNTHESIS_GRACE_SECONDS: float = 3.0
+    
+    # Síntesis estructurada: el moderador pide JSON restringido por esquema
+    # en lugar de Markdown (no aplica a la síntesis en streaming)
+    STRUCTURED_SYNTHESIS_ENABLED: bool = False
+    
+    # Enrutado de la síntesis: omitirla si las respuestas coinciden casi por
+    # completo, escalar max_tokens con contenido y divergencia, y usar un modelo
+    # rápido para las síntesis pequeñas
+    SYNTHESIS_ROUTING_ENABLED: bool = False
+    SYNTHESIS_SKIP_AGREEMENT: float = 0.97  # Similitud coseno mínima entre todos los pares
+    SYNTHESIS_MIN_TOKENS: int = 400
+    SYNTHESIS_MAX_TOKENS: int = 1200
+    SYNTHESIS_FAST_MAX_TOKENS: int = 700  # Presupuestos hasta aquí van al modelo rápido
+    SYNTHESIS_REFERENCE_TOKENS: int = 3000  # Contenido que justifica el presupuesto máximo
+    SYNTHESIS_FAST_MODEL: str = "gpt-4o-mini"
+    
+    # Caché de prompts del proveedor: prefijos estáticos primero (OpenAI cachea
+    # automáticamente desde 1024 tokens) y puntos de corte cache_control en Anthropic
+    AI_PROMPT_CACHE_ENABLED: bool = True
+    ANTHROPIC_PROMPT_CACHE_MIN_TOKENS: int = 1024
+    ANTHROPIC_HAIKU_PROMPT_CACHE_MIN_TOKENS: int = 2048
+    
+    # Clasificador de continuidad conversacional: patrones precompilados y, si se
+    # activan, similitud con la última interacción y el LLM en la banda ambigua.
+    # Ambos añaden llamadas de red por consulta: sin ellos la banda ambigua
+    # mantiene la continuidad por defecto
+    FOLLOWUP_AMBIGUITY_BAND_LOW: float = 0.25
+    FOLLOWUP_AMBIGUITY_BAND_HIGH: float = 0.75
+    FOLLOWUP_EMBEDDING_CHECK_ENABLED: bool = False
+    FOLLOWUP_SIMILARITY_LOW: float = 0.2  # Coseno por debajo: tema nuevo
+    FOLLOWUP_SIMILARITY_HIGH: float = 0.6  # Coseno por encima: mismo tema
+    FOLLOWUP_LLM_FALLBACK_ENABLED: bool = False
+    
+    # Persistencia write-behind de interacciones: una cola acotada que un worker
+    # vacía en lotes (inserciones multi-fila por intervalo de volcado)
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_QUEUE_SIZE: int = 1000
+    WRITE_BEHIND_BATCH_SIZE: int = 50
+    WRITE_BEHIND_FLUSH_INTERVAL_SECONDS: float = 0.5
+    WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS: float = 5.0  # Con la cola llena: esperar y luego escribir directo
+    WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS: float = 30.0
+    
     @property
     def sync_database_url(self) -> str:
         """URL de database síncrona para Alembic"""
@@ -88,6 +204,10 @@ class Settings(BaseSettings):
             if self.DATABASE_URL.startswith("postgresql://"):
                 self.DATABASE_URL = self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
         
+        # La réplica de Render también llega como postgresql://
+        if self.DATABASE_READ_URL and self.DATABASE_READ_URL.startswith("postgresql://"):
+            self.DATABASE_READ_URL = self.DATABASE_READ_URL.replace("postgresql://", "postgresql+asyncpg://")
+        
         # Configurar DEBUG basado en ENVIRONMENT
         if self.ENVIRONMENT == "production":
             self.DEBUG = False
@@ -1,20 +1,62 @@
-from typing import AsyncGenerator
+import logging
+from typing import Any, AsyncGenerator, Optional
 
 from sqlmodel import SQLModel
+from sqlmodel import Session as SQLModelSession
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session as ORMSession, sessionmaker
 
 from app.core.config import settings
+from app.core import fast_json
+from app.core.db_pool import (
+    InstrumentedAsyncPool,
+    InstrumentedReadPool,
+    pool_monitor,
+    read_pool_monitor,
+    resolve_pool_limits,
+)
+from app.core.read_routing import read_router
+
+logger = logging.getLogger(__name__)
 
-engine = create_async_engine(
-    settings.async_database_url,
-    echo=False,
-    future=True,
-    pool_size=5,
-    max_overflow=10,
+POOL_SIZE, MAX_OVERFLOW = resolve_pool_limits(
+    settings.ENVIRONMENT,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    max_connections=settings.DB_MAX_CONNECTIONS,
+    reserved_connections=settings.DB_RESERVED_CONNECTIONS,
+    workers=settings.WEB_CONCURRENCY,
 )
 
+
+def _create_engine(url: str, poolclass: type, pool_size: int, max_overflow: int) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=poolclass,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        # Render cierra conexiones inactivas: reciclar y comprobar antes de usar
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # Caché de sentencias preparadas del adaptador asyncpg de SQLAlchemy y de asyncpg
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+        # Columnas JSONB: se guardan dict/list y se serializan con orjson
+        json_serializer=fast_json.dumps,
+        json_deserializer=fast_json.loads,
+    )
+
+
+engine = _create_engine(settings.async_database_url, InstrumentedAsyncPool, POOL_SIZE, MAX_OVERFLOW)
+pool_monitor.attach(engine)
+
 async_session_factory = sessionmaker(
     engine,
     class_=AsyncSession,
@@ -23,6 +65,74 @@ async_session_factory = sessionmaker(
     autoflush=False,
 )
 
+# Réplica de lectura opcional (DATABASE_READ_URL)
+read_engine: Optional[AsyncEngine] = None
+if settings.DATABASE_READ_URL:
+    READ_POOL_SIZE, READ_MAX_OVERFLOW = resolve_pool_limits(
+        settings.ENVIRONMENT,
+        pool_size=settings.DB_READ_POOL_SIZE if settings.DB_READ_POOL_SIZE is not None else POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW if settings.DB_READ_MAX_OVERFLOW is not None else MAX_OVERFLOW,
+        max_connections=settings.DB_MAX_CONNECTIONS,
+        reserved_connections=settings.DB_RESERVED_CONNECTIONS,
+        workers=settings.WEB_CONCURRENCY,
+    )
+    read_engine = _create_engine(settings.DATABASE_READ_URL, InstrumentedReadPool, READ_POOL_SIZE, READ_MAX_OVERFLOW)
+    read_pool_monitor.attach(read_engine)
+    read_router.replica_enabled = True
+    if settings.WEB_CONCURRENCY > 1:
+        logger.warning(
+            f"⚠️ Réplica de lectura con {settings.WEB_CONCURRENCY} workers: la ventana read-your-writes "
+            "es por proceso y no cubre lecturas atendidas por otro worker"
+        )
+
+
+class RoutedReadSession(SQLModelSession):
+    """
+    Sesión de solo lectura que elige réplica o primario en su primera consulta
+    (cuando ya se conoce el usuario autenticado) y lo mantiene hasta cerrarse.
+    """
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kw: Any) -> Any:
+        bind = self.info.get("routed_bind")
+        if bind is None:
+            use_replica = read_engine is not None and read_router.use_replica(self.info.get("user_id"))
+            bind = read_engine.sync_engine if use_replica else engine.sync_engine
+            self.info["routed_bind"] = bind
+        return bind
+
+
+if read_engine is not None:
+    read_session_factory = sessionmaker(
+        class_=AsyncSession,
+        sync_session_class=RoutedReadSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+else:
+    read_session_factory = async_session_factory
+
+
+def read_session(user_id: Optional[Any] = None) -> AsyncSession:
+    """
+    Sesión para lecturas pesadas (búsqueda vectorial, historial): réplica salvo
+    que `user_id` (o el usuario de la petición) haya escrito hace poco.
+    """
+    if read_engine is None:
+        return async_session_factory()
+    return read_session_factory(info={"user_id": str(user_id) if user_id is not None else None})
+
+
+@event.listens_for(ORMSession, "after_flush")
+def _mark_flushed_writes(session: ORMSession, flush_context: Any) -> None:
+    # Read-your-writes: cada usuario con filas escritas lee del primario un tiempo
+    if not read_router.replica_enabled:
+        return
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        user_id = getattr(instance, "user_id", None)
+        if user_id is not None:
+            read_router.mark_write(user_id)
+
 
 async def create_db_and_tables() -> None:
     async with engine.begin() as conn:
@@ -51,4 +161,16 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.rollback()
             raise 
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency de solo lectura para FastAPI: usa la réplica si está configurada,
+    salvo para usuarios que acaban de escribir (read-your-writes).
+    """
+    async with read_session() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,172 @@
+"""
+Pool de conexiones a PostgreSQL: dimensionado e instrumentación.
+
+`resolve_pool_limits` calcula pool_size/max_overflow por proceso a partir del
+entorno y, si se conoce el límite de conexiones del plan (DB_MAX_CONNECTIONS),
+lo reparte entre los workers (WEB_CONCURRENCY) para no agotarlo.
+
+`InstrumentedAsyncPool` mide la espera de cada checkout (incluida la apertura
+de conexiones de overflow) y los eventos del pool alimentan `pool_monitor`,
+que expone conexiones en uso/libres, uso del overflow y tiempos de espera en
+/health/detailed y /health/database.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (pool_size, max_overflow) por proceso según ENVIRONMENT
+POOL_DEFAULTS: Dict[str, Tuple[int, int]] = {
+    "production": (10, 5),
+    "development": (5, 10),
+}
+
+
+def resolve_pool_limits(
+    environment: str,
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+    max_connections: Optional[int] = None,
+    reserved_connections: int = 0,
+    workers: int = 1
+) -> Tuple[int, int]:
+    """
+    pool_size y max_overflow de un proceso. Los valores explícitos tienen
+    prioridad sobre los del entorno; con `max_connections` el total por worker
+    (pool + overflow) no supera su parte del límite del servidor.
+    """
+    default_size, default_overflow = POOL_DEFAULTS.get(environment, POOL_DEFAULTS["development"])
+    size = default_size if pool_size is None else pool_size
+    overflow = default_overflow if max_overflow is None else max_overflow
+
+    if max_connections:
+        budget = max(1, (max_connections - reserved_connections) // max(1, workers))
+        size = max(1, min(size, budget))
+        overflow = max(0, min(overflow, budget - size))
+    return size, overflow
+
+
+class PoolMonitor:
+    """Métricas del pool: esperas de checkout, ocupación y eventos"""
+
+    def __init__(self, slow_checkout_ms: float = 100.0, history: int = 1000):
+        self.slow_checkout_ms = slow_checkout_ms
+        self.waits_ms: Deque[float] = deque(maxlen=history)
+        self._target: Optional[Any] = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.waits_ms.clear()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.max_checked_out = 0
+        self.max_overflow_used = 0
+
+    @property
+    def pool(self) -> Optional[Any]:
+        # Se lee del engine en cada consulta: dispose() lo sustituye por uno nuevo
+        return getattr(self._target, "pool", self._target)
+
+    def attach(self, target: Any) -> None:
+        """Registra los eventos en el engine (sobreviven a pool.recreate()) o en un pool"""
+        target = getattr(target, "sync_engine", target)
+        self._target = target
+        event.listen(target, "connect", self._on_connect)
+        event.listen(target, "checkout", self._on_checkout)
+        event.listen(target, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        pool = self.pool
+        self.max_checked_out = max(self.max_checked_out, pool.checkedout())
+        self.max_overflow_used = max(self.max_overflow_used, pool.overflow())
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        self.invalidations += 1
+        if exception is not None:
+            logger.warning(f"⚠️ Conexión a la BD invalidada: {exception}")
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False) -> None:
+        if timed_out:
+            self.timeouts += 1
+            logger.error(f"❌ Pool de BD agotado: sin conexión libre tras {wait_ms:.0f}ms")
+            return
+        self.checkouts += 1
+        self.waits_ms.append(wait_ms)
+        if wait_ms >= self.slow_checkout_ms:
+            self.slow_checkouts += 1
+            logger.warning(f"⏳ Checkout de conexión lento: {wait_ms:.0f}ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "checkouts": self.checkouts,
+            "slow_checkouts": self.slow_checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "max_checked_out": self.max_checked_out,
+            "max_overflow_used": self.max_overflow_used,
+        }
+        pool = self.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            size, max_overflow = pool.size(), getattr(pool, "_max_overflow", 0)
+            in_use = pool.checkedout()
+            stats.update({
+                "pool_size": size,
+                "max_overflow": max_overflow,
+                "capacity": size + max(0, max_overflow),
+                "in_use": in_use,
+                "idle": pool.checkedin(),
+                # overflow() es negativo mientras no se han abierto todas las del pool
+                "overflow_in_use": max(0, pool.overflow()),
+                "utilization": round(in_use / (size + max(0, max_overflow)), 4) if size else 0.0,
+            })
+        waits = sorted(self.waits_ms)
+        if waits:
+            stats.update({
+                "avg_checkout_wait_ms": round(sum(waits) / len(waits), 2),
+                "p95_checkout_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2),
+                "max_checkout_wait_ms": round(waits[-1], 2),
+            })
+        return stats
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool que mide cuánto espera cada checkout"""
+
+    monitor: Optional[PoolMonitor] = None
+
+    def _do_get(self):
+        monitor = self.monitor or pool_monitor
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            monitor.record_wait((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        monitor.record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class InstrumentedReadPool(InstrumentedAsyncPool):
+    """Pool de la réplica de lectura, con su propio monitor"""
+
+
+# Instancias globales de los monitores (primario y réplica de lectura)
+pool_monitor = PoolMonitor(slow_checkout_ms=settings.DB_POOL_SLOW_CHECKOUT_MS)
+read_pool_monitor = PoolMonitor(slow_checkout_ms=settings.DB_POOL_SLOW_CHECKOUT_MS)
+InstrumentedReadPool.monitor = read_pool_monitor
@@ -0,0 +1,43 @@
+"""
+Serialización JSON rápida.
+
+Envoltorio de orjson (dependencia declarada en pyproject.toml). Solo para rutas
+calientes: respuestas de proveedores y salidas estructuradas del moderador, y
+(de)serializador de las columnas JSONB en el engine de SQLAlchemy.
+"""
+
+from typing import Any, Union
+
+import orjson
+
+
+def _default(value: Any) -> str:
+    """Tipos sin representación JSON nativa en orjson (Decimal, objetos con isoformat...)"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Parsea JSON desde str o bytes"""
+    return orjson.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """Serializa a una cadena JSON (UTF-8 sin escapar)"""
+    return orjson.dumps(value, default=_default).decode()
+
+
+def as_document(value: Any, default: Any = None) -> Any:
+    """
+    Contenido de una columna JSONB como dict/list. También acepta las filas
+    antiguas que guardaban dentro del JSONB la cadena producida por json.dumps.
+    """
+    if value is None or value == "":
+        return default
+    if isinstance(value, (str, bytes, bytearray)):
+        try:
+            return loads(value)
+        except ValueError:
+            return default
+    return value
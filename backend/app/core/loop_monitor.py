@@ -0,0 +1,90 @@
+"""
+Monitor de lag del event loop.
+
+Una tarea en segundo plano duerme `interval` segundos y mide cuánto tarde
+despierta realmente. Si alguna corrutina bloquea el loop (llamadas síncronas de
+red, CPU intensivo...) el retraso aparece como lag. Sirve para comprobar que el
+loop no se bloquea bajo carga concurrente de `/query`.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """Mide periódicamente el retraso del event loop"""
+
+    def __init__(self, interval: float = 0.25, warn_threshold_ms: float = 100.0, history: int = 1000):
+        self.interval = interval
+        self.warn_threshold_ms = warn_threshold_ms
+        self.samples_ms: Deque[float] = deque(maxlen=history)
+        self.max_lag_ms = 0.0
+        self.slow_ticks = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Inicia el monitor en el event loop actual"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"⏱️ Monitor de lag del event loop iniciado (intervalo {self.interval}s)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def reset(self) -> None:
+        self.samples_ms.clear()
+        self.max_lag_ms = 0.0
+        self.slow_ticks = 0
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def record(self, lag_ms: float) -> None:
+        self.samples_ms.append(lag_ms)
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms >= self.warn_threshold_ms:
+            self.slow_ticks += 1
+            logger.warning(f"⚠️ Event loop bloqueado {lag_ms:.0f}ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self.samples_ms)
+        if not samples:
+            return {"running": self.running, "samples": 0}
+        return {
+            "running": self.running,
+            "samples": len(samples),
+            "avg_lag_ms": round(sum(samples) / len(samples), 2),
+            "p95_lag_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "slow_ticks": self.slow_ticks,
+            "warn_threshold_ms": self.warn_threshold_ms,
+        }
+
+
+# Instancia global del monitor
+loop_lag_monitor = EventLoopLagMonitor(
+    interval=settings.EVENT_LOOP_LAG_INTERVAL_SECONDS,
+    warn_threshold_ms=settings.EVENT_LOOP_LAG_WARN_MS
+)
@@ -23,6 +23,7 @@ class OrchestrationMetrics:
     context_retrieval_time_ms: Optional[int] = None
     ai_orchestration_time_ms: Optional[int] = None
     moderator_synthesis_time_ms: Optional[int] = None
+    synthesis_first_insight_ms: Optional[int] = None  # Primera sección en streaming
     background_save_time_ms: Optional[int] = None
     total_processing_time_ms: Optional[int] = None
     
@@ -33,6 +34,16 @@ class OrchestrationMetrics:
     moderator_quality: Optional[str] = None
     fallback_used: bool = False
     
+    # Métricas del pipeline (DAG): tiempos por etapa y camino crítico
+    stage_timings: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    critical_path: list = field(default_factory=list)
+    critical_path_ms: Optional[int] = None
+    overlap_saved_ms: Optional[int] = None
+    
+    # Despacho especulativo a proveedores ("hit", "miss" o None si no se especuló)
+    speculation_outcome: Optional[str] = None
+    speculation_saved_ms: Optional[int] = None
+    
     # Métricas de errores
     errors: list = field(default_factory=list)
     warnings: list = field(default_factory=list)
@@ -79,6 +90,7 @@ class OrchestrationMetricsCollector:
             "avg_processing_time": 0,
             "total_processing_time": 0
         })
+        self._speculation_stats = {"hits": 0, "misses": 0, "latency_saved_ms": 0}
     
     def start_orchestration(
         self, 
@@ -158,11 +170,58 @@ class OrchestrationMetricsCollector:
                 metrics.moderator_synthesis_time_ms = duration_ms
                 metrics.moderator_quality = kwargs.get("quality")
                 metrics.fallback_used = kwargs.get("fallback_used", False)
+                metrics.synthesis_first_insight_ms = kwargs.get("first_insight_ms")
             elif step == "background_save":
                 metrics.background_save_time_ms = duration_ms
             
             logger.debug(f"📊 Actualizado paso {step}: {duration_ms}ms para {interaction_id}")
     
+    def record_pipeline_run(self, interaction_id: UUID, pipeline_metrics: Dict[str, Any]):
+        """Registrar tiempos por etapa y camino crítico del pipeline"""
+        with self._lock:
+            metrics = self._metrics.get(interaction_id)
+            if not metrics:
+                return
+            
+            metrics.stage_timings = pipeline_metrics.get("stages", {})
+            metrics.critical_path = pipeline_metrics.get("critical_path", [])
+            metrics.critical_path_ms = pipeline_metrics.get("critical_path_ms")
+            metrics.overlap_saved_ms = pipeline_metrics.get("overlap_saved_ms")
+            
+            logger.debug(
+                f"📊 Pipeline {interaction_id}: camino crítico {' → '.join(metrics.critical_path)} "
+                f"({metrics.critical_path_ms}ms, {metrics.overlap_saved_ms}ms solapados)"
+            )
+    
+    def record_speculation(self, interaction_id: UUID, hit: bool, latency_saved_ms: float = 0.0):
+        """Registrar el resultado del despacho especulativo a proveedores"""
+        with self._lock:
+            if hit:
+                self._speculation_stats["hits"] += 1
+                self._speculation_stats["latency_saved_ms"] += int(latency_saved_ms)
+            else:
+                self._speculation_stats["misses"] += 1
+            
+            metrics = self._metrics.get(interaction_id)
+            if metrics:
+                metrics.speculation_outcome = "hit" if hit else "miss"
+                metrics.speculation_saved_ms = int(latency_saved_ms) if hit else 0
+    
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """Tasa de acierto y latencia ahorrada por el despacho especulativo"""
+        with self._lock:
+            hits = self._speculation_stats["hits"]
+            total = hits + self._speculation_stats["misses"]
+            saved = self._speculation_stats["latency_saved_ms"]
+            return {
+                "attempts": total,
+                "hits": hits,
+                "misses": total - hits,
+                "hit_rate_percent": round(hits / total * 100, 2) if total else 0.0,
+                "total_latency_saved_ms": saved,
+                "avg_latency_saved_ms": round(saved / hits, 2) if hits else 0.0
+            }
+    
     def add_error(self, interaction_id: UUID, error: str, step: str):
         """Agregar error a las métricas"""
         with self._lock:
@@ -209,6 +268,7 @@ class OrchestrationMetricsCollector:
     
     def get_system_health_metrics(self) -> Dict[str, Any]:
         """Obtener métricas de salud del sistema"""
+        speculation = self.get_speculation_stats()
         with self._lock:
             active_orchestrations = len(self._metrics)
             completed_today = 0
@@ -234,7 +294,8 @@ class OrchestrationMetricsCollector:
                 "success_rate_percent": round(success_rate, 2),
                 "avg_processing_time_ms": round(avg_processing_time, 2),
                 "total_completed_requests": len(self._completed_metrics),
-                "memory_usage_entries": len(self._completed_metrics) + active_orchestrations
+                "memory_usage_entries": len(self._completed_metrics) + active_orchestrations,
+                "speculation": speculation
             }
     
     def cleanup_old_data(self, days_to_keep: int = 30):
@@ -276,7 +337,10 @@ class MetricsTimer:
         if self.start_time:
             duration_ms = int((datetime.utcnow() - self.start_time).total_seconds() * 1000)
             
-            if exc_type:
+            if exc_type is asyncio.CancelledError:
+                # Trabajo cancelado a propósito (p. ej. especulación descartada)
+                return
+            elif exc_type:
                 # Si hubo una excepción, registrarla como error
                 metrics_collector.add_error(
                     self.interaction_id, 
@@ -0,0 +1,117 @@
+"""
+Enrutado de lecturas a la réplica con read-your-writes.
+
+Las lecturas pesadas (búsqueda vectorial, historial conversacional y listados
+de interacciones) pueden ir a una réplica de lectura. Como la réplica va con
+retraso, un usuario que acaba de escribir (interacción guardada, chunks de
+contexto, mensajes) lee del primario durante READ_YOUR_WRITES_WINDOW_SECONDS:
+así ve siempre sus propias escrituras.
+
+Las escrituras se registran con `mark_write(user_id)`: automáticamente tras
+cada flush del ORM de objetos con `user_id` (ver app.core.database) y
+explícitamente en las rutas que insertan sin ORM (write-behind, tras el
+commit de cada lote). El usuario de la petición se toma de `set_current_user`,
+que llama `get_current_user`.
+
+La ventana vive en la memoria de cada proceso: con varios workers
+(WEB_CONCURRENCY > 1) una escritura registrada en un worker no protege las
+lecturas que atiende otro, que pueden ir a la réplica y ver datos atrasados.
+La garantía solo se cumple con un único worker (o con afinidad de sesión por
+usuario en el balanceador).
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+# Usuario autenticado de la petición en curso
+_current_user: ContextVar[Optional[str]] = ContextVar("read_routing_current_user", default=None)
+
+
+def set_current_user(user_id: Optional[Any]) -> None:
+    _current_user.set(str(user_id) if user_id is not None else None)
+
+
+def get_current_user_id() -> Optional[str]:
+    return _current_user.get()
+
+
+class ReadRouter:
+    """Decide si una lectura puede ir a la réplica"""
+
+    def __init__(self, window_seconds: float = 5.0, max_tracked_users: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_tracked_users = max_tracked_users
+        self.replica_enabled = False
+        # user_id -> instante (monotonic) hasta el que lee del primario
+        self._sticky_until: Dict[str, float] = {}
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.writes_marked = 0
+
+    def mark_write(self, user_id: Optional[Any]) -> None:
+        """El usuario acaba de escribir: sus lecturas van al primario durante la ventana"""
+        if user_id is None or self.window_seconds <= 0:
+            return
+        now = time.monotonic()
+        if len(self._sticky_until) >= self.max_tracked_users:
+            self._prune(now)
+        self._sticky_until[str(user_id)] = now + self.window_seconds
+        self.writes_marked += 1
+
+    def recently_wrote(self, user_id: Optional[Any]) -> bool:
+        if user_id is None:
+            return False
+        until = self._sticky_until.get(str(user_id))
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            self._sticky_until.pop(str(user_id), None)
+            return False
+        return True
+
+    def use_replica(self, user_id: Optional[Any] = None) -> bool:
+        """
+        True si la lectura puede ir a la réplica. Sin `user_id` se usa el
+        usuario de la petición en curso.
+        """
+        if not self.replica_enabled:
+            self.primary_reads += 1
+            return False
+        if self.recently_wrote(user_id if user_id is not None else get_current_user_id()):
+            self.sticky_reads += 1
+            self.primary_reads += 1
+            return False
+        self.replica_reads += 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        expired = [user_id for user_id, until in self._sticky_until.items() if until <= now]
+        for user_id in expired:
+            del self._sticky_until[user_id]
+        # Si siguen sin caber, descartar las ventanas que antes caducan
+        overflow = len(self._sticky_until) - self.max_tracked_users + 1
+        if overflow > 0:
+            for user_id, _ in sorted(self._sticky_until.items(), key=lambda item: item[1])[:overflow]:
+                del self._sticky_until[user_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "replica_enabled": self.replica_enabled,
+            "window_seconds": self.window_seconds,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "writes_marked": self.writes_marked,
+            "sticky_users": len(self._sticky_until),
+        }
+
+
+# Instancia global del enrutador
+read_router = ReadRouter(window_seconds=settings.READ_YOUR_WRITES_WINDOW_SECONDS)
@@ -0,0 +1,102 @@
+"""
+Deduplicación single-flight de operaciones asíncronas idénticas.
+
+Si llegan varias ejecuciones con la misma clave mientras una está en curso,
+solo la primera (líder) ejecuta la operación y el resto espera el mismo
+resultado. Opcionalmente el resultado se retiene unos segundos para servir
+repeticiones inmediatas (doble clic, reintentos del frontend).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normaliza un prompt para deduplicar: espacios colapsados y sin distinción de mayúsculas"""
+    return _WHITESPACE_RE.sub(" ", prompt or "").strip().casefold()
+
+
+def make_flight_key(*parts: Any, **options: Any) -> str:
+    """Clave estable a partir de identificadores y opciones de la operación"""
+    material = json.dumps(
+        {"parts": [str(part) for part in parts], "options": options},
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SingleFlight(Generic[T]):
+    """Agrupa ejecuciones concurrentes con la misma clave en una sola"""
+
+    def __init__(self, retention_seconds: float = 0.0):
+        self.retention_seconds = retention_seconds
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._retained: Dict[str, Tuple[float, T]] = {}
+
+        # Métricas
+        self.leaders = 0
+        self.shared_in_flight = 0
+        self.shared_retained = 0
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._retained.items() if expires_at <= now]:
+            del self._retained[key]
+
+    async def run(self, key: str, operation: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Ejecuta `operation` o se une a la ejecución en curso con la misma clave.
+        Retorna (resultado, compartido). `compartido` es False solo para el líder.
+        """
+        self._purge_expired()
+
+        if key in self._retained:
+            self.shared_retained += 1
+            return self._retained[key][1], True
+
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(operation())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._on_done(key, finished))
+        else:
+            self.shared_in_flight += 1
+
+        # shield: si un cliente se desconecta no se cancela la operación de los demás
+        result = await asyncio.shield(task)
+        return result, shared
+
+    def _on_done(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            return  # Los errores no se retienen: la siguiente petición reintenta
+        if self.retention_seconds > 0:
+            self._retained[key] = (time.monotonic() + self.retention_seconds, task.result())
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._purge_expired()
+        return {
+            "in_flight": len(self._in_flight),
+            "retained": len(self._retained),
+            "leaders": self.leaders,
+            "shared_in_flight": self.shared_in_flight,
+            "shared_retained": self.shared_retained,
+        }
@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 from sqlmodel import Session, select, and_
 from uuid import UUID
-from sqlalchemy import text
+from sqlalchemy import insert, text
 import numpy as np
 from datetime import datetime
 
@@ -29,6 +29,20 @@ async def create_context_chunk(db: Session, chunk: ChunkCreate) -> ContextChunk:
     await db.refresh(db_chunk)
     return db_chunk
 
+async def create_context_chunks_bulk(db: AsyncSession, chunks: Sequence[ChunkCreate]) -> int:
+    """
+    Inserta varios chunks en una sola sentencia multi-fila (sin commit).
+    """
+    if not chunks:
+        return 0
+    columns = ContextChunk.__table__.columns
+    rows = []
+    for chunk in chunks:
+        db_chunk = ContextChunk(**chunk.model_dump())
+        rows.append({column.name: getattr(db_chunk, column.key) for column in columns})
+    await db.execute(insert(ContextChunk.__table__), rows)
+    return len(rows)
+
 # Versiones síncronas (para pruebas)
 def create_context_chunk_sync(db: Session, chunk: ChunkCreate) -> ContextChunk:
     """
@@ -117,50 +131,6 @@ async def find_similar_chunks(
     
     return result.scalars().all()
 
-def find_similar_chunks_sync(
-    db: Session,
-    query_embedding: List[float],
-    project_id: UUID,
-    user_id: Optional[UUID] = None,
-    top_k: int = 5,
-    similarity_threshold: Optional[float] = None
-) -> List[ContextChunk]:
-    """
-    Busca los chunks más similares a un embedding dado usando similitud coseno (versión síncrona).
-    """
-    # Construimos la consulta base
-    query = select(ContextChunk).where(
-        ContextChunk.project_id == project_id,
-        ContextChunk.deleted_at.is_(None)
-    )
-    
-    # Añadimos filtro por usuario si se especifica
-    if user_id:
-        query = query.where(ContextChunk.user_id == user_id)
-    
-    # Añadimos la condición de similitud coseno
-    cosine_similarity = text("content_embedding <=> CAST(:embedding AS vector)")
-    query = query.order_by(cosine_similarity)
-    
-    # Añadimos el umbral de similitud si se especifica
-    if similarity_threshold is not None:
-        # Crear una nueva expresión de texto para la comparación
-        threshold_condition = text("content_embedding <=> CAST(:embedding AS vector) <= :threshold")
-        query = query.where(threshold_condition)
-    
-    # Limitamos el número de resultados
-    query = query.limit(top_k)
-    
-    # Preparar parámetros
-    params = {"embedding": str(query_embedding)}
-    if similarity_threshold is not None:
-        params["threshold"] = similarity_threshold
-    
-    # Ejecutamos la consulta
-    result = db.execute(query, params)
-    
-    return result.scalars().all()
-
 async def delete_project_chunks(
     db: Session,
     project_id: UUID,
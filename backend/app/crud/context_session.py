@@ -1,13 +1,14 @@
-import json
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Sequence
 from uuid import UUID, uuid4
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models.models import InteractionEvent
+from app.core.fast_json import as_document
+from app.models.models import ContextSessionMessage, InteractionEvent
 from app.models.context_session import ContextMessage, ContextSession, ContextSessionSummary
 
 logger = logging.getLogger(__name__)
@@ -31,31 +32,34 @@ async def create_context_session(
     Returns:
         Nueva sesión de contexto
     """
-    # Crear historial inicial
-    conversation_history = []
-    if initial_message:
-        conversation_history.append({
-            "role": "user",
-            "content": initial_message,
-            "timestamp": datetime.utcnow().isoformat(),
-            "message_type": "information"
-        })
-    
     # Crear InteractionEvent para construcción de contexto
+    # (el historial conversacional vive en context_messages)
     session = InteractionEvent(
         id=uuid4(),
         project_id=project_id,
         user_id=user_id,
         user_prompt_text=initial_message or "Iniciando construcción de contexto",
         context_used_summary="",  # Contexto acumulado
-        ai_responses_json=json.dumps(conversation_history),  # Historial conversacional
         interaction_type="context_building",
         session_status="active",
         context_used=True,
+        message_count=1 if initial_message else 0,
         created_at=datetime.utcnow()
     )
-    
     db.add(session)
+    
+    if initial_message:
+        # El mensaje referencia la sesión: se inserta después de ella
+        await db.flush()
+        db.add(ContextSessionMessage(
+            session_id=session.id,
+            seq=1,
+            role="user",
+            content=initial_message,
+            message_type="information",
+            created_at=session.created_at
+        ))
+    
     await db.commit()
     await db.refresh(session)
     
@@ -119,6 +123,68 @@ async def get_active_session_for_project(
     return result.scalar_one_or_none()
 
 
+async def append_context_messages(
+    db: AsyncSession,
+    session: InteractionEvent,
+    new_messages: Sequence[ContextMessage],
+    updated_context: str
+) -> InteractionEvent:
+    """
+    Agrega mensajes a una sesión de contexto sin reescribir el historial.
+    
+    Reserva los números de secuencia incrementando message_count en la fila de
+    la sesión (el bloqueo de fila serializa turnos concurrentes, así que no se
+    pierden mensajes) e inserta solo las filas nuevas en context_messages.
+    
+    Args:
+        db: Sesión de base de datos
+        session: Sesión a actualizar
+        new_messages: Mensajes nuevos, en orden
+        updated_context: Contexto actualizado
+        
+    Returns:
+        Sesión actualizada
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(InteractionEvent)
+        .where(InteractionEvent.id == session.id)
+        .values(
+            message_count=InteractionEvent.message_count + len(new_messages),
+            context_used_summary=updated_context,
+            updated_at=now
+        )
+        .returning(InteractionEvent.message_count)
+        .execution_options(synchronize_session=False)
+    )
+    last_seq = result.scalar_one()
+    first_seq = last_seq - len(new_messages) + 1
+    
+    if new_messages:
+        await db.execute(insert(ContextSessionMessage), [
+            {
+                "session_id": session.id,
+                "seq": first_seq + offset,
+                "role": message.role,
+                "content": message.content,
+                "message_type": message.message_type,
+                "created_at": message.timestamp
+            }
+            for offset, message in enumerate(new_messages)
+        ])
+    
+    await db.commit()
+    
+    # Valores ya guardados: sin marcar el objeto como modificado, para que un
+    # flush posterior no sobrescriba incrementos concurrentes de message_count
+    set_committed_value(session, "message_count", last_seq)
+    set_committed_value(session, "context_used_summary", updated_context)
+    set_committed_value(session, "updated_at", now)
+    
+    logger.info(f"📝 Sesión de contexto actualizada: {session.id} (mensajes {first_seq}-{last_seq})")
+    return session
+
+
 async def update_context_session(
     db: AsyncSession,
     session: InteractionEvent,
@@ -137,30 +203,59 @@ async def update_context_session(
     Returns:
         Sesión actualizada
     """
-    # Parsear historial actual
-    try:
-        conversation_history = json.loads(session.ai_responses_json or "[]")
-    except (json.JSONDecodeError, TypeError):
-        conversation_history = []
-    
-    # Agregar nuevo mensaje
-    conversation_history.append({
-        "role": new_message.role,
-        "content": new_message.content,
-        "timestamp": new_message.timestamp.isoformat(),
-        "message_type": new_message.message_type
-    })
+    return await append_context_messages(db, session, [new_message], updated_context)
+
+
+async def get_context_messages(
+    db: AsyncSession,
+    session_id: UUID,
+    after_seq: int = 0,
+    limit: Optional[int] = None
+) -> List[ContextSessionMessage]:
+    """
+    Obtiene los mensajes de una sesión en orden, paginando por seq.
     
-    # Actualizar sesión
-    session.ai_responses_json = json.dumps(conversation_history)
-    session.context_used_summary = updated_context
-    session.updated_at = datetime.utcnow()
+    Args:
+        db: Sesión de base de datos
+        session_id: ID de la sesión
+        after_seq: Devolver solo mensajes posteriores a este seq
+        limit: Máximo de mensajes (None = todos)
+        
+    Returns:
+        Mensajes ordenados por seq
+    """
+    query = select(ContextSessionMessage).where(
+        ContextSessionMessage.session_id == session_id,
+        ContextSessionMessage.seq > after_seq
+    ).order_by(ContextSessionMessage.seq)
+    if limit is not None:
+        query = query.limit(limit)
     
-    await db.commit()
-    await db.refresh(session)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def stream_context_messages(
+    db: AsyncSession,
+    session_id: UUID,
+    batch_size: int = 200
+) -> AsyncIterator[ContextSessionMessage]:
+    """
+    Recorre los mensajes de una sesión por lotes, sin cargar todo el historial.
     
-    logger.info(f"📝 Sesión de contexto actualizada: {session.id}")
-    return session
+    Args:
+        db: Sesión de base de datos
+        session_id: ID de la sesión
+        batch_size: Mensajes por consulta
+    """
+    after_seq = 0
+    while True:
+        batch = await get_context_messages(db, session_id, after_seq=after_seq, limit=batch_size)
+        for message in batch:
+            yield message
+        if len(batch) < batch_size:
+            return
+        after_seq = batch[-1].seq
 
 
 async def finalize_context_session(
@@ -222,17 +317,11 @@ async def get_project_context_sessions(
     # Convertir a resúmenes
     summaries = []
     for session in sessions:
-        try:
-            conversation_history = json.loads(session.ai_responses_json or "[]")
-            messages_count = len(conversation_history)
-        except (json.JSONDecodeError, TypeError):
-            messages_count = 0
-        
         summaries.append(ContextSessionSummary(
             id=session.id,
             project_id=session.project_id,
             accumulated_context=session.context_used_summary or "",
-            messages_count=messages_count,
+            messages_count=session.message_count or 0,
             is_active=(session.session_status == "active"),
             created_at=session.created_at,
             last_activity=session.updated_at
@@ -241,29 +330,46 @@ async def get_project_context_sessions(
     return summaries
 
 
-def convert_interaction_to_context_session(interaction: InteractionEvent) -> ContextSession:
+def convert_interaction_to_context_session(
+    interaction: InteractionEvent,
+    messages: Optional[Sequence[ContextSessionMessage]] = None
+) -> ContextSession:
     """
     Convierte un InteractionEvent a modelo ContextSession.
     
     Args:
         interaction: InteractionEvent de tipo context_building
+        messages: Mensajes de context_messages; sin ellos se lee el historial
+            antiguo guardado en ai_responses_json
         
     Returns:
         Sesión en formato ContextSession
     """
-    try:
-        conversation_data = json.loads(interaction.ai_responses_json or "[]")
+    if messages is not None:
         conversation_history = [
             ContextMessage(
-                role=msg.get("role", "user"),
-                content=msg.get("content", ""),
-                timestamp=datetime.fromisoformat(msg.get("timestamp", datetime.utcnow().isoformat())),
-                message_type=msg.get("message_type")
+                role=message.role,
+                content=message.content,
+                timestamp=message.created_at,
+                message_type=message.message_type
             )
-            for msg in conversation_data
+            for message in messages
         ]
-    except (json.JSONDecodeError, TypeError):
-        conversation_history = []
+    else:
+        conversation_data = as_document(interaction.ai_responses_json, [])
+        try:
+            conversation_history = [
+                ContextMessage(
+                    role=msg.get("role", "user"),
+                    content=msg.get("content", ""),
+                    timestamp=datetime.fromisoformat(msg.get("timestamp", datetime.utcnow().isoformat())),
+                    message_type=msg.get("message_type")
+                )
+                for msg in conversation_data
+                if isinstance(msg, dict)
+            ]
+        except (ValueError, TypeError):
+            conversation_history = []
     
     return ContextSession(
         id=interaction.id,
@@ -274,4 +380,42 @@ def convert_interaction_to_context_session(interaction: InteractionEvent) -> Con
         is_active=(interaction.session_status == "active"),
         created_at=interaction.created_at,
         updated_at=interaction.updated_at
-    ) 
\ No newline at end of file
+    )
+
+
+async def load_context_session(
+    db: AsyncSession,
+    interaction: InteractionEvent
+) -> ContextSession:
+    """
+    Convierte un InteractionEvent a ContextSession con su historial de context_messages.
+    
+    Args:
+        db: Sesión de base de datos
+        interaction: InteractionEvent de tipo context_building
+        
+    Returns:
+        Sesión en formato ContextSession
+    """
+    messages = await get_context_messages(db, interaction.id)
+    return convert_interaction_to_context_session(interaction, messages)
+
+
+async def get_context_session_model(
+    db: AsyncSession,
+    session_id: UUID
+) -> Optional[ContextSession]:
+    """
+    Obtiene una sesión de contexto por ID como ContextSession.
+    
+    Args:
+        db: Sesión de base de datos
+        session_id: ID de la sesión
+        
+    Returns:
+        Sesión en formato ContextSession o None si no existe
+    """
+    interaction = await get_context_session(db, session_id)
+    if not interaction:
+        return None
+    return await load_context_session(db, interaction)
@@ -1,23 +1,58 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 from uuid import UUID
 from datetime import datetime
-import json
+import base64
 
+from sqlalchemy import case, delete, func, insert, or_
 from sqlmodel import select, and_
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.models import InteractionEvent
+from app.models.models import IAResponse, InteractionEvent, ModeratedSynthesis, ProjectInteractionCount
 from app.schemas.interaction import InteractionEventCreate
 
+# Longitudes máximas de los campos de InteractionSummary
+SUMMARY_PROMPT_CHARS = 200
+SUMMARY_SYNTHESIS_CHARS = 300
 
-async def create_interaction(
-    db: AsyncSession,
-    interaction_data: Dict[str, Any]
-) -> InteractionEvent:
-    """
-    Crear un nuevo evento de interacción en la base de datos.
+
+def _enum_value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _build_ia_response(interaction: InteractionEvent, response: Dict[str, Any]) -> IAResponse:
+    """Fila de ia_responses para la respuesta de un proveedor"""
+    return IAResponse(
+        interaction_event_id=interaction.id,
+        ia_provider_name=_enum_value(response.get("ia_provider_name")) or "unknown",
+        raw_response_text=response.get("response_text") or "",
+        latency_ms=int(response.get("latency_ms") or 0),
+        status=_enum_value(response.get("status")) or "success",
+        error_message=response.get("error_message"),
+        received_at=_as_datetime(response.get("timestamp")) or interaction.created_at,
+        created_at=interaction.created_at,
+        updated_at=interaction.created_at
+    )
+
+
+def build_interaction(interaction_data: Dict[str, Any]) -> InteractionEvent:
     """
+    Construir (sin guardar) un evento de interacción a partir del dict del pipeline.
     
+    Además de los documentos JSONB, el evento lleva sus filas normalizadas:
+    `moderated_synthesis` (moderated_syntheses) e `ia_responses` (una por
+    proveedor), que se guardan con él.
+    """
     # Convertir datos del dict a modelo de creación
     interaction_create = InteractionEventCreate(
         id=UUID(interaction_data["id"]),
@@ -38,14 +73,42 @@ async def create_interaction(
         project_id=interaction_create.project_id,
         user_id=interaction_create.user_id,
         user_prompt_text=interaction_create.user_prompt,
-        ai_responses_json=json.dumps(interaction_create.ai_responses),
-        moderator_synthesis_json=json.dumps(interaction_create.moderator_synthesis),
+        ai_responses_json=interaction_create.ai_responses,
+        moderator_synthesis_json=interaction_create.moderator_synthesis,
         context_used=interaction_create.context_used,
         context_preview=interaction_create.context_preview,
         processing_time_ms=interaction_create.processing_time_ms,
         created_at=interaction_create.created_at
     )
     
+    synthesis_text = interaction_create.moderator_synthesis.get("synthesis_text")
+    if synthesis_text:
+        synthesis = ModeratedSynthesis(
+            synthesis_text=synthesis_text,
+            quality=_enum_value(interaction_create.moderator_synthesis.get("quality")),
+            created_at=db_interaction.created_at,
+            updated_at=db_interaction.created_at
+        )
+        db_interaction.moderated_synthesis = synthesis
+        db_interaction.moderated_synthesis_id = synthesis.id
+    
+    db_interaction.ia_responses = [
+        _build_ia_response(db_interaction, response)
+        for response in interaction_create.ai_responses
+        if isinstance(response, dict)
+    ]
+    return db_interaction
+
+
+async def create_interaction(
+    db: AsyncSession,
+    interaction_data: Dict[str, Any]
+) -> InteractionEvent:
+    """
+    Crear un nuevo evento de interacción en la base de datos.
+    """
+    db_interaction = build_interaction(interaction_data)
+    
     db.add(db_interaction)
     await db.flush()
     await db.refresh(db_interaction)
@@ -53,6 +116,35 @@ async def create_interaction(
     return db_interaction
 
 
+async def _insert_rows(db: AsyncSession, model: Any, instances: Sequence[Any]) -> None:
+    """INSERT multi-fila de instancias sin pasar por la unidad de trabajo del ORM"""
+    if not instances:
+        return
+    columns = model.__table__.columns
+    rows = [{column.name: getattr(instance, column.key) for column in columns} for instance in instances]
+    await db.execute(insert(model.__table__), rows)
+
+
+async def create_interactions_bulk(
+    db: AsyncSession,
+    interactions: Sequence[InteractionEvent]
+) -> int:
+    """
+    Insertar varias interacciones con sus síntesis y respuestas por proveedor
+    (sin commit): una sentencia multi-fila por tabla, en el orden de las
+    claves foráneas, dentro de la transacción del llamador.
+    """
+    if not interactions:
+        return 0
+    syntheses = [interaction.moderated_synthesis for interaction in interactions if interaction.moderated_synthesis]
+    ia_responses = [response for interaction in interactions for response in interaction.ia_responses]
+    
+    await _insert_rows(db, ModeratedSynthesis, syntheses)
+    await _insert_rows(db, InteractionEvent, interactions)
+    await _insert_rows(db, IAResponse, ia_responses)
+    return len(interactions)
+
+
 async def get_interaction_by_id(
     db: AsyncSession,
     interaction_id: UUID,
@@ -105,6 +197,100 @@ async def get_project_interactions(
     return result.scalars().all()
 
 
+def _preview(text_expression, max_chars: int):
+    """Recorte en el servidor a max_chars caracteres, terminando en '...' si se corta"""
+    return case(
+        (func.char_length(text_expression) > max_chars, func.concat(func.left(text_expression, max_chars - 3), "...")),
+        else_=text_expression
+    )
+
+
+def encode_cursor(created_at: datetime, interaction_id: UUID) -> str:
+    """Cursor opaco de paginación por clave (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{interaction_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Clave (created_at, id) de un cursor. Lanza ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, interaction_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(interaction_id)
+    except ValueError as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+
+def _after_key(key: Tuple[datetime, UUID], descending: bool):
+    """
+    Filas posteriores a la clave en el orden (created_at, id). La condición
+    sobre created_at sola es indexable; el id solo desempata.
+    """
+    created_at, interaction_id = key
+    if descending:
+        return and_(
+            InteractionEvent.created_at <= created_at,
+            or_(InteractionEvent.created_at < created_at, InteractionEvent.id < interaction_id)
+        )
+    return and_(
+        InteractionEvent.created_at >= created_at,
+        or_(InteractionEvent.created_at > created_at, InteractionEvent.id > interaction_id)
+    )
+
+
+async def get_project_interaction_summaries(
+    db: AsyncSession,
+    project_id: UUID,
+    user_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    order_by: str = "created_at",
+    order_direction: str = "desc",
+    after: Optional[Tuple[datetime, UUID]] = None
+) -> List[Any]:
+    """
+    Listado ligero de interacciones: solo las columnas del resumen, recortadas
+    en el servidor. Los documentos JSONB completos no salen de la base de datos;
+    la síntesis y la calidad se extraen con ->>.
+    
+    Ordenando por created_at se puede paginar por clave con `after` (la clave
+    de la última fila de la página anterior): cualquier página cuesta lo mismo
+    que la primera, a diferencia de OFFSET.
+    """
+    synthesis_text = InteractionEvent.moderator_synthesis_json["synthesis_text"].astext
+    query = select(
+        InteractionEvent.id,
+        _preview(InteractionEvent.user_prompt_text, SUMMARY_PROMPT_CHARS).label("user_prompt"),
+        _preview(synthesis_text, SUMMARY_SYNTHESIS_CHARS).label("synthesis_preview"),
+        func.coalesce(InteractionEvent.moderator_synthesis_json["quality"].astext, "unknown").label("moderator_quality"),
+        InteractionEvent.created_at,
+        func.coalesce(InteractionEvent.processing_time_ms, 0).label("processing_time_ms")
+    ).where(
+        and_(
+            InteractionEvent.project_id == project_id,
+            InteractionEvent.user_id == user_id,
+            InteractionEvent.deleted_at.is_(None)
+        )
+    )
+    
+    # Ordenamiento (con id como desempate, el orden por fecha es total)
+    descending = order_direction.lower() == "desc"
+    sort_columns = [getattr(InteractionEvent, order_by)]
+    if order_by == "created_at":
+        sort_columns.append(InteractionEvent.id)
+        if after is not None:
+            query = query.where(_after_key(after, descending))
+    query = query.order_by(*(column.desc() if descending else column for column in sort_columns))
+    
+    # Paginación
+    if skip:
+        query = query.offset(skip)
+    query = query.limit(limit)
+    
+    result = await db.execute(query)
+    return result.all()
+
+
 async def delete_interaction(
     db: AsyncSession,
     interaction_id: UUID,
@@ -113,13 +299,21 @@ async def delete_interaction(
 ) -> bool:
     """
     Eliminar una interacción específica.
+    
+    Sus filas de ia_responses se borran en cascada; la fila de
+    moderated_syntheses (una por interacción) se borra después, ya sin la
+    referencia desde interaction_events.
     """
     interaction = await get_interaction_by_id(db, interaction_id, project_id, user_id)
     
     if not interaction:
         return False
     
+    moderated_synthesis_id = interaction.moderated_synthesis_id
     await db.delete(interaction)
+    if moderated_synthesis_id is not None:
+        await db.flush()
+        await db.execute(delete(ModeratedSynthesis).where(ModeratedSynthesis.id == moderated_synthesis_id))
     return True
 
 
@@ -129,14 +323,26 @@ async def count_project_interactions(
     user_id: UUID
 ) -> int:
     """
-    Contar el número total de interacciones en un proyecto.
+    Contar las interacciones (sin borrar) de un proyecto.
+    
+    Lee el contador de project_interaction_counts que mantiene un trigger sobre
+    interaction_events; si el proyecto aún no tiene contador, cuenta las filas.
     """
-    from sqlmodel import func
+    counter = await db.execute(
+        select(ProjectInteractionCount.interaction_count).where(
+            ProjectInteractionCount.project_id == project_id,
+            ProjectInteractionCount.user_id == user_id
+        )
+    )
+    count = counter.scalar_one_or_none()
+    if count is not None:
+        return max(0, count)
     
     query = select(func.count(InteractionEvent.id)).where(
         and_(
             InteractionEvent.project_id == project_id,
-            InteractionEvent.user_id == user_id
+            InteractionEvent.user_id == user_id,
+            InteractionEvent.deleted_at.is_(None)
         )
     )
     result = await db.execute(query)
@@ -149,10 +355,9 @@ async def get_interaction_stats(
     user_id: UUID
 ) -> Dict[str, Any]:
     """
-    Obtener estadísticas básicas de las interacciones de un proyecto.
+    Obtener estadísticas de las interacciones de un proyecto: totales,
+    calidad de las síntesis y latencia/errores por proveedor.
     """
-    from sqlmodel import func
-    
     # Consulta para obtener estadísticas
     stats_query = select(
         func.count(InteractionEvent.id).label("total_interactions"),
@@ -162,7 +367,8 @@ async def get_interaction_stats(
     ).where(
         and_(
             InteractionEvent.project_id == project_id,
-            InteractionEvent.user_id == user_id
+            InteractionEvent.user_id == user_id,
+            InteractionEvent.deleted_at.is_(None)
         )
     )
     
@@ -173,5 +379,102 @@ async def get_interaction_stats(
         "total_interactions": stats.total_interactions or 0,
         "average_processing_time_ms": int(stats.avg_processing_time or 0),
         "first_interaction_date": stats.first_interaction,
-        "last_interaction_date": stats.last_interaction
-    } 
\ No newline at end of file
+        "last_interaction_date": stats.last_interaction,
+        "synthesis_quality": await get_synthesis_quality_counts(db, project_id, user_id),
+        "providers": await get_provider_stats(db, project_id, user_id)
+    }
+
+
+async def get_provider_stats(
+    db: AsyncSession,
+    project_id: UUID,
+    user_id: UUID,
+    since: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Latencia y errores por proveedor de IA, agregados en la base de datos
+    sobre ia_responses. Las latencias son de las respuestas exitosas.
+    """
+    succeeded = IAResponse.status == "success"
+    latency = IAResponse.latency_ms
+    query = select(
+        IAResponse.ia_provider_name.label("provider"),
+        func.count().label("responses"),
+        func.count().filter(~succeeded).label("errors"),
+        func.avg(latency).filter(succeeded).label("avg_latency_ms"),
+        func.percentile_cont(0.5).within_group(latency).filter(succeeded).label("p50_latency_ms"),
+        func.percentile_cont(0.95).within_group(latency).filter(succeeded).label("p95_latency_ms"),
+        func.max(latency).filter(succeeded).label("max_latency_ms")
+    ).join(
+        InteractionEvent, IAResponse.interaction_event_id == InteractionEvent.id
+    ).where(
+        InteractionEvent.project_id == project_id,
+        InteractionEvent.user_id == user_id,
+        InteractionEvent.deleted_at.is_(None),
+        IAResponse.deleted_at.is_(None)
+    )
+    if since is not None:
+        query = query.where(IAResponse.received_at >= since)
+    query = query.group_by(IAResponse.ia_provider_name).order_by(IAResponse.ia_provider_name)
+    
+    errors_query = select(
+        IAResponse.ia_provider_name,
+        IAResponse.status,
+        func.count().label("count")
+    ).join(
+        InteractionEvent, IAResponse.interaction_event_id == InteractionEvent.id
+    ).where(
+        InteractionEvent.project_id == project_id,
+        InteractionEvent.user_id == user_id,
+        InteractionEvent.deleted_at.is_(None),
+        IAResponse.deleted_at.is_(None),
+        ~succeeded
+    )
+    if since is not None:
+        errors_query = errors_query.where(IAResponse.received_at >= since)
+    errors_query = errors_query.group_by(IAResponse.ia_provider_name, IAResponse.status)
+    
+    errors_by_status: Dict[str, Dict[str, int]] = {}
+    for row in (await db.execute(errors_query)).all():
+        errors_by_status.setdefault(row.ia_provider_name, {})[row.status] = row.count
+    
+    def _ms(value: Any) -> Optional[float]:
+        return round(float(value), 2) if value is not None else None
+    
+    return [
+        {
+            "provider": row.provider,
+            "responses": row.responses,
+            "errors": row.errors,
+            "error_rate": round(row.errors / row.responses, 4) if row.responses else 0.0,
+            "errors_by_status": errors_by_status.get(row.provider, {}),
+            "avg_latency_ms": _ms(row.avg_latency_ms),
+            "p50_latency_ms": _ms(row.p50_latency_ms),
+            "p95_latency_ms": _ms(row.p95_latency_ms),
+            "max_latency_ms": row.max_latency_ms
+        }
+        for row in (await db.execute(query)).all()
+    ]
+
+
+async def get_synthesis_quality_counts(
+    db: AsyncSession,
+    project_id: UUID,
+    user_id: UUID
+) -> Dict[str, int]:
+    """
+    Número de síntesis por calidad, agregado sobre moderated_syntheses.
+    """
+    query = select(
+        func.coalesce(ModeratedSynthesis.quality, "unknown").label("quality"),
+        func.count().label("count")
+    ).join(
+        InteractionEvent, InteractionEvent.moderated_synthesis_id == ModeratedSynthesis.id
+    ).where(
+        InteractionEvent.project_id == project_id,
+        InteractionEvent.user_id == user_id,
+        InteractionEvent.deleted_at.is_(None)
+    ).group_by(func.coalesce(ModeratedSynthesis.quality, "unknown"))
+    
+    result = await db.execute(query)
+    return {row.quality: row.count for row in result.all()}
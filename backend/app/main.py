@@ -11,6 +11,9 @@ from app.api.v1.context import router as context_router
 # Configuración y middleware
 from app.core.config import settings
 from app.core.database import create_db_and_tables
+from app.core.loop_monitor import loop_lag_monitor
+from app.services.interaction_writer import interaction_writer
+from app.services.outbound_scheduler import count_tokens
 from app.middleware.rate_limiting import RateLimitMiddleware
 
 # Configurar logging
@@ -28,11 +31,19 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Iniciando Orquix Backend...")
     await create_db_and_tables()
     logger.info("✅ Base de datos inicializada")
+    # Precargar el tokenizer para que la primera consulta no bloquee el event loop
+    count_tokens("warmup")
+    loop_lag_monitor.start()
+    if settings.WRITE_BEHIND_ENABLED:
+        interaction_writer.start()
     
     yield
     
     # Shutdown
     logger.info("🔄 Cerrando Orquix Backend...")
+    # Guardar las interacciones pendientes antes de cerrar
+    await interaction_writer.stop(timeout=settings.WRITE_BEHIND_SHUTDOWN_TIMEOUT_SECONDS)
+    await loop_lag_monitor.stop()
 
 
 app = FastAPI(
@@ -5,6 +5,8 @@ from .models import (
     IAResponse,
     ModeratedSynthesis,
     ContextChunk,
+    ContextSessionMessage,
+    ProjectInteractionCount,
 )
 
 __all__ = [
@@ -14,4 +16,6 @@ __all__ = [
     "IAResponse",
     "ModeratedSynthesis",
     "ContextChunk",
+    "ContextSessionMessage",
+    "ProjectInteractionCount",
 ] 
\ No newline at end of file
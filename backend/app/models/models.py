@@ -1,9 +1,10 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from uuid import UUID, uuid4
 
 from pgvector.sqlalchemy import Vector
 from sqlmodel import Field, Relationship, SQLModel, Column, Text, DateTime, String, Integer, Boolean
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID, JSONB
 
 
@@ -60,11 +61,36 @@ class ModeratedSynthesis(SQLModel, table=True):
     deleted_at: Optional[datetime] = Field(default=None, index=True)
 
     synthesis_text: str = Field(sa_column=Column(Text, nullable=False))
+    quality: Optional[str] = Field(default=None, sa_column=Column(String(20), nullable=True))
 
 
 class InteractionEvent(SQLModel, table=True):
     __tablename__ = "interaction_events"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Rutas calientes (historial, seguimiento, estado de conversación):
+        # filtran por proyecto y usuario sin borrados y ordenan por fecha
+        Index(
+            "ix_interaction_events_live_history",
+            "project_id", "user_id", text("created_at DESC"),
+            postgresql_include=["id"],
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # Sesiones de construcción de contexto por proyecto y usuario
+        Index(
+            "ix_interaction_events_context_sessions",
+            "project_id", "user_id", text("updated_at DESC"),
+            postgresql_where=text("interaction_type = 'context_building' AND deleted_at IS NULL"),
+        ),
+        # Sesión activa de construcción de contexto (muy pocas filas)
+        Index(
+            "ix_interaction_events_active_context_session",
+            "project_id", "user_id", text("updated_at DESC"),
+            postgresql_where=text(
+                "interaction_type = 'context_building' AND session_status = 'active' AND deleted_at IS NULL"
+            ),
+        ),
+        {'extend_existing': True},
+    )
 
     id: UUID = Field(
         sa_column=Column(PostgresUUID(as_uuid=True), primary_key=True, nullable=False)
@@ -80,8 +106,9 @@ class InteractionEvent(SQLModel, table=True):
     created_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False, index=True))
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), nullable=False))
     deleted_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True, index=True))
-    ai_responses_json: Optional[str] = Field(default=None, sa_column=Column(JSONB, nullable=True))
-    moderator_synthesis_json: Optional[str] = Field(default=None, sa_column=Column(JSONB, nullable=True))
+    # Documentos JSONB nativos (dict/list), no cadenas de json.dumps
+    ai_responses_json: Optional[Any] = Field(default=None, sa_column=Column(JSONB, nullable=True))
+    moderator_synthesis_json: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONB, nullable=True))
     context_used: bool = Field(default=False, sa_column=Column(Boolean, nullable=False, default=False))
     context_preview: Optional[str] = Field(default=None, sa_column=Column(String(500), nullable=True))
     processing_time_ms: Optional[int] = Field(default=None, sa_column=Column(Integer, nullable=True))
@@ -93,27 +120,89 @@ class InteractionEvent(SQLModel, table=True):
     # NUEVO: Estado de sesión para construcción de contexto
     session_status: Optional[str] = Field(default=None, sa_column=Column(String(20), nullable=True))
     # Valores posibles: "active", "completed", "abandoned" (solo para context_building)
+    
+    # Último seq de context_messages (solo para context_building)
+    message_count: int = Field(default=0, sa_column=Column(Integer, nullable=False, default=0, server_default="0"))
 
     # Relationships
     project: Project = Relationship(back_populates="interaction_events")
     user: User = Relationship(back_populates="interaction_events")
-    ia_responses: List["IAResponse"] = Relationship(back_populates="interaction_event")
+    # Las respuestas se borran con la interacción (ON DELETE CASCADE en la BD)
+    ia_responses: List["IAResponse"] = Relationship(
+        back_populates="interaction_event",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True}
+    )
     moderated_synthesis: Optional[ModeratedSynthesis] = Relationship()
 
 
+class ProjectInteractionCount(SQLModel, table=True):
+    """Número de interacciones sin borrar por proyecto y usuario (mantenido por trigger)"""
+    __tablename__ = "project_interaction_counts"
+    __table_args__ = {'extend_existing': True}
+
+    project_id: UUID = Field(
+        sa_column=Column(PostgresUUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    )
+    user_id: UUID = Field(
+        sa_column=Column(PostgresUUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    )
+    interaction_count: int = Field(default=0, nullable=False)
+
+
+class ContextSessionMessage(SQLModel, table=True):
+    """Mensaje de una sesión de construcción de contexto (solo se insertan, nunca se reescriben)"""
+    __tablename__ = "context_messages"
+    __table_args__ = {'extend_existing': True}
+
+    session_id: UUID = Field(
+        sa_column=Column(
+            PostgresUUID(as_uuid=True), ForeignKey("interaction_events.id", ondelete="CASCADE"), primary_key=True
+        )
+    )
+    seq: int = Field(primary_key=True)
+    role: str = Field(sa_column=Column(String(20), nullable=False))
+    content: str = Field(sa_column=Column(Text, nullable=False))
+    message_type: Optional[str] = Field(default=None, sa_column=Column(String(20), nullable=True))
+    created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True), nullable=False))
+
+
 class IAResponse(SQLModel, table=True):
     __tablename__ = "ia_responses"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Analítica por proveedor: latencia y estado en una ventana de tiempo
+        Index(
+            "ix_ia_responses_provider_received",
+            "ia_provider_name", "received_at",
+            postgresql_include=["latency_ms", "status"],
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # Errores por proveedor (pocas filas)
+        Index(
+            "ix_ia_responses_provider_errors",
+            "ia_provider_name", "received_at",
+            postgresql_where=text("status <> 'success' AND deleted_at IS NULL"),
+        ),
+        {'extend_existing': True},
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     deleted_at: Optional[datetime] = Field(default=None, index=True)
 
-    interaction_event_id: UUID = Field(foreign_key="interaction_events.id", index=True)
+    interaction_event_id: UUID = Field(
+        sa_column=Column(
+            PostgresUUID(as_uuid=True),
+            ForeignKey("interaction_events.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True
+        )
+    )
     ia_provider_name: str = Field(index=True)
     raw_response_text: str
     latency_ms: int
+    # Valores de AIResponseStatus: "success", "error", "timeout", "rate_limit"...
+    status: str = Field(default="success", sa_column=Column(String(30), nullable=False, default="success", server_default="success"))
     error_message: Optional[str] = Field(default=None)
     received_at: datetime = Field(default_factory=datetime.utcnow)
 
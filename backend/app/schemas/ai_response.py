@@ -8,6 +8,11 @@ class AIProviderEnum(str, Enum):
     OPENAI = "openai"
     ANTHROPIC = "anthropic"
 
+class RequestPriority(str, Enum):
+    """Prioridad de una llamada saliente a un proveedor de IA"""
+    INTERACTIVE = "interactive"  # El usuario está esperando la respuesta
+    BACKGROUND = "background"  # Ingesta de contexto, tareas en segundo plano
+
 class AIResponseStatus(str, Enum):
     """Estados posibles de una respuesta de IA"""
     SUCCESS = "success"
@@ -42,6 +47,7 @@ class RetryInfo(BaseModel):
     successful_attempt: Optional[int] = None  # En qué intento fue exitoso
     failed_attempts: List[str] = []  # Errores de cada intento fallido
     total_retry_time_ms: int = 0
+    stop_reason: Optional[str] = None  # max_attempts | deadline | retry_budget | non_retryable
 
 class StandardAIResponse(BaseModel):
     """
@@ -64,6 +70,9 @@ class StandardAIResponse(BaseModel):
     
     # Información de uso (tokens, costos, etc.)
     usage_info: Optional[Dict[str, Any]] = None
+    
+    # Salida estructurada ya parseada cuando la solicitud trae `response_schema`
+    structured_output: Optional[Dict[str, Any]] = None
 
 class AIRequest(BaseModel):
     """Estructura estándar para solicitudes a IAs"""
@@ -76,6 +85,24 @@ class AIRequest(BaseModel):
     user_id: Optional[str] = None
     project_id: Optional[str] = None
     conversation_id: Optional[str] = None
+    
+    # Prioridad en el planificador de llamadas salientes
+    priority: RequestPriority = RequestPriority.INTERACTIVE
+    
+    # Deadline total de la solicitud (time.monotonic()); los reintentos no lo superan
+    deadline: Optional[float] = None
+    
+    # Control de la caché de respuestas
+    bypass_cache: bool = False  # Ni lee ni escribe en caché
+    refresh_cache: bool = False  # Ignora lo cacheado pero guarda la respuesta nueva
+    
+    # Salida estructurada: JSON schema que debe cumplir la respuesta
+    response_schema: Optional[Dict[str, Any]] = None
+    response_schema_name: str = "structured_output"
+    
+    # Prefijo estático del prompt (idéntico entre solicitudes): el proveedor puede cachearlo
+    cacheable_prefix_chars: int = 0
+    cacheable_prefix_tokens: int = 0
 
 class ProviderHealthStatus(str, Enum):
     """Estado de salud de un proveedor"""
@@ -1,4 +1,4 @@
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -18,6 +18,7 @@ class DatabaseHealth(BaseModel):
     connection_pool_size: Optional[int] = None
     active_connections: Optional[int] = None
     response_time_ms: Optional[int] = None
+    pool: Optional[Dict[str, Any]] = Field(None, description="Ocupación del pool y tiempos de espera de checkout")
 
 
 class AIProviderHealth(BaseModel):
@@ -86,6 +86,30 @@ class InteractionHistoryResponse(BaseModel):
     per_page: int
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = Field(default=None, description="Cursor para pedir la página siguiente")
+
+
+class ProviderStats(BaseModel):
+    """Latencia y errores de un proveedor de IA"""
+    provider: str
+    responses: int
+    errors: int
+    error_rate: float
+    errors_by_status: Dict[str, int] = Field(default_factory=dict)
+    avg_latency_ms: Optional[float] = None
+    p50_latency_ms: Optional[float] = None
+    p95_latency_ms: Optional[float] = None
+    max_latency_ms: Optional[int] = None
+
+
+class InteractionStatsResponse(BaseModel):
+    """Estadísticas de las interacciones de un proyecto"""
+    total_interactions: int
+    average_processing_time_ms: int
+    first_interaction_date: Optional[datetime] = None
+    last_interaction_date: Optional[datetime] = None
+    synthesis_quality: Dict[str, int] = Field(default_factory=dict, description="Síntesis por calidad")
+    providers: List[ProviderStats] = Field(default_factory=list)
 
 
 class InteractionDetailResponse(BaseModel):
@@ -1,7 +1,21 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from app.core import fast_json
+from app.core.config import settings
 from app.services.ai_adapters.base import BaseAIAdapter
+from app.services.outbound_scheduler import count_tokens
 from app.schemas.ai_response import AIRequest, AIProviderEnum
 
+# Marca de punto de corte para la caché de prompts de Anthropic
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+@lru_cache(maxsize=128)
+def _static_tokens(text: str) -> int:
+    """Tokens de un texto estático (system prompts): se cuentan una vez por texto"""
+    return count_tokens(text)
+
+
 class AnthropicAdapter(BaseAIAdapter):
     """Adaptador para Anthropic Claude 3 Haiku"""
     
@@ -13,6 +27,11 @@ class AnthropicAdapter(BaseAIAdapter):
     def provider_name(self) -> AIProviderEnum:
         return AIProviderEnum.ANTHROPIC
     
+    @property
+    def supports_structured_output(self) -> bool:
+        # Se fuerza una herramienta cuyo input_schema es el esquema pedido
+        return True
+    
     @property
     def base_url(self) -> str:
         return "https://api.anthropic.com/v1/messages"
@@ -42,19 +61,66 @@ class AnthropicAdapter(BaseAIAdapter):
         if request.system_message:
             payload["system"] = request.system_message
         
+        if settings.AI_PROMPT_CACHE_ENABLED:
+            self._add_cache_breakpoints(payload, request)
+        
+        # Salida estructurada: forzar una herramienta cuyo input_schema es el esquema
+        if request.response_schema:
+            payload["tools"] = [{
+                "name": request.response_schema_name,
+                "description": "Registra la respuesta estructurada",
+                "input_schema": request.response_schema
+            }]
+            payload["tool_choice"] = {"type": "tool", "name": request.response_schema_name}
+        
         return payload
     
+    def _add_cache_breakpoints(self, payload: dict, request: AIRequest) -> None:
+        """
+        Marca con `cache_control` el system message y el prefijo estático del
+        prompt. Solo se marcan prefijos que alcanzan el mínimo cacheable: escribir
+        en caché cuesta más que una entrada normal.
+        """
+        minimum = settings.ANTHROPIC_PROMPT_CACHE_MIN_TOKENS
+        if "haiku" in self.model:
+            minimum = max(minimum, settings.ANTHROPIC_HAIKU_PROMPT_CACHE_MIN_TOKENS)
+        system_tokens = _static_tokens(request.system_message) if request.system_message else 0
+        
+        if system_tokens >= minimum:
+            payload["system"] = [{"type": "text", "text": request.system_message, "cache_control": _CACHE_CONTROL}]
+        
+        prefix_chars = request.cacheable_prefix_chars
+        if 0 < prefix_chars < len(request.prompt) and system_tokens + request.cacheable_prefix_tokens >= minimum:
+            payload["messages"][0]["content"] = [
+                {"type": "text", "text": request.prompt[:prefix_chars], "cache_control": _CACHE_CONTROL},
+                {"type": "text", "text": request.prompt[prefix_chars:]}
+            ]
+    
     def _extract_response_text(self, response_data: dict) -> str:
         """Extrae el texto de respuesta de Anthropic"""
         try:
             content = response_data["content"]
             if isinstance(content, list) and len(content) > 0:
-                return content[0]["text"]
+                for block in content:
+                    if block.get("type", "text") == "text":
+                        return block["text"]
+                # Respuesta con tool-use (salida estructurada) y sin texto
+                structured = self._extract_structured_output(response_data)
+                if structured is not None:
+                    return fast_json.dumps(structured)
+                raise ValueError("Respuesta sin bloques de texto")
             else:
                 raise ValueError("Formato de contenido inesperado")
         except (KeyError, IndexError, TypeError) as e:
             raise ValueError(f"Formato de respuesta inesperado de Anthropic: {e}")
     
+    def _extract_structured_output(self, response_data: dict) -> Optional[dict]:
+        """El input del bloque tool_use ya es el objeto estructurado"""
+        for block in response_data.get("content") or []:
+            if block.get("type") == "tool_use":
+                return block.get("input")
+        return None
+    
     def _extract_usage_info(self, response_data: dict) -> Optional[dict]:
         """Extrae información de uso de Anthropic"""
         usage = response_data.get("usage", {})
@@ -66,5 +132,34 @@ class AnthropicAdapter(BaseAIAdapter):
             "input_tokens": usage.get("input_tokens", 0),
             "output_tokens": usage.get("output_tokens", 0),
             "total_tokens": usage.get("input_tokens", 0) + usage.get("output_tokens", 0),
+            **self._cache_usage(usage),
             "model": response_data.get("model", self.model)
-        } 
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def _cache_usage(usage: dict) -> Dict[str, int]:
+        """Tokens leídos de la caché de prompts y escritos en ella (no incluidos en input_tokens)"""
+        return {
+            "cached_tokens": usage.get("cache_read_input_tokens") or 0,
+            "cache_creation_tokens": usage.get("cache_creation_input_tokens") or 0
+        }
+    
+    def _extract_stream_delta(self, event: dict) -> Optional[str]:
+        """Extrae el fragmento de texto de un evento content_block_delta de Anthropic"""
+        if event.get("type") != "content_block_delta":
+            return None
+        delta = event.get("delta") or {}
+        return delta.get("text") if delta.get("type") == "text_delta" else None
+    
+    def _update_stream_usage(self, event: dict, usage: Dict[str, Any]) -> None:
+        # message_start trae los tokens de entrada y message_delta los de salida
+        if event.get("type") == "message_start":
+            message = event.get("message") or {}
+            usage["input_tokens"] = (message.get("usage") or {}).get("input_tokens", 0)
+            usage.update(self._cache_usage(message.get("usage") or {}))
+            usage["model"] = message.get("model", self.model)
+        elif event.get("type") == "message_delta":
+            usage["output_tokens"] = (event.get("usage") or {}).get("output_tokens", 0)
+        else:
+            return
+        usage["total_tokens"] = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
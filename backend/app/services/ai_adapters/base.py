@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 import httpx
 import asyncio
 import logging
@@ -18,6 +18,10 @@ from app.schemas.ai_response import (
     ErrorDetail, ErrorCategory, RetryInfo, ProviderHealthInfo, ProviderHealthStatus
 )
 from app.core.config import settings
+from app.core import fast_json
+from app.services.outbound_scheduler import outbound_scheduler, estimate_request_tokens
+from app.services.response_cache import response_cache
+from app.services.ai_adapters.retry_policy import retry_policy
 
 logger = logging.getLogger(__name__)
 
@@ -77,9 +81,24 @@ class BaseAIAdapter(ABC):
         """Extrae información de uso (tokens, costos, etc.)"""
         pass
     
+    def _extract_structured_output(self, response_data: dict) -> Optional[dict]:
+        """Extrae la salida estructurada (solicitudes con `response_schema`)"""
+        return None
+    
+    @property
+    def supports_structured_output(self) -> bool:
+        """Si el modelo acepta `response_schema` (salida restringida por JSON schema)"""
+        return False
+    
     def _classify_error(self, exception: Exception) -> ErrorDetail:
         """Clasifica el tipo de error para mejor manejo"""
-        if isinstance(exception, httpx.TimeoutException):
+        if isinstance(exception, asyncio.TimeoutError):
+            return ErrorDetail(
+                category=ErrorCategory.NETWORK,
+                code="DEADLINE_EXCEEDED",
+                message="Request deadline exceeded"
+            )
+        elif isinstance(exception, httpx.TimeoutException):
             return ErrorDetail(
                 category=ErrorCategory.NETWORK,
                 code="TIMEOUT",
@@ -157,6 +176,30 @@ class BaseAIAdapter(ABC):
         start_time = time.time()
         retry_info = RetryInfo(total_attempts=0, failed_attempts=[])
         
+        # Consultar la caché de respuestas antes de salir a la red
+        cache_lookup = None
+        if settings.AI_RESPONSE_CACHE_ENABLED and not request.bypass_cache:
+            cache_lookup = await response_cache.lookup(
+                self.provider_name,
+                self._build_payload(request),
+                request,
+                model=getattr(self, "model", None),
+                read=not request.refresh_cache
+            )
+            if cache_lookup.hit:
+                logger.info(f"⚡ Respuesta de {self.provider_name} servida desde caché ({cache_lookup.mode})")
+                metadata = dict(cache_lookup.response.provider_metadata or {})
+                metadata.update({"cache_hit": True, "cache_mode": cache_lookup.mode})
+                return cache_lookup.response.model_copy(update={
+                    "latency_ms": int((time.time() - start_time) * 1000),
+                    "timestamp": datetime.utcnow(),
+                    "retry_info": None,
+                    "provider_metadata": metadata
+                })
+        
+        retry_policy.budget_for(self.provider_name.value).record_request()
+        previous_delay = 0.0
+        
         for attempt in range(1, self.max_retries + 1):
             retry_info.total_attempts = attempt
             attempt_start = time.time()
@@ -164,7 +207,14 @@ class BaseAIAdapter(ABC):
             try:
                 logger.info(f"Intento {attempt}/{self.max_retries} para {self.provider_name}")
                 
-                response = await self._make_api_call(request)
+                # El intento completo (cola del planificador + llamada) respeta el deadline
+                remaining = retry_policy.remaining(request.deadline)
+                if remaining is None:
+                    response, usage_info = await self._attempt_call(request)
+                else:
+                    response, usage_info = await asyncio.wait_for(
+                        self._attempt_call(request), timeout=max(remaining, 0)
+                    )
                 
                 # Calcular latencia total y del intento
                 total_latency_ms = int((time.time() - start_time) * 1000)
@@ -177,16 +227,23 @@ class BaseAIAdapter(ABC):
                 # Actualizar métricas de salud
                 self._update_health_metrics(success=True, latency_ms=attempt_latency_ms)
                 
+                if request.cacheable_prefix_tokens:
+                    usage_info = {**(usage_info or {}), "cache_eligible_prefix_tokens": request.cacheable_prefix_tokens}
+                
                 # Respuesta exitosa
-                return StandardAIResponse(
+                ai_response = StandardAIResponse(
                     ia_provider_name=self.provider_name,
                     response_text=self._extract_response_text(response),
                     status=AIResponseStatus.SUCCESS,
                     latency_ms=total_latency_ms,
                     retry_info=retry_info if attempt > 1 else None,
-                    usage_info=self._extract_usage_info(response),
-                    provider_metadata={"raw_response": response}
+                    usage_info=usage_info,
+                    provider_metadata={"raw_response": response},
+                    structured_output=self._extract_structured_output(response) if request.response_schema else None
                 )
+                if cache_lookup is not None:
+                    response_cache.store(cache_lookup, ai_response)
+                return ai_response
                 
             except Exception as e:
                 attempt_latency_ms = int((time.time() - attempt_start) * 1000)
@@ -197,11 +254,30 @@ class BaseAIAdapter(ABC):
                 
                 logger.warning(f"Intento {attempt} falló para {self.provider_name}: {error_detail.message}")
                 
-                # Verificar si debemos reintentar
-                if attempt == self.max_retries or not self._should_retry(error_detail):
+                if error_detail.category == ErrorCategory.RATE_LIMITING:
+                    # El presupuesto local subestimó al proveedor: frenar al resto de la cola
+                    outbound_scheduler.note_rate_limited(self.provider_name)
+                
+                # Verificar si debemos reintentar (reglas por categoría, deadline y presupuesto)
+                wait_time, reason = None, "non_retryable"
+                if self._should_retry(error_detail):
+                    wait_time, reason = retry_policy.next_delay(
+                        provider=self.provider_name.value,
+                        error_detail=error_detail,
+                        attempt=attempt,
+                        max_attempts=self.max_retries,
+                        previous_delay=previous_delay,
+                        deadline=request.deadline
+                    )
+                
+                if wait_time is None:
                     # No más intentos o error no retryable
                     total_latency_ms = int((time.time() - start_time) * 1000)
                     retry_info.total_retry_time_ms = total_latency_ms
+                    retry_info.stop_reason = reason
+                    
+                    if reason in ("deadline", "retry_budget"):
+                        logger.info(f"Sin reintento para {self.provider_name}: {reason}")
                     
                     # Actualizar métricas de salud
                     self._update_health_metrics(success=False, latency_ms=attempt_latency_ms)
@@ -226,14 +302,10 @@ class BaseAIAdapter(ABC):
                         retry_info=retry_info
                     )
                 
-                # Esperar antes del siguiente intento (backoff exponencial)
-                if attempt < self.max_retries:
-                    wait_time = min(2 ** (attempt - 1), 30)  # Max 30 segundos
-                    if error_detail.retry_after:
-                        wait_time = max(wait_time, error_detail.retry_after)
-                    
-                    logger.info(f"Esperando {wait_time}s antes del siguiente intento")
-                    await asyncio.sleep(wait_time)
+                # Esperar antes del siguiente intento (backoff con jitter decorrelado)
+                logger.info(f"Esperando {wait_time:.2f}s antes del siguiente intento")
+                previous_delay = wait_time
+                await asyncio.sleep(wait_time)
         
         # Este punto no debería alcanzarse, pero por seguridad
         total_latency_ms = int((time.time() - start_time) * 1000)
@@ -245,17 +317,100 @@ class BaseAIAdapter(ABC):
             retry_info=retry_info
         )
     
+    async def _attempt_call(self, request: AIRequest) -> Tuple[dict, Optional[dict]]:
+        """Un intento: turno en el planificador, llamada al proveedor y conciliación de tokens"""
+        async with outbound_scheduler.slot(
+            self.provider_name,
+            tenant=request.project_id or request.user_id,
+            priority=request.priority,
+            estimated_tokens=estimate_request_tokens(request)
+        ) as grant:
+            response = await self._make_api_call(request)
+            usage_info = self._extract_usage_info(response)
+            # Conciliar la reserva estimada con los tokens realmente cobrados
+            grant.reconcile(usage_info)
+        return response, usage_info
+    
     async def _make_api_call(self, request: AIRequest) -> dict:
         """Realiza la llamada API específica del proveedor"""
         payload = self._build_payload(request)
         
+        # El timeout HTTP nunca supera el tiempo que queda hasta el deadline
+        timeout = self.timeout
+        remaining = retry_policy.remaining(request.deadline)
+        if remaining is not None:
+            timeout = max(0.1, min(self.timeout, remaining))
+        
         response = await self.client.post(
             self.base_url,
-            json=payload
+            json=payload,
+            timeout=timeout
         )
         
         response.raise_for_status()
-        return response.json()
+        return fast_json.loads(response.content)
+    
+    def _build_stream_payload(self, request: AIRequest) -> dict:
+        """Payload para la variante en streaming (SSE) de la llamada"""
+        payload = self._build_payload(request)
+        payload["stream"] = True
+        return payload
+    
+    @abstractmethod
+    def _extract_stream_delta(self, event: dict) -> Optional[str]:
+        """Extrae el fragmento de texto de un evento SSE del proveedor"""
+        pass
+    
+    def _update_stream_usage(self, event: dict, usage: Dict[str, Any]) -> None:
+        """Acumula en `usage` la información de tokens que traen los eventos SSE"""
+        pass
+    
+    async def stream_response(self, request: AIRequest) -> AsyncIterator[str]:
+        """
+        Genera la respuesta como un flujo de fragmentos de texto (SSE del proveedor).
+        
+        No hay reintentos ni caché: un fallo a mitad del flujo no se puede
+        repetir sin duplicar texto ya entregado, así que el error se propaga.
+        """
+        start_time = time.time()
+        payload = self._build_stream_payload(request)
+        usage: Dict[str, Any] = {}
+        
+        timeout = self.timeout
+        remaining = retry_policy.remaining(request.deadline)
+        if remaining is not None:
+            timeout = max(0.1, min(self.timeout, remaining))
+        
+        try:
+            async with outbound_scheduler.slot(
+                self.provider_name,
+                tenant=request.project_id or request.user_id,
+                priority=request.priority,
+                estimated_tokens=estimate_request_tokens(request)
+            ) as grant:
+                async with self.client.stream("POST", self.base_url, json=payload, timeout=timeout) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if not data or data == "[DONE]":
+                            continue
+                        event = fast_json.loads(data)
+                        self._update_stream_usage(event, usage)
+                        delta = self._extract_stream_delta(event)
+                        if delta:
+                            yield delta
+                grant.reconcile(usage or None)
+        except Exception as e:
+            error_detail = self._classify_error(e)
+            if error_detail.category == ErrorCategory.RATE_LIMITING:
+                outbound_scheduler.note_rate_limited(self.provider_name)
+            self._update_health_metrics(success=False, latency_ms=int((time.time() - start_time) * 1000))
+            logger.warning(f"Streaming falló para {self.provider_name}: {error_detail.message}")
+            raise
+        
+        self._update_health_metrics(success=True, latency_ms=int((time.time() - start_time) * 1000))
     
     def _update_health_metrics(self, success: bool, latency_ms: int):
         """Actualiza las métricas de salud del proveedor"""
@@ -315,7 +470,8 @@ class BaseAIAdapter(ABC):
             test_request = AIRequest(
                 prompt="Hello",
                 max_tokens=1,
-                temperature=0.1
+                temperature=0.1,
+                bypass_cache=True  # Debe comprobar el proveedor real, no la caché
             )
             response = await self.generate_response(test_request)
             return response.status == AIResponseStatus.SUCCESS
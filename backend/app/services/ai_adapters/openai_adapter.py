@@ -1,7 +1,14 @@
-from typing import Optional
+import logging
+from typing import Any, Dict, Optional
+from app.core import fast_json
 from app.services.ai_adapters.base import BaseAIAdapter
 from app.schemas.ai_response import AIRequest, AIProviderEnum
 
+logger = logging.getLogger(__name__)
+
+# Modelos que aceptan response_format de tipo json_schema (gpt-3.5-turbo y gpt-4-turbo no)
+_JSON_SCHEMA_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
 class OpenAIAdapter(BaseAIAdapter):
     """Adaptador para OpenAI GPT-4o-mini"""
     
@@ -17,6 +24,10 @@ class OpenAIAdapter(BaseAIAdapter):
     def base_url(self) -> str:
         return "https://api.openai.com/v1/chat/completions"
     
+    @property
+    def supports_structured_output(self) -> bool:
+        return self.model.startswith(_JSON_SCHEMA_MODEL_PREFIXES)
+    
     def _get_default_headers(self) -> dict:
         return {
             "Authorization": f"Bearer {self.api_key}",
@@ -47,6 +58,17 @@ class OpenAIAdapter(BaseAIAdapter):
             "temperature": request.temperature
         }
         
+        # Salida restringida por JSON schema (modo estricto)
+        if request.response_schema:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": request.response_schema_name,
+                    "schema": request.response_schema,
+                    "strict": True
+                }
+            }
+        
         return payload
     
     def _extract_response_text(self, response_data: dict) -> str:
@@ -56,6 +78,14 @@ class OpenAIAdapter(BaseAIAdapter):
         except (KeyError, IndexError) as e:
             raise ValueError(f"Formato de respuesta inesperado de OpenAI: {e}")
     
+    def _extract_structured_output(self, response_data: dict) -> Optional[dict]:
+        """Con response_format el contenido del mensaje es el JSON"""
+        try:
+            return fast_json.loads(self._extract_response_text(response_data))
+        except ValueError as e:
+            logger.warning(f"Salida estructurada inválida de OpenAI: {e}")
+            return None
+    
     def _extract_usage_info(self, response_data: dict) -> Optional[dict]:
         """Extrae información de uso de OpenAI"""
         usage = response_data.get("usage", {})
@@ -67,5 +97,29 @@ class OpenAIAdapter(BaseAIAdapter):
             "prompt_tokens": usage.get("prompt_tokens", 0),
             "completion_tokens": usage.get("completion_tokens", 0),
             "total_tokens": usage.get("total_tokens", 0),
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
             "model": response_data.get("model", self.model)
-        } 
\ No newline at end of file
+        } 
+    
+    def _build_stream_payload(self, request: AIRequest) -> dict:
+        payload = super()._build_stream_payload(request)
+        # El último evento del flujo trae el uso de tokens
+        payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    def _extract_stream_delta(self, event: dict) -> Optional[str]:
+        """Extrae el fragmento de texto de un chunk de OpenAI"""
+        choices = event.get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("delta") or {}).get("content")
+    
+    def _update_stream_usage(self, event: dict, usage: Dict[str, Any]) -> None:
+        if event.get("usage"):
+            usage.update({
+                "prompt_tokens": event["usage"].get("prompt_tokens", 0),
+                "completion_tokens": event["usage"].get("completion_tokens", 0),
+                "total_tokens": event["usage"].get("total_tokens", 0),
+                "cached_tokens": (event["usage"].get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                "model": event.get("model", self.model)
+            })
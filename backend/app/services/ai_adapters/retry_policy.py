@@ -0,0 +1,156 @@
+"""
+Política de reintentos para los adaptadores de IA.
+
+- Reglas por categoría de error (qué se reintenta, cuántas veces y con qué espera).
+- Backoff con "decorrelated jitter": evita que todas las peticiones que fallaron
+  a la vez vuelvan a la carga en el mismo instante.
+- Deadline total propagado desde el llamador: nunca se reintenta si la espera
+  más un intento mínimo no caben en el tiempo restante.
+- Presupuesto de reintentos por proveedor: los reintentos no pueden superar
+  una fracción del tráfico reciente, para no amplificar una caída del proveedor.
+"""
+
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.ai_response import ErrorCategory, ErrorDetail
+
+
+@dataclass(frozen=True)
+class RetryRule:
+    """Cómo reintentar una categoría de error"""
+    max_attempts: int  # Intentos totales (1 = sin reintentos)
+    base_delay: float = 0.5  # segundos
+    max_delay: float = 10.0  # segundos
+    respect_retry_after: bool = False
+
+
+DEFAULT_RULES: Dict[ErrorCategory, RetryRule] = {
+    ErrorCategory.NETWORK: RetryRule(max_attempts=3, base_delay=0.5, max_delay=8.0),
+    ErrorCategory.EXTERNAL_API: RetryRule(max_attempts=3, base_delay=1.0, max_delay=10.0),
+    ErrorCategory.RATE_LIMITING: RetryRule(
+        max_attempts=3, base_delay=1.0, max_delay=30.0, respect_retry_after=True
+    ),
+    ErrorCategory.INTERNAL: RetryRule(max_attempts=2, base_delay=0.5, max_delay=2.0),
+    # Errores que no se arreglan reintentando
+    ErrorCategory.AUTHENTICATION: RetryRule(max_attempts=1),
+    ErrorCategory.QUOTA: RetryRule(max_attempts=1),
+    ErrorCategory.VALIDATION: RetryRule(max_attempts=1),
+}
+
+
+class RetryBudget:
+    """
+    Limita los reintentos a una fracción de las peticiones de la ventana reciente.
+    Siempre se permite un mínimo de reintentos para no bloquear con poco tráfico.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window_seconds: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window_seconds:
+                events.popleft()
+
+    def record_request(self) -> None:
+        self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """Consume un reintento si el presupuesto lo permite"""
+        now = time.monotonic()
+        self._trim(now)
+        allowed = self.min_retries + self.ratio * len(self._requests)
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+    def get_stats(self) -> Dict[str, float]:
+        self._trim(time.monotonic())
+        return {"requests": len(self._requests), "retries": len(self._retries), "ratio": self.ratio}
+
+
+class RetryPolicy:
+    """Decide si reintentar y cuánto esperar tras un intento fallido"""
+
+    def __init__(
+        self,
+        rules: Optional[Dict[ErrorCategory, RetryRule]] = None,
+        budget_ratio: float = 0.2,
+        budget_min_retries: int = 3,
+        min_attempt_seconds: float = 1.0,
+    ):
+        self.rules = rules or DEFAULT_RULES
+        self.budget_ratio = budget_ratio
+        self.budget_min_retries = budget_min_retries
+        self.min_attempt_seconds = min_attempt_seconds
+        self._budgets: Dict[str, RetryBudget] = {}
+
+    def budget_for(self, provider: str) -> RetryBudget:
+        budget = self._budgets.get(provider)
+        if budget is None:
+            budget = RetryBudget(self.budget_ratio, self.budget_min_retries)
+            self._budgets[provider] = budget
+        return budget
+
+    def rule_for(self, category: ErrorCategory) -> RetryRule:
+        return self.rules.get(category, RetryRule(max_attempts=1))
+
+    @staticmethod
+    def remaining(deadline: Optional[float]) -> Optional[float]:
+        """Segundos que quedan hasta el deadline (monotónico), o None si no hay"""
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def next_delay(
+        self,
+        provider: str,
+        error_detail: ErrorDetail,
+        attempt: int,
+        max_attempts: int,
+        previous_delay: float,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Optional[float], str]:
+        """
+        Retorna (espera, motivo). Espera None significa no reintentar y el
+        motivo explica por qué (para logs y retry_info).
+        """
+        rule = self.rule_for(error_detail.category)
+        if attempt >= min(rule.max_attempts, max_attempts):
+            return None, "max_attempts"
+
+        # Decorrelated jitter: uniforme entre la base y el triple de la espera anterior
+        upper = max(rule.base_delay, previous_delay * 3)
+        delay = min(rule.max_delay, random.uniform(rule.base_delay, upper))
+        if rule.respect_retry_after and error_detail.retry_after:
+            delay = max(delay, float(error_detail.retry_after))
+
+        remaining = self.remaining(deadline)
+        if remaining is not None and delay + self.min_attempt_seconds > remaining:
+            return None, "deadline"
+
+        if not self.budget_for(provider).try_spend():
+            return None, "retry_budget"
+
+        return delay, "retry"
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {provider: budget.get_stats() for provider, budget in self._budgets.items()}
+
+
+# Política compartida por todos los adaptadores
+retry_policy = RetryPolicy(
+    budget_ratio=settings.AI_RETRY_BUDGET_RATIO,
+    budget_min_retries=settings.AI_RETRY_BUDGET_MIN_RETRIES,
+    min_attempt_seconds=settings.AI_RETRY_MIN_ATTEMPT_SECONDS,
+)
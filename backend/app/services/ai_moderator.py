@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 import asyncio
 import logging
 from datetime import datetime
@@ -9,6 +9,14 @@ from app.schemas.ai_response import StandardAIResponse, AIResponseStatus, AIRequ
 from app.services.ai_adapters.openai_adapter import OpenAIAdapter
 from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
 from app.core.config import settings
+from app.services.structured_synthesis import (
+    SYNTHESIS_JSON_SCHEMA,
+    SYNTHESIS_SCHEMA_NAME,
+    StructuredSynthesis,
+    parse_structured_synthesis
+)
+from app.services.synthesis_router import SynthesisRoute, synthesis_router
+from app.services.prompt_compiler import CompiledPrompt, RenderedPrompt
 
 logger = logging.getLogger(__name__)
 
@@ -41,66 +49,48 @@ class ModeratorResponse(BaseModel):
     fallback_used: bool = False
     original_responses_count: int = 0
     successful_responses_count: int = 0
+    synthesis_route: str = "full"  # skip | fast | full
 
-class AIModerator:
+class SynthesisStreamEvent(BaseModel):
     """
-    Moderador IA que sintetiza respuestas de múltiples proveedores.
-    Implementa síntesis extractiva mejorada usando LLM económico.
+    Evento de la síntesis en streaming:
+    - token: fragmento de texto recién generado
+    - section: sección cerrada con los componentes extraídos de ella
+    - final: respuesta completa del moderador
+    """
+    event: str
+    text: Optional[str] = None
+    section: Optional[str] = None
+    components: Dict[str, Any] = Field(default_factory=dict)
+    result: Optional[ModeratorResponse] = None
+
+class SynthesisStreamParser:
     """
+    Máquina de estados que corta el texto de la síntesis en secciones a medida
+    que llega. Una sección se cierra al aparecer el siguiente '##' (mismo
+    criterio que `_extract_synthesis_components`), y la última al cerrar el flujo.
+    """
+    
+    SEPARATOR = "##"
     
     def __init__(self):
-        self.synthesis_adapter = None
-        self._initialize_synthesis_adapter()
+        self._pending = ""
     
-    def _initialize_synthesis_adapter(self):
-        """Inicializa el adaptador para síntesis (LLM económico)"""
-        try:
-            # Priorizar Claude 3 Haiku por ser más económico
-            if settings.ANTHROPIC_API_KEY:
-                self.synthesis_adapter = AnthropicAdapter(
-                    api_key=settings.ANTHROPIC_API_KEY,
-                    model="claude-3-haiku-20240307"
-                )
-                logger.info("Moderador inicializado con Claude 3 Haiku")
-                return
-        except Exception as e:
-            logger.warning(f"Error inicializando Claude para síntesis: {e}")
-        
-        try:
-            # Fallback a GPT-3.5-Turbo
-            if settings.OPENAI_API_KEY:
-                self.synthesis_adapter = OpenAIAdapter(
-                    api_key=settings.OPENAI_API_KEY,
-                    model="gpt-3.5-turbo"
-                )
-                logger.info("Moderador inicializado con GPT-3.5-Turbo")
-                return
-        except Exception as e:
-            logger.warning(f"Error inicializando GPT-3.5 para síntesis: {e}")
-        
-        logger.error("No se pudo inicializar ningún adaptador para síntesis")
+    def feed(self, chunk: str) -> List[str]:
+        """Añade un fragmento y retorna las secciones que quedaron cerradas"""
+        self._pending += chunk
+        parts = self._pending.split(self.SEPARATOR)
+        # La última parte sigue abierta (puede terminar en un '#' incompleto)
+        self._pending = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
     
-    def _create_synthesis_prompt(self, responses: List[StandardAIResponse]) -> str:
-        """Crea el prompt v2.0 de meta-análisis profesional para síntesis avanzada"""
-        
-        # Filtrar solo respuestas exitosas
-        successful_responses = [
-            r for r in responses 
-            if r.status == AIResponseStatus.SUCCESS and r.response_text
-        ]
-        
-        if not successful_responses:
-            return ""
-        
-        # Construir las respuestas en el formato requerido
-        external_ai_responses = ""
-        for i, response in enumerate(successful_responses, 1):
-            provider_name = response.ia_provider_name.value.upper()
-            external_ai_responses += f"[AI_Modelo_{provider_name}] dice: {response.response_text.strip()}\n\n"
-        
-        # Crear el prompt v2.0 completo
-        prompt = f"""**System Role:**
-Eres un asistente de meta-análisis objetivo, analítico y altamente meticuloso. Tu tarea principal es procesar un conjunto de respuestas de múltiples modelos de IA diversos (`external_ai_responses`) a una consulta específica del investigador (`user_question`). Tu objetivo es generar un reporte estructurado, claro y altamente accionable (objetivo total de salida: aproximadamente 800-1000 tokens) que ayude al investigador a:
+    def close(self) -> List[str]:
+        """Cierra el flujo y retorna la última sección"""
+        section, self._pending = self._pending.strip(), ""
+        return [section] if section else []
+
+_SYNTHESIS_INSTRUCTIONS = """**System Role:**
+Eres un asistente de meta-análisis objetivo, analítico y altamente meticuloso. Tu tarea principal es procesar un conjunto de respuestas de múltiples modelos de IA diversos (`external_ai_responses`) a una consulta específica del investigador (`user_question`). Tu objetivo es generar un reporte estructurado, claro y altamente accionable (la extensión objetivo de la salida se indica al final, junto a los datos de entrada) que ayude al investigador a:
     a) Comprender las perspectivas diversas y contribuciones clave de cada IA.
     b) Identificar puntos cruciales de consenso y contradicciones factuales obvias.
     c) Reconocer cobertura temática, énfasis y omisiones notables.
@@ -165,24 +155,143 @@ Analiza la `user_question` y las `external_ai_responses` para generar un reporte
     - `- Accionabilidad de Preguntas: ¿Las 'Preguntas Sugeridas' (3.a) son específicas y pueden guiar una acción o investigación?`
     - `- Síntesis General: ¿El 'Resumen Conciso General' (1) captura realmente un tema dominante si existe?`
     - `- Adherencia a Límites: ¿Se ha respetado el objetivo de longitud total del output?`
-    - `- Claridad y Objetividad: ¿El tono general es neutral y la información fácil de entender?`
+    - `- Claridad y Objetividad: ¿El tono general es neutral y la información fácil de entender?`"""
 
----
+_SYNTHESIS_INPUT_HEADER = """---
 
 **INPUT DATA:**
 
 **user_question:** [La pregunta del usuario se inferirá del contexto de las respuestas]
 
 **external_ai_responses:**
-{external_ai_responses}
+"""
+
+_STRUCTURED_OUTPUT_INSTRUCTIONS = """**Formato de Salida:**
+Entrega el meta-análisis como un objeto JSON que cumpla el esquema indicado en lugar de Markdown: cada sección corresponde a un campo y las listas vacías indican que no se identificó nada para esa sección."""
+
+_SYNTHESIS_INPUT_TEMPLATE = """{external_ai_responses}
+
+**Extensión objetivo:** {length_target}
 
 Por favor, genera el meta-análisis siguiendo exactamente la estructura especificada arriba."""
 
-        return prompt
+# Con presupuestos pequeños (ruta rápida) el reporte completo no cabe: se
+# acortan las secciones para que no se corten las preguntas sugeridas
+_SHORT_SYNTHESIS_INSTRUCTIONS = (
+    " Con esta extensión, limita cada subsección a 1-2 puntos breves, prioriza las secciones 1 y 3.a "
+    "y omite las secciones 0, 2.d, 3.c y 4."
+)
+
+
+def synthesis_length_target(max_tokens: int) -> str:
+    """Extensión objetivo del reporte acorde al max_tokens de la solicitud"""
+    low, high = (int(round(max_tokens * ratio / 50) * 50) for ratio in (2 / 3, 5 / 6))
+    target = f"aproximadamente {low}-{high} tokens en total."
+    if max_tokens <= settings.SYNTHESIS_FAST_MAX_TOKENS:
+        target += _SHORT_SYNTHESIS_INSTRUCTIONS
+    return target
+
+SYNTHESIS_SYSTEM_MESSAGE = "Eres un asistente de meta-análisis objetivo, analítico y altamente meticuloso. Genera reportes estructurados, claros y accionables siguiendo exactamente la estructura especificada."
+
+# Prompts de síntesis precompilados: instrucciones estáticas primero (prefijo
+# cacheable por el proveedor) y las respuestas de las IAs al final
+SYNTHESIS_PROMPT = CompiledPrompt(
+    f"{_SYNTHESIS_INSTRUCTIONS}\n\n{_SYNTHESIS_INPUT_HEADER}",
+    _SYNTHESIS_INPUT_TEMPLATE
+)
+STRUCTURED_SYNTHESIS_PROMPT = CompiledPrompt(
+    f"{_SYNTHESIS_INSTRUCTIONS}\n\n{_STRUCTURED_OUTPUT_INSTRUCTIONS}\n\n{_SYNTHESIS_INPUT_HEADER}",
+    _SYNTHESIS_INPUT_TEMPLATE
+)
+
+class AIModerator:
+    """
+    Moderador IA que sintetiza respuestas de múltiples proveedores.
+    Implementa síntesis extractiva mejorada usando LLM económico.
+    """
     
-    def _extract_synthesis_components(self, synthesis_text: str) -> Dict[str, Any]:
-        """Extrae componentes estructurados de la síntesis v2.0 con meta-análisis profesional"""
-        components = {
+    def __init__(self):
+        self.synthesis_adapter = None
+        self.fast_synthesis_adapter = None
+        self.router = synthesis_router
+        self._initialize_synthesis_adapter()
+        self._initialize_fast_synthesis_adapter()
+    
+    def _initialize_synthesis_adapter(self):
+        """Inicializa el adaptador para síntesis (LLM económico)"""
+        try:
+            # Priorizar Claude 3 Haiku por ser más económico
+            if settings.ANTHROPIC_API_KEY:
+                self.synthesis_adapter = AnthropicAdapter(
+                    api_key=settings.ANTHROPIC_API_KEY,
+                    model="claude-3-haiku-20240307"
+                )
+                logger.info("Moderador inicializado con Claude 3 Haiku")
+                return
+        except Exception as e:
+            logger.warning(f"Error inicializando Claude para síntesis: {e}")
+        
+        try:
+            # Fallback a GPT-3.5-Turbo
+            if settings.OPENAI_API_KEY:
+                self.synthesis_adapter = OpenAIAdapter(
+                    api_key=settings.OPENAI_API_KEY,
+                    model="gpt-3.5-turbo"
+                )
+                logger.info("Moderador inicializado con GPT-3.5-Turbo")
+                return
+        except Exception as e:
+            logger.warning(f"Error inicializando GPT-3.5 para síntesis: {e}")
+        
+        logger.error("No se pudo inicializar ningún adaptador para síntesis")
+    
+    def _initialize_fast_synthesis_adapter(self):
+        """Inicializa el adaptador rápido para síntesis pequeñas (si hay credenciales)"""
+        model = settings.SYNTHESIS_FAST_MODEL
+        try:
+            if model.startswith("claude") and settings.ANTHROPIC_API_KEY:
+                self.fast_synthesis_adapter = AnthropicAdapter(api_key=settings.ANTHROPIC_API_KEY, model=model)
+            elif not model.startswith("claude") and settings.OPENAI_API_KEY:
+                self.fast_synthesis_adapter = OpenAIAdapter(api_key=settings.OPENAI_API_KEY, model=model)
+        except Exception as e:
+            logger.warning(f"Error inicializando el modelo rápido de síntesis {model}: {e}")
+    
+    def _create_synthesis_prompt(self, responses: List[StandardAIResponse]) -> str:
+        """Crea el prompt v2.0 de meta-análisis profesional para síntesis avanzada"""
+        rendered = self._render_synthesis_prompt(responses)
+        return rendered.text if rendered else ""
+    
+    def _render_synthesis_prompt(
+        self,
+        responses: List[StandardAIResponse],
+        structured: bool = False,
+        max_tokens: int = settings.SYNTHESIS_MAX_TOKENS
+    ) -> Optional[RenderedPrompt]:
+        """Prompt de síntesis a partir de la plantilla precompilada (None si no hay respuestas útiles)"""
+        # Filtrar solo respuestas exitosas
+        successful_responses = [
+            r for r in responses 
+            if r.status == AIResponseStatus.SUCCESS and r.response_text
+        ]
+        
+        if not successful_responses:
+            return None
+        
+        # Construir las respuestas en el formato requerido
+        external_ai_responses = "".join(
+            f"[AI_Modelo_{response.ia_provider_name.value.upper()}] dice: {response.response_text.strip()}\n\n"
+            for response in successful_responses
+        )
+        
+        template = STRUCTURED_SYNTHESIS_PROMPT if structured else SYNTHESIS_PROMPT
+        return template.render(
+            external_ai_responses=external_ai_responses,
+            length_target=synthesis_length_target(max_tokens)
+        )
+    
+    @staticmethod
+    def _empty_synthesis_components() -> Dict[str, Any]:
+        return {
             "key_themes": [],
             "contradictions": [],
             "consensus_areas": [],
@@ -193,6 +302,10 @@ Por favor, genera el meta-análisis siguiendo exactamente la estructura especifi
             "connections": [],
             "meta_analysis_quality": "unknown"
         }
+    
+    def _extract_synthesis_components(self, synthesis_text: str) -> Dict[str, Any]:
+        """Extrae componentes estructurados de la síntesis v2.0 con meta-análisis profesional"""
+        components = self._empty_synthesis_components()
         
         try:
             # Buscar secciones específicas del nuevo formato v2.0
@@ -202,124 +315,7 @@ Por favor, genera el meta-análisis siguiendo exactamente la estructura especifi
                 section = section.strip()
                 if not section:
                     continue
-                
-                # 1. Resumen Conciso General y Recomendación Clave
-                if "resumen conciso" in section.lower() or "recomendación clave" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line and "recomendación clave" in line.lower():
-                            # Extraer recomendación clave
-                            rec = line.split(":")[-1].strip()
-                            if rec:
-                                components["recommendations"].append(rec)
-                        elif line.startswith("- ") and "recomendación" not in line.lower():
-                            # Extraer temas del resumen conciso
-                            theme = line.lstrip("- ").strip()
-                            if theme and len(theme) > 20:  # Solo temas sustanciales
-                                components["key_themes"].append(theme)
-                
-                # 2.a. Afirmaciones Clave por IA
-                elif "afirmaciones clave" in section.lower() and "por ia" in section.lower():
-                    lines = section.split("\n")[1:]
-                    current_ai = None
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("**[AI_Modelo_") and "] dice:**" in line:
-                            # Extraer nombre de la IA
-                            import re
-                            ai_match = re.search(r'\*\*\[AI_Modelo_([^\]]+)\]', line)
-                            if ai_match:
-                                current_ai = ai_match.group(1)
-                                if current_ai not in components["source_references"]:
-                                    components["source_references"][current_ai] = []
-                        elif line.startswith("- ") and current_ai:
-                            # Extraer afirmación de la IA actual
-                            claim = line.lstrip("- ").strip()
-                            if claim:
-                                components["source_references"][current_ai].append(claim)
-                
-                # 2.b. Puntos de Consenso Directo
-                elif "puntos de consenso" in section.lower() or "consenso directo" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- ") and "apoyado por:" in line.lower():
-                            # Extraer punto de consenso
-                            consensus_point = line.split("(Apoyado por:")[0].lstrip("- ").strip()
-                            if consensus_point and "no se identificaron" not in consensus_point.lower():
-                                components["consensus_areas"].append(consensus_point)
-                
-                # 2.c. Contradicciones Factuales Evidentes
-                elif "contradicciones factuales" in section.lower() or "contradicciones evidentes" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- ") and ("afirma" in line.lower() or "dice" in line.lower()):
-                            # Extraer contradicción factual
-                            contradiction = line.lstrip("- ").strip()
-                            if contradiction and "no se identificaron" not in contradiction.lower():
-                                components["contradictions"].append(contradiction)
-                
-                # 2.d. Mapeo de Énfasis y Cobertura Temática
-                elif "mapeo de énfasis" in section.lower() or "cobertura temática" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- ") and "omisiones notables" not in line.lower():
-                            # Extraer énfasis temático como tema clave
-                            theme = line.lstrip("- ").strip()
-                            if theme:
-                                components["key_themes"].append(theme)
-                        elif line.startswith("**[AI_Modelo_") and "]:" in line:
-                            # Extraer descripción del enfoque de cada IA como tema
-                            ai_focus = line.split(":", 1)[-1].strip()
-                            if ai_focus and len(ai_focus) > 10:
-                                components["key_themes"].append(ai_focus)
-                
-                # 3.a. Preguntas Sugeridas
-                elif "preguntas sugeridas" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- Pregunta Sugerida"):
-                            # Extraer pregunta sugerida
-                            question = line.split(":", 1)[-1].strip()
-                            if question:
-                                components["suggested_questions"].append(question)
-                
-                # 3.b. Áreas Potenciales para Mayor Investigación
-                elif "áreas potenciales" in section.lower() or "mayor investigación" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- Área de Exploración"):
-                            # Extraer área de investigación
-                            area = line.split(":", 1)[-1].strip()
-                            if area:
-                                components["research_areas"].append(area)
-                
-                # 3.c. Conexiones Implícitas
-                elif "conexiones implícitas" in section.lower():
-                    lines = section.split("\n")[1:]
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith("- Posible Conexión"):
-                            # Extraer conexión implícita
-                            connection = line.split(":", 1)[-1].strip()
-                            if connection:
-                                components["connections"].append(connection)
-                
-                # 4. Auto-Validación (para evaluar calidad del meta-análisis)
-                elif "auto-validación" in section.lower() or "checklist" in section.lower():
-                    # Contar elementos del checklist para evaluar completitud
-                    checklist_items = len([line for line in section.split("\n") if line.strip().startswith("- ")])
-                    if checklist_items >= 6:
-                        components["meta_analysis_quality"] = "complete"
-                    elif checklist_items >= 4:
-                        components["meta_analysis_quality"] = "partial"
-                    else:
-                        components["meta_analysis_quality"] = "incomplete"
+                self._parse_synthesis_section(section, components)
         
         except Exception as e:
             logger.warning(f"Error extrayendo componentes de síntesis v2.0: {e}")
@@ -327,6 +323,126 @@ Por favor, genera el meta-análisis siguiendo exactamente la estructura especifi
         
         return components
     
+    def _parse_synthesis_section(self, section: str, components: Dict[str, Any]) -> None:
+        """Agrega a `components` lo extraído de una sección (texto entre dos '##')"""
+        # 1. Resumen Conciso General y Recomendación Clave
+        if "resumen conciso" in section.lower() or "recomendación clave" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line and "recomendación clave" in line.lower():
+                    # Extraer recomendación clave
+                    rec = line.split(":")[-1].strip()
+                    if rec:
+                        components["recommendations"].append(rec)
+                elif line.startswith("- ") and "recomendación" not in line.lower():
+                    # Extraer temas del resumen conciso
+                    theme = line.lstrip("- ").strip()
+                    if theme and len(theme) > 20:  # Solo temas sustanciales
+                        components["key_themes"].append(theme)
+        
+        # 2.a. Afirmaciones Clave por IA
+        elif "afirmaciones clave" in section.lower() and "por ia" in section.lower():
+            lines = section.split("\n")[1:]
+            current_ai = None
+            for line in lines:
+                line = line.strip()
+                if line.startswith("**[AI_Modelo_") and "] dice:**" in line:
+                    # Extraer nombre de la IA
+                    import re
+                    ai_match = re.search(r'\*\*\[AI_Modelo_([^\]]+)\]', line)
+                    if ai_match:
+                        current_ai = ai_match.group(1)
+                        if current_ai not in components["source_references"]:
+                            components["source_references"][current_ai] = []
+                elif line.startswith("- ") and current_ai:
+                    # Extraer afirmación de la IA actual
+                    claim = line.lstrip("- ").strip()
+                    if claim:
+                        components["source_references"][current_ai].append(claim)
+        
+        # 2.b. Puntos de Consenso Directo
+        elif "puntos de consenso" in section.lower() or "consenso directo" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- ") and "apoyado por:" in line.lower():
+                    # Extraer punto de consenso
+                    consensus_point = line.split("(Apoyado por:")[0].lstrip("- ").strip()
+                    if consensus_point and "no se identificaron" not in consensus_point.lower():
+                        components["consensus_areas"].append(consensus_point)
+        
+        # 2.c. Contradicciones Factuales Evidentes
+        elif "contradicciones factuales" in section.lower() or "contradicciones evidentes" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- ") and ("afirma" in line.lower() or "dice" in line.lower()):
+                    # Extraer contradicción factual
+                    contradiction = line.lstrip("- ").strip()
+                    if contradiction and "no se identificaron" not in contradiction.lower():
+                        components["contradictions"].append(contradiction)
+        
+        # 2.d. Mapeo de Énfasis y Cobertura Temática
+        elif "mapeo de énfasis" in section.lower() or "cobertura temática" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- ") and "omisiones notables" not in line.lower():
+                    # Extraer énfasis temático como tema clave
+                    theme = line.lstrip("- ").strip()
+                    if theme:
+                        components["key_themes"].append(theme)
+                elif line.startswith("**[AI_Modelo_") and "]:" in line:
+                    # Extraer descripción del enfoque de cada IA como tema
+                    ai_focus = line.split(":", 1)[-1].strip()
+                    if ai_focus and len(ai_focus) > 10:
+                        components["key_themes"].append(ai_focus)
+        
+        # 3.a. Preguntas Sugeridas
+        elif "preguntas sugeridas" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- Pregunta Sugerida"):
+                    # Extraer pregunta sugerida
+                    question = line.split(":", 1)[-1].strip()
+                    if question:
+                        components["suggested_questions"].append(question)
+        
+        # 3.b. Áreas Potenciales para Mayor Investigación
+        elif "áreas potenciales" in section.lower() or "mayor investigación" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- Área de Exploración"):
+                    # Extraer área de investigación
+                    area = line.split(":", 1)[-1].strip()
+                    if area:
+                        components["research_areas"].append(area)
+        
+        # 3.c. Conexiones Implícitas
+        elif "conexiones implícitas" in section.lower():
+            lines = section.split("\n")[1:]
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- Posible Conexión"):
+                    # Extraer conexión implícita
+                    connection = line.split(":", 1)[-1].strip()
+                    if connection:
+                        components["connections"].append(connection)
+        
+        # 4. Auto-Validación (para evaluar calidad del meta-análisis)
+        elif "auto-validación" in section.lower() or "checklist" in section.lower():
+            # Contar elementos del checklist para evaluar completitud
+            checklist_items = len([line for line in section.split("\n") if line.strip().startswith("- ")])
+            if checklist_items >= 6:
+                components["meta_analysis_quality"] = "complete"
+            elif checklist_items >= 4:
+                components["meta_analysis_quality"] = "partial"
+            else:
+                components["meta_analysis_quality"] = "incomplete"
+    
     def _validate_synthesis_quality(self, synthesis_text: str) -> tuple[bool, str]:
         """
         Validación específica para Tarea 3.3: Formato y Validación de la Respuesta Sintetizada
@@ -549,102 +665,422 @@ Por favor, genera el meta-análisis siguiendo exactamente la estructura especifi
         # Caso principal: Múltiples respuestas - Generar síntesis
         if not self.synthesis_adapter:
             # Fallback si no hay adaptador de síntesis
-            fallback_text = self._select_best_fallback_response(responses)
-            processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
-            
-            return ModeratorResponse(
-                synthesis_text=fallback_text,
-                quality=SynthesisQuality.LOW,
-                key_themes=[],
-                contradictions=[],
-                consensus_areas=[],
-                source_references={},
-                recommendations=[],
-                suggested_questions=[],
-                research_areas=[],
-                connections=[],
-                meta_analysis_quality="error",
-                processing_time_ms=processing_time,
-                fallback_used=True,
-                original_responses_count=len(responses),
-                successful_responses_count=len(successful_responses)
-            )
+            return self._fallback_response(responses, len(successful_responses), start_time)
+        
+        route = await self._route_synthesis(successful_responses)
+        if route.skip:
+            return self._consensus_response(responses, successful_responses, start_time)
         
         try:
-            # Crear prompt para síntesis
-            synthesis_prompt = self._create_synthesis_prompt(responses)
-            
-            if not synthesis_prompt:
-                raise ValueError("No se pudo crear prompt de síntesis")
-            
-            # Solicitar síntesis al LLM
-            synthesis_request = AIRequest(
-                prompt=synthesis_prompt,
-                max_tokens=1200,  # Aumentado para meta-análisis v2.0 de 800-1000 tokens
-                temperature=0.3,  # Baja temperatura para consistencia
-                system_message="Eres un asistente de meta-análisis objetivo, analítico y altamente meticuloso. Genera reportes estructurados, claros y accionables siguiendo exactamente la estructura especificada."
+            adapter = self._adapter_for(route, structured=settings.STRUCTURED_SYNTHESIS_ENABLED)
+            structured = settings.STRUCTURED_SYNTHESIS_ENABLED and adapter.supports_structured_output
+            if settings.STRUCTURED_SYNTHESIS_ENABLED and not structured:
+                logger.info(f"El modelo de síntesis {adapter.model} no admite salida estructurada, se usa Markdown")
+            synthesis_response = await adapter.generate_response(
+                self._build_synthesis_request(responses, structured=structured, max_tokens=route.max_tokens)
             )
             
-            synthesis_response = await self.synthesis_adapter.generate_response(synthesis_request)
-            
             if synthesis_response.status != AIResponseStatus.SUCCESS or not synthesis_response.response_text:
                 raise ValueError(f"Síntesis falló: {synthesis_response.error_message}")
             
-            # Procesar la síntesis
-            synthesis_text = synthesis_response.response_text.strip()
-            components = self._extract_synthesis_components(synthesis_text)
-            quality = self._assess_synthesis_quality(synthesis_text, components)
+            if structured:
+                result = self._structured_synthesized_response(
+                    synthesis_response, responses, len(successful_responses), start_time
+                )
+            else:
+                result = self._synthesized_response(
+                    synthesis_response.response_text, responses, len(successful_responses), start_time
+                )
+            result.synthesis_route = route.mode
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error en síntesis automática: {e}")
             
-            # Si la calidad es muy baja, usar fallback
-            if quality == SynthesisQuality.FAILED:
-                raise ValueError("Calidad de síntesis insuficiente")
+            # Fallback a mejor respuesta individual
+            return self._fallback_response(responses, len(successful_responses), start_time)
+    
+    async def stream_synthesis(self, responses: List[StandardAIResponse]) -> AsyncIterator[SynthesisStreamEvent]:
+        """
+        Variante en streaming de `synthesize_responses`: emite los tokens de la
+        síntesis según se generan, cada sección con sus componentes en cuanto se
+        cierra y, al final, un evento 'final' con la respuesta completa.
+        """
+        start_time = datetime.utcnow()
+        successful_responses = [
+            r for r in responses 
+            if r.status == AIResponseStatus.SUCCESS and r.response_text
+        ]
+        
+        # Sin síntesis LLM (0-1 respuestas o sin adaptador) no hay nada que transmitir
+        if len(successful_responses) < 2 or not self.synthesis_adapter:
+            yield SynthesisStreamEvent(event="final", result=await self.synthesize_responses(responses))
+            return
+        
+        route = await self._route_synthesis(successful_responses)
+        if route.skip:
+            yield SynthesisStreamEvent(
+                event="final", result=self._consensus_response(responses, successful_responses, start_time)
+            )
+            return
+        
+        parser = SynthesisStreamParser()
+        chunks: List[str] = []
+        
+        try:
+            request = self._build_synthesis_request(responses, max_tokens=route.max_tokens)
+            async for delta in self._adapter_for(route).stream_response(request):
+                chunks.append(delta)
+                yield SynthesisStreamEvent(event="token", text=delta)
+                for section in parser.feed(delta):
+                    yield self._section_event(section)
             
-            processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+            for section in parser.close():
+                yield self._section_event(section)
             
-            return ModeratorResponse(
-                synthesis_text=synthesis_text,
-                quality=quality,
-                key_themes=components["key_themes"],
-                contradictions=components["contradictions"],
-                consensus_areas=components["consensus_areas"],
-                source_references=components["source_references"],
-                recommendations=components["recommendations"],
-                suggested_questions=components["suggested_questions"],
-                research_areas=components["research_areas"],
-                connections=components["connections"],
-                meta_analysis_quality=components["meta_analysis_quality"],
-                processing_time_ms=processing_time,
-                fallback_used=False,
-                original_responses_count=len(responses),
-                successful_responses_count=len(successful_responses)
+            result = self._synthesized_response(
+                "".join(chunks), responses, len(successful_responses), start_time
             )
+            result.synthesis_route = route.mode
         
         except Exception as e:
-            logger.error(f"Error en síntesis automática: {e}")
-            
-            # Fallback a mejor respuesta individual
-            fallback_text = self._select_best_fallback_response(responses)
-            processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+            logger.error(f"Error en síntesis en streaming: {e}")
+            result = self._fallback_response(responses, len(successful_responses), start_time)
+        
+        yield SynthesisStreamEvent(event="final", result=result)
+    
+    def _section_event(self, section: str) -> SynthesisStreamEvent:
+        """Evento con los componentes extraídos de una sección recién cerrada"""
+        components = self._empty_synthesis_components()
+        try:
+            self._parse_synthesis_section(section, components)
+        except Exception as e:
+            logger.warning(f"Error extrayendo componentes de sección: {e}")
+        
+        title = section.split("\n", 1)[0].strip(" #*:")
+        extracted = {
+            key: value for key, value in components.items()
+            if value and key != "meta_analysis_quality"
+        }
+        return SynthesisStreamEvent(event="section", section=title, components=extracted)
+    
+    async def _route_synthesis(self, successful_responses: List[StandardAIResponse]) -> SynthesisRoute:
+        """Ruta de la síntesis; sin enrutado (o si falla) se hace la síntesis completa"""
+        default_route = SynthesisRoute(mode="full", max_tokens=settings.SYNTHESIS_MAX_TOKENS)
+        if not settings.SYNTHESIS_ROUTING_ENABLED or not self.router:
+            return default_route
+        
+        try:
+            route = await self.router.route(successful_responses)
+        except Exception as e:
+            logger.warning(f"Error enrutando la síntesis, se usa la síntesis completa: {e}")
+            return default_route
+        
+        logger.info(
+            f"🧭 Síntesis enrutada: {route.mode} (max_tokens={route.max_tokens}, "
+            f"acuerdo mínimo={route.agreement_min}, contenido={route.content_tokens} tokens)"
+        )
+        return route
+    
+    def _adapter_for(self, route: SynthesisRoute, structured: bool = False):
+        """
+        Adaptador de síntesis para una ruta (el rápido solo si está disponible).
+        En modo estructurado, si el modelo de la ruta no admite JSON schema
+        (p. ej. GPT-3.5-Turbo sin clave de Anthropic) se usa el rápido si lo admite.
+        """
+        adapter = self.synthesis_adapter
+        if route.fast and self.fast_synthesis_adapter:
+            adapter = self.fast_synthesis_adapter
+        fast = self.fast_synthesis_adapter
+        if structured and not adapter.supports_structured_output and fast and fast.supports_structured_output:
+            return fast
+        return adapter
+    
+    def _consensus_response(
+        self,
+        responses: List[StandardAIResponse],
+        successful_responses: List[StandardAIResponse],
+        start_time: datetime
+    ) -> ModeratorResponse:
+        """Respuesta sin síntesis LLM cuando todas las IAs dicen prácticamente lo mismo"""
+        best_response = max(successful_responses, key=lambda r: len(r.response_text))
+        providers = [r.ia_provider_name.value.upper() for r in successful_responses]
+        processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        
+        return ModeratorResponse(
+            synthesis_text=f"""**Respuestas concordantes de {', '.join(providers)}:**
+
+{best_response.response_text}
+
+*Nota: Todas las IAs coinciden en lo esencial; se muestra la respuesta más completa en lugar de un meta-análisis.*""",
+            quality=SynthesisQuality.MEDIUM,
+            key_themes=[],
+            contradictions=[],
+            consensus_areas=["Las respuestas de todas las IAs coinciden en lo esencial"],
+            source_references={provider: ["Respuesta concordante"] for provider in providers},
+            meta_analysis_quality="unknown",
+            processing_time_ms=processing_time,
+            fallback_used=False,
+            original_responses_count=len(responses),
+            successful_responses_count=len(successful_responses),
+            synthesis_route="skip"
+        )
+    
+    def _build_synthesis_request(
+        self,
+        responses: List[StandardAIResponse],
+        structured: bool = False,
+        max_tokens: int = 1200
+    ) -> AIRequest:
+        """Solicitud de síntesis al LLM (Markdown o salida estructurada por JSON schema)"""
+        synthesis_prompt = self._render_synthesis_prompt(responses, structured=structured, max_tokens=max_tokens)
+        
+        if not synthesis_prompt:
+            raise ValueError("No se pudo crear prompt de síntesis")
+        
+        logger.debug(f"🧩 Prompt de síntesis: {synthesis_prompt.prefix_tokens} tokens de prefijo cacheable")
+        
+        return AIRequest(
+            prompt=synthesis_prompt.text,
+            max_tokens=max_tokens,  # La extensión pedida en el prompt se ajusta a este presupuesto
+            temperature=0.3,  # Baja temperatura para consistencia
+            system_message=SYNTHESIS_SYSTEM_MESSAGE,
+            cacheable_prefix_chars=synthesis_prompt.prefix_chars,
+            cacheable_prefix_tokens=synthesis_prompt.prefix_tokens,
+            response_schema=SYNTHESIS_JSON_SCHEMA if structured else None,
+            response_schema_name=SYNTHESIS_SCHEMA_NAME
+        )
+    
+    def _assess_structured_quality(self, synthesis: StructuredSynthesis, components: Dict[str, Any]) -> SynthesisQuality:
+        """
+        Calidad de una síntesis estructurada. La estructura la garantiza el
+        esquema, así que solo se evalúa el contenido (sin pasadas sobre el texto).
+        """
+        if not synthesis.summary.strip() and not synthesis.claims_by_ai:
+            return SynthesisQuality.FAILED
+        
+        content_score = sum([
+            len(components["recommendations"]) > 0,
+            len(components["suggested_questions"]) > 0,
+            len(components["research_areas"]) > 0,
+            len(components["source_references"]) > 0
+        ])
+        
+        if content_score >= 3 and len(synthesis.claims_by_ai) >= 2 and components["meta_analysis_quality"] == "complete":
+            return SynthesisQuality.HIGH
+        elif content_score >= 2:
+            return SynthesisQuality.MEDIUM
+        else:
+            return SynthesisQuality.LOW
+    
+    def _structured_synthesized_response(
+        self,
+        synthesis_response: StandardAIResponse,
+        responses: List[StandardAIResponse],
+        successful_count: int,
+        start_time: datetime
+    ) -> ModeratorResponse:
+        """Procesa una síntesis estructurada; lanza ValueError si no es válida"""
+        synthesis = parse_structured_synthesis(
+            synthesis_response.structured_output or synthesis_response.response_text
+        )
+        components = synthesis.to_components()
+        quality = self._assess_structured_quality(synthesis, components)
+        
+        if quality == SynthesisQuality.FAILED:
+            raise ValueError("Síntesis estructurada sin contenido")
+        
+        processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        
+        return ModeratorResponse(
+            synthesis_text=synthesis.to_markdown(),
+            quality=quality,
+            key_themes=components["key_themes"],
+            contradictions=components["contradictions"],
+            consensus_areas=components["consensus_areas"],
+            source_references=components["source_references"],
+            recommendations=components["recommendations"],
+            suggested_questions=components["suggested_questions"],
+            research_areas=components["research_areas"],
+            connections=components["connections"],
+            meta_analysis_quality=components["meta_analysis_quality"],
+            processing_time_ms=processing_time,
+            fallback_used=False,
+            original_responses_count=len(responses),
+            successful_responses_count=successful_count
+        )
+    
+    def _synthesized_response(
+        self,
+        synthesis_text: str,
+        responses: List[StandardAIResponse],
+        successful_count: int,
+        start_time: datetime
+    ) -> ModeratorResponse:
+        """Procesa el texto de síntesis; lanza ValueError si la calidad es insuficiente"""
+        synthesis_text = synthesis_text.strip()
+        components = self._extract_synthesis_components(synthesis_text)
+        quality = self._assess_synthesis_quality(synthesis_text, components)
+        
+        # Si la calidad es muy baja, usar fallback
+        if quality == SynthesisQuality.FAILED:
+            raise ValueError("Calidad de síntesis insuficiente")
+        
+        processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        
+        return ModeratorResponse(
+            synthesis_text=synthesis_text,
+            quality=quality,
+            key_themes=components["key_themes"],
+            contradictions=components["contradictions"],
+            consensus_areas=components["consensus_areas"],
+            source_references=components["source_references"],
+            recommendations=components["recommendations"],
+            suggested_questions=components["suggested_questions"],
+            research_areas=components["research_areas"],
+            connections=components["connections"],
+            meta_analysis_quality=components["meta_analysis_quality"],
+            processing_time_ms=processing_time,
+            fallback_used=False,
+            original_responses_count=len(responses),
+            successful_responses_count=successful_count
+        )
+    
+    def _fallback_response(
+        self,
+        responses: List[StandardAIResponse],
+        successful_count: int,
+        start_time: datetime
+    ) -> ModeratorResponse:
+        """Respuesta de fallback con la mejor respuesta individual"""
+        fallback_text = self._select_best_fallback_response(responses)
+        processing_time = int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        
+        return ModeratorResponse(
+            synthesis_text=fallback_text,
+            quality=SynthesisQuality.LOW,
+            key_themes=[],
+            contradictions=[],
+            consensus_areas=[],
+            source_references={},
+            recommendations=[],
+            suggested_questions=[],
+            research_areas=[],
+            connections=[],
+            meta_analysis_quality="error",
+            processing_time_ms=processing_time,
+            fallback_used=True,
+            original_responses_count=len(responses),
+            successful_responses_count=successful_count
+        )
+    
+    def _create_delta_merge_prompt(
+        self,
+        synthesis: ModeratorResponse,
+        late_responses: List[StandardAIResponse]
+    ) -> str:
+        """Prompt corto para fusionar respuestas tardías en una síntesis ya generada"""
+        def bullet_list(items: List[str]) -> str:
+            return "\n".join(f"- {item}" for item in items) or "- (ninguno)"
+        
+        new_responses = ""
+        for response in late_responses:
+            provider_name = response.ia_provider_name.value.upper()
+            new_responses += f"[AI_Modelo_{provider_name}] dice: {response.response_text.strip()}\n\n"
+        
+        return f"""Ya existe un meta-análisis de varias respuestas de IA. Han llegado respuestas nuevas.
+NO rehagas el análisis: indica SOLO lo que las respuestas nuevas añaden o cambian, en español.
+
+**Temas clave actuales:**
+{bullet_list(synthesis.key_themes)}
+
+**Consenso actual:**
+{bullet_list(synthesis.consensus_areas)}
+
+**Contradicciones actuales:**
+{bullet_list(synthesis.contradictions)}
+
+**Respuestas nuevas:**
+{new_responses}
+Usa exactamente estos encabezados y formatos, omitiendo los que no tengan novedades:
+
+### 2.a. Afirmaciones Clave por IA:
+**[AI_Modelo_X] dice:**
+- Afirmación distintiva de la respuesta nueva
+
+### 2.b. Puntos de Consenso Directo:
+- [Afirmación de Consenso] (Apoyado por: [AI_Modelo_A], [AI_Modelo_B])
+
+### 2.c. Contradicciones Factuales Evidentes:
+- [Hecho Disputado]: [AI_Modelo_A] afirma '[Valor A]', mientras que [AI_Modelo_B] afirma '[Valor B]'
+
+### 3.a. Preguntas Sugeridas:
+- Pregunta Sugerida 1: [Texto de la pregunta]"""
+    
+    async def merge_late_responses(
+        self,
+        synthesis: ModeratorResponse,
+        late_responses: List[StandardAIResponse]
+    ) -> ModeratorResponse:
+        """
+        Incorpora respuestas que llegaron después de iniciar la síntesis con un
+        pase de fusión barato: el LLM recibe solo los componentes de la síntesis
+        actual y las respuestas nuevas, y devuelve lo que cambia.
+        """
+        start_time = datetime.utcnow()
+        successful_late = [
+            r for r in late_responses 
+            if r.status == AIResponseStatus.SUCCESS and r.response_text
+        ]
+        
+        merged = synthesis.model_copy(deep=True)
+        merged.original_responses_count += len(late_responses)
+        if not successful_late:
+            return merged
+        
+        delta_text = None
+        try:
+            if not self.synthesis_adapter:
+                raise ValueError("Sin adaptador de síntesis")
             
-            return ModeratorResponse(
-                synthesis_text=fallback_text,
-                quality=SynthesisQuality.LOW,
-                key_themes=[],
-                contradictions=[],
-                consensus_areas=[],
-                source_references={},
-                recommendations=[],
-                suggested_questions=[],
-                research_areas=[],
-                connections=[],
-                meta_analysis_quality="error",
-                processing_time_ms=processing_time,
-                fallback_used=True,
-                original_responses_count=len(responses),
-                successful_responses_count=len(successful_responses)
+            delta_response = await self.synthesis_adapter.generate_response(AIRequest(
+                prompt=self._create_delta_merge_prompt(synthesis, successful_late),
+                max_tokens=400,  # Solo las novedades, no el meta-análisis completo
+                temperature=0.3,
+                system_message="Eres un asistente de meta-análisis objetivo. Actualiza un análisis existente indicando solo las novedades."
+            ))
+            if delta_response.status != AIResponseStatus.SUCCESS or not delta_response.response_text:
+                raise ValueError(f"Fusión falló: {delta_response.error_message}")
+            delta_text = delta_response.response_text.strip()
+        
+        except Exception as e:
+            logger.warning(f"Error fusionando respuestas tardías, se registran sin análisis: {e}")
+        
+        components = self._extract_synthesis_components(delta_text) if delta_text else self._empty_synthesis_components()
+        
+        for key in ("key_themes", "contradictions", "consensus_areas", "recommendations",
+                    "suggested_questions", "research_areas", "connections"):
+            current = getattr(merged, key)
+            current.extend(item for item in components[key] if item not in current)
+        
+        for provider, claims in components["source_references"].items():
+            merged.source_references.setdefault(provider, []).extend(claims)
+        for response in successful_late:
+            # La fuente queda registrada aunque la fusión no aporte afirmaciones
+            merged.source_references.setdefault(
+                response.ia_provider_name.value.upper(), ["Respuesta recibida tras iniciar la síntesis"]
             )
+        
+        if delta_text:
+            merged.synthesis_text = f"{merged.synthesis_text}\n\n## 5. Actualización con Respuestas Tardías\n\n{delta_text}"
+        
+        merged.successful_responses_count += len(successful_late)
+        merged.processing_time_ms += int((datetime.utcnow() - start_time).total_seconds() * 1000)
+        return merged
     
     async def close(self):
         """Cierra las conexiones del moderador"""
         if self.synthesis_adapter and hasattr(self.synthesis_adapter, 'close'):
-            await self.synthesis_adapter.close() 
\ No newline at end of file
+            await self.synthesis_adapter.close()
+        if self.fast_synthesis_adapter and hasattr(self.fast_synthesis_adapter, 'close'):
+            await self.fast_synthesis_adapter.close() 
\ No newline at end of file
@@ -1,12 +1,15 @@
 from typing import List, Optional, Dict, Any
 import asyncio
 import logging
+import time
+from dataclasses import dataclass, field
 from enum import Enum
 
 from app.services.ai_adapters.openai_adapter import OpenAIAdapter
 from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
 from app.schemas.ai_response import AIRequest, StandardAIResponse, AIProviderEnum, AIResponseStatus
 from app.core.config import settings
+from app.services.outbound_scheduler import outbound_scheduler, estimate_request_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +19,83 @@ class AIOrchestrationStrategy(str, Enum):
     PARALLEL = "parallel"  # Todas las IAs en paralelo
     FALLBACK = "fallback"  # Intentar una, si falla usar la siguiente
     FASTEST = "fastest"  # La primera que responda exitosamente
+    QUORUM = "quorum"  # Retornar al alcanzar N respuestas exitosas; el resto sigue pendiente
+
+@dataclass
+class QuorumResponses:
+    """
+    Resultado de la estrategia QUORUM: las respuestas disponibles al alcanzar
+    el quórum y las tareas de los proveedores que aún no han respondido.
+    """
+    responses: List[StandardAIResponse]
+    pending: Dict[AIProviderEnum, asyncio.Task] = field(default_factory=dict)
+    reached_at: float = field(default_factory=time.monotonic)
+    # Instante (monotonic) en que terminó cada tarea pendiente
+    finished_at: Dict[AIProviderEnum, float] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        for provider, task in self.pending.items():
+            task.add_done_callback(
+                lambda _, provider=provider: self.finished_at.setdefault(provider, time.monotonic())
+            )
+    
+    async def collect_late(self, grace_seconds: float) -> List[StandardAIResponse]:
+        """
+        Incorpora a los proveedores rezagados que terminaron como mucho
+        `grace_seconds` después de alcanzar el quórum. Se puede llamar cuando
+        la síntesis ya ha terminado: lo que llegó después de la ventana se
+        descarta aunque ya esté disponible, y lo que sigue en curso se cancela.
+        Ambos se reportan como TIMEOUT.
+        """
+        if not self.pending:
+            return []
+        
+        deadline = self.reached_at + grace_seconds
+        done, _ = await asyncio.wait(self.pending.values(), timeout=max(0.0, deadline - time.monotonic()))
+        
+        late_responses = []
+        for provider, task in self.pending.items():
+            finished_at = self.finished_at.get(provider, time.monotonic())
+            if task in done and finished_at <= deadline:
+                late_responses.append(_task_response(provider, task))
+                continue
+            if task in done:
+                error_message = "Respuesta descartada: llegó después de la ventana de gracia"
+            else:
+                task.cancel()
+                finished_at = time.monotonic()
+                error_message = "Respuesta descartada: no llegó dentro de la ventana de gracia"
+            late_responses.append(StandardAIResponse(
+                ia_provider_name=provider,
+                status=AIResponseStatus.TIMEOUT,
+                error_message=error_message,
+                latency_ms=int((finished_at - self.reached_at) * 1000)
+            ))
+        self.pending = {}
+        return late_responses
+    
+    def cancel_pending(self) -> None:
+        for task in self.pending.values():
+            task.cancel()
+        self.pending = {}
+
+def _task_response(provider: AIProviderEnum, task: asyncio.Task) -> StandardAIResponse:
+    """Convierte una tarea terminada de un proveedor en su respuesta (o error)"""
+    if task.cancelled():
+        return StandardAIResponse(
+            ia_provider_name=provider,
+            status=AIResponseStatus.ERROR,
+            error_message="Solicitud cancelada",
+            latency_ms=0
+        )
+    if task.exception() is not None:
+        return StandardAIResponse(
+            ia_provider_name=provider,
+            status=AIResponseStatus.ERROR,
+            error_message=f"Excepción: {str(task.exception())}",
+            latency_ms=0
+        )
+    return task.result()
 
 class AIOrchestrator:
     """
@@ -58,6 +138,50 @@ class AIOrchestrator:
         """Retorna lista de proveedores disponibles"""
         return list(self.adapters.keys())
     
+    def progressive_quorum(self) -> Optional[int]:
+        """
+        Quórum de la síntesis progresiva relativo a los proveedores activos:
+        PROGRESSIVE_SYNTHESIS_QUORUM acotado entre 2 (algo que sintetizar) y
+        proveedores - 1 (no esperar siempre al más lento). Con menos de tres
+        proveedores no existe tal quórum y se retorna None: se espera a todos.
+        """
+        if not settings.PROGRESSIVE_SYNTHESIS_ENABLED:
+            return None
+        
+        active = len(self.get_available_providers())
+        if active < 3:
+            logger.debug(f"Síntesis progresiva sin efecto con {active} proveedores (requiere 3 o más)")
+            return None
+        return max(2, min(settings.PROGRESSIVE_SYNTHESIS_QUORUM, active - 1))
+    
+    def _order_by_headroom(
+        self, 
+        request: AIRequest, 
+        providers: List[AIProviderEnum]
+    ) -> List[AIProviderEnum]:
+        """
+        Reordena los proveedores para enviar primero a los que tienen presupuesto
+        RPM/TPM disponible, en lugar de esperar a que el proveedor responda 429.
+        Mantiene el orden original entre proveedores con la misma disponibilidad.
+        """
+        if len(providers) < 2:
+            return providers
+        
+        estimated_tokens = estimate_request_tokens(request)
+        threshold = settings.PROVIDER_REROUTE_WAIT_SECONDS
+        saturated = {
+            provider: outbound_scheduler.predicted_wait(provider, estimated_tokens) > threshold
+            for provider in providers
+        }
+        ordered = sorted(providers, key=lambda provider: saturated[provider])
+        
+        if ordered[0] != providers[0]:
+            logger.info(
+                f"🔀 {providers[0]} sin presupuesto TPM suficiente "
+                f"({estimated_tokens} tokens estimados), redirigiendo a {ordered[0]}"
+            )
+        return ordered
+    
     async def generate_single_response(
         self, 
         request: AIRequest, 
@@ -124,6 +248,63 @@ class AIOrchestrator:
         
         return processed_responses
     
+    async def generate_quorum_responses(
+        self,
+        request: AIRequest,
+        quorum: int,
+        providers: Optional[List[AIProviderEnum]] = None
+    ) -> QuorumResponses:
+        """
+        Lanza todos los proveedores en paralelo y retorna en cuanto `quorum`
+        de ellos responden con éxito (o todos terminan). Los que siguen en
+        curso quedan en `pending` para incorporarlos más tarde.
+        """
+        if providers is None:
+            providers = self.get_available_providers()
+        
+        available_providers = [p for p in providers if p in self.adapters]
+        
+        if not available_providers:
+            return QuorumResponses(responses=[StandardAIResponse(
+                ia_provider_name=AIProviderEnum.OPENAI,  # Default
+                status=AIResponseStatus.ERROR,
+                error_message="No hay proveedores disponibles",
+                latency_ms=0
+            )])
+        
+        tasks = {
+            provider: asyncio.ensure_future(self.adapters[provider].generate_response(request))
+            for provider in available_providers
+        }
+        
+        completed: Dict[AIProviderEnum, StandardAIResponse] = {}
+        pending = set(tasks.values())
+        successes = 0
+        try:
+            while pending and successes < quorum:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for provider, task in tasks.items():
+                    if task in done:
+                        completed[provider] = _task_response(provider, task)
+                        if completed[provider].status == AIResponseStatus.SUCCESS:
+                            successes += 1
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        
+        pending_by_provider = {provider: task for provider, task in tasks.items() if task in pending}
+        if pending_by_provider:
+            logger.info(
+                f"⏩ Quórum de {quorum} alcanzado; pendientes: "
+                f"{', '.join(provider.value for provider in pending_by_provider)}"
+            )
+        
+        return QuorumResponses(
+            responses=[completed[provider] for provider in available_providers if provider in completed],
+            pending=pending_by_provider
+        )
+    
     async def generate_fallback_response(
         self, 
         request: AIRequest, 
@@ -145,6 +326,7 @@ class AIOrchestrator:
                 latency_ms=0
             )
         
+        available_providers = self._order_by_headroom(request, available_providers)
         last_response = None
         
         for provider in available_providers:
@@ -225,10 +407,12 @@ class AIOrchestrator:
         self, 
         request: AIRequest, 
         strategy: AIOrchestrationStrategy = AIOrchestrationStrategy.FALLBACK,
-        providers: Optional[List[AIProviderEnum]] = None
+        providers: Optional[List[AIProviderEnum]] = None,
+        quorum: Optional[int] = None
     ) -> Any:
         """
         Método principal de orquestación que ejecuta la estrategia especificada.
+        `quorum` solo aplica a la estrategia QUORUM.
         """
         if strategy == AIOrchestrationStrategy.SINGLE:
             # Si no se especifica proveedor, usar el primero disponible
@@ -243,7 +427,11 @@ class AIOrchestrator:
                     latency_ms=0
                 )
             
-            return await self.generate_single_response(request, providers[0])
+            # Entre varios candidatos, usar el primero con presupuesto disponible
+            candidates = [p for p in providers if p in self.adapters] or providers
+            return await self.generate_single_response(
+                request, self._order_by_headroom(request, candidates)[0]
+            )
         
         elif strategy == AIOrchestrationStrategy.PARALLEL:
             return await self.generate_parallel_responses(request, providers)
@@ -254,6 +442,11 @@ class AIOrchestrator:
         elif strategy == AIOrchestrationStrategy.FASTEST:
             return await self.generate_fastest_response(request, providers)
         
+        elif strategy == AIOrchestrationStrategy.QUORUM:
+            return await self.generate_quorum_responses(
+                request, quorum or settings.PROGRESSIVE_SYNTHESIS_QUORUM, providers
+            )
+        
         else:
             raise ValueError(f"Estrategia no soportada: {strategy}")
     
@@ -5,7 +5,7 @@ from typing import Dict, List, Optional
 from uuid import UUID, uuid4
 
 import openai
-from app.core.config import settings
+from app.services.llm_client import get_async_openai_client, create_chat_completion
 from app.models.context_session import (
     ContextMessage, 
     ContextChatResponse,
@@ -23,7 +23,7 @@ class ContextBuilderService:
     """
     
     def __init__(self):
-        self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = get_async_openai_client()
         self.model = "gpt-3.5-turbo"
         self.temperature = 0.3  # Más determinístico para consistencia
         self.max_tokens = 500   # Respuestas concisas
@@ -53,7 +53,8 @@ class ContextBuilderService:
             )
             
             # Llamar a GPT-3.5
-            response = await self.client.chat.completions.create(
+            response = await create_chat_completion(
+                client=self.client,
                 model=self.model,
                 messages=messages,
                 temperature=self.temperature,
@@ -430,7 +431,8 @@ Responde SOLO con este formato JSON:
 Si es información, usa "information" como message_type.
 """
         
-        response = await self.client.chat.completions.create(
+        response = await create_chat_completion(
+            client=self.client,
             model=self.model,
             messages=[{"role": "user", "content": simple_prompt}],
             temperature=0.1,
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Tuple, Optional
 from uuid import UUID
 import asyncio
+import copy
 import logging
 from datetime import datetime
 import numpy as np
@@ -14,9 +15,16 @@ from app.models.models import ContextChunk, InteractionEvent, ModeratedSynthesis
 from app.schemas.context import ChunkCreate, ChunkWithSimilarity, ContextBlock
 from app.crud.context import create_context_chunk, find_similar_chunks
 from app.core.config import settings
+from app.core.fast_json import as_document
+from app.schemas.ai_response import AIProviderEnum, RequestPriority
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.continuity_classifier import continuity_classifier
 
 logger = logging.getLogger(__name__)
 
+# Máximo de textos por llamada de embeddings en lote
+EMBEDDING_BATCH_MAX_INPUTS = 256
+
 class EmbeddingError(Exception):
     """Error durante la generación de embeddings."""
     pass
@@ -26,8 +34,10 @@ class TokenLimitError(Exception):
     pass
 
 class ContextManager:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, priority: RequestPriority = RequestPriority.INTERACTIVE):
         self.db = db
+        # Prioridad de las llamadas de embeddings en el planificador de salida
+        self.priority = priority
         # Inicializamos el cliente de OpenAI
         self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.embedding_model = "text-embedding-3-small"
@@ -38,6 +48,15 @@ class ContextManager:
         # Inicializamos el tokenizer de tiktoken
         self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Compatible con la mayoría de modelos
 
+    def bind(self, db: AsyncSession) -> "ContextManager":
+        """
+        Copia ligada a otra sesión que comparte el cliente de OpenAI y el
+        tokenizer (una por petición en lugar de un ContextManager nuevo).
+        """
+        bound = copy.copy(self)
+        bound.db = db
+        return bound
+
     def create_chunks(self, text: str) -> List[str]:
         """
         Divide el texto en chunks con solapamiento.
@@ -91,17 +110,23 @@ class ContextManager:
         
         return chunks
 
-    async def generate_embedding(self, text: str) -> List[float]:
+    async def generate_embedding(self, text: str, tenant: Optional[str] = None) -> List[float]:
         """
         Genera el embedding para un texto dado usando la API de OpenAI.
         Incluye manejo de errores y reintentos.
         """
         for attempt in range(self.max_retries):
             try:
-                response = await self.client.embeddings.create(
-                    model=self.embedding_model,
-                    input=text
-                )
+                async with outbound_scheduler.slot(
+                    AIProviderEnum.OPENAI,
+                    tenant=tenant,
+                    priority=self.priority,
+                    estimated_tokens=len(self.tokenizer.encode(text))
+                ):
+                    response = await self.client.embeddings.create(
+                        model=self.embedding_model,
+                        input=text
+                    )
                 return response.data[0].embedding
             except Exception as e:
                 logger.error(f"Error al generar embedding (intento {attempt + 1}): {str(e)}")
@@ -110,6 +135,36 @@ class ContextManager:
                 else:
                     raise EmbeddingError(f"Error al generar embedding después de {self.max_retries} intentos: {str(e)}")
 
+    async def generate_embeddings(self, texts: List[str], tenant: Optional[str] = None) -> List[List[float]]:
+        """
+        Genera los embeddings de varios textos con una llamada a la API por
+        cada EMBEDDING_BATCH_MAX_INPUTS textos, con los mismos reintentos.
+        """
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_MAX_INPUTS):
+            batch = texts[start:start + EMBEDDING_BATCH_MAX_INPUTS]
+            for attempt in range(self.max_retries):
+                try:
+                    async with outbound_scheduler.slot(
+                        AIProviderEnum.OPENAI,
+                        tenant=tenant,
+                        priority=self.priority,
+                        estimated_tokens=sum(len(self.tokenizer.encode(text)) for text in batch)
+                    ):
+                        response = await self.client.embeddings.create(
+                            model=self.embedding_model,
+                            input=batch
+                        )
+                    embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+                    break
+                except Exception as e:
+                    logger.error(f"Error al generar embeddings en lote (intento {attempt + 1}): {str(e)}")
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(self.retry_delay)
+                    else:
+                        raise EmbeddingError(f"Error al generar embeddings después de {self.max_retries} intentos: {str(e)}")
+        return embeddings
+
     async def process_and_store_text(
         self,
         text: str,
@@ -129,7 +184,7 @@ class ContextManager:
         
         for chunk_text in chunks:
             try:
-                embedding = await self.generate_embedding(chunk_text)
+                embedding = await self.generate_embedding(chunk_text, tenant=str(project_id))
                 
                 chunk_data = ChunkCreate(
                     project_id=project_id,
@@ -173,7 +228,7 @@ class ContextManager:
         """
         try:
             # Generamos el embedding de la consulta
-            query_embedding = await self.generate_embedding(query)
+            query_embedding = await self.generate_embedding(query, tenant=str(project_id))
             
             # Buscamos chunks similares
             similar_chunks = await find_similar_chunks(
@@ -510,52 +565,10 @@ class ContextManager:
     def _query_needs_history(self, query: str) -> bool:
         """
         Determina si una consulta probablemente necesita historial conversacional.
-        Busca patrones de referencias implícitas.
+        Busca referencias implícitas con la expresión precompilada del
+        clasificador de continuidad (una sola pasada sobre la consulta).
         """
-        query_lower = query.lower().strip()
-        
-        # Patrones que indican referencias implícitas
-        implicit_patterns = [
-            # Referencias directoriales 
-            "últimos", "primeros", "anteriores", "previos",
-            
-            # Pronombres y referencias 
-            "eso", "esto", "esos", "estas", "aquello", "lo que",
-            "el que", "la que", "los que", "las que",
-            
-            # Referencias temporales implícitas
-            "antes", "después", "luego", "ahora", "ya",
-            
-            # Acciones sobre contenido previo
-            "mejora", "cambia", "modifica", "ajusta", "corrige",
-            "amplía", "resume", "explica", "detalla",
-            
-            # Referencias numéricas sin contexto
-            "los 4", "las 5", "los 3", "dame 2",
-            
-            # Comparaciones implícitas
-            "mejor", "peor", "similar", "parecido", "como",
-            
-            # Referencias a resultados previos
-            "resultado", "respuesta", "lo anterior", "arriba"
-        ]
-        
-        # Verificar si contiene algún patrón
-        for pattern in implicit_patterns:
-            if pattern in query_lower:
-                return True
-        
-        # Verificar queries muy cortas (probable referencia implícita)
-        # Pero excluir preguntas completas con palabras interrogativas
-        words = query.split()
-        if len(words) <= 3:
-            # Excluir preguntas que empiecen con palabras interrogativas completas
-            interrogative_words = ["qué", "que", "cómo", "como", "cuándo", "cuando", "dónde", "donde", "por", "para", "quién", "quien"]
-            first_word = words[0].lower().strip("¿?")
-            if first_word not in interrogative_words:
-                return True
-            
-        return False
+        return continuity_classifier.needs_history(query)
 
     async def get_recent_interaction_context(
         self,
@@ -577,7 +590,6 @@ class ContextManager:
         Returns:
             Lista de diccionarios con información de las interacciones recientes
         """
-        import json
         from app.models.models import ModeratedSynthesis
         
         try:
@@ -598,13 +610,9 @@ class ContextManager:
             for interaction_event, moderated_synthesis in rows:
                 # Extraer refined_prompt del JSON si existe
                 refined_prompt = None
-                if interaction_event.ai_responses_json:
-                    try:
-                        ai_responses = json.loads(interaction_event.ai_responses_json)
-                        if isinstance(ai_responses, dict) and "refined_prompt" in ai_responses:
-                            refined_prompt = ai_responses["refined_prompt"]
-                    except:
-                        pass
+                ai_responses = as_document(interaction_event.ai_responses_json)
+                if isinstance(ai_responses, dict) and "refined_prompt" in ai_responses:
+                    refined_prompt = ai_responses["refined_prompt"]
                 
                 interaction_context = {
                     "interaction_id": str(interaction_event.id),
@@ -0,0 +1,251 @@
+"""
+Clasificador local de continuidad conversacional.
+
+Decide si una consulta continúa la interacción anterior sin llamar al LLM en
+los casos claros:
+
+1. Patrones léxicos: una única expresión regular precompilada con grupos
+   nombrados (tema nuevo, referencia fuerte, referencia débil, referencia
+   implícita) que se evalúa en una sola pasada, en microsegundos.
+2. Similitud semántica: si el léxico no basta, coseno entre el embedding de
+   la consulta y el de la última interacción (una sola llamada en bloque).
+3. LLM: solo cuando la probabilidad combinada cae en la banda de ambigüedad.
+
+La probabilidad de continuidad se combina de forma lineal y la banda de
+ambigüedad se puede calibrar con ejemplos etiquetados (`calibrate`).
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.synthesis_router import BatchEmbedder, openai_batch_embedder
+
+logger = logging.getLogger(__name__)
+
+# Cada categoría es una alternativa con nombre; el orden de prioridad al
+# resolver varias coincidencias está en _CATEGORY_PRIORITY
+_CONTINUITY_PATTERN = re.compile(
+    r"(?P<new_topic>(?<!\w)(?:nueva consulta|cambio de tema|ahora quiero|otro tema"
+    r"|por otro lado|completamente diferente)(?!\w))"
+    r"|(?P<strong>(?<!\w)(?:eso|esto|lo anterior|lo que dijiste|la respuesta anterior"
+    r"|mejora eso|mejóralo|dame más detalles|amplía|los últimos \d+|lo último|la última vez"
+    r"|después de eso|luego|también considera|además)(?!\w)|¿\s*y si(?!\w)|pero qué tal si(?!\w)|(?<!\w)y también(?!\w))"
+    r"|(?P<weak>(?<!\w)(?:otra opción|alternativa|diferente|también|igualmente|parecido"
+    r"|pero|sin embargo|aunque)(?!\w))"
+    r"|(?P<implicit>(?<!\w)(?:últimos|primeros|anteriores|previos|esos|estas|aquello"
+    r"|lo que|el que|la que|los que|las que|antes|después|ahora|ya|los \d+|las \d+|dame \d+"
+    r"|peor|similar|como|resultado|respuesta|arriba)(?!\w)"
+    r"|(?<!\w)(?:mej[oó]r|c[aá]mbi|modif[ií]c|aj[uú]st|corr[ií]g|ampl[ií]|res[uú]m|expl[ií]c|det[aá]ll)\w*)",
+    re.IGNORECASE
+)
+
+_CATEGORY_PRIORITY = ("new_topic", "strong", "weak", "implicit")
+
+# Probabilidad de continuidad que aporta cada categoría léxica
+_LEXICAL_PROBABILITY = {
+    "new_topic": 0.1,
+    "strong": 0.9,
+    "weak": 0.6,
+    "implicit": 0.6,
+    "short": 0.6,
+    None: 0.4,
+}
+
+_REFERENCE_TYPES = {
+    "new_topic": "new_topic",
+    "strong": "anaphoric",
+    "weak": "topic_expansion",
+    "implicit": "anaphoric",
+    "short": "clarification",
+}
+
+_INTERROGATIVE_WORDS = frozenset({
+    "qué", "que", "cómo", "como", "cuándo", "cuando", "dónde", "donde",
+    "por", "para", "quién", "quien"
+})
+
+# Peso de la similitud semántica frente a la evidencia léxica
+_SEMANTIC_WEIGHT = 0.6
+# Caracteres de la interacción anterior que se comparan con la consulta
+_PREVIOUS_TEXT_CHARS = 1500
+
+
+@dataclass
+class LexicalSignal:
+    """Resultado de la pasada léxica sobre la consulta"""
+    category: Optional[str]
+    keywords: List[str] = field(default_factory=list)
+
+    @property
+    def probability(self) -> float:
+        return _LEXICAL_PROBABILITY[self.category]
+
+
+@dataclass
+class ContinuityDecision:
+    """Decisión de continuidad con la etapa que la resolvió"""
+    probability: float
+    stage: str  # "lexical" | "embedding" | "llm" | "default"
+    reference_type: str
+    keywords: List[str] = field(default_factory=list)
+    similarity: Optional[float] = None
+    ambiguous: bool = False
+
+    @property
+    def is_continuation(self) -> bool:
+        return self.probability >= 0.5
+
+    @property
+    def confidence(self) -> float:
+        return round(max(self.probability, 1.0 - self.probability), 3)
+
+
+class ContinuityClassifier:
+    """Clasificador de continuidad con banda de ambigüedad calibrable"""
+
+    def __init__(
+        self,
+        embedder: Optional[BatchEmbedder] = None,
+        band_low: float = 0.25,
+        band_high: float = 0.75,
+        similarity_low: float = 0.2,
+        similarity_high: float = 0.6
+    ):
+        self.embedder = embedder
+        self.band_low = band_low
+        self.band_high = band_high
+        self.similarity_low = similarity_low
+        self.similarity_high = similarity_high
+        self._resolutions = {"lexical": 0, "embedding": 0, "llm": 0, "default": 0}
+
+    def lexical(self, query: str) -> LexicalSignal:
+        """Pasada única de la expresión precompilada sobre la consulta"""
+        found = {}
+        for match in _CONTINUITY_PATTERN.finditer(query):
+            found.setdefault(match.lastgroup, []).append(match.group().lower())
+
+        for category in _CATEGORY_PRIORITY:
+            if category in found:
+                return LexicalSignal(category, found[category])
+
+        # Consultas muy cortas que no son preguntas completas suelen ser referencias implícitas
+        words = query.split()
+        if 0 < len(words) <= 3 and words[0].lower().strip("¿?") not in _INTERROGATIVE_WORDS:
+            return LexicalSignal("short")
+        return LexicalSignal(None)
+
+    def needs_history(self, query: str) -> bool:
+        """La consulta parece referirse a algo dicho antes (sin marcas de tema nuevo)"""
+        return self.lexical(query.strip()).category not in (None, "new_topic")
+
+    def in_band(self, probability: float) -> bool:
+        return self.band_low < probability < self.band_high
+
+    def classify_lexical(self, query: str) -> ContinuityDecision:
+        """Decisión solo con patrones; `ambiguous` indica que hace falta más evidencia"""
+        signal = self.lexical(query.strip())
+        return ContinuityDecision(
+            probability=signal.probability,
+            stage="lexical",
+            reference_type=_REFERENCE_TYPES.get(signal.category, "new_topic"),
+            keywords=signal.keywords,
+            ambiguous=self.in_band(signal.probability)
+        )
+
+    async def classify_semantic(
+        self,
+        query: str,
+        previous_text: str,
+        lexical: ContinuityDecision
+    ) -> ContinuityDecision:
+        """Combina la evidencia léxica con la similitud a la interacción anterior"""
+        similarity = await self.similarity(query, previous_text)
+        if similarity is None:
+            return lexical
+
+        span = max(1e-6, self.similarity_high - self.similarity_low)
+        semantic = min(1.0, max(0.0, (similarity - self.similarity_low) / span))
+        probability = (1 - _SEMANTIC_WEIGHT) * lexical.probability + _SEMANTIC_WEIGHT * semantic
+        if probability >= 0.5:
+            reference_type = lexical.reference_type if lexical.is_continuation else "topic_expansion"
+        else:
+            reference_type = "new_topic"
+        return ContinuityDecision(
+            probability=round(probability, 3),
+            stage="embedding",
+            reference_type=reference_type,
+            keywords=lexical.keywords,
+            similarity=similarity,
+            ambiguous=self.in_band(probability)
+        )
+
+    async def similarity(self, query: str, previous_text: str) -> Optional[float]:
+        """Coseno entre la consulta y la interacción anterior; None si no se puede medir"""
+        if self.embedder is None or not previous_text:
+            return None
+        try:
+            vectors = await self.embedder([query, previous_text[:_PREVIOUS_TEXT_CHARS]])
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo medir la similitud con la interacción anterior: {e}")
+            return None
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        if matrix.shape[0] != 2 or not np.all(norms > 0):
+            return None
+        return float(matrix[0] @ matrix[1] / (norms[0] * norms[1]))
+
+    def calibrate(self, samples: Sequence[Tuple[float, bool]], target_precision: float = 0.95) -> Tuple[float, float]:
+        """
+        Ajusta la banda con probabilidades etiquetadas (probabilidad, es_continuación):
+        fuera de la banda, las decisiones locales alcanzan la precisión objetivo.
+        """
+        ordered = sorted(samples)
+        probabilities = [p for p, _ in ordered]
+
+        band_low = 0.0
+        for index, probability in enumerate(probabilities):
+            below = ordered[:index + 1]
+            if probability < 0.5 and sum(not label for _, label in below) / len(below) >= target_precision:
+                band_low = probability
+
+        band_high = 1.0
+        for index in range(len(ordered) - 1, -1, -1):
+            above = ordered[index:]
+            if probabilities[index] >= 0.5 and sum(label for _, label in above) / len(above) >= target_precision:
+                band_high = probabilities[index]
+
+        # Los límites quedan justo fuera de la banda (la banda es abierta)
+        self.band_low, self.band_high = band_low, band_high
+        logger.info(f"🎯 Banda de ambigüedad de continuidad calibrada: ({band_low:.2f}, {band_high:.2f})")
+        return band_low, band_high
+
+    def record(self, stage: str):
+        """Registra qué etapa resolvió una consulta"""
+        self._resolutions[stage] = self._resolutions.get(stage, 0) + 1
+
+    def get_stats(self) -> dict:
+        """Resoluciones por etapa y tasa de resolución local (sin LLM)"""
+        total = sum(self._resolutions.values())
+        local = total - self._resolutions["llm"]
+        return {
+            "resolutions": dict(self._resolutions),
+            "total": total,
+            "local_resolution_rate_percent": round(local / total * 100, 2) if total else 0.0,
+            "band": [self.band_low, self.band_high],
+        }
+
+
+# Instancia global del clasificador
+continuity_classifier = ContinuityClassifier(
+    embedder=openai_batch_embedder if settings.OPENAI_API_KEY and settings.FOLLOWUP_EMBEDDING_CHECK_ENABLED else None,
+    band_low=settings.FOLLOWUP_AMBIGUITY_BAND_LOW,
+    band_high=settings.FOLLOWUP_AMBIGUITY_BAND_HIGH,
+    similarity_low=settings.FOLLOWUP_SIMILARITY_LOW,
+    similarity_high=settings.FOLLOWUP_SIMILARITY_HIGH,
+)
@@ -1,14 +1,18 @@
 import json
-import re
+import logging
 from typing import Dict, List, Optional, Tuple
 from uuid import UUID
-import openai
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 
 from app.models.models import InteractionEvent, ModeratedSynthesis
 from app.schemas.query import QueryRequest, QueryType
 from app.core.config import settings
+from app.core.fast_json import as_document
+from app.services.llm_client import get_async_openai_client, create_chat_completion
+from app.services.continuity_classifier import continuity_classifier
+
+logger = logging.getLogger(__name__)
 
 
 class ContinuityAnalysis:
@@ -20,13 +24,15 @@ class ContinuityAnalysis:
         reference_type: str,
         confidence_score: float,
         previous_interaction_id: Optional[UUID] = None,
-        contextual_keywords: Optional[List[str]] = None
+        contextual_keywords: Optional[List[str]] = None,
+        resolution_stage: Optional[str] = None
     ):
         self.is_continuation = is_continuation
         self.reference_type = reference_type  # "anaphoric", "topic_expansion", "clarification", "new_topic"
         self.confidence_score = confidence_score
         self.previous_interaction_id = previous_interaction_id
         self.contextual_keywords = contextual_keywords or []
+        self.resolution_stage = resolution_stage  # "lexical", "embedding", "llm", "default"
 
 
 class InteractionContext:
@@ -52,7 +58,8 @@ class FollowUpInterpreter:
     
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Cliente asíncrono compartido: la llamada no bloquea el event loop
+        self.client = get_async_openai_client()
         self.model = "gpt-3.5-turbo-1106"
         self.temperature = 0.2  # Baja temperatura para consistencia en detección
     
@@ -144,8 +151,12 @@ class FollowUpInterpreter:
         """
         Analiza si una consulta es continuación de una interacción previa.
         
-        SIMPLIFICADO: Siempre asume continuidad si hay interacciones previas,
-        a menos que el usuario seleccione explícitamente "Nueva conversación" en el frontend.
+        Los casos claros se resuelven en local con los patrones precompilados
+        del clasificador de continuidad. En la banda de ambigüedad se asume
+        continuidad, que el usuario puede cambiar con el ConversationModeToggle
+        del frontend, salvo que estén activados la similitud con la última
+        interacción (FOLLOWUP_EMBEDDING_CHECK_ENABLED) o el LLM
+        (FOLLOWUP_LLM_FALLBACK_ENABLED).
         """
         # Verificar si hay interacciones previas
         recent_interaction_id = await self._get_most_recent_interaction_id(project_id, user_id)
@@ -158,90 +169,76 @@ class FollowUpInterpreter:
                 confidence_score=1.0
             )
         
-        # Hay interacciones previas - asumir continuidad por defecto
-        # El usuario puede cambiar esto usando el ConversationModeToggle en el frontend
+        decision = continuity_classifier.classify_lexical(user_prompt)
+        
+        if decision.ambiguous and (continuity_classifier.embedder or settings.FOLLOWUP_LLM_FALLBACK_ENABLED):
+            # La interacción anterior solo se carga cuando los patrones no bastan
+            recent_interaction = await self.get_recent_interaction_context(
+                project_id, user_id, recent_interaction_id
+            )
+            if recent_interaction:
+                decision = await continuity_classifier.classify_semantic(
+                    user_prompt, self._interaction_text(recent_interaction), decision
+                )
+                if decision.ambiguous and settings.FOLLOWUP_LLM_FALLBACK_ENABLED:
+                    llm_result = await self._analyze_with_llm(user_prompt, recent_interaction)
+                    if llm_result:
+                        continuity_classifier.record("llm")
+                        return ContinuityAnalysis(
+                            is_continuation=llm_result["is_continuation"],
+                            reference_type=llm_result["reference_type"],
+                            confidence_score=llm_result["confidence"],
+                            previous_interaction_id=recent_interaction_id if llm_result["is_continuation"] else None,
+                            contextual_keywords=llm_result["keywords"],
+                            resolution_stage="llm"
+                        )
+        
+        if decision.ambiguous:
+            # Sin evidencia suficiente se mantiene la continuidad por defecto
+            continuity_classifier.record("default")
+            return ContinuityAnalysis(
+                is_continuation=True,
+                reference_type="topic_expansion",
+                confidence_score=0.8,
+                previous_interaction_id=recent_interaction_id,
+                contextual_keywords=["continuidad_automatica"],
+                resolution_stage="default"
+            )
+        
+        continuity_classifier.record(decision.stage)
         return ContinuityAnalysis(
-            is_continuation=True,
-            reference_type="topic_expansion",  # Tipo genérico para continuidad
-            confidence_score=0.8,  # Alta confianza en la decisión
-            previous_interaction_id=recent_interaction_id,
-            contextual_keywords=["continuidad_automatica"]
+            is_continuation=decision.is_continuation,
+            reference_type=decision.reference_type,
+            confidence_score=decision.confidence,
+            previous_interaction_id=recent_interaction_id if decision.is_continuation else None,
+            contextual_keywords=decision.keywords,
+            resolution_stage=decision.stage
         )
     
+    @staticmethod
+    def _interaction_text(interaction: InteractionContext) -> str:
+        """Texto de la interacción anterior que se compara con la nueva consulta"""
+        prompt = interaction.refined_prompt or interaction.user_prompt
+        return f"{prompt}\n{interaction.synthesis_text or ''}".strip()
+    
     def _analyze_heuristic_patterns(self, user_prompt: str) -> Dict:
         """
         Análisis heurístico basado en patrones lingüísticos.
         
-        Detecta referencias anafóricas y palabras clave de continuidad.
+        Detecta referencias anafóricas y palabras clave de continuidad con la
+        expresión precompilada del clasificador de continuidad.
         """
-        prompt_lower = user_prompt.lower().strip()
-        
-        # Patrones de continuidad fuerte (alta confianza)
-        strong_continuation_patterns = [
-            r'\b(eso|esto|lo anterior|lo que dijiste|la respuesta anterior)\b',
-            r'(¿y si|pero qué tal si|y también|además)',
-            r'\b(mejora eso|mejóralo|dame más detalles|amplía)\b',
-            r'\b(los últimos \d+|lo último|la última vez)\b',
-            r'\b(después de eso|luego|también considera)\b',
-            r'(¿qué|¿cuál|¿cómo).*(algoritmo|método|técnica|enfoque|estrategia)',
-            r'(¿qué|¿cuál).*(usar|utilizar|aplicar|implementar)',
-            r'(¿cómo).*(hacer|implementar|desarrollar|crear)'
-        ]
-        
-        # Patrones de continuidad débil (requieren análisis LLM)
-        weak_continuation_patterns = [
-            r'\b(otra opción|alternativa|diferente)\b',
-            r'\b(también|igualmente|parecido)\b',
-            r'\b(pero|sin embargo|aunque)\b'
-        ]
-        
-        # Patrones de tema nuevo
-        new_topic_patterns = [
-            r'\b(nueva consulta|cambio de tema|ahora quiero)\b',
-            r'\b(por otro lado|completamente diferente)\b'
-        ]
-        
-        # Verificar patrones fuertes de continuidad
-        for pattern in strong_continuation_patterns:
-            if re.search(pattern, prompt_lower):
-                return {
-                    "is_continuation": True,
-                    "reference_type": "anaphoric",
-                    "confidence": 0.9,
-                    "keywords": re.findall(pattern, prompt_lower)
-                }
-        
-        # Verificar patrones de tema nuevo
-        for pattern in new_topic_patterns:
-            if re.search(pattern, prompt_lower):
-                return {
-                    "is_continuation": False,
-                    "reference_type": "new_topic",
-                    "confidence": 0.9,
-                    "keywords": re.findall(pattern, prompt_lower)
-                }
-        
-        # Verificar patrones débiles
-        for pattern in weak_continuation_patterns:
-            if re.search(pattern, prompt_lower):
-                return {
-                    "is_continuation": True,
-                    "reference_type": "topic_expansion",
-                    "confidence": 0.4,  # Baja confianza, requiere análisis LLM
-                    "keywords": re.findall(pattern, prompt_lower)
-                }
-        
-        # Sin patrones detectados - probablemente tema nuevo
+        decision = continuity_classifier.classify_lexical(user_prompt)
         return {
-            "is_continuation": False,
-            "reference_type": "new_topic",
-            "confidence": 0.6,
-            "keywords": []
+            "is_continuation": decision.is_continuation,
+            "reference_type": decision.reference_type,
+            "confidence": decision.confidence,
+            "keywords": decision.keywords
         }
     
-    async def _analyze_with_llm(self, user_prompt: str, recent_interaction: InteractionContext) -> Dict:
+    async def _analyze_with_llm(self, user_prompt: str, recent_interaction: InteractionContext) -> Optional[Dict]:
         """
-        Análisis con LLM para casos ambiguos.
+        Análisis con LLM para casos ambiguos. Devuelve None si la llamada falla.
         """
         system_prompt = """Eres un experto en análisis conversacional. Tu tarea es determinar si una nueva consulta del usuario es continuación de una consulta anterior o un tema completamente nuevo.
 
@@ -268,7 +265,8 @@ NUEVA CONSULTA:
 ¿Es la nueva consulta una continuación de la anterior?"""
 
         try:
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                client=self.client,
                 model=self.model,
                 temperature=self.temperature,
                 messages=[
@@ -288,13 +286,9 @@ NUEVA CONSULTA:
             }
             
         except Exception as e:
-            # Fallback en caso de error
-            return {
-                "is_continuation": False,
-                "reference_type": "new_topic",
-                "confidence": 0.3,
-                "keywords": []
-            }
+            # Fallback en caso de error: decide el clasificador local
+            logger.warning(f"⚠️ Análisis de continuidad con LLM fallido: {e}")
+            return None
     
     async def get_recent_interaction_context(
         self,
@@ -320,7 +314,8 @@ NUEVA CONSULTA:
                 ModeratedSynthesis, InteractionEvent.moderated_synthesis_id == ModeratedSynthesis.id
             ).where(
                 InteractionEvent.project_id == project_id,
-                InteractionEvent.user_id == user_id
+                InteractionEvent.user_id == user_id,
+                InteractionEvent.deleted_at.is_(None)
             ).order_by(InteractionEvent.created_at.desc()).limit(1)
         
         result = await self.db.exec(stmt)
@@ -333,14 +328,9 @@ NUEVA CONSULTA:
         
         # Extraer refined_prompt del JSON si existe
         refined_prompt = None
-        if interaction_event.ai_responses_json:
-            try:
-                ai_responses = json.loads(interaction_event.ai_responses_json)
-                # Buscar refined_prompt en los metadatos
-                if isinstance(ai_responses, dict) and "refined_prompt" in ai_responses:
-                    refined_prompt = ai_responses["refined_prompt"]
-            except:
-                pass
+        ai_responses = as_document(interaction_event.ai_responses_json)
+        if isinstance(ai_responses, dict) and "refined_prompt" in ai_responses:
+            refined_prompt = ai_responses["refined_prompt"]
         
         return InteractionContext(
             interaction_id=interaction_event.id,
@@ -354,7 +344,8 @@ NUEVA CONSULTA:
         """Obtiene el ID de la interacción más reciente."""
         stmt = select(InteractionEvent.id).where(
             InteractionEvent.project_id == project_id,
-            InteractionEvent.user_id == user_id
+            InteractionEvent.user_id == user_id,
+            InteractionEvent.deleted_at.is_(None)
         ).order_by(InteractionEvent.created_at.desc()).limit(1)
         
         result = await self.db.exec(stmt)
@@ -0,0 +1,286 @@
+"""
+Persistencia write-behind de interacciones.
+
+Las interacciones terminadas se encolan en una cola acotada en memoria y un
+worker las vuelca en lotes: todas las interacciones del lote en un INSERT
+multi-fila, los chunks de sus síntesis con una sola llamada de embeddings y
+otro INSERT multi-fila. Son dos sesiones de base de datos por lote en lugar de
+dos por interacción.
+
+Con la cola llena el productor espera (backpressure); si la espera supera
+WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS la interacción se escribe directamente.
+Al cerrar la aplicación `stop()` vacía la cola antes de terminar.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.read_routing import read_router
+from app.crud import context as context_crud
+from app.crud import interaction as interaction_crud
+from app.models.models import InteractionEvent
+from app.schemas.ai_response import RequestPriority
+from app.schemas.context import ChunkCreate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingInteraction:
+    """Interacción pendiente de guardar, con la síntesis a indexar como contexto"""
+    interaction: InteractionEvent
+    synthesis_text: Optional[str] = None
+
+    @property
+    def id(self) -> UUID:
+        return self.interaction.id
+
+
+class InteractionWriteBehind:
+    """Cola acotada de interacciones que un worker guarda en lotes"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Any]] = None,
+        context_manager: Optional[Any] = None,
+        max_queue_size: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        enqueue_timeout: float = 5.0,
+        history: int = 500
+    ):
+        self._session_factory = session_factory
+        self._context_manager = context_manager
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Avisa al worker de nuevos elementos o del cierre sin esperar al intervalo
+        self._wake: Optional[asyncio.Event] = None
+        self._closing = False
+        self.flush_latencies_ms: Deque[float] = deque(maxlen=history)
+        self.reset()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def reset(self) -> None:
+        self.flush_latencies_ms.clear()
+        self.max_queue_depth = 0
+        self.flushes = 0
+        self.interactions_written = 0
+        self.chunks_written = 0
+        self.failed_interactions = 0
+        self.backpressure_waits = 0
+        self.direct_writes = 0
+
+    def start(self) -> None:
+        """Inicia el worker en el event loop actual"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"💾 Persistencia write-behind iniciada (cola {self.max_queue_size}, "
+            f"lotes de {self.batch_size}, volcado cada {self.flush_interval}s)"
+        )
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Vacía la cola (como mucho `timeout` segundos) y detiene el worker"""
+        if self._task is None:
+            return
+        # Volcar ya lo pendiente, sin esperar a completar lotes
+        self._closing = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Write-behind: {self.queue_depth} interacciones sin guardar al cerrar")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("💾 Persistencia write-behind detenida")
+
+    async def submit(self, item: PendingInteraction) -> None:
+        """
+        Encola una interacción. Con la cola llena espera hasta enqueue_timeout;
+        sin worker o si la espera se agota, la guarda directamente.
+        """
+        if not self.running:
+            await self._write([item])
+            return
+        if self._queue.full():
+            self.backpressure_waits += 1
+            logger.warning(f"⏳ Write-behind: cola llena ({self.queue_depth}), esperando hueco")
+        try:
+            await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.direct_writes += 1
+            logger.warning(f"⚠️ Write-behind saturado: guardando interacción {item.id} directamente")
+            await self._write([item])
+            return
+        self._wake.set()
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth + 1)
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                self._wake.clear()
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if self._closing or remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.error(f"❌ Write-behind: error inesperado guardando lote de {len(batch)}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: Sequence[PendingInteraction]) -> None:
+        """Guarda un lote: interacciones y después los chunks de sus síntesis"""
+        start = time.perf_counter()
+        saved = await self._insert_interactions(batch)
+        self.interactions_written += len(saved)
+        self.failed_interactions += len(batch) - len(saved)
+        # Read-your-writes: la ventana empieza cuando las filas ya están confirmadas
+        self._mark_writes(saved)
+        if saved:
+            self.chunks_written += await self._store_synthesis_chunks(saved)
+            self._mark_writes(saved)
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.flush_latencies_ms.append(latency_ms)
+        logger.info(f"💾 Lote guardado: {len(saved)}/{len(batch)} interacciones en {latency_ms:.0f}ms")
+
+    @staticmethod
+    def _mark_writes(items: Sequence[PendingInteraction]) -> None:
+        for user_id in {item.interaction.user_id for item in items}:
+            read_router.mark_write(user_id)
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.core.database import async_session_factory
+            self._session_factory = async_session_factory
+        return self._session_factory()
+
+    async def _insert_interactions(self, batch: Sequence[PendingInteraction]) -> List[PendingInteraction]:
+        """INSERT multi-fila; si falla, fila a fila para aislar las inválidas"""
+        try:
+            async with self._session() as db:
+                await interaction_crud.create_interactions_bulk(db, [item.interaction for item in batch])
+                await db.commit()
+            return list(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"❌ Error guardando interacción {batch[0].id}: {e}")
+                return []
+            logger.warning(f"⚠️ Falló el INSERT del lote ({len(batch)}), guardando una a una: {e}")
+
+        saved = []
+        for item in batch:
+            saved.extend(await self._insert_interactions([item]))
+        return saved
+
+    def _chunker(self):
+        if self._context_manager is None:
+            from app.services.context_manager import ContextManager
+            # Ingesta en segundo plano: cede el turno a las consultas interactivas
+            self._context_manager = ContextManager(None, priority=RequestPriority.BACKGROUND)
+        return self._context_manager
+
+    async def _store_synthesis_chunks(self, saved: Sequence[PendingInteraction]) -> int:
+        """Chunks de todas las síntesis del lote: un lote de embeddings y un INSERT"""
+        context_manager = self._chunker()
+        pending = [
+            (item, chunk_text)
+            for item in saved if item.synthesis_text
+            for chunk_text in context_manager.create_chunks(item.synthesis_text)
+        ]
+        if not pending:
+            return 0
+        try:
+            embeddings = await context_manager.generate_embeddings([chunk_text for _, chunk_text in pending])
+            chunks = [
+                ChunkCreate(
+                    project_id=item.interaction.project_id,
+                    user_id=item.interaction.user_id,
+                    content_text=chunk_text,
+                    content_embedding=embedding,
+                    source_type="ai_synthesis",
+                    source_identifier=str(item.id)
+                )
+                for (item, chunk_text), embedding in zip(pending, embeddings)
+            ]
+            async with self._session() as db:
+                stored = await context_crud.create_context_chunks_bulk(db, chunks)
+                await db.commit()
+            return stored
+        except Exception as e:
+            # Las interacciones ya están guardadas; solo se pierde el contexto indexado
+            logger.error(f"❌ Error guardando {len(pending)} chunks de síntesis: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.flush_latencies_ms)
+        stats: Dict[str, Any] = {
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "queue_capacity": self.max_queue_size,
+            "max_queue_depth": self.max_queue_depth,
+            "flushes": self.flushes,
+            "interactions_written": self.interactions_written,
+            "chunks_written": self.chunks_written,
+            "failed_interactions": self.failed_interactions,
+            "backpressure_waits": self.backpressure_waits,
+            "direct_writes": self.direct_writes,
+        }
+        if latencies:
+            stats.update({
+                "avg_batch_size": round((self.interactions_written + self.failed_interactions) / self.flushes, 2),
+                "avg_flush_latency_ms": round(sum(latencies) / len(latencies), 2),
+                "p95_flush_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+                "max_flush_latency_ms": round(latencies[-1], 2),
+            })
+        return stats
+
+
+# Instancia global del escritor
+interaction_writer = InteractionWriteBehind(
+    max_queue_size=settings.WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL_SECONDS,
+    enqueue_timeout=settings.WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS
+)
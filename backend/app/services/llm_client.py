@@ -0,0 +1,78 @@
+"""
+Cliente OpenAI asíncrono compartido para las llamadas auxiliares de LLM
+(PreAnalyst, FollowUpInterpreter, ContextBuilder).
+
+Un único `AsyncOpenAI` reutiliza el pool de conexiones, nunca bloquea el event
+loop y aplica un timeout propio. Todas las llamadas pasan por el planificador
+de llamadas salientes para respetar los límites del proveedor.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.schemas.ai_response import AIProviderEnum, RequestPriority
+from app.services.outbound_scheduler import outbound_scheduler, count_tokens
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Retorna el cliente AsyncOpenAI compartido (creado de forma perezosa)"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_CLIENT_TIMEOUT_SECONDS,
+            max_retries=settings.LLM_CLIENT_MAX_RETRIES
+        )
+    return _client
+
+
+def _usage_to_dict(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
+
+
+async def create_chat_completion(
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    client: Optional[AsyncOpenAI] = None,
+    tenant: Optional[str] = None,
+    priority: RequestPriority = RequestPriority.INTERACTIVE,
+    timeout: Optional[float] = None,
+    **kwargs: Any
+) -> Any:
+    """
+    Ejecuta `chat.completions.create` de forma asíncrona pasando por el
+    planificador de llamadas salientes. Retorna el objeto de respuesta del SDK.
+    """
+    client = client or get_async_openai_client()
+    estimated_tokens = sum(count_tokens(message.get("content")) for message in messages)
+    estimated_tokens += kwargs.get("max_tokens") or settings.DEFAULT_AI_MAX_TOKENS
+
+    async with outbound_scheduler.slot(
+        AIProviderEnum.OPENAI,
+        tenant=tenant,
+        priority=priority,
+        estimated_tokens=estimated_tokens
+    ) as grant:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or settings.LLM_CLIENT_TIMEOUT_SECONDS,
+            **kwargs
+        )
+        grant.reconcile(_usage_to_dict(getattr(response, "usage", None)))
+
+    return response
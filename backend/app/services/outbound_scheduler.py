@@ -0,0 +1,439 @@
+"""
+Planificador de llamadas salientes a proveedores de IA.
+
+Todas las llamadas a OpenAI/Anthropic (adaptadores, embeddings, clasificadores)
+pasan por aquí antes de salir a la red. Por cada proveedor se aplica:
+
+- Un límite de concurrencia (semáforo).
+- Dos token buckets que reflejan los límites RPM/TPM del proveedor.
+- Un presupuesto de tokens por minuto: el coste se estima antes de enviar con
+  el tokenizer y se concilia después con el `usage_info` real de la respuesta.
+- Una cola con prioridades (interactivo antes que background) y reparto
+  round-robin entre tenants (proyecto/usuario) dentro de cada prioridad,
+  para que una ráfaga de un único proyecto no acapare el proveedor.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple, Union
+
+import tiktoken
+
+from app.core.config import settings
+from app.schemas.ai_response import AIProviderEnum, AIRequest, RequestPriority
+
+logger = logging.getLogger(__name__)
+
+# Orden de atención de las prioridades (menor = antes)
+PRIORITY_ORDER: Dict[RequestPriority, int] = {
+    RequestPriority.INTERACTIVE: 0,
+    RequestPriority.BACKGROUND: 1,
+}
+
+DEFAULT_TENANT = "anonymous"
+
+
+@dataclass
+class ProviderLimits:
+    """Límites de un proveedor. Un valor <= 0 desactiva ese límite."""
+    max_concurrency: int
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+def default_provider_limits() -> Dict[str, ProviderLimits]:
+    """Construye los límites por proveedor a partir de la configuración"""
+    return {
+        AIProviderEnum.OPENAI.value: ProviderLimits(
+            max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+            requests_per_minute=settings.OPENAI_RPM_LIMIT,
+            tokens_per_minute=settings.OPENAI_TPM_LIMIT,
+        ),
+        AIProviderEnum.ANTHROPIC.value: ProviderLimits(
+            max_concurrency=settings.ANTHROPIC_MAX_CONCURRENCY,
+            requests_per_minute=settings.ANTHROPIC_RPM_LIMIT,
+            tokens_per_minute=settings.ANTHROPIC_TPM_LIMIT,
+        ),
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    """
+    Tokenizer compartido (cl100k es una buena aproximación para ambos proveedores).
+    Si no se puede cargar se recuerda el fallo, para no reintentar la descarga en cada llamada.
+    """
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ Tokenizer no disponible, se aproximan los tokens por caracteres: {e}")
+        return None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Cuenta tokens de un texto; si el tokenizer no está disponible, aproxima por caracteres"""
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 4
+    try:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    except Exception:
+        return len(text) // 4
+
+
+# Tokens extra por mensaje (rol, separadores) que cobran los proveedores
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_request_tokens(request: AIRequest) -> int:
+    """Coste estimado de una solicitud: tokens de entrada + salida máxima permitida"""
+    input_tokens = count_tokens(request.prompt) + _MESSAGE_OVERHEAD_TOKENS
+    if request.system_message:
+        input_tokens += count_tokens(request.system_message) + _MESSAGE_OVERHEAD_TOKENS
+    return input_tokens + (request.max_tokens or 0)
+
+
+def usage_total_tokens(usage_info: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Tokens reales consumidos según el `usage_info` de OpenAI o Anthropic"""
+    if not usage_info:
+        return None
+    if usage_info.get("total_tokens"):
+        return int(usage_info["total_tokens"])
+    prompt = usage_info.get("prompt_tokens", usage_info.get("input_tokens", 0)) or 0
+    completion = usage_info.get("completion_tokens", usage_info.get("output_tokens", 0)) or 0
+    total = int(prompt) + int(completion)
+    return total or None
+
+
+class TokenBucket:
+    """Token bucket con recarga continua expresada en unidades por minuto"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_minute > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_minute / 60.0)
+
+    def time_until_available(self, amount: float) -> float:
+        """Segundos que faltan para poder consumir `amount` unidades"""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        # Una solicitud mayor que la capacidad esperaría para siempre: se limita a la capacidad
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.rate_per_minute
+
+    def consume(self, amount: float) -> None:
+        if not self.enabled:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Devuelve (delta > 0) o cobra (delta < 0) unidades tras conciliar el uso real"""
+        if not self.enabled:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+    def drain(self) -> None:
+        """Vacía el bucket (p. ej. tras un 429 inesperado del proveedor)"""
+        if not self.enabled:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclass
+class _Waiter:
+    """Solicitud en cola esperando turno"""
+    future: asyncio.Future
+    tenant: str
+    priority: int
+    tokens: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class SlotGrant:
+    """Plaza concedida por el planificador; permite conciliar el uso real de tokens"""
+    lane: "_ProviderLane"
+    reserved_tokens: int
+    reconciled: bool = False
+
+    def reconcile(self, usage_info: Optional[Dict[str, Any]]) -> None:
+        """Ajusta el presupuesto TPM con los tokens que el proveedor realmente cobró"""
+        if self.reconciled:
+            return
+        actual = usage_total_tokens(usage_info)
+        if actual is None:
+            return  # Sin usage_info se mantiene la reserva estimada
+        self.reconciled = True
+        self.lane.record_usage(self.reserved_tokens, actual)
+
+
+class _ProviderLane:
+    """Cola, límites y estadísticas de un proveedor"""
+
+    def __init__(self, provider: str, limits: ProviderLimits):
+        self.provider = provider
+        self.limits = limits
+        self.in_flight = 0
+        self.request_bucket = TokenBucket(limits.requests_per_minute)
+        self.token_bucket = TokenBucket(limits.tokens_per_minute)
+        # prioridad -> tenant -> cola FIFO de ese tenant (el orden del dict es el turno)
+        self.queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {
+            order: OrderedDict() for order in sorted(PRIORITY_ORDER.values())
+        }
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._wakeup_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Estadísticas
+        self.dispatched = 0
+        self.max_queue_depth = 0
+        self.rate_limited = 0
+        self.wait_times_ms: Deque[float] = deque(maxlen=500)
+        self.usage_window: Deque[Tuple[float, int]] = deque()
+        self.estimate_ratios: Deque[float] = deque(maxlen=500)
+
+    # ------------------------------------------------------------------ cola
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        orders = [priority] if priority is not None else list(self.queues)
+        return sum(len(q) for order in orders for q in self.queues[order].values())
+
+    def enqueue(self, waiter: _Waiter) -> None:
+        tenants = self.queues[waiter.priority]
+        tenants.setdefault(waiter.tenant, deque()).append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+
+    def discard(self, waiter: _Waiter) -> None:
+        tenants = self.queues[waiter.priority]
+        queue = tenants.get(waiter.tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del tenants[waiter.tenant]
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Siguiente solicitud según prioridad y turno de tenant"""
+        for order in sorted(self.queues):
+            tenants = self.queues[order]
+            while tenants:
+                tenant, queue = next(iter(tenants.items()))
+                while queue and queue[0].future.done():
+                    queue.popleft()  # cancelada mientras esperaba
+                if queue:
+                    return queue[0]
+                del tenants[tenant]
+        return None
+
+    def _pop(self, waiter: _Waiter) -> None:
+        tenants = self.queues[waiter.priority]
+        queue = tenants[waiter.tenant]
+        queue.popleft()
+        if queue:
+            tenants.move_to_end(waiter.tenant)  # el tenant pasa al final del turno
+        else:
+            del tenants[waiter.tenant]
+
+    # ------------------------------------------------------------- despacho
+
+    def _has_capacity(self) -> bool:
+        return self.limits.max_concurrency <= 0 or self.in_flight < self.limits.max_concurrency
+
+    def pump(self) -> None:
+        """Despacha solicitudes en cola mientras haya capacidad"""
+        while self._has_capacity():
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+
+            wait = max(
+                self.request_bucket.time_until_available(1),
+                self.token_bucket.time_until_available(waiter.tokens),
+            )
+            if wait > 0:
+                self._schedule_wakeup(wait)
+                return
+
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(waiter.tokens)
+            self._pop(waiter)
+            self.in_flight += 1
+            self.dispatched += 1
+            self.wait_times_ms.append((time.monotonic() - waiter.enqueued_at) * 1000)
+            waiter.future.set_result(None)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._wakeup is not None and self._wakeup_loop is loop and not self._wakeup.cancelled():
+            return
+        self._wakeup_loop = loop
+        self._wakeup = loop.call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self.pump()
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self.pump()
+
+    # ------------------------------------------------------ presupuesto TPM
+
+    def predicted_wait(self, tokens: int) -> float:
+        """Segundos estimados hasta poder despachar una solicitud de `tokens` tokens"""
+        return max(
+            self.request_bucket.time_until_available(1),
+            self.token_bucket.time_until_available(tokens),
+        )
+
+    def record_usage(self, reserved: int, actual: int) -> None:
+        """Concilia la reserva con el uso real y lo registra en la ventana de un minuto"""
+        self.token_bucket.adjust(reserved - actual)
+        now = time.monotonic()
+        self.usage_window.append((now, actual))
+        while self.usage_window and now - self.usage_window[0][0] > 60:
+            self.usage_window.popleft()
+        if reserved > 0:
+            self.estimate_ratios.append(actual / reserved)
+        self.pump()  # una devolución puede desbloquear solicitudes en cola
+
+    def note_rate_limited(self) -> None:
+        """El proveedor respondió 429: se vacían los buckets para frenar al resto de la cola"""
+        self.rate_limited += 1
+        self.request_bucket.drain()
+        self.token_bucket.drain()
+
+    def tokens_used_last_minute(self) -> int:
+        now = time.monotonic()
+        return sum(tokens for ts, tokens in self.usage_window if now - ts <= 60)
+
+    # ---------------------------------------------------------- estadísticas
+
+    def get_stats(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_times_ms)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.limits.max_concurrency,
+            "queue_depth": {
+                priority.value: self.queue_depth(order)
+                for priority, order in PRIORITY_ORDER.items()
+            },
+            "max_queue_depth": self.max_queue_depth,
+            "dispatched": self.dispatched,
+            "avg_wait_ms": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "p95_wait_ms": round(p95, 2),
+            "max_wait_ms": round(waits[-1], 2) if waits else 0.0,
+            "rpm_limit": self.limits.requests_per_minute,
+            "tpm_limit": self.limits.tokens_per_minute,
+            "tpm_available": int(self.token_bucket.tokens) if self.token_bucket.enabled else None,
+            "tokens_used_last_minute": self.tokens_used_last_minute(),
+            "avg_actual_to_estimate_ratio": (
+                round(sum(self.estimate_ratios) / len(self.estimate_ratios), 3)
+                if self.estimate_ratios else None
+            ),
+            "rate_limited": self.rate_limited,
+        }
+
+
+class OutboundScheduler:
+    """
+    Planificador global de llamadas salientes.
+    Uso: `async with outbound_scheduler.slot(provider, tenant=..., priority=...)`.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimits]] = None):
+        self._limits = limits
+        self._lanes: Dict[str, _ProviderLane] = {}
+
+    def _lane(self, provider: Union[AIProviderEnum, str]) -> _ProviderLane:
+        key = provider.value if isinstance(provider, AIProviderEnum) else str(provider)
+        lane = self._lanes.get(key)
+        if lane is None:
+            if self._limits is None:
+                self._limits = default_provider_limits()
+            # Proveedores sin configuración explícita no tienen límites
+            limits = self._limits.get(key, ProviderLimits(0, 0, 0))
+            lane = _ProviderLane(key, limits)
+            self._lanes[key] = lane
+        return lane
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: Union[AIProviderEnum, str],
+        tenant: Optional[str] = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        estimated_tokens: int = 0,
+    ) -> AsyncIterator[SlotGrant]:
+        """
+        Espera turno para el proveedor y libera la plaza al salir.
+        `estimated_tokens` se reserva del presupuesto TPM; llamar a
+        `grant.reconcile(usage_info)` ajusta la reserva al uso real.
+        """
+        lane = self._lane(provider)
+        waiter = _Waiter(
+            future=asyncio.get_running_loop().create_future(),
+            tenant=tenant or DEFAULT_TENANT,
+            priority=PRIORITY_ORDER[RequestPriority(priority)],
+            tokens=max(0, int(estimated_tokens)),
+        )
+        lane.enqueue(waiter)
+        lane.pump()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                lane.release()  # se concedió la plaza justo antes de cancelar
+            else:
+                lane.discard(waiter)
+                lane.pump()
+            raise
+
+        try:
+            yield SlotGrant(lane=lane, reserved_tokens=waiter.tokens)
+        finally:
+            lane.release()
+
+    def predicted_wait(self, provider: Union[AIProviderEnum, str], estimated_tokens: int) -> float:
+        """Espera estimada por límites RPM/TPM antes de que el proveedor acepte la solicitud"""
+        return self._lane(provider).predicted_wait(estimated_tokens)
+
+    def note_rate_limited(self, provider: Union[AIProviderEnum, str]) -> None:
+        """Registra un 429 del proveedor y frena su cola hasta que se recarguen los buckets"""
+        self._lane(provider).note_rate_limited()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidad de cola y tiempos de espera por proveedor"""
+        return {provider: lane.get_stats() for provider, lane in self._lanes.items()}
+
+
+# Instancia global del planificador
+outbound_scheduler = OutboundScheduler()
@@ -2,7 +2,7 @@ import json
 import openai
 from typing import Dict, Any
 from app.models.pre_analysis import PreAnalysisResult
-from app.core.config import settings
+from app.services.llm_client import get_async_openai_client, create_chat_completion
 
 # Sistema prompt para el análisis de intenciones
 SYSTEM_PROMPT = """Eres un asistente experto que ayuda a interpretar preguntas de usuarios sobre investigación, ideas o planificación. Tu tarea es:
@@ -51,7 +51,8 @@ class PreAnalystService:
     """Servicio para análisis previo de prompts del usuario."""
     
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Cliente asíncrono compartido: la llamada no bloquea el event loop
+        self.client = get_async_openai_client()
         self.model = "gpt-3.5-turbo-1106"
         self.temperature = 0.3
     
@@ -71,7 +72,8 @@ class PreAnalystService:
         """
         try:
             # Llamada a OpenAI
-            response = self.client.chat.completions.create(
+            response = await create_chat_completion(
+                client=self.client,
                 model=self.model,
                 temperature=self.temperature,
                 messages=[
@@ -0,0 +1,50 @@
+"""
+Compilador de plantillas de prompt con prefijo estático.
+
+Los prompts largos (p. ej. el meta-análisis del moderador) tienen cientos de
+líneas de instrucciones que no cambian entre solicitudes. Se compilan una sola
+vez al importar el módulo: todo lo estático va al principio y en cada solicitud
+solo se añade la parte variable al final, de modo que el prefijo es idéntico
+byte a byte y los proveedores pueden reutilizarlo (caché automática de prompts
+de OpenAI, `cache_control` de Anthropic).
+"""
+
+from dataclasses import dataclass
+from functools import cached_property
+from string import Formatter
+
+from app.services.outbound_scheduler import count_tokens
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """Prompt listo para enviar, con la extensión de su prefijo cacheable"""
+    text: str
+    prefix_chars: int
+    prefix_tokens: int
+
+
+class CompiledPrompt:
+    """
+    Plantilla dividida en un prefijo estático (precompilado) y un sufijo con
+    los campos variables. Lanza ValueError si el prefijo contiene campos.
+    """
+
+    def __init__(self, static_prefix: str, suffix_template: str):
+        if any(field for _, field, _, _ in Formatter().parse(static_prefix)):
+            raise ValueError("El prefijo estático no puede contener campos variables")
+        self.prefix = static_prefix
+        self.suffix_template = suffix_template
+
+    @cached_property
+    def prefix_tokens(self) -> int:
+        """Tokens del prefijo; se cuentan una vez, en la primera solicitud"""
+        return count_tokens(self.prefix)
+
+    def render(self, **variables: str) -> RenderedPrompt:
+        """Une el prefijo precompilado con la parte variable en una sola pasada"""
+        return RenderedPrompt(
+            text=self.prefix + self.suffix_template.format(**variables),
+            prefix_chars=len(self.prefix),
+            prefix_tokens=self.prefix_tokens
+        )
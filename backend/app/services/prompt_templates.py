@@ -20,13 +20,7 @@ class PromptTemplateManager:
             system_template="""**Instrucción del Sistema:**
 Eres un asistente experto de IA, encargado de proporcionar una respuesta de alta calidad, perspicaz y bien estructurada a la pregunta principal del usuario. Tu respuesta debe tener aproximadamente **600-800 palabras**. Bajo ninguna circunstancia debe exceder las 900 palabras; si la complejidad de la pregunta se aborda completamente en menos palabras, eso es aceptable. Las respuestas que excedan significativamente el límite superior pueden ser truncadas por el sistema Orquix. DEBES considerar cuidadosamente todo el "Contexto Proporcionado" para informar tu respuesta, asegurándote de que sea relevante para la investigación o consulta en curso. Por favor, proporciona tu respuesta en **español**.
 
-**Pregunta Principal del Usuario:**
-"{user_question}"
-
-**Contexto Proporcionado (Considera esta información para entender el trasfondo y alcance de la consulta del usuario. Tu respuesta debe basarse en o ser consistente con este contexto. Si crees que el contexto está desactualizado, contiene errores significativos, o es en gran medida irrelevante para la pregunta del usuario, DEBES señalar respetuosamente estas discrepancias y explicar por qué (ej., "El contexto proporcionado sobre X parece desactualizado; datos actuales de Y sugieren Z...") antes de proceder con tu respuesta principal. Si ninguna parte del contexto es relevante después de una consideración cuidadosa, declara esto explícitamente y procede basándote únicamente en la pregunta del usuario.):**
----
-{context}
----
+**Sobre el Contexto Proporcionado (Considera esta información para entender el trasfondo y alcance de la consulta del usuario. Tu respuesta debe basarse en o ser consistente con este contexto. Si crees que el contexto está desactualizado, contiene errores significativos, o es en gran medida irrelevante para la pregunta del usuario, DEBES señalar respetuosamente estas discrepancias y explicar por qué (ej., "El contexto proporcionado sobre X parece desactualizado; datos actuales de Y sugieren Z...") antes de proceder con tu respuesta principal. Si ninguna parte del contexto es relevante después de una consideración cuidadosa, declara esto explícitamente y procede basándote únicamente en la pregunta del usuario.)**
 
 **Tu Tarea y Estructura de Respuesta Esperada:**
 Basándote en la "Pregunta Principal del Usuario" y el "Contexto Proporcionado," genera una respuesta integral. Para mejorar la claridad y utilidad para el posterior meta-análisis por el Moderador IA de Orquix, DEBES adherirte a la siguiente estructura usando Markdown para los encabezados:
@@ -61,7 +55,15 @@ Basándote en la "Pregunta Principal del Usuario" y el "Contexto Proporcionado,"
 
 Tu respuesta es una entrada crítica para un posterior meta-análisis y síntesis por el Moderador IA de Orquix. Por lo tanto, su claridad, profundidad, relevancia directa, naturaleza estructurada y cualquier indicación de su distintividad o confianza son de importancia primordial. Evita verbosidad innecesaria o digresiones no directamente relevantes.""",
             
-            user_template="""{user_question}""",
+            # La pregunta y el contexto van al final, en el mensaje del usuario, para
+            # que el system message sea un prefijo estático cacheable por el proveedor
+            user_template="""**Pregunta Principal del Usuario:**
+"{user_question}"
+
+**Contexto Proporcionado:**
+---
+{context}
+---""",
             
             context_template="""**Fuente:** {source_type} | **Relevancia:** {similarity:.2f}
 {content_text}
@@ -108,12 +110,12 @@ Tu respuesta es una entrada crítica para un posterior meta-análisis y síntesi
 2. Si no hay información suficiente en el contexto, di explícitamente que no puedes responder completamente
 3. Mantén un tono profesional y analítico
 4. Responde en español
-5. Máximo 900 palabras, óptimo 600-800 palabras
-
-**Contexto disponible:**
-{context}""",
+5. Máximo 900 palabras, óptimo 600-800 palabras""",
             
-            user_template="""**Pregunta Principal del Usuario:** {user_question}
+            user_template="""**Contexto disponible:**
+{context}
+
+**Pregunta Principal del Usuario:** {user_question}
 
 Por favor, proporciona una respuesta estructurada siguiendo el formato de 6 secciones especificado arriba, basándote en el contexto proporcionado y tu conocimiento general.""",
             
@@ -0,0 +1,212 @@
+"""
+Ejecutor de grafos de dependencias (DAG) para el pipeline de consulta.
+
+Cada etapa declara qué valores necesita (`inputs`) y cuáles produce
+(`outputs`). El ejecutor lanza todas las etapas a la vez y cada una arranca en
+cuanto sus entradas están disponibles, de modo que las etapas independientes
+(p. ej. historial conversacional y búsqueda de contexto) se solapan.
+
+Al terminar se registra el tiempo de cada etapa y el camino crítico: la cadena
+de etapas que determinó la latencia total.
+
+`Speculation` permite lanzar trabajo antes de conocer su entrada definitiva
+(p. ej. las llamadas a proveedores con el prompt sin refinar) y decidir después
+si se aprovecha o se descarta.
+"""
+
+import asyncio
+import difflib
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.single_flight import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_similarity(a: str, b: str) -> float:
+    """Similitud 0..1 entre dos prompts normalizados (difflib)"""
+    a, b = normalize_prompt(a), normalize_prompt(b)
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+@dataclass
+class PipelineStage:
+    """Etapa del pipeline: una corrutina con entradas y salidas con nombre"""
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+
+
+@dataclass
+class StageTiming:
+    """Tiempos de una etapa relativos al inicio del pipeline"""
+    start_ms: float
+    end_ms: float
+
+    @property
+    def duration_ms(self) -> float:
+        return self.end_ms - self.start_ms
+
+
+@dataclass
+class PipelineRun:
+    """Resultado de una ejecución: valores producidos y tiempos"""
+    values: Dict[str, Any]
+    timings: Dict[str, StageTiming]
+    total_ms: float
+    critical_path: List[str] = field(default_factory=list)
+
+    @property
+    def critical_path_ms(self) -> float:
+        return sum(self.timings[name].duration_ms for name in self.critical_path)
+
+    @property
+    def overlap_saved_ms(self) -> float:
+        """Tiempo ahorrado frente a ejecutar todas las etapas en secuencia"""
+        return max(0.0, sum(t.duration_ms for t in self.timings.values()) - self.total_ms)
+
+    def as_metrics(self) -> Dict[str, Any]:
+        return {
+            "stages": {
+                name: {
+                    "start_ms": int(timing.start_ms),
+                    "end_ms": int(timing.end_ms),
+                    "duration_ms": int(timing.duration_ms),
+                }
+                for name, timing in self.timings.items()
+            },
+            "total_ms": int(self.total_ms),
+            "critical_path": self.critical_path,
+            "critical_path_ms": int(self.critical_path_ms),
+            "overlap_saved_ms": int(self.overlap_saved_ms),
+        }
+
+
+class PipelineExecutor:
+    """Ejecuta un conjunto de etapas respetando sus dependencias de datos"""
+
+    def __init__(self, stages: List[PipelineStage]):
+        self.stages = stages
+        self._producers: Dict[str, PipelineStage] = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self._producers:
+                    raise ValueError(f"La salida '{output}' la producen varias etapas")
+                self._producers[output] = stage
+        self._check_acyclic()
+
+    def _dependencies(self, stage: PipelineStage) -> List[PipelineStage]:
+        return [self._producers[name] for name in stage.inputs if name in self._producers]
+
+    def _check_acyclic(self) -> None:
+        pending = {stage.name: {dep.name for dep in self._dependencies(stage)} for stage in self.stages}
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependencias cíclicas entre etapas: {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+
+    async def run(self, initial: Optional[Dict[str, Any]] = None) -> PipelineRun:
+        """Ejecuta el grafo. Si una etapa falla se cancelan las demás y se propaga el error."""
+        initial = dict(initial or {})
+        for stage in self.stages:
+            missing = [name for name in stage.inputs if name not in initial and name not in self._producers]
+            if missing:
+                raise ValueError(f"La etapa '{stage.name}' necesita valores no disponibles: {missing}")
+
+        loop = asyncio.get_running_loop()
+        futures: Dict[str, asyncio.Future] = {name: loop.create_future() for name in self._producers}
+        values: Dict[str, Any] = dict(initial)
+        timings: Dict[str, StageTiming] = {}
+        origin = time.perf_counter()
+
+        async def run_stage(stage: PipelineStage) -> None:
+            kwargs = {}
+            for name in stage.inputs:
+                kwargs[name] = initial[name] if name in initial else await futures[name]
+
+            start = time.perf_counter()
+            result = await stage.func(**kwargs)
+            end = time.perf_counter()
+
+            if len(stage.outputs) == 1:
+                result = (result,)
+            elif not stage.outputs:
+                result = ()
+            for name, value in zip(stage.outputs, result):
+                values[name] = value
+                futures[name].set_result(value)
+            timings[stage.name] = StageTiming((start - origin) * 1000, (end - origin) * 1000)
+
+        tasks = [asyncio.ensure_future(run_stage(stage)) for stage in self.stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        run = PipelineRun(
+            values=values,
+            timings=timings,
+            total_ms=(time.perf_counter() - origin) * 1000,
+        )
+        run.critical_path = self._critical_path(timings)
+        return run
+
+    def _critical_path(self, timings: Dict[str, StageTiming]) -> List[str]:
+        """Recorre hacia atrás desde la última etapa en terminar, por la dependencia más tardía"""
+        if not timings:
+            return []
+        by_name = {stage.name: stage for stage in self.stages}
+        current = max(timings, key=lambda name: timings[name].end_ms)
+        path = [current]
+        while True:
+            deps = [dep.name for dep in self._dependencies(by_name[current]) if dep.name in timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda name: timings[name].end_ms)
+            path.append(current)
+        return list(reversed(path))
+
+
+class Speculation:
+    """
+    Trabajo lanzado de forma especulativa. Se confirma (se espera y se usa su
+    resultado) o se descarta (se cancela) cuando se conoce la entrada definitiva.
+    """
+
+    def __init__(self, coro: Awaitable[Any], key: Any = None):
+        self.key = key
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.latency_saved_ms = 0.0
+        self.task = asyncio.ensure_future(coro)
+        self.task.add_done_callback(self._on_done)
+
+    def _on_done(self, _task: asyncio.Future) -> None:
+        self.finished_at = time.perf_counter()
+
+    async def confirm(self) -> Any:
+        """
+        Usa el resultado especulativo. La latencia ahorrada es lo que la
+        especulación llevaba avanzado al tomar la decisión.
+        """
+        decided_at = time.perf_counter()
+        result = await self.task
+        self.latency_saved_ms = (min(self.finished_at or decided_at, decided_at) - self.started_at) * 1000
+        return result
+
+    def discard(self) -> None:
+        if not self.task.done():
+            self.task.cancel()
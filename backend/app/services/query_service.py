@@ -2,8 +2,8 @@ import time
 import asyncio
 import logging
 from typing import List, Optional, Dict, Any
+from contextlib import asynccontextmanager
 from uuid import UUID
-from sqlmodel import Session, create_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.schemas.query import (
@@ -14,6 +14,7 @@ from app.schemas.ai_response import (
     ErrorCategory, ErrorDetail
 )
 from app.services.context_manager import ContextManager
+from app.crud.context import find_similar_chunks
 from app.services.ai_orchestrator import AIOrchestrator
 from app.services.prompt_templates import PromptTemplateManager
 from app.core.config import settings
@@ -37,7 +38,7 @@ class QueryService:
     async def process_query(
         self, 
         query_request: QueryRequest,
-        session: Optional[Session] = None
+        session: Optional[AsyncSession] = None
     ) -> QueryResponse:
         """
         Procesa una consulta completa con manejo robusto de errores:
@@ -190,82 +191,73 @@ class QueryService:
             "providers_attempted": [p.value for p in providers_used]
         }
     
+    @asynccontextmanager
+    async def _retrieval_session(self, session: Optional[AsyncSession], user_id: Optional[UUID] = None):
+        """
+        Sesión para la búsqueda de contexto: la del llamador o una de lectura
+        de app.core.database (réplica si la hay; nunca un engine por consulta).
+        """
+        if isinstance(session, AsyncSession):
+            yield session
+            return
+        from app.core.database import read_session
+        async with read_session(user_id) as db:
+            yield db
+    
+    def _get_context_manager(self, db: AsyncSession) -> ContextManager:
+        if not self.context_manager:
+            self.context_manager = ContextManager(db)
+        return self.context_manager.bind(db)
+    
     async def _search_relevant_context(
         self, 
         query_request: QueryRequest, 
-        session: Optional[Session]
+        session: Optional[AsyncSession]
     ) -> tuple[Optional[ContextInfo], str]:
         """Busca contexto relevante para la consulta"""
         try:
-            # Para la funcionalidad de historial necesitamos una sesión async
-            # Vamos a crear una temporal si no la tenemos
-            from sqlmodel.ext.asyncio.session import AsyncSession
-            from sqlalchemy.ext.asyncio import create_async_engine
-            
-            if not session:
-                # Crear sesión async temporal para búsqueda
-                async_engine = create_async_engine(settings.DATABASE_URL, echo=False)
-                async_session = AsyncSession(async_engine)
-            else:
-                # Convertir la sesión sync a async si es necesario
-                if isinstance(session, AsyncSession):
-                    async_session = session
-                else:
-                    # Para compatibilidad, creamos una sesión async temporal
-                    async_engine = create_async_engine(settings.DATABASE_URL, echo=False)
-                    async_session = AsyncSession(async_engine)
-            
-            # Inicializar context manager si no existe
-            if not self.context_manager:
-                self.context_manager = ContextManager(async_session)
-            
-            # 🧠 NUEVA FUNCIONALIDAD: Enriquecer query con historial conversacional
-            enriched_query = query_request.user_question
-            
-            # Solo enriquecer si tenemos project_id y user_id
-            if query_request.project_id and query_request.user_id:
-                enriched_query = await self.context_manager.enrich_query_with_history(
-                    query=query_request.user_question,
+            async with self._retrieval_session(session, query_request.user_id) as db:
+                context_manager = self._get_context_manager(db)
+                
+                # 🧠 NUEVA FUNCIONALIDAD: Enriquecer query con historial conversacional
+                enriched_query = query_request.user_question
+                
+                # Solo enriquecer si tenemos project_id y user_id
+                if query_request.project_id and query_request.user_id:
+                    enriched_query = await context_manager.enrich_query_with_history(
+                        query=query_request.user_question,
+                        project_id=query_request.project_id,
+                        user_id=query_request.user_id,
+                        enable_history=True,  # Configurable en el futuro
+                        max_history_tokens=600
+                    )
+                    
+                    # Log si se enriqueció
+                    if enriched_query != query_request.user_question:
+                        logger.info("✨ Query enriquecida con historial conversacional")
+                
+                if db is not session:
+                    # Liberar la conexión mientras se genera el embedding (la sesión se reutiliza)
+                    await db.close()
+                
+                # Buscar chunks relevantes usando la query enriquecida
+                query_embedding = await context_manager.generate_embedding(enriched_query)
+                
+                config = query_request.context_config or ContextConfig()
+                
+                # Convertir umbral de similitud
+                cosine_threshold = None
+                if config.similarity_threshold:
+                    cosine_threshold = 1 - config.similarity_threshold
+                
+                chunks = await find_similar_chunks(
+                    db=db,
+                    query_embedding=query_embedding,
                     project_id=query_request.project_id,
                     user_id=query_request.user_id,
-                    enable_history=True,  # Configurable en el futuro
-                    max_history_tokens=600
+                    top_k=config.top_k,
+                    similarity_threshold=cosine_threshold
                 )
-                
-                # Log si se enriqueció
-                if enriched_query != query_request.user_question:
-                    logger.info("✨ Query enriquecida con historial conversacional")
-            
-            # Buscar chunks relevantes usando la query enriquecida
-            query_embedding = await self.context_manager.generate_embedding(enriched_query)
-            
-            # Para la búsqueda vectorial necesitamos usar una sesión sync
-            # Crear sesión sync para la búsqueda vectorial
-            database_url = settings.DATABASE_URL.replace("postgresql+asyncpg", "postgresql")
-            sync_engine = create_engine(database_url, echo=False)
-            sync_session = Session(sync_engine)
-            
-            # Importar la función de búsqueda
-            from app.crud.context import find_similar_chunks_sync
-            
-            config = query_request.context_config or ContextConfig()
-            
-            # Convertir umbral de similitud
-            cosine_threshold = None
-            if config.similarity_threshold:
-                cosine_threshold = 1 - config.similarity_threshold
-            
-            chunks = find_similar_chunks_sync(
-                db=sync_session,
-                query_embedding=query_embedding,
-                project_id=query_request.project_id,
-                user_id=query_request.user_id,
-                top_k=config.top_k,
-                similarity_threshold=cosine_threshold
-            )
-            
-            # Cerrar la sesión sync temporal
-            sync_session.close()
             
             if not chunks:
                 logger.info("No se encontró contexto relevante")
@@ -429,9 +421,11 @@ class QueryService:
     ) -> StandardAIResponse:
         """Consulta a un proveedor específico con timeout"""
         try:
-            # Aplicar timeout a toda la operación
+            # El deadline se propaga al adaptador para que sus reintentos no lo excedan;
+            # wait_for queda como red de seguridad
+            deadline = time.monotonic() + timeout_seconds
             return await asyncio.wait_for(
-                self._query_single_provider(provider, query_request, context_text),
+                self._query_single_provider(provider, query_request, context_text, deadline),
                 timeout=timeout_seconds
             )
         except asyncio.TimeoutError:
@@ -455,7 +449,8 @@ class QueryService:
         self,
         provider: AIProviderEnum,
         query_request: QueryRequest,
-        context_text: str
+        context_text: str,
+        deadline: Optional[float] = None
     ) -> StandardAIResponse:
         """Consulta a un proveedor específico"""
         try:
@@ -483,7 +478,8 @@ class QueryService:
                 temperature=query_request.temperature,
                 user_id=str(query_request.user_id) if query_request.user_id else None,
                 project_id=str(query_request.project_id),
-                conversation_id=query_request.conversation_id
+                conversation_id=query_request.conversation_id,
+                deadline=deadline
             )
             
             # 4. Ejecutar consulta
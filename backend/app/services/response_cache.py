@@ -0,0 +1,260 @@
+"""
+Caché de respuestas de proveedores de IA.
+
+Evita reenviar a los proveedores solicitudes idénticas (reintentos del usuario,
+doble envío, `retry_single_ai`...). Dos modos de búsqueda:
+
+- Exacto: clave = hash canónico del payload de `_build_payload` + proveedor.
+- Semántico (opcional): mismas opciones (modelo, temperatura, system message,
+  max_tokens) y similitud coseno del prompt >= umbral.
+
+Las entradas caducan por TTL y el tamaño está acotado con política LRU.
+Solo se guardan respuestas exitosas.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.ai_response import AIProviderEnum, AIRequest, StandardAIResponse
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+
+def _provider_key(provider: Union[AIProviderEnum, str]) -> str:
+    return provider.value if isinstance(provider, AIProviderEnum) else str(provider)
+
+
+def _canonical_hash(data: Dict[str, Any]) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _CacheEntry:
+    response: StandardAIResponse
+    expires_at: float
+    options_key: str
+    embedding: Optional[np.ndarray] = None
+
+
+@dataclass
+class CacheLookup:
+    """Resultado de una búsqueda en caché"""
+    key: str
+    options_key: str
+    response: Optional[StandardAIResponse] = None
+    mode: Optional[str] = None  # "exact" | "semantic"
+    embedding: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @property
+    def hit(self) -> bool:
+        return self.response is not None
+
+
+class ResponseCache:
+    """Caché LRU con TTL para respuestas de proveedores de IA"""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 300,
+        semantic_threshold: Optional[float] = None,
+        embedder: Optional[Embedder] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+        # Métricas
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic_threshold is not None and self.embedder is not None
+
+    # ---------------------------------------------------------------- claves
+
+    def make_key(self, provider: Union[AIProviderEnum, str], payload: Dict[str, Any], request: AIRequest) -> str:
+        """Clave exacta: hash canónico del payload que se enviaría al proveedor, por proyecto y usuario"""
+        return _canonical_hash({
+            "provider": _provider_key(provider),
+            "project_id": request.project_id,
+            "user_id": request.user_id,
+            "payload": payload,
+        })
+
+    def make_options_key(
+        self,
+        provider: Union[AIProviderEnum, str],
+        request: AIRequest,
+        model: Optional[str] = None,
+    ) -> str:
+        """Clave de todo lo que no es el prompt; el modo semántico solo compara dentro de ella"""
+        return _canonical_hash({
+            "provider": _provider_key(provider),
+            "model": model,
+            # Ni el modo semántico reutiliza respuestas de otro proyecto o usuario
+            "project_id": request.project_id,
+            "user_id": request.user_id,
+            "system_message": request.system_message,
+            "temperature": request.temperature,
+            "max_tokens": request.max_tokens,
+            # Una síntesis estructurada (JSON) nunca reutiliza una en Markdown
+            "response_schema": request.response_schema,
+            "response_schema_name": request.response_schema_name,
+        })
+
+    # ------------------------------------------------------------- búsqueda
+
+    def _get_fresh(self, key: str) -> Optional[_CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def lookup(
+        self,
+        provider: Union[AIProviderEnum, str],
+        payload: Dict[str, Any],
+        request: AIRequest,
+        model: Optional[str] = None,
+        read: bool = True,
+    ) -> CacheLookup:
+        """
+        Busca una respuesta, primero por clave exacta y luego por similitud.
+        Con `read=False` solo prepara las claves para guardar la respuesta nueva.
+        """
+        result = CacheLookup(
+            key=self.make_key(provider, payload, request),
+            options_key=self.make_options_key(provider, request, model),
+        )
+
+        if not read:
+            if self.semantic_enabled:
+                result.embedding = await self._embed(request.prompt)
+            return result
+
+        entry = self._get_fresh(result.key)
+        if entry is not None:
+            self.hits += 1
+            result.response, result.mode = entry.response, "exact"
+            return result
+
+        if self.semantic_enabled:
+            result.embedding = await self._embed(request.prompt)
+            key = self._find_similar(result.options_key, result.embedding) if result.embedding is not None else None
+            entry = self._get_fresh(key) if key else None
+            if entry is not None:
+                self.hits += 1
+                self.semantic_hits += 1
+                result.response, result.mode = entry.response, "semantic"
+                return result
+
+        self.misses += 1
+        return result
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embedder(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo generar embedding para la caché semántica: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _find_similar(self, options_key: str, embedding: np.ndarray) -> Optional[str]:
+        candidates = [
+            (key, entry.embedding) for key, entry in self._entries.items()
+            if entry.options_key == options_key and entry.embedding is not None
+        ]
+        if not candidates:
+            return None
+        similarities = np.stack([vector for _, vector in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.semantic_threshold:
+            return candidates[best][0]
+        return None
+
+    # ----------------------------------------------------------- escritura
+
+    def store(self, lookup: CacheLookup, response: StandardAIResponse) -> None:
+        """Guarda una respuesta exitosa bajo la clave de la búsqueda previa"""
+        self._entries[lookup.key] = _CacheEntry(
+            response=response,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            options_key=lookup.options_key,
+            embedding=lookup.embedding,
+        )
+        self._entries.move_to_end(lookup.key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "semantic_enabled": self.semantic_enabled,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+_embedding_client = None
+
+
+async def _openai_embedder(text: str) -> List[float]:
+    """Embedder por defecto para el modo semántico (mismo modelo que el contexto)"""
+    from openai import AsyncOpenAI
+    from app.services.outbound_scheduler import outbound_scheduler, count_tokens
+
+    global _embedding_client
+    if _embedding_client is None:
+        _embedding_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    async with outbound_scheduler.slot(AIProviderEnum.OPENAI, estimated_tokens=count_tokens(text)):
+        response = await _embedding_client.embeddings.create(
+            model="text-embedding-3-small",
+            input=text
+        )
+    return response.data[0].embedding
+
+# Instancia global de la caché
+response_cache = ResponseCache(
+    max_entries=settings.AI_RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AI_RESPONSE_CACHE_TTL_SECONDS,
+    semantic_threshold=(
+        settings.AI_RESPONSE_CACHE_SEMANTIC_THRESHOLD
+        if settings.AI_RESPONSE_CACHE_SEMANTIC_ENABLED else None
+    ),
+    embedder=_openai_embedder if settings.AI_RESPONSE_CACHE_SEMANTIC_ENABLED else None,
+)
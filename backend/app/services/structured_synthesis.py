@@ -0,0 +1,169 @@
+"""
+Síntesis estructurada del moderador.
+
+En lugar de pedir Markdown y extraer los componentes con varias pasadas de
+`split`/`startswith`/regex, se pide al LLM un objeto JSON restringido por
+esquema (OpenAI `response_format`, Anthropic tool-use). El objeto se valida una
+sola vez y los componentes se leen directamente de sus campos; el Markdown para
+el usuario se genera a partir de él solo cuando hace falta.
+"""
+
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.core import fast_json
+
+
+class AIClaims(BaseModel):
+    ai: str
+    claims: List[str] = Field(default_factory=list)
+
+
+class ConsensusPoint(BaseModel):
+    point: str
+    supported_by: List[str] = Field(default_factory=list)
+
+
+class AIEmphasis(BaseModel):
+    ai: str
+    focus: str
+
+
+class ValidationCheck(BaseModel):
+    check: str
+    passed: bool
+
+
+class StructuredSynthesis(BaseModel):
+    """Meta-análisis v2.0 como datos (mismas secciones que el formato Markdown)"""
+    summary: str = ""
+    key_recommendation: str = ""
+    key_themes: List[str] = Field(default_factory=list)
+    claims_by_ai: List[AIClaims] = Field(default_factory=list)
+    consensus: List[ConsensusPoint] = Field(default_factory=list)
+    contradictions: List[str] = Field(default_factory=list)
+    emphasis_by_ai: List[AIEmphasis] = Field(default_factory=list)
+    omissions: List[str] = Field(default_factory=list)
+    suggested_questions: List[str] = Field(default_factory=list)
+    research_areas: List[str] = Field(default_factory=list)
+    connections: List[str] = Field(default_factory=list)
+    self_validation: List[ValidationCheck] = Field(default_factory=list)
+
+    _markdown: Optional[str] = PrivateAttr(default=None)
+
+    def meta_analysis_quality(self) -> str:
+        """Completitud del checklist, con los mismos umbrales que el formato Markdown"""
+        checks = len(self.self_validation)
+        if checks >= 6:
+            return "complete"
+        if checks >= 4:
+            return "partial"
+        return "incomplete"
+
+    def to_components(self) -> Dict[str, Any]:
+        """Componentes con la misma forma que `AIModerator._extract_synthesis_components`"""
+        return {
+            "key_themes": self.key_themes + [item.focus for item in self.emphasis_by_ai if item.focus],
+            "contradictions": list(self.contradictions),
+            "consensus_areas": [item.point for item in self.consensus],
+            "source_references": {item.ai: list(item.claims) for item in self.claims_by_ai},
+            "recommendations": [self.key_recommendation] if self.key_recommendation else [],
+            "suggested_questions": list(self.suggested_questions),
+            "research_areas": list(self.research_areas),
+            "connections": list(self.connections),
+            "meta_analysis_quality": self.meta_analysis_quality()
+        }
+
+    def to_markdown(self) -> str:
+        """Renderiza el meta-análisis en el formato Markdown v2.0 (se calcula una sola vez)"""
+        if self._markdown is None:
+            self._markdown = self._render_markdown()
+        return self._markdown
+
+    def _render_markdown(self) -> str:
+        def bullets(items: List[str], empty: str) -> List[str]:
+            return [f"- {item}" for item in items] or [f"- {empty}"]
+
+        lines = ["## 1. Resumen Conciso General y Recomendación Clave"]
+        lines.append(f"- {self.summary}" if self.summary else "- Las respuestas ofrecen perspectivas diversas sin un único tema central dominante.")
+        if self.key_recommendation:
+            lines.append(f"- **Recomendación Clave para Avanzar**: {self.key_recommendation}")
+
+        lines += ["", "## 2. Comparación Estructurada de Contribuciones de las IAs", "", "### 2.a. Afirmaciones Clave por IA:"]
+        for item in self.claims_by_ai:
+            lines.append(f"**[AI_Modelo_{item.ai}] dice:**")
+            lines += [f"- {claim}" for claim in item.claims]
+
+        lines += ["", "### 2.b. Puntos de Consenso Directo:"]
+        lines += [
+            f"- {item.point} (Apoyado por: {', '.join(f'[AI_Modelo_{ai}]' for ai in item.supported_by)})"
+            for item in self.consensus
+        ] or ["- No se identificaron puntos de consenso directo fuerte entre las respuestas."]
+
+        lines += ["", "### 2.c. Contradicciones Factuales Evidentes:"]
+        lines += bullets(self.contradictions, "No se identificaron contradicciones factuales evidentes en los datos presentados.")
+
+        lines += ["", "### 2.d. Mapeo de Énfasis y Cobertura Temática Diferencial:"]
+        lines += [f"**[AI_Modelo_{item.ai}]:** {item.focus}" for item in self.emphasis_by_ai]
+        if self.omissions:
+            lines.append(f"- **Omisiones Notables:** {'; '.join(self.omissions)}")
+
+        lines += ["", "## 3. Puntos de Interés para Exploración (Accionables)", "", "### 3.a. Preguntas Sugeridas para Clarificación o Profundización:"]
+        lines += [f"- Pregunta Sugerida {i}: {question}" for i, question in enumerate(self.suggested_questions, 1)]
+
+        lines += ["", "### 3.b. Áreas Potenciales para Mayor Investigación:"]
+        lines += [f"- Área de Exploración {i}: {area}" for i, area in enumerate(self.research_areas, 1)]
+
+        if self.connections:
+            lines += ["", "### 3.c. Conexiones Implícitas Simples:"]
+            lines += [f"- Posible Conexión a Explorar: {connection}" for connection in self.connections]
+
+        lines += ["", "## 4. Auto-Validación Interna de esta Síntesis (Checklist):"]
+        lines += [f"- {item.check}: {'✅' if item.passed else '❌'}" for item in self.self_validation]
+
+        return "\n".join(lines)
+
+
+def _strict_schema(model: type) -> Dict[str, Any]:
+    """
+    JSON schema sin referencias y con todos los campos obligatorios, como exige
+    el modo estricto de `response_format` de OpenAI.
+    """
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def resolve(node: Any) -> Any:
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(definitions[node["$ref"].split("/")[-1]])
+            node = {key: resolve(value) for key, value in node.items() if key not in ("title", "default")}
+            if node.get("type") == "object":
+                node["required"] = list(node.get("properties", {}))
+                node["additionalProperties"] = False
+            return node
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        return node
+
+    return resolve(schema)
+
+
+SYNTHESIS_SCHEMA_NAME = "meta_analysis"
+SYNTHESIS_JSON_SCHEMA: Dict[str, Any] = _strict_schema(StructuredSynthesis)
+
+
+def parse_structured_synthesis(data: Union[Dict[str, Any], str, bytes]) -> StructuredSynthesis:
+    """
+    Valida la salida estructurada del LLM (ya parseada o como texto JSON).
+    Lanza ValueError si no es un meta-análisis válido.
+    """
+    if isinstance(data, (str, bytes)):
+        text = data.strip() if isinstance(data, str) else data
+        if isinstance(text, str) and text.startswith("```"):
+            # Algunos modelos envuelven el JSON en un bloque de código
+            text = text.strip("`").removeprefix("json").strip()
+        data = fast_json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("La salida estructurada no es un objeto JSON")
+    return StructuredSynthesis.model_validate(data)
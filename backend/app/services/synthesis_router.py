@@ -0,0 +1,148 @@
+"""
+Enrutado de la síntesis del moderador.
+
+Antes de llamar al LLM de síntesis se mide, de forma barata, cuánto coinciden
+las respuestas de los proveedores (similitud coseno entre sus embeddings,
+calculada en bloque con numpy) y cuánto contenido hay que sintetizar:
+
+- Respuestas casi idénticas: no hace falta meta-análisis ("skip").
+- Poco contenido que sintetizar: presupuesto pequeño y modelo rápido ("fast").
+- Resto: síntesis completa con un presupuesto de tokens proporcional ("full").
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.ai_response import AIProviderEnum, StandardAIResponse
+from app.services.llm_client import get_async_openai_client
+from app.services.outbound_scheduler import count_tokens, outbound_scheduler
+
+logger = logging.getLogger(__name__)
+
+BatchEmbedder = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+# Caracteres de cada respuesta que se usan para medir el acuerdo
+_AGREEMENT_TEXT_CHARS = 4000
+
+
+@dataclass
+class SynthesisRoute:
+    """Decisión de enrutado para una síntesis"""
+    mode: str  # "skip" | "fast" | "full"
+    max_tokens: int
+    agreement_min: Optional[float] = None
+    agreement_mean: Optional[float] = None
+    content_tokens: int = 0
+
+    @property
+    def skip(self) -> bool:
+        return self.mode == "skip"
+
+    @property
+    def fast(self) -> bool:
+        return self.mode == "fast"
+
+
+class SynthesisRouter:
+    """Decide si sintetizar, con qué presupuesto de tokens y con qué modelo"""
+
+    def __init__(
+        self,
+        embedder: Optional[BatchEmbedder] = None,
+        skip_agreement: float = 0.97,
+        min_tokens: int = 400,
+        max_tokens: int = 1200,
+        fast_max_tokens: int = 700,
+        reference_tokens: int = 3000,
+        full_divergence: float = 0.25
+    ):
+        self.embedder = embedder
+        self.skip_agreement = skip_agreement
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.fast_max_tokens = fast_max_tokens
+        self.reference_tokens = reference_tokens
+        self.full_divergence = full_divergence
+
+    async def route(self, responses: List[StandardAIResponse]) -> SynthesisRoute:
+        """Ruta para un conjunto de respuestas exitosas (al menos dos)"""
+        texts = [response.response_text for response in responses]
+        content_tokens = sum(count_tokens(text) for text in texts)
+        agreement = await self.agreement(texts)
+        agreement_min, agreement_mean = agreement if agreement else (None, None)
+
+        if agreement_min is not None and agreement_min >= self.skip_agreement:
+            mode, max_tokens = "skip", 0
+        else:
+            max_tokens = self.budget(content_tokens, agreement_mean)
+            mode = "fast" if max_tokens <= self.fast_max_tokens else "full"
+
+        return SynthesisRoute(
+            mode=mode,
+            max_tokens=max_tokens,
+            agreement_min=agreement_min,
+            agreement_mean=agreement_mean,
+            content_tokens=content_tokens
+        )
+
+    async def agreement(self, texts: List[str]) -> Optional[Tuple[float, float]]:
+        """
+        Similitud coseno mínima y media entre todos los pares de respuestas.
+        Devuelve None si no hay embedder o falla (se asume divergencia).
+        """
+        if self.embedder is None or len(texts) < 2:
+            return None
+        try:
+            vectors = await self.embedder([text[:_AGREEMENT_TEXT_CHARS] for text in texts])
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo medir el acuerdo entre respuestas: {e}")
+            return None
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        if matrix.shape[0] != len(texts) or not np.all(norms > 0):
+            return None
+
+        matrix /= norms
+        pairs = (matrix @ matrix.T)[np.triu_indices(len(texts), k=1)]
+        return float(pairs.min()), float(pairs.mean())
+
+    def budget(self, content_tokens: int, agreement_mean: Optional[float]) -> int:
+        """max_tokens según el volumen de contenido y la divergencia entre respuestas"""
+        size_factor = min(1.0, content_tokens / self.reference_tokens)
+        if agreement_mean is None:
+            divergence_factor = 1.0
+        else:
+            divergence_factor = min(1.0, max(0.0, 1.0 - agreement_mean) / self.full_divergence)
+
+        # El volumen marca el techo; la divergencia decide cuánto de él se usa
+        # (respuestas que coinciden se resumen en la mitad de tokens)
+        budget = self.min_tokens + (self.max_tokens - self.min_tokens) * size_factor * (0.5 + divergence_factor / 2)
+        # Redondeo a múltiplos de 50 para que las solicitudes repetidas compartan caché
+        return int(min(self.max_tokens, max(self.min_tokens, round(budget / 50) * 50)))
+
+
+async def openai_batch_embedder(texts: List[str]) -> List[List[float]]:
+    """Embeddings de todas las respuestas en una sola llamada"""
+    estimated_tokens = sum(count_tokens(text) for text in texts)
+    async with outbound_scheduler.slot(AIProviderEnum.OPENAI, estimated_tokens=estimated_tokens):
+        response = await get_async_openai_client().embeddings.create(
+            model="text-embedding-3-small",
+            input=texts
+        )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+# Instancia global del enrutador
+synthesis_router = SynthesisRouter(
+    embedder=openai_batch_embedder if settings.OPENAI_API_KEY else None,
+    skip_agreement=settings.SYNTHESIS_SKIP_AGREEMENT,
+    min_tokens=settings.SYNTHESIS_MIN_TOKENS,
+    max_tokens=settings.SYNTHESIS_MAX_TOKENS,
+    fast_max_tokens=settings.SYNTHESIS_FAST_MAX_TOKENS,
+    reference_tokens=settings.SYNTHESIS_REFERENCE_TOKENS,
+)
@@ -128,16 +128,18 @@ async def debug_context_flow():
         # Buscar contexto manualmente para debug
         query_embedding = await context_manager.generate_embedding(query_request.user_question)
         
-        from app.crud.context import find_similar_chunks_sync
+        from app.core.database import async_session_factory
+        from app.crud.context import find_similar_chunks
         
-        chunks = find_similar_chunks_sync(
-            db=session,
-            query_embedding=query_embedding,
-            project_id=project_id,
-            user_id=user_id,
-            top_k=5,
-            similarity_threshold=None  # Sin umbral para ver todos
-        )
+        async with async_session_factory() as async_db:
+            chunks = await find_similar_chunks(
+                db=async_db,
+                query_embedding=query_embedding,
+                project_id=project_id,
+                user_id=user_id,
+                top_k=5,
+                similarity_threshold=None  # Sin umbral para ver todos
+            )
         
         print(f"📊 Chunks encontrados: {len(chunks)}")
         
@@ -158,7 +160,7 @@ async def debug_context_flow():
         
         # Ahora ejecutar la consulta completa
         print("\n🚀 Ejecutando consulta completa...")
-        response = await query_service.process_query(query_request, session)
+        response = await query_service.process_query(query_request)
         
         print(f"\n📋 Resultado:")
         print(f"Context info: {response.context_info}")
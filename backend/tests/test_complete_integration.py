@@ -156,7 +156,7 @@ async def test_complete_integration_flow():
         )
         
         try:
-            response = await query_service.process_query(query_request, session)
+            response = await query_service.process_query(query_request)
             
             print("\n📋 Resultados de la consulta:")
             print(f"   ⏱️  Tiempo total: {response.processing_time_ms}ms")
@@ -0,0 +1,149 @@
+"""
+Pruebas del historial de sesiones de construcción de contexto en context_messages
+Verificación de que cada turno solo inserta las filas nuevas (sin reescribir el
+historial), de la reserva de seq en la fila de la sesión y de la lectura
+paginada por seq
+"""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql
+
+from app.crud import context_session as context_crud
+from app.models.context_session import ContextMessage
+from app.models.models import ContextSessionMessage, InteractionEvent
+
+
+def _session(message_count=0):
+    return InteractionEvent(
+        id=uuid4(),
+        project_id=uuid4(),
+        user_id=uuid4(),
+        user_prompt_text="Iniciando construcción de contexto",
+        interaction_type="context_building",
+        session_status="active",
+        message_count=message_count,
+        created_at=datetime.utcnow()
+    )
+
+
+def _stored(session_id, seq):
+    return ContextSessionMessage(
+        session_id=session_id,
+        seq=seq,
+        role="user" if seq % 2 else "assistant",
+        content=f"Mensaje {seq}",
+        message_type="information",
+        created_at=datetime(2026, 10, 19, 12, 0, seq % 60)
+    )
+
+
+@pytest.fixture
+def db():
+    db = Mock()
+    db.add = Mock()
+    db.flush = AsyncMock()
+    db.commit = AsyncMock()
+    db.refresh = AsyncMock()
+    db.execute = AsyncMock()
+    return db
+
+
+class TestAppendMessages:
+    """Cada turno es una reserva de seq y una inserción de filas nuevas"""
+
+    async def test_turn_inserts_only_new_rows(self, db):
+        session = _session(message_count=40)
+        db.execute.side_effect = [Mock(scalar_one=Mock(return_value=42)), Mock()]
+        messages = [
+            ContextMessage(role="user", content="Vendemos por internet", timestamp=datetime.utcnow(), message_type="information"),
+            ContextMessage(role="assistant", content="¿Cuál es tu público?", timestamp=datetime.utcnow(), message_type="question"),
+        ]
+
+        updated = await context_crud.append_context_messages(db, session, messages, "Tienda online")
+
+        reserve, insert = db.execute.await_args_list
+        sql = str(reserve.args[0].compile(dialect=postgresql.dialect()))
+        assert sql.startswith("UPDATE interaction_events SET")
+        assert "message_count=(interaction_events.message_count + " in sql
+        assert "RETURNING interaction_events.message_count" in sql
+        assert "ai_responses_json" not in sql
+
+        rows = insert.args[1]
+        assert [(row["seq"], row["role"]) for row in rows] == [(41, "user"), (42, "assistant")]
+        assert all(row["session_id"] == session.id for row in rows)
+        assert updated.message_count == 42
+        assert updated.context_used_summary == "Tienda online"
+        db.commit.assert_awaited_once()
+        # Un flush posterior no vuelve a escribir message_count
+        state = inspect(updated)
+        assert not state.attrs.message_count.history.has_changes()
+        assert not state.attrs.context_used_summary.history.has_changes()
+
+    async def test_update_context_session_appends_one_message(self, db):
+        session = _session(message_count=3)
+        db.execute.side_effect = [Mock(scalar_one=Mock(return_value=4)), Mock()]
+        message = ContextMessage(role="assistant", content="Entendido", timestamp=datetime.utcnow())
+
+        await context_crud.update_context_session(db, session, message, "contexto")
+
+        rows = db.execute.await_args_list[1].args[1]
+        assert [row["seq"] for row in rows] == [4]
+
+    async def test_create_session_stores_initial_message(self, db):
+        project_id, user_id = uuid4(), uuid4()
+
+        session = await context_crud.create_context_session(db, project_id, user_id, "Necesito ayuda con mi startup")
+
+        added = [call.args[0] for call in db.add.call_args_list]
+        assert added[0] is session and session.ai_responses_json is None
+        assert session.message_count == 1
+        assert isinstance(added[1], ContextSessionMessage)
+        assert (added[1].session_id, added[1].seq, added[1].content) == (session.id, 1, "Necesito ayuda con mi startup")
+        db.flush.assert_awaited_once()
+
+
+class TestReadMessages:
+    """Lectura del historial en orden y por lotes"""
+
+    async def test_get_messages_paginates_by_seq(self, db):
+        db.execute.return_value = Mock(scalars=Mock(return_value=Mock(all=Mock(return_value=[]))))
+
+        await context_crud.get_context_messages(db, uuid4(), after_seq=50, limit=25)
+
+        sql = str(db.execute.await_args.args[0].compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        ))
+        assert "context_messages.seq > 50" in sql
+        assert "ORDER BY context_messages.seq" in sql
+        assert "LIMIT 25" in sql and "OFFSET" not in sql
+
+    async def test_stream_reads_in_batches(self, monkeypatch):
+        session_id = uuid4()
+        stored = [_stored(session_id, seq) for seq in range(1, 6)]
+        calls = []
+
+        async def fake_get(db, sid, after_seq=0, limit=None):
+            calls.append(after_seq)
+            return [m for m in stored if m.seq > after_seq][:limit]
+
+        monkeypatch.setattr(context_crud, "get_context_messages", fake_get)
+
+        streamed = [message.seq async for message in context_crud.stream_context_messages(None, session_id, batch_size=2)]
+
+        assert streamed == [1, 2, 3, 4, 5]
+        assert calls == [0, 2, 4]
+
+    def test_convert_uses_stored_messages(self):
+        session = _session(message_count=2)
+        session.ai_responses_json = {"responses": []}  # Respuestas de las IAs, no historial
+        stored = [_stored(session.id, 1), _stored(session.id, 2)]
+
+        model = context_crud.convert_interaction_to_context_session(session, stored)
+
+        assert [m.content for m in model.conversation_history] == ["Mensaje 1", "Mensaje 2"]
+        assert [m.role for m in model.conversation_history] == ["user", "assistant"]
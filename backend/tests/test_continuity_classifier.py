@@ -0,0 +1,235 @@
+"""
+Pruebas del clasificador local de continuidad conversacional
+Verificación de la expresión precompilada, la combinación con la similitud
+semántica, la calibración de la banda de ambigüedad y el uso del LLM solo
+dentro de esa banda desde FollowUpInterpreter
+"""
+
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+import numpy as np
+
+import app.services.followup_interpreter as interpreter_module
+from app.services.continuity_classifier import ContinuityClassifier
+from app.services.followup_interpreter import FollowUpInterpreter
+from app.models.models import InteractionEvent, ModeratedSynthesis
+
+
+PREVIOUS_PROMPT = "Necesito ayuda para planear un viaje de 5 días a Cuba con mi esposa"
+PREVIOUS_SYNTHESIS = (
+    "Para un viaje de 5 días a Cuba en pareja, te recomiendo visitar La Habana, Viñales y Varadero. "
+    "El presupuesto estimado del viaje incluye vuelos, hoteles y comidas."
+)
+
+# Consultas etiquetadas (consulta, es_continuación) tras PREVIOUS_PROMPT
+LABELED_QUERIES = [
+    ("¿Y si fuéramos con niños?", True),
+    ("Dame más detalles sobre eso", True),
+    ("Mejora la respuesta anterior", True),
+    ("Amplía lo que dijiste sobre Varadero", True),
+    ("Los últimos 3 hoteles que mencionaste", True),
+    ("Resume el presupuesto", True),
+    ("¿Qué hoteles hay en Varadero para el viaje a Cuba?", True),
+    ("¿Cuánto cuesta el viaje a La Habana en pareja?", True),
+    ("Ahora quiero información sobre programación en Python", False),
+    ("Cambio de tema: ¿cómo configuro PostgreSQL?", False),
+    ("Por otro lado, necesito una receta de paella", False),
+    ("¿Cómo se instala Docker en Ubuntu?", False),
+    ("Explícame la diferencia entre TCP y UDP", False),
+    ("¿Cuál es la capital de Australia?", False),
+]
+
+
+async def hashing_embedder(texts):
+    """Embedder local determinista: bolsa de palabras proyectada por hash"""
+    vectors = np.zeros((len(texts), 512), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w{4,}", text.lower()):
+            vectors[row, zlib.crc32(word.encode()) % 512] += 1.0
+    return vectors.tolist()
+
+
+def _interpreter(classifier, monkeypatch):
+    monkeypatch.setattr(interpreter_module, "continuity_classifier", classifier)
+    interaction = InteractionEvent(
+        id=uuid4(),
+        project_id=uuid4(),
+        user_id=uuid4(),
+        user_prompt_text=PREVIOUS_PROMPT,
+        ai_responses_json="{}",
+        created_at=datetime.now(timezone.utc)
+    )
+    synthesis = ModeratedSynthesis(id=uuid4(), synthesis_text=PREVIOUS_SYNTHESIS)
+    result = Mock()
+    result.first.side_effect = lambda: interaction.id if result.first.call_count == 1 else (interaction, synthesis)
+    db = AsyncMock()
+    db.exec = AsyncMock(return_value=result)
+
+    interpreter = FollowUpInterpreter(db)
+    interpreter._analyze_with_llm = AsyncMock(return_value={
+        "is_continuation": True,
+        "reference_type": "clarification",
+        "confidence": 0.7,
+        "keywords": []
+    })
+    return interpreter, interaction, result
+
+
+class TestLexicalPass:
+    """Pruebas de la expresión precompilada"""
+
+    def test_categories(self):
+        classifier = ContinuityClassifier()
+
+        assert classifier.lexical("Dame más detalles sobre eso").category == "strong"
+        assert classifier.lexical("¿Y si fuéramos con niños?").category == "strong"
+        assert classifier.lexical("Ahora quiero hablar de Python").category == "new_topic"
+        assert classifier.lexical("¿Hay otra opción más barata?").category == "weak"
+        assert classifier.lexical("Modifícalo para tres personas").category == "implicit"
+        assert classifier.lexical("Varadero").category == "short"
+        assert classifier.lexical("¿Cómo se instala Docker en Ubuntu?").category is None
+
+    def test_whole_words_only(self):
+        classifier = ContinuityClassifier()
+
+        # "eso" dentro de "proceso" o "ya" dentro de "playa" no son referencias
+        assert classifier.lexical("Describe el proceso de compilación de un kernel").category is None
+        assert classifier.lexical("¿Qué playa de Cuba tiene arena blanca?").category is None
+
+    def test_new_topic_marker_wins(self):
+        signal = ContinuityClassifier().lexical("Por otro lado, mejora eso")
+
+        assert signal.category == "new_topic"
+        assert signal.keywords == ["por otro lado"]
+
+    def test_needs_history(self):
+        classifier = ContinuityClassifier()
+
+        assert classifier.needs_history("Dame los 4 mejores")
+        assert classifier.needs_history("Resume lo anterior")
+        assert not classifier.needs_history("¿Qué es Python?")
+        assert not classifier.needs_history("Cambio de tema: recetas de paella")
+
+    def test_lexical_pass_is_fast(self):
+        classifier = ContinuityClassifier()
+        queries = [query for query, _ in LABELED_QUERIES] * 200
+
+        start = time.perf_counter()
+        for query in queries:
+            classifier.classify_lexical(query)
+        per_query_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+        print(f"\nPasada léxica: {per_query_us:.1f}µs por consulta")
+        assert per_query_us < 200
+
+
+class TestSemanticPass:
+    """Pruebas de la combinación con la similitud semántica"""
+
+    async def test_similarity_resolves_ambiguous_queries(self):
+        classifier = ContinuityClassifier(embedder=hashing_embedder)
+        previous = f"{PREVIOUS_PROMPT}\n{PREVIOUS_SYNTHESIS}"
+
+        related = await classifier.classify_semantic(
+            "¿Qué hoteles hay en Varadero para el viaje a Cuba?", previous,
+            classifier.classify_lexical("¿Qué hoteles hay en Varadero para el viaje a Cuba?")
+        )
+        unrelated = await classifier.classify_semantic(
+            "¿Cuál es la capital de Australia?", previous,
+            classifier.classify_lexical("¿Cuál es la capital de Australia?")
+        )
+
+        assert related.stage == unrelated.stage == "embedding"
+        assert related.is_continuation and not related.ambiguous
+        assert not unrelated.is_continuation and not unrelated.ambiguous
+
+    async def test_embedder_failure_keeps_lexical_decision(self):
+        async def failing(texts):
+            raise RuntimeError("sin red")
+
+        classifier = ContinuityClassifier(embedder=failing)
+        lexical = classifier.classify_lexical("¿Cuál es la capital de Australia?")
+
+        assert await classifier.classify_semantic("¿Cuál es la capital de Australia?", PREVIOUS_PROMPT, lexical) is lexical
+
+    def test_calibrate_band(self):
+        classifier = ContinuityClassifier()
+        samples = [(0.1, False), (0.2, False), (0.3, False), (0.4, True), (0.45, False),
+                   (0.55, False), (0.6, True), (0.7, True), (0.8, True), (0.9, True)]
+
+        band_low, band_high = classifier.calibrate(samples, target_precision=0.9)
+
+        assert (band_low, band_high) == (0.3, 0.6)
+        assert classifier.in_band(0.45) and classifier.in_band(0.55)
+        assert not classifier.in_band(0.3) and not classifier.in_band(0.6)
+
+
+class TestInterpreterFastPath:
+    """FollowUpInterpreter solo llama al LLM dentro de la banda de ambigüedad"""
+
+    async def test_strong_reference_resolves_without_loading_history(self, monkeypatch):
+        interpreter, interaction, result = _interpreter(ContinuityClassifier(), monkeypatch)
+
+        analysis = await interpreter.analyze_query_continuity("Dame más detalles sobre eso", uuid4(), uuid4())
+
+        assert analysis.is_continuation
+        assert analysis.resolution_stage == "lexical"
+        assert analysis.previous_interaction_id == interaction.id
+        assert interpreter.db.exec.await_count == 1  # Solo el id de la última interacción
+        interpreter._analyze_with_llm.assert_not_awaited()
+
+    async def test_new_topic_marker(self, monkeypatch):
+        interpreter, _, _ = _interpreter(ContinuityClassifier(), monkeypatch)
+
+        analysis = await interpreter.analyze_query_continuity("Cambio de tema: recetas de paella", uuid4(), uuid4())
+
+        assert not analysis.is_continuation
+        assert analysis.previous_interaction_id is None
+
+    async def test_llm_only_in_ambiguity_band(self, monkeypatch):
+        monkeypatch.setattr(interpreter_module.settings, "FOLLOWUP_LLM_FALLBACK_ENABLED", True)
+        # Sin embedder, una consulta sin marcas queda en la banda
+        interpreter, _, _ = _interpreter(ContinuityClassifier(), monkeypatch)
+
+        analysis = await interpreter.analyze_query_continuity("¿Cómo se instala Docker en Ubuntu?", uuid4(), uuid4())
+
+        assert analysis.resolution_stage == "llm"
+        interpreter._analyze_with_llm.assert_awaited_once()
+
+    async def test_ambiguous_query_keeps_default_continuity(self, monkeypatch):
+        # Por defecto (sin embedder ni LLM) no hay llamadas de red ni se carga la interacción
+        monkeypatch.setattr(interpreter_module.settings, "FOLLOWUP_LLM_FALLBACK_ENABLED", False)
+        classifier = ContinuityClassifier()
+        interpreter, interaction, _ = _interpreter(classifier, monkeypatch)
+
+        analysis = await interpreter.analyze_query_continuity("¿Cómo se instala Docker en Ubuntu?", uuid4(), uuid4())
+
+        assert analysis.is_continuation
+        assert analysis.resolution_stage == "default"
+        assert analysis.previous_interaction_id == interaction.id
+        assert (analysis.confidence_score, analysis.contextual_keywords) == (0.8, ["continuidad_automatica"])
+        assert interpreter.db.exec.await_count == 1
+        interpreter._analyze_with_llm.assert_not_awaited()
+        assert classifier.get_stats()["resolutions"]["default"] == 1
+
+    async def test_local_resolution_rate(self, monkeypatch):
+        classifier = ContinuityClassifier(embedder=hashing_embedder)
+        correct = 0
+        for query, expected in LABELED_QUERIES:
+            interpreter, _, _ = _interpreter(classifier, monkeypatch)
+            analysis = await interpreter.analyze_query_continuity(query, uuid4(), uuid4())
+            correct += analysis.is_continuation == expected
+
+        stats = classifier.get_stats()
+        print(
+            f"\nResolución local: {stats['local_resolution_rate_percent']}% "
+            f"({stats['resolutions']}), aciertos {correct}/{len(LABELED_QUERIES)}"
+        )
+        assert stats["total"] == len(LABELED_QUERIES)
+        assert stats["local_resolution_rate_percent"] >= 80
+        assert correct >= len(LABELED_QUERIES) - 1
@@ -0,0 +1,94 @@
+"""
+Pruebas del dimensionado e instrumentación del pool de conexiones
+Verificación del reparto del límite de conexiones entre workers, de la medida
+de la espera de checkout (incluidos los timeouts con el pool agotado) y de la
+ocupación que se expone en /health/detailed
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.util import greenlet_spawn
+
+from app.core.db_pool import InstrumentedAsyncPool, PoolMonitor, resolve_pool_limits
+
+
+class TestResolvePoolLimits:
+    """pool_size y max_overflow por proceso"""
+
+    def test_environment_defaults(self):
+        assert resolve_pool_limits("development") == (5, 10)
+        assert resolve_pool_limits("production") == (10, 5)
+        assert resolve_pool_limits("staging") == (5, 10)
+
+    def test_explicit_values_win(self):
+        assert resolve_pool_limits("production", pool_size=20, max_overflow=0) == (20, 0)
+
+    def test_connection_limit_is_shared_by_workers(self):
+        # Plan de 97 conexiones, 5 reservadas y 4 workers: 23 por worker
+        size, overflow = resolve_pool_limits(
+            "production", pool_size=20, max_overflow=10,
+            max_connections=97, reserved_connections=5, workers=4
+        )
+        assert (size, overflow) == (20, 3)
+        assert (size + overflow) * 4 <= 97 - 5
+
+    def test_tiny_limit_keeps_one_connection(self):
+        assert resolve_pool_limits("production", max_connections=3, reserved_connections=5, workers=2) == (1, 0)
+
+
+def _pool(monitor, pool_size=1, max_overflow=1, timeout=0.05):
+    # El creator sustituye a asyncpg: no se abre ninguna conexión real
+    pool = InstrumentedAsyncPool(creator=Mock, pool_size=pool_size, max_overflow=max_overflow, timeout=timeout)
+    pool.monitor = monitor
+    monitor.attach(pool)
+    return pool
+
+
+class TestPoolMonitor:
+    """Esperas de checkout y ocupación del pool"""
+
+    async def test_checkouts_and_occupancy(self):
+        monitor = PoolMonitor()
+        pool = _pool(monitor)
+
+        first = await greenlet_spawn(pool.connect)
+        second = await greenlet_spawn(pool.connect)  # Conexión de overflow
+
+        stats = monitor.get_stats()
+        print(f"\nPool: {stats}")
+        assert stats["checkouts"] == 2 and stats["connects"] == 2
+        assert (stats["in_use"], stats["idle"], stats["overflow_in_use"]) == (2, 0, 1)
+        assert stats["capacity"] == 2 and stats["utilization"] == 1.0
+        assert stats["max_checkout_wait_ms"] >= 0
+
+        first.close()
+        second.close()
+        stats = monitor.get_stats()
+        assert (stats["in_use"], stats["idle"]) == (0, 1)
+        assert (stats["max_checked_out"], stats["max_overflow_used"]) == (2, 1)
+
+    async def test_exhausted_pool_counts_timeouts(self):
+        monitor = PoolMonitor()
+        pool = _pool(monitor, max_overflow=0)
+        held = await greenlet_spawn(pool.connect)
+
+        with pytest.raises(sa_exc.TimeoutError):
+            await greenlet_spawn(pool.connect)
+
+        held.close()
+        stats = monitor.get_stats()
+        assert stats["timeouts"] == 1
+        assert stats["checkouts"] == 1
+
+    def test_slow_checkouts(self):
+        monitor = PoolMonitor(slow_checkout_ms=50.0)
+
+        for wait_ms in (1.0, 2.0, 80.0):
+            monitor.record_wait(wait_ms)
+
+        stats = monitor.get_stats()
+        assert stats["slow_checkouts"] == 1
+        assert stats["max_checkout_wait_ms"] == 80.0
+        assert "pool_size" not in stats  # Sin engine asociado
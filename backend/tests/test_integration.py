@@ -5,7 +5,7 @@ from sqlmodel import Session, create_engine
 from sqlalchemy import text as sql_text
 from app.services.context_manager import ContextManager
 from app.core.config import settings
-from app.crud.context import create_context_chunk_sync, find_similar_chunks_sync
+from app.crud.context import create_context_chunk_sync, find_similar_chunks
 from app.schemas.context import ChunkCreate
 
 async def test_full_integration():
@@ -150,14 +150,16 @@ async def test_full_integration():
                 # Generar embedding para la query
                 query_embedding = await context_manager.generate_embedding(query)
                 
-                # Buscar chunks similares usando función síncrona
-                similar_chunks = find_similar_chunks_sync(
-                    session,
-                    query_embedding,
-                    project_id,
-                    top_k=3,
-                    similarity_threshold=None  # Eliminar umbral por ahora
-                )
+                # Buscar chunks similares con el engine async compartido
+                from app.core.database import async_session_factory
+                async with async_session_factory() as async_db:
+                    similar_chunks = await find_similar_chunks(
+                        async_db,
+                        query_embedding,
+                        project_id,
+                        top_k=3,
+                        similarity_threshold=None  # Eliminar umbral por ahora
+                    )
                 
                 print(f"   🎯 Resultados encontrados: {len(similar_chunks)} chunks")
                 
@@ -0,0 +1,158 @@
+"""
+Benchmark de los índices de las rutas calientes de interaction_events
+Genera 1M de filas en una tabla temporal con los índices del modelo y comprueba
+con EXPLAIN que cada consulta usa su índice compuesto/parcial sin ordenar en
+memoria. Requiere PostgreSQL (DATABASE_URL); sin base de datos se omite.
+"""
+
+import pytest
+import hashlib
+import json
+from uuid import UUID
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.models.models import InteractionEvent
+
+asyncpg = pytest.importorskip("asyncpg")
+
+ROWS = 1_000_000
+PROJECTS = 2_000
+
+HOT_PATH_INDEXES = (
+    "ix_interaction_events_live_history",
+    "ix_interaction_events_context_sessions",
+    "ix_interaction_events_active_context_session",
+)
+
+# Consultas de las rutas calientes, con parámetros como las emite el ORM
+HOT_QUERIES = {
+    "recent_history": (
+        "SELECT id, user_prompt_text, created_at FROM interaction_events "
+        "WHERE project_id = $1 AND user_id = $2 AND deleted_at IS NULL "
+        "ORDER BY created_at DESC LIMIT 10",
+        "ix_interaction_events_live_history",
+    ),
+    "most_recent_id": (
+        "SELECT id FROM interaction_events "
+        "WHERE project_id = $1 AND user_id = $2 AND deleted_at IS NULL "
+        "ORDER BY created_at DESC LIMIT 1",
+        "ix_interaction_events_live_history",
+    ),
+    "context_sessions": (
+        "SELECT id, updated_at FROM interaction_events "
+        "WHERE project_id = $1 AND user_id = $2 AND interaction_type = $3 AND deleted_at IS NULL "
+        "ORDER BY updated_at DESC LIMIT 10",
+        "ix_interaction_events_context_sessions",
+    ),
+    "active_context_session": (
+        "SELECT id FROM interaction_events "
+        "WHERE project_id = $1 AND user_id = $2 AND interaction_type = $3 "
+        "AND session_status = $4 AND deleted_at IS NULL "
+        "ORDER BY updated_at DESC",
+        "ix_interaction_events_active_context_session",
+    ),
+}
+
+# Proyecto y usuario de la fila i = 42 (mismo md5 que genera el INSERT)
+PROJECT_ID = UUID(hashlib.md5(b"project42").hexdigest())
+USER_ID = UUID(hashlib.md5(b"user42").hexdigest())
+QUERY_ARGS = (PROJECT_ID, USER_ID, "context_building", "active")
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.fixture
+async def populated_connection():
+    """Tabla temporal interaction_events (oculta la real) con 1M de filas"""
+    if not settings.DATABASE_URL:
+        pytest.skip("DATABASE_URL no configurado")
+    try:
+        connection = await asyncpg.connect(
+            settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"), timeout=3
+        )
+    except Exception as e:
+        pytest.skip(f"PostgreSQL no disponible: {e}")
+
+    try:
+        await connection.execute("""
+            CREATE TEMP TABLE interaction_events (
+                id uuid PRIMARY KEY,
+                project_id uuid NOT NULL,
+                user_id uuid NOT NULL,
+                user_prompt_text text NOT NULL,
+                created_at timestamptz NOT NULL,
+                updated_at timestamptz NOT NULL,
+                deleted_at timestamptz,
+                interaction_type varchar(50) NOT NULL,
+                session_status varchar(20)
+            )
+        """)
+        # Proyectos con su usuario propietario; ~5% borradas, ~10% sesiones de contexto
+        await connection.execute(f"""
+            INSERT INTO interaction_events
+            SELECT
+                gen_random_uuid(),
+                md5('project' || (i % {PROJECTS}))::uuid,
+                md5('user' || (i % {PROJECTS}))::uuid,
+                'Consulta ' || i,
+                now() - (i || ' seconds')::interval,
+                now() - ((i / 2) || ' seconds')::interval,
+                CASE WHEN i % 20 = 0 THEN now() END,
+                CASE WHEN i % 10 = 0 THEN 'context_building' ELSE 'final_query' END,
+                CASE WHEN i % 10 = 0 THEN (CASE WHEN i % 1000 = 0 THEN 'active' ELSE 'completed' END) END
+            FROM generate_series(1, {ROWS}) AS i
+        """)
+        # Índices de una sola columna previos a la migración
+        for column in ("project_id", "user_id", "created_at", "deleted_at"):
+            await connection.execute(f"CREATE INDEX ON interaction_events ({column})")
+        dialect = postgresql.dialect()
+        for index in InteractionEvent.__table__.indexes:
+            if index.name in HOT_PATH_INDEXES:
+                await connection.execute(str(CreateIndex(index).compile(dialect=dialect)))
+        await connection.execute("VACUUM ANALYZE interaction_events")
+        yield connection
+    finally:
+        await connection.close()
+
+
+async def _explain(connection, name):
+    sql, _ = HOT_QUERIES[name]
+    args = QUERY_ARGS[:sql.count("$")]
+    result = await connection.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *args)
+    explain = json.loads(result)[0]
+    return explain["Plan"], explain["Execution Time"]
+
+
+class TestHotPathIndexes:
+    """Planes de consulta de las rutas calientes a 1M de filas"""
+
+    async def test_hot_paths_use_composite_indexes(self, populated_connection):
+        timings = {}
+        for name, (_, expected_index) in HOT_QUERIES.items():
+            plan, execution_ms = await _explain(populated_connection, name)
+            nodes = list(_plan_nodes(plan))
+            timings[name] = execution_ms
+
+            assert any(node.get("Index Name") == expected_index for node in nodes), (name, plan)
+            assert not any(node["Node Type"] in ("Sort", "BitmapAnd", "Seq Scan") for node in nodes), (name, plan)
+
+        # La consulta del id más reciente no visita el heap (INCLUDE (id))
+        plan, _ = await _explain(populated_connection, "most_recent_id")
+        assert any(node["Node Type"] == "Index Only Scan" for node in _plan_nodes(plan))
+
+        # Mismas consultas solo con los índices de una columna
+        for index_name in HOT_PATH_INDEXES:
+            await populated_connection.execute(f"DROP INDEX {index_name}")
+        baseline = {name: (await _explain(populated_connection, name))[1] for name in HOT_QUERIES}
+
+        print("\nRutas calientes a 1M de filas (ms, sin -> con índices compuestos):")
+        for name in HOT_QUERIES:
+            print(f"  {name}: {baseline[name]:.2f} -> {timings[name]:.2f}")
+        assert sum(timings.values()) < sum(baseline.values())
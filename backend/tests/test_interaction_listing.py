@@ -0,0 +1,166 @@
+"""
+Pruebas del listado ligero del historial de interacciones
+Verificación de que la consulta solo proyecta los campos del resumen (sin
+documentos JSONB completos) y benchmark de bytes transferidos y latencia por
+página frente a cargar filas completas. El benchmark requiere PostgreSQL
+(DATABASE_URL); sin base de datos se omite.
+"""
+
+import pytest
+import statistics
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.core import fast_json
+from app.core.config import settings
+from app.crud import interaction as interaction_crud
+from app.models.models import InteractionEvent
+from app.schemas.interaction import InteractionSummary
+
+PAGE_SIZE = 100
+
+
+def _documents(index: int):
+    """Documentos de tamaño realista: tres proveedores y una síntesis larga"""
+    ai_responses = [
+        {
+            "ia_provider_name": provider,
+            "response_text": f"Respuesta {index} de {provider}. " + "Contenido detallado del proveedor. " * 120,
+            "status": "success",
+            "latency_ms": 1800,
+            "usage_info": {"prompt_tokens": 900, "completion_tokens": 700},
+        }
+        for provider in ("openai", "anthropic", "groq")
+    ]
+    moderator_synthesis = {
+        "synthesis_text": f"## Síntesis {index}\n" + "Punto de consenso entre las IAs. " * 150,
+        "quality": "high",
+        "key_themes": ["Python", "datos"],
+        "recommendations": ["Evaluar pandas frente a Polars"] * 5,
+    }
+    return ai_responses, moderator_synthesis
+
+
+def _payload_bytes(rows) -> int:
+    """Bytes aproximados transferidos: tamaño serializado de cada valor recibido"""
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (dict, list)):
+                total += len(fast_json.dumps(value).encode())
+            elif value is not None:
+                total += len(str(value).encode())
+    return total
+
+
+class TestSummaryProjection:
+    """La consulta del listado solo trae los campos del resumen"""
+
+    async def test_statement_never_selects_full_documents(self):
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[])))
+
+        await interaction_crud.get_project_interaction_summaries(db, uuid4(), uuid4(), limit=20)
+
+        statement = db.execute.await_args.args[0]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        select_list = sql.split(" FROM ")[0]
+        assert "ai_responses_json" not in select_list
+        # La síntesis solo se lee campo a campo con ->>
+        column = "interaction_events.moderator_synthesis_json"
+        assert select_list.count(column) == select_list.count(f"{column} ->>") > 0
+        assert "left(" in select_list
+        assert [column.name for column in statement.selected_columns] == [
+            "id", "user_prompt", "synthesis_preview", "moderator_quality", "created_at", "processing_time_ms"
+        ]
+
+
+@pytest.fixture
+async def connection():
+    """Conexión con una tabla temporal interaction_events (oculta la real)"""
+    if not settings.DATABASE_URL:
+        pytest.skip("DATABASE_URL no configurado")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        json_serializer=fast_json.dumps,
+        json_deserializer=fast_json.loads,
+    )
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL no disponible: {e}")
+
+    try:
+        await conn.execute(text(
+            "CREATE TEMP TABLE interaction_events (LIKE public.interaction_events INCLUDING DEFAULTS)"
+        ))
+        yield conn
+    finally:
+        await conn.close()
+        await engine.dispose()
+
+
+class TestListingBenchmark:
+    """Bytes y latencia por página: filas completas frente a la proyección"""
+
+    async def test_projection_transfers_less(self, connection):
+        project_id, user_id = uuid4(), uuid4()
+        now = datetime.utcnow()
+        rows = []
+        for index in range(PAGE_SIZE):
+            ai_responses, moderator_synthesis = _documents(index)
+            rows.append({
+                "id": uuid4(),
+                "project_id": project_id,
+                "user_id": user_id,
+                "user_prompt_text": f"Consulta {index}: " + "¿Cómo organizo un proyecto de datos? " * 10,
+                "created_at": now - timedelta(minutes=index),
+                "updated_at": now,
+                "ai_responses_json": ai_responses,
+                "moderator_synthesis_json": moderator_synthesis,
+                "context_used": False,
+                "processing_time_ms": 2500,
+                "interaction_type": "final_query",
+            })
+        await connection.execute(InteractionEvent.__table__.insert(), rows)
+
+        full_query = select(InteractionEvent.__table__).where(
+            InteractionEvent.project_id == project_id
+        ).order_by(InteractionEvent.created_at.desc()).limit(PAGE_SIZE)
+
+        async def full_page():
+            return (await connection.execute(full_query)).all()
+
+        async def summary_page():
+            return await interaction_crud.get_project_interaction_summaries(
+                connection, project_id, user_id, limit=PAGE_SIZE
+            )
+
+        timings = {}
+        for name, page in (("full", full_page), ("summary", summary_page)):
+            samples = []
+            for _ in range(15):
+                start = time.perf_counter()
+                result = await page()
+                samples.append(time.perf_counter() - start)
+            timings[name] = (statistics.median(samples) * 1000, _payload_bytes(result))
+
+        summaries = [InteractionSummary(**row._mapping) for row in result]
+        print(
+            f"\nPágina de {PAGE_SIZE}: filas completas {timings['full'][1] / 1024:.0f}KB "
+            f"en {timings['full'][0]:.1f}ms -> proyección {timings['summary'][1] / 1024:.0f}KB "
+            f"en {timings['summary'][0]:.1f}ms"
+        )
+        assert len(summaries) == PAGE_SIZE
+        assert summaries[0].moderator_quality == "high"
+        assert len(summaries[0].synthesis_preview) == 300 and summaries[0].synthesis_preview.endswith("...")
+        assert len(summaries[0].user_prompt) == 200
+        assert timings["summary"][1] < timings["full"][1] * 0.1
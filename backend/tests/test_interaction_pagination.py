@@ -0,0 +1,181 @@
+"""
+Pruebas de la paginación por clave del historial de interacciones
+Verificación del cursor (created_at, id), de que la consulta con cursor no usa
+OFFSET, del conteo desde project_interaction_counts y benchmark de páginas
+profundas frente a OFFSET. El benchmark requiere PostgreSQL (DATABASE_URL);
+sin base de datos se omite.
+"""
+
+import pytest
+import statistics
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.crud import interaction as interaction_crud
+from app.models.models import InteractionEvent
+
+PAGE_SIZE = 20
+ROWS = 200_000
+
+
+def _compile(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def _db(*results):
+    db = Mock()
+    db.execute = AsyncMock(side_effect=list(results))
+    return db
+
+
+class TestCursor:
+    """Codificación del cursor opaco"""
+
+    def test_roundtrip(self):
+        created_at, interaction_id = datetime(2026, 10, 19, 12, 30, 15, 123456), uuid4()
+
+        cursor = interaction_crud.encode_cursor(created_at, interaction_id)
+
+        assert "=" not in cursor
+        assert interaction_crud.decode_cursor(cursor) == (created_at, interaction_id)
+
+    @pytest.mark.parametrize("cursor", ["", "no-es-un-cursor", "bWFs", "MjAyNi0xMC0xOXxub3V1aWQ"])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            interaction_crud.decode_cursor(cursor)
+
+
+class TestKeysetStatement:
+    """La consulta con cursor filtra por clave en lugar de saltar filas"""
+
+    async def test_cursor_replaces_offset(self):
+        db = _db(Mock(all=Mock(return_value=[])))
+        after = (datetime(2026, 10, 19, 12, 0), uuid4())
+
+        await interaction_crud.get_project_interaction_summaries(db, uuid4(), uuid4(), limit=21, after=after)
+
+        sql = _compile(db.execute.await_args.args[0])
+        assert "OFFSET" not in sql
+        assert "interaction_events.deleted_at IS NULL" in sql
+        assert "interaction_events.created_at <= '2026-10-19 12:00:00'" in sql
+        assert f"interaction_events.id < '{after[1]}'" in sql
+        assert "ORDER BY interaction_events.created_at DESC, interaction_events.id DESC" in sql
+
+    async def test_ascending_cursor(self):
+        db = _db(Mock(all=Mock(return_value=[])))
+
+        await interaction_crud.get_project_interaction_summaries(
+            db, uuid4(), uuid4(), order_direction="asc", after=(datetime(2026, 10, 19), uuid4())
+        )
+
+        sql = _compile(db.execute.await_args.args[0])
+        assert "interaction_events.created_at >= " in sql
+        assert "ORDER BY interaction_events.created_at, interaction_events.id" in sql
+
+    async def test_legacy_page_keeps_offset(self):
+        db = _db(Mock(all=Mock(return_value=[])))
+
+        await interaction_crud.get_project_interaction_summaries(db, uuid4(), uuid4(), skip=40, limit=20)
+
+        assert "OFFSET 40" in _compile(db.execute.await_args.args[0])
+
+
+class TestInteractionCount:
+    """Conteo desde el contador mantenido por trigger"""
+
+    async def test_reads_counter(self):
+        db = _db(Mock(scalar_one_or_none=Mock(return_value=1234)))
+
+        assert await interaction_crud.count_project_interactions(db, uuid4(), uuid4()) == 1234
+        assert db.execute.await_count == 1
+        assert "project_interaction_counts" in _compile(db.execute.await_args.args[0])
+
+    async def test_falls_back_to_count_without_counter(self):
+        db = _db(Mock(scalar_one_or_none=Mock(return_value=None)), Mock(scalar=Mock(return_value=7)))
+
+        assert await interaction_crud.count_project_interactions(db, uuid4(), uuid4()) == 7
+        sql = _compile(db.execute.await_args.args[0])
+        assert "count(interaction_events.id)" in sql
+        assert "interaction_events.deleted_at IS NULL" in sql
+
+
+@pytest.fixture
+async def connection():
+    """Conexión con una tabla temporal interaction_events (oculta la real) de un solo proyecto"""
+    if not settings.DATABASE_URL:
+        pytest.skip("DATABASE_URL no configurado")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"PostgreSQL no disponible: {e}")
+
+    try:
+        await conn.execute(text(
+            "CREATE TEMP TABLE interaction_events (LIKE public.interaction_events INCLUDING DEFAULTS)"
+        ))
+        yield conn
+    finally:
+        await conn.close()
+        await engine.dispose()
+
+
+class TestDeepPageBenchmark:
+    """Latencia de una página profunda: OFFSET frente a cursor"""
+
+    async def test_deep_page_costs_like_first_page(self, connection):
+        project_id, user_id = uuid4(), uuid4()
+        await connection.execute(text(f"""
+            INSERT INTO interaction_events
+                (id, project_id, user_id, user_prompt_text, created_at, updated_at,
+                 context_used, interaction_type)
+            SELECT gen_random_uuid(), :project_id, :user_id, 'Consulta ' || i,
+                   now() - (i || ' seconds')::interval, now(), false, 'final_query'
+            FROM generate_series(1, {ROWS}) AS i
+        """), {"project_id": project_id, "user_id": user_id})
+        # Índice parcial del historial (created_at DESC INCLUDE id)
+        index = next(i for i in InteractionEvent.__table__.indexes if i.name == "ix_interaction_events_live_history")
+        await connection.execute(CreateIndex(index))
+        await connection.execute(text("ANALYZE interaction_events"))
+
+        deep_skip = ROWS - PAGE_SIZE * 2
+        boundary = (await connection.execute(text(
+            f"SELECT created_at, id FROM interaction_events ORDER BY created_at DESC, id DESC "
+            f"OFFSET {deep_skip - 1} LIMIT 1"
+        ))).one()
+
+        async def page(**kwargs):
+            return await interaction_crud.get_project_interaction_summaries(
+                connection, project_id, user_id, limit=PAGE_SIZE, **kwargs
+            )
+
+        timings = {}
+        for name, kwargs in (
+            ("first", {}),
+            ("offset", {"skip": deep_skip}),
+            ("cursor", {"after": (boundary.created_at, boundary.id)}),
+        ):
+            samples = []
+            for _ in range(10):
+                start = time.perf_counter()
+                rows = await page(**kwargs)
+                samples.append(time.perf_counter() - start)
+            timings[name] = (statistics.median(samples) * 1000, rows)
+
+        print(
+            f"\nPágina {deep_skip // PAGE_SIZE} de {ROWS // PAGE_SIZE}: OFFSET {timings['offset'][0]:.1f}ms, "
+            f"cursor {timings['cursor'][0]:.1f}ms (primera página {timings['first'][0]:.1f}ms)"
+        )
+        assert [row.id for row in timings["cursor"][1]] == [row.id for row in timings["offset"][1]]
+        assert timings["cursor"][0] < timings["offset"][0]
+        assert timings["cursor"][0] < timings["first"][0] * 5
@@ -0,0 +1,235 @@
+"""
+Pruebas de la persistencia write-behind de interacciones
+Verificación del volcado en lotes (una sesión y un INSERT multi-fila por lote),
+la backpressure con la cola llena, el vaciado al cerrar, el aislamiento de
+filas inválidas y las métricas de cola y latencia
+"""
+
+import asyncio
+from datetime import datetime
+from typing import List
+from uuid import uuid4
+
+from app.crud import context as context_crud
+from app.crud import interaction as interaction_crud
+from app.services.interaction_writer import InteractionWriteBehind, PendingInteraction
+
+
+def _pending(synthesis_text="Punto uno.\nPunto dos."):
+    return PendingInteraction(
+        interaction=interaction_crud.build_interaction({
+            "id": str(uuid4()),
+            "project_id": str(uuid4()),
+            "user_id": str(uuid4()),
+            "user_prompt": "¿Qué es Python?",
+            "ai_responses": [{"ia_provider_name": "openai", "response_text": "Un lenguaje"}],
+            "moderator_synthesis": {"synthesis_text": synthesis_text, "quality": "high"},
+            "context_used": False,
+            "processing_time_ms": 1200,
+            "created_at": datetime.utcnow().isoformat()
+        }),
+        synthesis_text=synthesis_text
+    )
+
+
+class FakeSession:
+    def __init__(self, database):
+        self.database = database
+
+    async def __aenter__(self):
+        self.database.sessions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows=None):
+        table = statement.table.name
+        if self.database.gate is not None:
+            await self.database.gate.wait()
+        if table == "interaction_events" and any(row["id"] in self.database.rejected for row in rows):
+            raise RuntimeError("violación de clave foránea")
+        self.database.statements.append((table, len(rows)))
+        self.database.rows.setdefault(table, []).extend(rows)
+
+    async def commit(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.sessions = 0
+        self.statements = []
+        self.rows = {}
+        self.rejected = set()
+        self.gate = None
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeContextManager:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.embedding_calls: List[int] = []
+
+    def create_chunks(self, text):
+        return [line for line in text.split("\n") if line]
+
+    async def generate_embeddings(self, texts, tenant=None):
+        self.embedding_calls.append(len(texts))
+        if self.fail:
+            raise RuntimeError("sin red")
+        return [[0.1] * 4 for _ in texts]
+
+
+def _writer(database, context_manager=None, **kwargs):
+    options = {"batch_size": 50, "flush_interval": 0.05, "enqueue_timeout": 1.0, **kwargs}
+    return InteractionWriteBehind(
+        session_factory=database,
+        context_manager=context_manager or FakeContextManager(),
+        **options
+    )
+
+
+class TestBulkInserts:
+    """Inserciones multi-fila de los CRUD"""
+
+    async def test_interactions_bulk_fills_model_defaults(self):
+        database = FakeDatabase()
+        items = [_pending(), _pending()]
+
+        async with database() as db:
+            assert await interaction_crud.create_interactions_bulk(db, [item.interaction for item in items]) == 2
+
+        # Síntesis, interacciones y respuestas por proveedor: una sentencia por tabla
+        assert database.statements == [("moderated_syntheses", 2), ("interaction_events", 2), ("ia_responses", 2)]
+        row = database.rows["interaction_events"][0]
+        assert row["interaction_type"] == "final_query"
+        assert row["message_count"] == 0
+        assert row["updated_at"] is not None
+        assert row["moderator_synthesis_json"]["quality"] == "high"
+
+    async def test_context_chunks_bulk(self):
+        database = FakeDatabase()
+        from app.schemas.context import ChunkCreate
+        chunks = [
+            ChunkCreate(project_id=uuid4(), user_id=uuid4(), content_text=f"Chunk {i}",
+                        content_embedding=[0.0] * 4, source_type="ai_synthesis", source_identifier="x")
+            for i in range(3)
+        ]
+
+        async with database() as db:
+            assert await context_crud.create_context_chunks_bulk(db, chunks) == 3
+
+        assert database.statements == [("context_chunks", 3)]
+        assert all(row["id"] and row["created_at"] for row in database.rows["context_chunks"])
+
+
+class TestWriteBehind:
+    """Cola acotada volcada en lotes"""
+
+    async def test_batches_share_sessions_and_statements(self):
+        database, context_manager = FakeDatabase(), FakeContextManager()
+        writer = _writer(database, context_manager)
+        writer.start()
+
+        await asyncio.gather(*(writer.submit(_pending()) for _ in range(120)))
+        await writer.stop()
+
+        interaction_inserts = [rows for table, rows in database.statements if table == "interaction_events"]
+        assert sum(interaction_inserts) == 120
+        assert len(interaction_inserts) == 3  # Lotes de 50, 50 y 20
+        assert len(database.rows["context_chunks"]) == 240
+        assert context_manager.embedding_calls == [100, 100, 40]
+        # Dos sesiones por lote frente a dos por interacción
+        assert database.sessions == 6
+        stats = writer.get_stats()
+        print(f"\nWrite-behind: {stats}")
+        assert stats["interactions_written"] == 120 and stats["flushes"] == 3
+        assert stats["queue_depth"] == 0 and stats["max_queue_depth"] > 0
+
+    async def test_without_worker_writes_directly(self):
+        database = FakeDatabase()
+        writer = _writer(database)
+
+        await writer.submit(_pending())
+
+        assert ("interaction_events", 1) in database.statements
+        assert writer.get_stats()["flushes"] == 1
+
+    async def test_backpressure_when_queue_is_full(self):
+        database = FakeDatabase()
+        database.gate = asyncio.Event()
+        writer = _writer(database, max_queue_size=2, batch_size=1, flush_interval=0.0, enqueue_timeout=0.05)
+        writer.start()
+
+        # El worker queda bloqueado con la primera; la cola admite dos más
+        for _ in range(3):
+            await writer.submit(_pending())
+        await asyncio.sleep(0.01)
+        blocked = asyncio.create_task(writer.submit(_pending()))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()  # El productor espera
+
+        database.gate.set()
+        await blocked
+        await writer.stop()
+
+        stats = writer.get_stats()
+        assert stats["backpressure_waits"] >= 1
+        assert stats["interactions_written"] == 4
+
+    async def test_saturated_queue_falls_back_to_direct_write(self):
+        database = FakeDatabase()
+        database.gate = asyncio.Event()
+        writer = _writer(database, max_queue_size=1, batch_size=1, flush_interval=0.0, enqueue_timeout=0.01)
+        writer.start()
+        await writer.submit(_pending())
+        await asyncio.sleep(0.01)
+        await writer.submit(_pending())
+
+        direct = asyncio.create_task(writer.submit(_pending()))
+        await asyncio.sleep(0.05)
+        database.gate.set()
+        await direct
+        await writer.stop()
+
+        assert writer.get_stats()["direct_writes"] == 1
+        assert writer.get_stats()["interactions_written"] == 3
+
+    async def test_stop_flushes_pending_items(self):
+        database = FakeDatabase()
+        writer = _writer(database, flush_interval=10.0)
+        writer.start()
+
+        for _ in range(5):
+            await writer.submit(_pending())
+        await writer.stop(timeout=0.5)
+
+        assert len(database.rows["interaction_events"]) == 5
+        assert not writer.running
+
+    async def test_invalid_row_is_isolated(self):
+        database = FakeDatabase()
+        items = [_pending() for _ in range(4)]
+        database.rejected.add(items[2].id)
+        writer = _writer(database)
+
+        await writer._write(items)
+
+        saved = {row["id"] for row in database.rows["interaction_events"]}
+        assert saved == {item.id for item in items} - {items[2].id}
+        assert writer.get_stats()["failed_interactions"] == 1
+        # Solo se indexan las síntesis de las interacciones guardadas
+        assert {row["source_identifier"] for row in database.rows["context_chunks"]} == {str(item.id) for item in items if item is not items[2]}
+
+    async def test_embedding_failure_keeps_interactions(self):
+        database = FakeDatabase()
+        writer = _writer(database, FakeContextManager(fail=True))
+
+        await writer._write([_pending(), _pending(synthesis_text=None)])
+
+        assert len(database.rows["interaction_events"]) == 2
+        assert "context_chunks" not in database.rows
+        assert writer.get_stats()["chunks_written"] == 0
@@ -0,0 +1,85 @@
+"""
+Pruebas de los documentos JSONB nativos de interaction_events
+Verificación del serializador del engine, la lectura tolerante de filas
+antiguas (cadenas de json.dumps) y la escritura de dict/list en los CRUD
+"""
+
+import pytest
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, Mock
+from uuid import uuid4
+
+from app.core import fast_json
+from app.crud import context_session as context_crud
+from app.crud.interaction import create_interaction
+from app.models.models import InteractionEvent
+
+
+def _session(ai_responses_json):
+    return InteractionEvent(
+        id=uuid4(),
+        project_id=uuid4(),
+        user_id=uuid4(),
+        user_prompt_text="Iniciando construcción de contexto",
+        ai_responses_json=ai_responses_json,
+        interaction_type="context_building",
+        session_status="active",
+        created_at=datetime.utcnow()
+    )
+
+
+@pytest.fixture
+def db():
+    db = Mock()
+    db.add = Mock()
+    db.flush = AsyncMock()
+    db.commit = AsyncMock()
+    db.refresh = AsyncMock()
+    return db
+
+
+class TestFastJsonDocuments:
+    """Pruebas de fast_json para columnas JSONB"""
+
+    def test_as_document(self):
+        document = {"quality": "high", "key_themes": ["Python"]}
+
+        assert fast_json.as_document(document) is document
+        assert fast_json.as_document(json.dumps(document)) == document  # Fila antigua
+        assert fast_json.as_document(None, []) == []
+        assert fast_json.as_document("no es json", {}) == {}
+
+    def test_dumps_non_native_types(self):
+        moment = datetime(2026, 1, 2, 3, 4, 5)
+
+        data = json.loads(fast_json.dumps({"at": moment, "cost": Decimal("1.5"), "name": "síntesis"}))
+
+        assert data == {"at": "2026-01-02T03:04:05", "cost": "1.5", "name": "síntesis"}
+
+
+class TestCrudWritesDocuments:
+    """Los CRUD guardan dict/list en lugar de cadenas"""
+
+    async def test_create_interaction(self, db):
+        interaction = await create_interaction(db, {
+            "id": str(uuid4()),
+            "project_id": str(uuid4()),
+            "user_id": str(uuid4()),
+            "user_prompt": "¿Qué es Python?",
+            "ai_responses": [{"ia_provider_name": "openai", "response_text": "Un lenguaje"}],
+            "moderator_synthesis": {"synthesis_text": "Síntesis", "quality": "high"},
+            "context_used": False,
+            "processing_time_ms": 1200,
+            "created_at": datetime.utcnow().isoformat()
+        })
+
+        assert interaction.ai_responses_json == [{"ia_provider_name": "openai", "response_text": "Un lenguaje"}]
+        assert interaction.moderator_synthesis_json["quality"] == "high"
+
+    def test_convert_session_with_responses_document(self):
+        # query_ais_individually guarda un dict con las respuestas de las IAs
+        session = _session({"responses": [], "user_question": "¿Qué es Python?"})
+
+        assert context_crud.convert_interaction_to_context_session(session).conversation_history == []
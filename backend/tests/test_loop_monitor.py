@@ -0,0 +1,94 @@
+"""
+Pruebas del monitor de lag del event loop y de las llamadas LLM no bloqueantes
+de PreAnalystService y FollowUpInterpreter (con un proveedor simulado local)
+"""
+
+import pytest
+import asyncio
+import gc
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from app.core.loop_monitor import EventLoopLagMonitor
+from app.services.outbound_scheduler import count_tokens
+from app.services.pre_analyst import PreAnalystService
+from app.services.followup_interpreter import FollowUpInterpreter, InteractionContext
+
+
+class MockAsyncOpenAI:
+    """Cliente OpenAI asíncrono simulado que tarda `delay` segundos en responder"""
+
+    def __init__(self, content: dict, delay: float = 0.2):
+        self.calls = 0
+
+        async def create(**kwargs):
+            self.calls += 1
+            await asyncio.sleep(delay)
+            message = SimpleNamespace(content=json.dumps(content))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+class TestEventLoopLag:
+    """El loop no se bloquea durante las llamadas LLM auxiliares"""
+
+    @pytest.fixture
+    async def monitor(self):
+        count_tokens("precarga")  # La carga del tokenizer es única y se hace al arrancar
+        gc.collect()  # Que una pasada completa del GC no cuente como bloqueo
+        monitor = EventLoopLagMonitor(interval=0.01, warn_threshold_ms=50)
+        monitor.start()
+        yield monitor
+        await monitor.stop()
+
+    async def test_monitor_detects_blocking_call(self, monitor):
+        """Una llamada síncrona bloqueante aparece como lag"""
+        await asyncio.sleep(0.03)
+        time.sleep(0.2)
+        await asyncio.sleep(0.03)
+        assert monitor.get_stats()["max_lag_ms"] >= 150
+
+    async def test_pre_analyst_does_not_block_loop(self, monitor):
+        """Consultas concurrentes al PreAnalyst no bloquean el loop"""
+        service = PreAnalystService()
+        service.client = MockAsyncOpenAI({
+            "interpreted_intent": "intención",
+            "clarification_questions": [],
+            "refined_prompt_candidate": "prompt refinado"
+        })
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(service.analyze_prompt(f"pregunta {i}") for i in range(10)))
+        elapsed = time.perf_counter() - start
+
+        assert all(result.refined_prompt_candidate == "prompt refinado" for result in results)
+        assert service.client.calls == 10
+        assert elapsed < 1.0  # En paralelo, no 10 x 0.2s
+        assert monitor.get_stats()["max_lag_ms"] < 50
+
+    async def test_followup_llm_does_not_block_loop(self, monitor):
+        """El análisis LLM de continuidad es asíncrono"""
+        interpreter = FollowUpInterpreter(AsyncMock())
+        interpreter.client = MockAsyncOpenAI({
+            "is_continuation": True,
+            "reference_type": "anaphoric",
+            "confidence": 0.9,
+            "keywords": ["eso"]
+        })
+        previous = InteractionContext(
+            interaction_id=None,
+            user_prompt="¿Qué es Python?",
+            refined_prompt=None,
+            synthesis_text="Python es un lenguaje",
+            created_at="2024-01-01"
+        )
+
+        results = await asyncio.gather(
+            *(interpreter._analyze_with_llm("¿Y eso para qué sirve?", previous) for _ in range(5))
+        )
+
+        assert all(result["is_continuation"] for result in results)
+        assert monitor.get_stats()["max_lag_ms"] < 50
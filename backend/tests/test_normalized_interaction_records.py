@@ -0,0 +1,209 @@
+"""
+Pruebas de las filas normalizadas de las interacciones
+Verificación de que cada consulta final genera su fila de moderated_syntheses y
+una fila de ia_responses por proveedor, de que se insertan en lote en el orden
+de las claves foráneas, de que las estadísticas se agregan en SQL y de que
+borrar una interacción borra también sus filas normalizadas
+"""
+
+import re
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock
+from uuid import UUID, uuid4
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from app.crud import interaction as interaction_crud
+from app.models.models import IAResponse, InteractionEvent, ModeratedSynthesis, Project, User
+from app.schemas.ai_response import AIProviderEnum, AIResponseStatus
+
+
+def _interaction_data(ai_responses=None, synthesis=None):
+    return {
+        "id": str(uuid4()),
+        "project_id": str(uuid4()),
+        "user_id": str(uuid4()),
+        "user_prompt": "¿Qué es Python?",
+        "ai_responses": ai_responses if ai_responses is not None else [
+            {"ia_provider_name": AIProviderEnum.OPENAI, "response_text": "Un lenguaje", "latency_ms": 820,
+             "status": AIResponseStatus.SUCCESS, "timestamp": "2026-10-19T12:00:01"},
+            {"ia_provider_name": "anthropic", "response_text": None, "latency_ms": 30000,
+             "status": "timeout", "error_message": "Tiempo agotado"},
+        ],
+        "moderator_synthesis": synthesis if synthesis is not None else {"synthesis_text": "Síntesis", "quality": "high"},
+        "context_used": False,
+        "processing_time_ms": 1200,
+        "created_at": "2026-10-19T12:00:00"
+    }
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+class SyncSessionAdapter:
+    """Expone una Session síncrona (SQLite en memoria) con la interfaz async del CRUD"""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def execute(self, statement):
+        return self.session.execute(statement)
+
+    async def delete(self, instance):
+        self.session.delete(instance)
+
+    async def flush(self):
+        self.session.flush()
+
+
+def _compile(statement, literal_binds=True):
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": literal_binds}))
+
+
+class TestBuildInteraction:
+    """Construcción del evento con sus filas normalizadas"""
+
+    def test_builds_synthesis_and_responses(self):
+        interaction = interaction_crud.build_interaction(_interaction_data())
+
+        synthesis = interaction.moderated_synthesis
+        assert isinstance(synthesis, ModeratedSynthesis)
+        assert interaction.moderated_synthesis_id == synthesis.id
+        assert (synthesis.synthesis_text, synthesis.quality) == ("Síntesis", "high")
+
+        openai, anthropic = interaction.ia_responses
+        assert all(isinstance(r, IAResponse) and r.interaction_event_id == interaction.id for r in interaction.ia_responses)
+        # Los enums se guardan por su valor
+        assert (openai.ia_provider_name, openai.status, openai.latency_ms) == ("openai", "success", 820)
+        assert openai.received_at == datetime(2026, 10, 19, 12, 0, 1)
+        assert (anthropic.status, anthropic.error_message, anthropic.raw_response_text) == ("timeout", "Tiempo agotado", "")
+        # Sin timestamp propio se usa la fecha de la interacción
+        assert anthropic.received_at == interaction.created_at
+
+    def test_without_synthesis_text_no_synthesis_row(self):
+        interaction = interaction_crud.build_interaction(
+            _interaction_data(ai_responses=[], synthesis={"synthesis_text": "", "quality": "failed"})
+        )
+
+        assert interaction.moderated_synthesis is None
+        assert interaction.moderated_synthesis_id is None
+        assert interaction.ia_responses == []
+
+    def test_json_documents_are_kept(self):
+        data = _interaction_data()
+
+        interaction = interaction_crud.build_interaction(data)
+
+        assert interaction.moderator_synthesis_json["quality"] == "high"
+        assert len(interaction.ai_responses_json) == 2
+
+
+class TestBulkInsert:
+    """Una sentencia multi-fila por tabla, en el orden de las claves foráneas"""
+
+    async def test_insert_order_and_rows(self):
+        db = Mock()
+        db.execute = AsyncMock()
+        interactions = [
+            interaction_crud.build_interaction(_interaction_data()),
+            interaction_crud.build_interaction(_interaction_data(synthesis={"synthesis_text": None})),
+        ]
+
+        assert await interaction_crud.create_interactions_bulk(db, interactions) == 2
+
+        calls = [(call.args[0].table.name, call.args[1]) for call in db.execute.await_args_list]
+        assert [(table, len(rows)) for table, rows in calls] == [
+            ("moderated_syntheses", 1), ("interaction_events", 2), ("ia_responses", 4)
+        ]
+        syntheses, events, responses = (rows for _, rows in calls)
+        assert events[0]["moderated_synthesis_id"] == syntheses[0]["id"]
+        assert events[1]["moderated_synthesis_id"] is None
+        assert {row["interaction_event_id"] for row in responses} == {events[0]["id"], events[1]["id"]}
+        assert all(isinstance(row["id"], UUID) for row in responses)
+
+
+class TestProviderStats:
+    """Latencia y errores por proveedor agregados en la base de datos"""
+
+    async def test_stats_are_sql_aggregates(self):
+        db = Mock()
+        errors_result = Mock(all=Mock(return_value=[
+            Mock(ia_provider_name="anthropic", status="timeout", count=2),
+        ]))
+        stats_result = Mock(all=Mock(return_value=[
+            Mock(provider="anthropic", responses=10, errors=2, avg_latency_ms=900.456,
+                 p50_latency_ms=850.0, p95_latency_ms=1500.0, max_latency_ms=1800),
+            Mock(provider="openai", responses=4, errors=0, avg_latency_ms=None,
+                 p50_latency_ms=None, p95_latency_ms=None, max_latency_ms=None),
+        ]))
+        db.execute = AsyncMock(side_effect=[errors_result, stats_result])
+
+        providers = await interaction_crud.get_provider_stats(db, uuid4(), uuid4(), since=datetime(2026, 10, 1))
+
+        errors_sql, stats_sql = (_compile(call.args[0], literal_binds=False) for call in db.execute.await_args_list)
+        assert len(re.findall(r"percentile_cont\(\S+\) WITHIN GROUP \(ORDER BY ia_responses.latency_ms\)", stats_sql)) == 2
+        assert re.search(r"FILTER \(WHERE ia_responses.status = \S+\)", stats_sql)
+        assert "GROUP BY ia_responses.ia_provider_name" in stats_sql
+        assert "ia_responses.received_at >=" in stats_sql
+        assert "GROUP BY ia_responses.ia_provider_name, ia_responses.status" in errors_sql
+        # Nada se lee de los documentos JSONB
+        assert "ai_responses_json" not in stats_sql + errors_sql
+
+        anthropic, openai = providers
+        assert anthropic["error_rate"] == 0.2
+        assert anthropic["errors_by_status"] == {"timeout": 2}
+        assert anthropic["avg_latency_ms"] == 900.46
+        assert openai["errors_by_status"] == {} and openai["p95_latency_ms"] is None
+
+    async def test_quality_counts_group_by_quality(self):
+        db = Mock()
+        db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[
+            Mock(quality="high", count=7), Mock(quality="unknown", count=1),
+        ])))
+
+        counts = await interaction_crud.get_synthesis_quality_counts(db, uuid4(), uuid4())
+
+        sql = _compile(db.execute.await_args.args[0])
+        assert "JOIN interaction_events ON interaction_events.moderated_synthesis_id = moderated_syntheses.id" in sql
+        assert "GROUP BY coalesce(moderated_syntheses.quality, 'unknown')" in sql
+        assert counts == {"high": 7, "unknown": 1}
+
+
+class TestDeleteInteraction:
+    """Borrar una interacción elimina también sus filas normalizadas"""
+
+    async def test_delete_removes_responses_and_synthesis(self):
+        engine = create_engine("sqlite://")
+        event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+        tables = [model.__table__ for model in (User, Project, ModeratedSynthesis, InteractionEvent, IAResponse)]
+        InteractionEvent.metadata.create_all(engine, tables=tables)
+        data = _interaction_data()
+        data["created_at"] = "2026-10-19T12:00:00+00:00"
+        data["ai_responses"][0]["timestamp"] = "2026-10-19T12:00:01+00:00"
+        interaction = interaction_crud.build_interaction(data)
+
+        now = datetime.now(timezone.utc)
+        user = User(id=interaction.user_id, email="ana@example.com", name="Ana", google_id="g-1", avatar_url="",
+                    created_at=now, updated_at=now)
+        project = Project(id=interaction.project_id, user_id=user.id, name="Proyecto", description="",
+                          created_at=now, updated_at=now)
+
+        ids = (interaction.id, interaction.project_id, interaction.user_id)
+
+        with Session(engine) as session:
+            session.add_all([user, project, interaction])
+            session.commit()
+            session.expunge_all()
+
+            deleted = await interaction_crud.delete_interaction(SyncSessionAdapter(session), *ids)
+            session.commit()
+
+            assert deleted
+            for model in (InteractionEvent, IAResponse, ModeratedSynthesis):
+                assert session.scalar(select(func.count()).select_from(model)) == 0
@@ -0,0 +1,188 @@
+"""
+Pruebas del planificador de llamadas salientes a proveedores de IA
+Verificación de concurrencia, prioridades, reparto entre tenants y rate limits
+"""
+
+import pytest
+import asyncio
+
+from app.services.outbound_scheduler import (
+    OutboundScheduler, ProviderLimits, TokenBucket,
+    count_tokens, estimate_request_tokens, usage_total_tokens
+)
+from app.services.ai_orchestrator import AIOrchestrator
+from app.schemas.ai_response import AIProviderEnum, AIRequest, RequestPriority
+
+
+class TestOutboundScheduler:
+    """Pruebas del planificador global de llamadas salientes"""
+
+    @pytest.fixture
+    def scheduler(self):
+        """Planificador con una sola plaza y sin rate limits"""
+        return OutboundScheduler(limits={
+            AIProviderEnum.OPENAI.value: ProviderLimits(
+                max_concurrency=1, requests_per_minute=0, tokens_per_minute=0
+            )
+        })
+
+    async def _run(self, scheduler, order, name, tenant=None, priority=RequestPriority.INTERACTIVE):
+        async with scheduler.slot(AIProviderEnum.OPENAI, tenant=tenant, priority=priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def test_concurrency_limit(self):
+        """Nunca hay más llamadas en vuelo que el límite del proveedor"""
+        scheduler = OutboundScheduler(limits={
+            "openai": ProviderLimits(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0)
+        })
+        in_flight = 0
+        peak = 0
+
+        async def call():
+            nonlocal in_flight, peak
+            async with scheduler.slot(AIProviderEnum.OPENAI):
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+
+        assert peak == 2
+        stats = scheduler.get_stats()["openai"]
+        assert stats["dispatched"] == 6
+        assert stats["in_flight"] == 0
+        assert stats["max_queue_depth"] >= 4
+
+    async def test_interactive_before_background(self, scheduler):
+        """Las solicitudes interactivas adelantan a las de background en cola"""
+        order = []
+        async with scheduler.slot(AIProviderEnum.OPENAI):
+            tasks = [
+                asyncio.create_task(self._run(scheduler, order, "bg", priority=RequestPriority.BACKGROUND)),
+                asyncio.create_task(self._run(scheduler, order, "ui", priority=RequestPriority.INTERACTIVE)),
+            ]
+            await asyncio.sleep(0)
+            assert scheduler.get_stats()["openai"]["queue_depth"] == {"interactive": 1, "background": 1}
+
+        await asyncio.gather(*tasks)
+        assert order == ["ui", "bg"]
+
+    async def test_round_robin_between_tenants(self, scheduler):
+        """Un proyecto con ráfaga no acapara el proveedor frente a otro proyecto"""
+        order = []
+        async with scheduler.slot(AIProviderEnum.OPENAI):
+            tasks = [
+                asyncio.create_task(self._run(scheduler, order, f"a{i}", tenant="project-a"))
+                for i in range(3)
+            ]
+            tasks.append(asyncio.create_task(self._run(scheduler, order, "b0", tenant="project-b")))
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*tasks)
+        assert order == ["a0", "b0", "a1", "a2"]
+
+    async def test_cancelled_waiter_is_removed(self, scheduler):
+        """Una solicitud cancelada en cola no bloquea ni consume plaza"""
+        order = []
+        async with scheduler.slot(AIProviderEnum.OPENAI):
+            cancelled = asyncio.create_task(self._run(scheduler, order, "cancelled"))
+            kept = asyncio.create_task(self._run(scheduler, order, "kept"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+
+        await kept
+        assert order == ["kept"]
+        assert scheduler.get_stats()["openai"]["in_flight"] == 0
+
+    async def test_rate_limit_delays_dispatch(self):
+        """El bucket de RPM retrasa el despacho cuando se agota"""
+        scheduler = OutboundScheduler(limits={
+            "openai": ProviderLimits(max_concurrency=0, requests_per_minute=600, tokens_per_minute=0)
+        })
+        lane = scheduler._lane("openai")
+        lane.request_bucket.tokens = 0  # bucket vacío: 10 solicitudes/segundo de recarga
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with scheduler.slot(AIProviderEnum.OPENAI):
+            pass
+        assert loop.time() - start >= 0.08
+
+    def test_token_bucket_caps_oversized_requests(self):
+        """Una solicitud mayor que la capacidad no espera indefinidamente"""
+        bucket = TokenBucket(rate_per_minute=1000)
+        assert bucket.time_until_available(5000) == 0.0
+        bucket.consume(5000)
+        assert bucket.time_until_available(1) > 0
+
+    def test_disabled_bucket_never_waits(self):
+        """Un límite a 0 desactiva el bucket"""
+        bucket = TokenBucket(rate_per_minute=0)
+        bucket.consume(10 ** 6)
+        assert bucket.time_until_available(10 ** 6) == 0.0
+
+
+class TestTokenBudget:
+    """Pruebas del presupuesto de tokens por minuto"""
+
+    @pytest.fixture
+    def scheduler(self):
+        return OutboundScheduler(limits={
+            "openai": ProviderLimits(max_concurrency=0, requests_per_minute=0, tokens_per_minute=6000),
+            "anthropic": ProviderLimits(max_concurrency=0, requests_per_minute=0, tokens_per_minute=6000),
+        })
+
+    def test_estimate_includes_prompt_and_max_tokens(self):
+        """La estimación usa el tokenizer para la entrada y suma la salida máxima"""
+        request = AIRequest(prompt="hola " * 100, system_message="Eres útil.", max_tokens=200)
+        estimated = estimate_request_tokens(request)
+        input_tokens = count_tokens(request.prompt) + count_tokens(request.system_message)
+        assert input_tokens >= 100
+        assert input_tokens + 200 < estimated <= input_tokens + 220
+
+    def test_usage_total_tokens_both_providers(self):
+        """Se entiende el usage_info de OpenAI y de Anthropic"""
+        assert usage_total_tokens({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}) == 15
+        assert usage_total_tokens({"input_tokens": 7, "output_tokens": 3}) == 10
+        assert usage_total_tokens(None) is None
+        assert usage_total_tokens({}) is None
+
+    async def test_reconcile_refunds_unused_reservation(self, scheduler):
+        """La reserva no usada vuelve al presupuesto tras conciliar"""
+        async with scheduler.slot(AIProviderEnum.OPENAI, estimated_tokens=5000) as grant:
+            assert scheduler.predicted_wait(AIProviderEnum.OPENAI, 5000) > 0
+            grant.reconcile({"prompt_tokens": 300, "completion_tokens": 200, "total_tokens": 500})
+
+        assert scheduler.predicted_wait(AIProviderEnum.OPENAI, 5000) == 0
+        stats = scheduler.get_stats()["openai"]
+        assert stats["tokens_used_last_minute"] == 500
+        assert stats["avg_actual_to_estimate_ratio"] == 0.1
+
+    async def test_reconcile_charges_underestimate(self, scheduler):
+        """Si el proveedor cobró más de lo estimado se descuenta la diferencia"""
+        async with scheduler.slot(AIProviderEnum.OPENAI, estimated_tokens=100) as grant:
+            grant.reconcile({"input_tokens": 5000, "output_tokens": 900})
+
+        assert scheduler.predicted_wait(AIProviderEnum.OPENAI, 1000) > 0
+
+    def test_rate_limited_drains_budget(self, scheduler):
+        """Un 429 vacía el presupuesto para frenar al resto de la cola"""
+        scheduler.note_rate_limited(AIProviderEnum.ANTHROPIC)
+        assert scheduler.predicted_wait(AIProviderEnum.ANTHROPIC, 100) > 0
+        assert scheduler.get_stats()["anthropic"]["rate_limited"] == 1
+
+    def test_orchestrator_reroutes_saturated_provider(self, scheduler, monkeypatch):
+        """El orquestador prefiere un proveedor con presupuesto disponible"""
+        import app.services.ai_orchestrator as orchestrator_module
+        monkeypatch.setattr(orchestrator_module, "outbound_scheduler", scheduler)
+        scheduler.note_rate_limited(AIProviderEnum.OPENAI)
+
+        orchestrator = AIOrchestrator.__new__(AIOrchestrator)
+        request = AIRequest(prompt="Pregunta", max_tokens=500)
+        ordered = orchestrator._order_by_headroom(
+            request, [AIProviderEnum.OPENAI, AIProviderEnum.ANTHROPIC]
+        )
+        assert ordered == [AIProviderEnum.ANTHROPIC, AIProviderEnum.OPENAI]
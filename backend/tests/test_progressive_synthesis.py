@@ -0,0 +1,235 @@
+"""
+Pruebas de la síntesis progresiva
+Verificación de la estrategia QUORUM del orquestador, la ventana de gracia y la
+fusión barata de respuestas tardías en el moderador
+"""
+
+import pytest
+import asyncio
+import time
+from datetime import datetime
+
+import app.services.ai_orchestrator as orchestrator_module
+from app.services.ai_orchestrator import AIOrchestrator, AIOrchestrationStrategy
+from app.services.ai_moderator import AIModerator, ModeratorResponse, SynthesisQuality
+from app.schemas.ai_response import AIRequest, StandardAIResponse, AIResponseStatus, AIProviderEnum
+
+
+def _response(provider: AIProviderEnum, text: str = None, status=AIResponseStatus.SUCCESS) -> StandardAIResponse:
+    return StandardAIResponse(
+        ia_provider_name=provider,
+        response_text=text or f"Respuesta de {provider.value} sobre Python y ciencia de datos.",
+        status=status,
+        latency_ms=100,
+        timestamp=datetime.utcnow()
+    )
+
+
+class DelayedAdapter:
+    """Adaptador simulado que responde tras `delay` segundos"""
+
+    def __init__(self, provider: AIProviderEnum, delay: float, status=AIResponseStatus.SUCCESS):
+        self.provider = provider
+        self.delay = delay
+        self.status = status
+        self.cancelled = False
+
+    async def generate_response(self, request: AIRequest) -> StandardAIResponse:
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return _response(self.provider, status=self.status)
+
+    async def close(self):
+        pass
+
+
+class TestQuorumOrchestration:
+    """Pruebas de la estrategia QUORUM"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        orchestrator = AIOrchestrator()
+        orchestrator.adapters = {
+            AIProviderEnum.OPENAI: DelayedAdapter(AIProviderEnum.OPENAI, 0.02),
+            AIProviderEnum.ANTHROPIC: DelayedAdapter(AIProviderEnum.ANTHROPIC, 0.3),
+        }
+        return orchestrator
+
+    async def test_returns_when_quorum_is_reached(self, orchestrator):
+        """Con quórum 1 no se espera al proveedor lento"""
+        start = time.perf_counter()
+        result = await orchestrator.orchestrate(
+            AIRequest(prompt="Hola"), strategy=AIOrchestrationStrategy.QUORUM, quorum=1
+        )
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.2
+        assert [r.ia_provider_name for r in result.responses] == [AIProviderEnum.OPENAI]
+        assert list(result.pending) == [AIProviderEnum.ANTHROPIC]
+        result.cancel_pending()
+
+    async def test_late_response_within_grace_is_collected(self, orchestrator):
+        result = await orchestrator.generate_quorum_responses(AIRequest(prompt="Hola"), quorum=1)
+
+        late = await result.collect_late(grace_seconds=1.0)
+
+        assert [r.ia_provider_name for r in late] == [AIProviderEnum.ANTHROPIC]
+        assert late[0].status == AIResponseStatus.SUCCESS
+        assert result.pending == {}
+
+    async def test_response_after_grace_is_discarded(self, orchestrator):
+        """Lo que no llega dentro de la ventana de gracia se cancela"""
+        result = await orchestrator.generate_quorum_responses(AIRequest(prompt="Hola"), quorum=1)
+
+        late = await result.collect_late(grace_seconds=0.05)
+
+        assert late[0].status == AIResponseStatus.TIMEOUT
+        await asyncio.sleep(0)
+        assert orchestrator.adapters[AIProviderEnum.ANTHROPIC].cancelled
+
+    async def test_grace_is_measured_from_quorum_not_from_collection(self, orchestrator):
+        """Tras una síntesis larga solo se incorpora lo que terminó dentro de la ventana"""
+        result = await orchestrator.generate_quorum_responses(AIRequest(prompt="Hola"), quorum=1)
+        await asyncio.sleep(0.4)  # Síntesis en curso; Anthropic termina a los ~0.3s
+
+        late = await result.collect_late(grace_seconds=0.05)
+
+        assert late[0].status == AIResponseStatus.TIMEOUT
+        assert "después de la ventana" in late[0].error_message
+
+    async def test_straggler_within_grace_survives_long_synthesis(self, orchestrator):
+        result = await orchestrator.generate_quorum_responses(AIRequest(prompt="Hola"), quorum=1)
+        await asyncio.sleep(0.4)
+
+        late = await result.collect_late(grace_seconds=1.0)
+
+        assert late[0].status == AIResponseStatus.SUCCESS
+
+    async def test_failures_do_not_count_towards_quorum(self, orchestrator):
+        """Un error rápido no alcanza el quórum: se espera a una respuesta exitosa"""
+        orchestrator.adapters[AIProviderEnum.OPENAI].status = AIResponseStatus.ERROR
+
+        result = await orchestrator.generate_quorum_responses(AIRequest(prompt="Hola"), quorum=1)
+
+        assert {r.ia_provider_name: r.status for r in result.responses} == {
+            AIProviderEnum.OPENAI: AIResponseStatus.ERROR,
+            AIProviderEnum.ANTHROPIC: AIResponseStatus.SUCCESS,
+        }
+        assert result.pending == {}
+
+
+class TestProgressiveQuorum:
+    """Quórum de la síntesis progresiva relativo a los proveedores activos"""
+
+    @pytest.fixture(autouse=True)
+    def progressive(self, monkeypatch):
+        monkeypatch.setattr(orchestrator_module.settings, "PROGRESSIVE_SYNTHESIS_ENABLED", True)
+        monkeypatch.setattr(orchestrator_module.settings, "PROGRESSIVE_SYNTHESIS_QUORUM", 3)
+
+    @staticmethod
+    def _orchestrator(providers: int) -> AIOrchestrator:
+        orchestrator = AIOrchestrator()
+        orchestrator.adapters = {f"proveedor-{i}": DelayedAdapter(AIProviderEnum.OPENAI, 0) for i in range(providers)}
+        return orchestrator
+
+    def test_two_providers_wait_for_both(self):
+        assert self._orchestrator(2).progressive_quorum() is None
+
+    def test_quorum_leaves_the_slowest_out(self):
+        assert self._orchestrator(3).progressive_quorum() == 2
+        assert self._orchestrator(5).progressive_quorum() == 3
+
+    def test_quorum_never_below_two(self, monkeypatch):
+        monkeypatch.setattr(orchestrator_module.settings, "PROGRESSIVE_SYNTHESIS_QUORUM", 1)
+        assert self._orchestrator(4).progressive_quorum() == 2
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(orchestrator_module.settings, "PROGRESSIVE_SYNTHESIS_ENABLED", False)
+        assert self._orchestrator(4).progressive_quorum() is None
+
+
+class FakeSynthesisAdapter:
+    """Adaptador de síntesis simulado para el pase de fusión"""
+
+    def __init__(self, text: str = None):
+        self.text = text
+        self.requests = []
+
+    async def generate_response(self, request: AIRequest) -> StandardAIResponse:
+        self.requests.append(request)
+        if self.text is None:
+            return StandardAIResponse(
+                ia_provider_name=AIProviderEnum.ANTHROPIC,
+                status=AIResponseStatus.ERROR,
+                error_message="fallo",
+                latency_ms=10
+            )
+        return _response(AIProviderEnum.ANTHROPIC, text=self.text)
+
+
+class TestLateMerge:
+    """Pruebas de AIModerator.merge_late_responses"""
+
+    @pytest.fixture
+    def synthesis(self):
+        return ModeratorResponse(
+            synthesis_text="## 1. Resumen Conciso General\n- Python es versátil.",
+            quality=SynthesisQuality.MEDIUM,
+            key_themes=["Python es versátil"],
+            contradictions=[],
+            consensus_areas=["Python es popular"],
+            source_references={"OPENAI": ["Gran biblioteca estándar"]},
+            processing_time_ms=500,
+            original_responses_count=2,
+            successful_responses_count=2
+        )
+
+    async def test_delta_is_merged(self, synthesis):
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeSynthesisAdapter(
+            "### 2.a. Afirmaciones Clave por IA:\n"
+            "**[AI_Modelo_ANTHROPIC] dice:**\n"
+            "- Python 3.13 elimina el GIL de forma experimental.\n\n"
+            "### 2.c. Contradicciones Factuales Evidentes:\n"
+            "- Año de creación: [AI_Modelo_OPENAI] afirma '1991', mientras que [AI_Modelo_ANTHROPIC] afirma '1989'\n"
+        )
+
+        merged = await moderator.merge_late_responses(synthesis, [_response(AIProviderEnum.ANTHROPIC)])
+
+        assert merged.contradictions[0].startswith("Año de creación")
+        assert merged.source_references["ANTHROPIC"] == ["Python 3.13 elimina el GIL de forma experimental."]
+        assert merged.consensus_areas == ["Python es popular"]
+        assert merged.successful_responses_count == 3
+        assert "Actualización con Respuestas Tardías" in merged.synthesis_text
+        # Pase barato: pocos tokens y sin el texto completo de la síntesis previa
+        request = moderator.synthesis_adapter.requests[0]
+        assert request.max_tokens <= 400
+        assert synthesis.synthesis_text not in request.prompt
+        # La síntesis original no se modifica
+        assert synthesis.contradictions == []
+
+    async def test_failed_merge_still_records_source(self, synthesis):
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeSynthesisAdapter(text=None)
+
+        merged = await moderator.merge_late_responses(synthesis, [_response(AIProviderEnum.ANTHROPIC)])
+
+        assert merged.synthesis_text == synthesis.synthesis_text
+        assert "ANTHROPIC" in merged.source_references
+        assert merged.successful_responses_count == 3
+
+    async def test_only_discarded_responses(self, synthesis):
+        """Las respuestas descartadas se cuentan pero no disparan la fusión"""
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeSynthesisAdapter("no debería usarse")
+
+        merged = await moderator.merge_late_responses(
+            synthesis, [_response(AIProviderEnum.ANTHROPIC, status=AIResponseStatus.TIMEOUT)]
+        )
+
+        assert moderator.synthesis_adapter.requests == []
+        assert merged.original_responses_count == 3
+        assert merged.successful_responses_count == 2
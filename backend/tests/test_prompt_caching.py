@@ -0,0 +1,283 @@
+"""
+Pruebas de la caché de prompts del proveedor
+Verificación de los puntos de corte cache_control de Anthropic, el orden de
+prefijo estable de los templates, el reporte de tokens cacheados y un benchmark
+de TTFT contra servidores simulados que respetan la caché de prompts
+"""
+
+import pytest
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+import app.services.ai_adapters.anthropic_adapter as anthropic_module
+import app.services.ai_adapters.base as base_module
+from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.outbound_scheduler import OutboundScheduler, ProviderLimits, count_tokens
+from app.services.prompt_templates import PromptTemplateManager
+from app.services.response_cache import ResponseCache
+from app.schemas.ai_response import AIRequest, AIProviderEnum
+
+
+SONNET = "claude-3-5-sonnet-20241022"
+QUESTIONS = [
+    "¿Qué ventajas tiene PostgreSQL frente a MySQL?",
+    "¿Cómo se configura un índice GIN?",
+    "¿Qué es el particionado declarativo?",
+    "¿Cuándo conviene usar JSONB?",
+    "¿Cómo funciona el autovacuum?",
+    "¿Qué es una réplica de lectura?",
+]
+
+
+def _system_prompt() -> str:
+    """System message largo y estático (template de OpenAI, ~1400 tokens)"""
+    return PromptTemplateManager().build_prompt_for_provider(
+        AIProviderEnum.OPENAI, user_question="-", context_text="-"
+    )["system_message"]
+
+
+class PromptCachingServer:
+    """
+    Proveedor simulado con caché de prompts. El tiempo hasta el primer token
+    es una base más un coste de prefill por cada token de entrada no cacheado.
+
+    - Anthropic: cachea hasta el último bloque con `cache_control`.
+    - OpenAI: cachea automáticamente el prefijo común más largo con solicitudes
+      anteriores, en bloques de 128 tokens y a partir de 1024.
+    """
+
+    def __init__(self, provider: AIProviderEnum, base_ms: float = 5.0, prefill_ms_per_token: float = 0.05):
+        self.provider = provider
+        self.base_ms = base_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.cached_prefixes = set()
+        self.seen_inputs = []
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if self.provider == AIProviderEnum.ANTHROPIC:
+            input_tokens, cached_tokens, created_tokens = self._anthropic_cache(payload)
+        else:
+            input_tokens, cached_tokens, created_tokens = self._openai_cache(payload)
+
+        await asyncio.sleep((self.base_ms + (input_tokens - cached_tokens) * self.prefill_ms_per_token) / 1000)
+        return self._response(payload.get("stream", False), input_tokens, cached_tokens, created_tokens)
+
+    def _anthropic_cache(self, payload: dict):
+        blocks = []
+        system = payload.get("system")
+        if isinstance(system, list):
+            blocks.extend(system)
+        elif system:
+            blocks.append({"text": system})
+        for message in payload["messages"]:
+            content = message["content"]
+            blocks.extend(content if isinstance(content, list) else [{"text": content}])
+
+        input_tokens = sum(count_tokens(block["text"]) for block in blocks)
+        breakpoints = [i for i, block in enumerate(blocks) if "cache_control" in block]
+        if not breakpoints:
+            return input_tokens, 0, 0
+
+        prefix = "".join(block["text"] for block in blocks[:breakpoints[-1] + 1])
+        prefix_tokens = count_tokens(prefix)
+        if prefix in self.cached_prefixes:
+            return input_tokens, prefix_tokens, 0
+        self.cached_prefixes.add(prefix)
+        return input_tokens, 0, prefix_tokens
+
+    def _openai_cache(self, payload: dict):
+        text = "".join(message["content"] for message in payload["messages"])
+        input_tokens = count_tokens(text)
+        common_chars = max((len(_common_prefix(text, seen)) for seen in self.seen_inputs), default=0)
+        self.seen_inputs.append(text)
+        common_tokens = count_tokens(text[:common_chars])
+        cached_tokens = (common_tokens // 128) * 128 if common_tokens >= 1024 else 0
+        return input_tokens, cached_tokens, 0
+
+    def _response(self, stream: bool, input_tokens: int, cached_tokens: int, created_tokens: int) -> httpx.Response:
+        if self.provider == AIProviderEnum.ANTHROPIC:
+            usage = {
+                "input_tokens": input_tokens - cached_tokens - created_tokens,
+                "cache_read_input_tokens": cached_tokens,
+                "cache_creation_input_tokens": created_tokens,
+            }
+            if not stream:
+                return httpx.Response(200, json={
+                    "content": [{"type": "text", "text": "Hola"}], "usage": {**usage, "output_tokens": 1}
+                })
+            events = [
+                {"type": "message_start", "message": {"usage": usage}},
+                {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hola"}},
+                {"type": "message_delta", "usage": {"output_tokens": 1}},
+                {"type": "message_stop"},
+            ]
+        else:
+            usage = {
+                "prompt_tokens": input_tokens, "completion_tokens": 1, "total_tokens": input_tokens + 1,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            }
+            if not stream:
+                return httpx.Response(200, json={"choices": [{"message": {"content": "Hola"}}], "usage": usage})
+            events = [
+                {"choices": [{"delta": {"content": "Hola"}}]},
+                {"choices": [], "usage": usage},
+            ]
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+
+def _common_prefix(a: str, b: str) -> str:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return a[:length]
+
+
+async def _ttft_ms(adapter, request: AIRequest) -> float:
+    start = time.perf_counter()
+    async for _ in adapter.stream_response(request):
+        return (time.perf_counter() - start) * 1000
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch):
+    monkeypatch.setattr(base_module, "response_cache", ResponseCache())
+    # Sin límites RPM/TPM: el benchmark mide solo el servidor simulado
+    monkeypatch.setattr(base_module, "outbound_scheduler", OutboundScheduler(limits={
+        provider.value: ProviderLimits(max_concurrency=0, requests_per_minute=0, tokens_per_minute=0)
+        for provider in AIProviderEnum
+    }))
+
+
+class TestAnthropicCacheBreakpoints:
+    """Pruebas de los bloques cache_control del payload de Anthropic"""
+
+    def test_long_system_message_is_marked(self):
+        payload = AnthropicAdapter(api_key="sk-ant-test", model=SONNET)._build_payload(
+            AIRequest(prompt="Hola", system_message=_system_prompt())
+        )
+
+        assert payload["system"] == [{"type": "text", "text": _system_prompt(), "cache_control": {"type": "ephemeral"}}]
+        assert payload["messages"][0]["content"] == "Hola"
+
+    def test_short_prompts_are_not_marked(self):
+        """Por debajo del mínimo cacheable no se paga la escritura en caché"""
+        payload = AnthropicAdapter(api_key="sk-ant-test", model=SONNET)._build_payload(
+            AIRequest(prompt="Hola", system_message="Eres útil.", cacheable_prefix_chars=2, cacheable_prefix_tokens=1)
+        )
+
+        assert payload["system"] == "Eres útil."
+        assert payload["messages"][0]["content"] == "Hola"
+
+    def test_haiku_requires_longer_prefix(self):
+        payload = AnthropicAdapter(api_key="sk-ant-test")._build_payload(
+            AIRequest(prompt="Hola", system_message=_system_prompt())
+        )
+
+        assert isinstance(payload["system"], str)
+
+    def test_static_prompt_prefix_is_split(self):
+        prompt = "Instrucciones fijas. " * 600 + "Respuestas variables"
+        prefix_chars = len(prompt) - len("Respuestas variables")
+
+        payload = AnthropicAdapter(api_key="sk-ant-test")._build_payload(AIRequest(
+            prompt=prompt, cacheable_prefix_chars=prefix_chars, cacheable_prefix_tokens=count_tokens(prompt[:prefix_chars])
+        ))
+
+        content = payload["messages"][0]["content"]
+        assert content[0]["cache_control"] == {"type": "ephemeral"}
+        assert content[0]["text"] + content[1]["text"] == prompt
+        assert "cache_control" not in content[1]
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(anthropic_module.settings, "AI_PROMPT_CACHE_ENABLED", False)
+
+        payload = AnthropicAdapter(api_key="sk-ant-test", model=SONNET)._build_payload(
+            AIRequest(prompt="Hola", system_message=_system_prompt())
+        )
+
+        assert isinstance(payload["system"], str)
+
+
+class TestStablePrefixTemplates:
+    """Los templates dejan las partes variables al final"""
+
+    def test_system_messages_do_not_depend_on_question_or_context(self):
+        manager = PromptTemplateManager()
+        for provider in manager.get_available_providers():
+            first = manager.build_prompt_for_provider(provider, "¿Pregunta A?", "Contexto A")
+            second = manager.build_prompt_for_provider(provider, "¿Pregunta B?", "Contexto B")
+
+            assert first["system_message"] == second["system_message"]
+            assert "¿Pregunta A?" in first["user_message"]
+            assert "Contexto A" in first["user_message"]
+
+
+class TestPromptCachingBenchmark:
+    """Benchmark de TTFT con system prompts repetidos contra servidores simulados"""
+
+    async def test_anthropic_cache_control_reduces_ttft(self, monkeypatch):
+        async def run() -> float:
+            adapter = AnthropicAdapter(api_key="sk-ant-test", model=SONNET)
+            adapter.client = httpx.AsyncClient(transport=PromptCachingServer(AIProviderEnum.ANTHROPIC).transport())
+            ttfts = [
+                await _ttft_ms(adapter, AIRequest(prompt=question, system_message=_system_prompt()))
+                for question in QUESTIONS
+            ]
+            return statistics.median(ttfts[1:])  # El primero siempre escribe en caché
+
+        monkeypatch.setattr(anthropic_module.settings, "AI_PROMPT_CACHE_ENABLED", False)
+        uncached_ms = await run()
+        monkeypatch.setattr(anthropic_module.settings, "AI_PROMPT_CACHE_ENABLED", True)
+        cached_ms = await run()
+
+        print(f"\nTTFT Anthropic con system prompt repetido: {uncached_ms:.0f}ms -> {cached_ms:.0f}ms")
+        assert cached_ms < uncached_ms * 0.6
+
+    async def test_anthropic_cached_tokens_are_reported(self):
+        adapter = AnthropicAdapter(api_key="sk-ant-test", model=SONNET)
+        adapter.client = httpx.AsyncClient(transport=PromptCachingServer(AIProviderEnum.ANTHROPIC).transport())
+
+        first = await adapter.generate_response(AIRequest(prompt=QUESTIONS[0], system_message=_system_prompt()))
+        second = await adapter.generate_response(AIRequest(prompt=QUESTIONS[1], system_message=_system_prompt()))
+
+        assert first.usage_info["cache_creation_tokens"] > 1024
+        assert first.usage_info["cached_tokens"] == 0
+        assert second.usage_info["cached_tokens"] == first.usage_info["cache_creation_tokens"]
+
+    async def test_openai_stable_prefix_reduces_ttft(self):
+        """Con el system message estático los prompts repetidos reutilizan la caché automática"""
+        manager = PromptTemplateManager()
+        server = PromptCachingServer(AIProviderEnum.OPENAI)
+        adapter = OpenAIAdapter(api_key="sk-test")
+        adapter.client = httpx.AsyncClient(transport=server.transport())
+
+        async def ask(question: str, stable: bool):
+            prompt = manager.build_prompt_for_provider(AIProviderEnum.OPENAI, question, "Proyecto de bases de datos")
+            if not stable:
+                # Orden anterior: la pregunta delante de las instrucciones fijas
+                prompt = {"system_message": f"{prompt['user_message']}\n\n{prompt['system_message']}", "user_message": question}
+            return AIRequest(prompt=prompt["user_message"], system_message=prompt["system_message"])
+
+        variable_first = [await _ttft_ms(adapter, await ask(q, stable=False)) for q in QUESTIONS]
+        server.seen_inputs.clear()
+        stable_prefix = [await _ttft_ms(adapter, await ask(q, stable=True)) for q in QUESTIONS]
+        response = await adapter.generate_response(await ask("¿Qué es MVCC?", stable=True))
+
+        print(
+            f"\nTTFT OpenAI con system prompt repetido: {statistics.median(variable_first[1:]):.0f}ms -> "
+            f"{statistics.median(stable_prefix[1:]):.0f}ms"
+        )
+        assert statistics.median(stable_prefix[1:]) < statistics.median(variable_first[1:]) * 0.6
+        assert response.usage_info["cached_tokens"] >= 1024
@@ -0,0 +1,111 @@
+"""
+Pruebas del compilador de prompts con prefijo estático
+Verificación del prefijo precompilado, el conteo único de tokens cacheables y
+su propagación desde el moderador hasta la información de uso del adaptador
+"""
+
+import pytest
+from datetime import datetime
+
+import httpx
+
+import app.services.ai_adapters.base as base_module
+import app.services.prompt_compiler as compiler_module
+from app.services.prompt_compiler import CompiledPrompt
+from app.services.ai_moderator import AIModerator, SYNTHESIS_PROMPT, STRUCTURED_SYNTHESIS_PROMPT
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.response_cache import ResponseCache
+from app.schemas.ai_response import AIRequest, StandardAIResponse, AIResponseStatus, AIProviderEnum
+
+
+def _responses(text: str):
+    return [
+        StandardAIResponse(
+            ia_provider_name=provider,
+            response_text=f"{text} ({provider.value})",
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=1000,
+            timestamp=datetime.utcnow()
+        )
+        for provider in (AIProviderEnum.OPENAI, AIProviderEnum.ANTHROPIC)
+    ]
+
+
+class TestCompiledPrompt:
+    """Pruebas de CompiledPrompt"""
+
+    def test_render_appends_variable_part(self):
+        template = CompiledPrompt("Instrucciones fijas.\n", "Datos: {data}")
+
+        rendered = template.render(data="valor con {llaves}")
+
+        assert rendered.text == "Instrucciones fijas.\nDatos: valor con {llaves}"
+        assert rendered.prefix_chars == len("Instrucciones fijas.\n")
+
+    def test_prefix_cannot_have_fields(self):
+        with pytest.raises(ValueError):
+            CompiledPrompt("Pregunta: {question}\n", "{data}")
+
+    def test_prefix_tokens_are_counted_once(self, monkeypatch):
+        calls = []
+
+        def counting(text):
+            calls.append(text)
+            return 7
+
+        monkeypatch.setattr(compiler_module, "count_tokens", counting)
+        template = CompiledPrompt("Instrucciones fijas.\n", "{data}")
+
+        assert [template.render(data=str(i)).prefix_tokens for i in range(3)] == [7, 7, 7]
+        assert calls == ["Instrucciones fijas.\n"]
+
+
+class TestSynthesisPrompt:
+    """Pruebas del prompt de síntesis precompilado del moderador"""
+
+    def test_static_instructions_come_first(self):
+        moderator = AIModerator()
+        first = moderator._build_synthesis_request(_responses("Python es versátil"))
+        second = moderator._build_synthesis_request(_responses("Rust es seguro"))
+
+        assert first.cacheable_prefix_chars == len(SYNTHESIS_PROMPT.prefix)
+        assert first.cacheable_prefix_tokens == SYNTHESIS_PROMPT.prefix_tokens > 1024
+        assert first.prompt[:first.cacheable_prefix_chars] == second.prompt[:second.cacheable_prefix_chars]
+        # Solo las respuestas de las IAs quedan fuera del prefijo
+        assert "Python es versátil" in first.prompt[first.cacheable_prefix_chars:]
+        assert first.prompt.startswith("**System Role:**")
+
+    def test_structured_instructions_are_in_prefix(self):
+        request = AIModerator()._build_synthesis_request(_responses("Python es versátil"), structured=True)
+
+        prefix = request.prompt[:request.cacheable_prefix_chars]
+        assert prefix == STRUCTURED_SYNTHESIS_PROMPT.prefix
+        assert "objeto JSON" in prefix
+
+    def test_no_successful_responses(self):
+        assert AIModerator()._create_synthesis_prompt([]) == ""
+
+
+class TestCacheEligibleUsage:
+    """Los adaptadores reportan los tokens de prefijo cacheable por solicitud"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_cache(self, monkeypatch):
+        monkeypatch.setattr(base_module, "response_cache", ResponseCache())
+
+    async def test_usage_reports_prefix_and_cached_tokens(self):
+        adapter = OpenAIAdapter(api_key="sk-test")
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={
+            "choices": [{"message": {"content": "Hola"}}],
+            "usage": {
+                "prompt_tokens": 2500, "completion_tokens": 10, "total_tokens": 2510,
+                "prompt_tokens_details": {"cached_tokens": 2048}
+            }
+        })))
+
+        response = await adapter.generate_response(
+            AIRequest(prompt="Hola", cacheable_prefix_chars=3, cacheable_prefix_tokens=2076)
+        )
+
+        assert response.usage_info["cache_eligible_prefix_tokens"] == 2076
+        assert response.usage_info["cached_tokens"] == 2048
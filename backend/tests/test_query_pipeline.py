@@ -0,0 +1,178 @@
+"""
+Pruebas del ejecutor de grafos de dependencias del pipeline de consulta
+Verificación de solapamiento de etapas, camino crítico, cancelación ante errores
+y despacho especulativo
+"""
+
+import pytest
+import asyncio
+import time
+from uuid import uuid4
+
+from app.core.metrics import OrchestrationMetricsCollector
+from app.services.query_pipeline import PipelineExecutor, PipelineStage, Speculation, prompt_similarity
+
+
+def _stage(name, delay, inputs=(), outputs=(), log=None):
+    async def func(**kwargs):
+        if log is not None:
+            log.append(f"{name}:start")
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(f"{name}:end")
+        values = tuple(f"{name}.{output}" for output in outputs)
+        return values[0] if len(values) == 1 else values
+    return PipelineStage(name, func, inputs=tuple(inputs), outputs=tuple(outputs))
+
+
+class TestPipelineExecutor:
+    """Pruebas de la ejecución del grafo"""
+
+    async def test_independent_stages_overlap(self):
+        """Dos etapas independientes de 0.1s terminan en ~0.1s, no en 0.2s"""
+        executor = PipelineExecutor([
+            _stage("history", 0.1, inputs=("prompt",), outputs=("history",)),
+            _stage("retrieval", 0.1, inputs=("prompt",), outputs=("context",)),
+            _stage("orchestration", 0.01, inputs=("history", "context"), outputs=("result",)),
+        ])
+
+        start = time.perf_counter()
+        run = await executor.run({"prompt": "hola"})
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.18
+        assert run.values["result"] == "orchestration.result"
+        assert run.overlap_saved_ms > 50
+
+    async def test_stage_waits_for_its_inputs(self):
+        """Una etapa no arranca hasta que sus entradas están disponibles"""
+        log = []
+        executor = PipelineExecutor([
+            _stage("b", 0.01, inputs=("a_out",), outputs=("b_out",), log=log),
+            _stage("a", 0.05, outputs=("a_out",), log=log),
+        ])
+        await executor.run()
+        assert log.index("a:end") < log.index("b:start")
+
+    async def test_multiple_outputs(self):
+        """Una etapa puede producir varios valores"""
+        executor = PipelineExecutor([_stage("pre", 0.0, outputs=("refined", "flag"))])
+        run = await executor.run()
+        assert run.values["refined"] == "pre.refined"
+        assert run.values["flag"] == "pre.flag"
+
+    async def test_critical_path(self):
+        """El camino crítico sigue la dependencia más lenta"""
+        executor = PipelineExecutor([
+            _stage("fast", 0.01, outputs=("x",)),
+            _stage("slow", 0.08, outputs=("y",)),
+            _stage("join", 0.01, inputs=("x", "y"), outputs=("z",)),
+        ])
+        run = await executor.run()
+        assert run.critical_path == ["slow", "join"]
+        assert run.critical_path_ms >= 80
+        assert set(run.as_metrics()["stages"]) == {"fast", "slow", "join"}
+
+    async def test_failure_cancels_remaining_stages(self):
+        """Si una etapa falla se cancelan las demás y se propaga el error"""
+        cancelled = asyncio.Event()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def long_running():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        executor = PipelineExecutor([
+            PipelineStage("failing", failing, outputs=("a",)),
+            PipelineStage("long", long_running, outputs=("b",)),
+            _stage("after", 0.0, inputs=("a",), outputs=("c",)),
+        ])
+
+        with pytest.raises(RuntimeError):
+            await executor.run()
+        assert cancelled.is_set()
+
+    def test_cycle_is_rejected(self):
+        """Un grafo con ciclos se rechaza al construirlo"""
+        with pytest.raises(ValueError):
+            PipelineExecutor([
+                _stage("a", 0.0, inputs=("b_out",), outputs=("a_out",)),
+                _stage("b", 0.0, inputs=("a_out",), outputs=("b_out",)),
+            ])
+
+    def test_duplicate_output_is_rejected(self):
+        with pytest.raises(ValueError):
+            PipelineExecutor([
+                _stage("a", 0.0, outputs=("x",)),
+                _stage("b", 0.0, outputs=("x",)),
+            ])
+
+    async def test_missing_input_is_rejected(self):
+        """Una entrada que nadie produce y no viene en los valores iniciales es un error"""
+        executor = PipelineExecutor([_stage("a", 0.0, inputs=("prompt",), outputs=("x",))])
+        with pytest.raises(ValueError):
+            await executor.run()
+
+
+class TestPromptSimilarity:
+    """Pruebas de la similitud usada para reutilizar la búsqueda especulativa"""
+
+    def test_identical_after_normalization(self):
+        assert prompt_similarity("¿Qué es Python?", "  ¿qué es  python? ") == 1.0
+
+    def test_small_refinement_is_similar(self):
+        assert prompt_similarity(
+            "Explica las ventajas de Python",
+            "Explica las ventajas de Python para ciencia de datos"
+        ) > 0.7
+
+    def test_different_prompts_are_not_similar(self):
+        assert prompt_similarity("¿Qué es Python?", "Receta de tortilla de patatas") < 0.5
+
+
+class TestSpeculation:
+    """Pruebas del trabajo especulativo (despacho a proveedores durante el pre-análisis)"""
+
+    async def test_confirm_reports_latency_saved(self):
+        """Al confirmar, lo ya avanzado por la especulación cuenta como ahorro"""
+        speculation = Speculation(asyncio.sleep(0.1, result="respuestas"))
+        await asyncio.sleep(0.05)  # Pre-análisis en curso
+        result = await speculation.confirm()
+        assert result == "respuestas"
+        assert 40 <= speculation.latency_saved_ms <= 90
+
+    async def test_confirm_after_completion_saves_whole_duration(self):
+        speculation = Speculation(asyncio.sleep(0.03, result="ok"))
+        await asyncio.sleep(0.08)
+        await speculation.confirm()
+        assert 25 <= speculation.latency_saved_ms <= 60
+
+    async def test_discard_cancels_work(self):
+        """Descartar cancela las llamadas especulativas en curso"""
+        speculation = Speculation(asyncio.sleep(5))
+        speculation.discard()
+        await asyncio.sleep(0)
+        assert speculation.task.cancelled()
+
+    def test_hit_rate_metrics(self):
+        """El recolector reporta tasa de acierto y latencia ahorrada"""
+        collector = OrchestrationMetricsCollector()
+        interaction_id = uuid4()
+        collector.start_orchestration(interaction_id, uuid4(), uuid4())
+
+        collector.record_speculation(interaction_id, hit=True, latency_saved_ms=300)
+        collector.record_speculation(uuid4(), hit=True, latency_saved_ms=100)
+        collector.record_speculation(uuid4(), hit=False)
+
+        stats = collector.get_speculation_stats()
+        assert stats["attempts"] == 3
+        assert stats["hit_rate_percent"] == pytest.approx(66.67)
+        assert stats["avg_latency_saved_ms"] == 200
+        assert collector.get_current_metrics(interaction_id).speculation_outcome == "hit"
+        assert collector.get_system_health_metrics()["speculation"]["hits"] == 2
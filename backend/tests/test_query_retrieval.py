@@ -0,0 +1,168 @@
+"""
+Pruebas de regresión de la búsqueda de contexto de QueryService
+Verificación de que la búsqueda usa el pool compartido de app.core.database
+(ningún engine creado por consulta, ninguna sesión síncrona) y de que consultas
+concurrentes no bloquean el event loop
+"""
+
+import pytest
+import asyncio
+import gc
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+import sqlmodel
+
+from app.core.config import settings
+from app.core.loop_monitor import EventLoopLagMonitor
+from app.schemas.query import ContextConfig, QueryRequest, QueryType
+from app.services import query_service as query_service_module
+from app.services.context_manager import ContextManager
+from app.services.query_service import QueryService
+
+DB_LATENCY = 0.02
+
+
+class FakeSession:
+    def __init__(self, factory):
+        self.factory = factory
+        self.closed = 0
+
+    async def __aenter__(self):
+        self.factory.sessions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def close(self):
+        self.closed += 1
+
+
+class FakeSessionFactory:
+    def __init__(self):
+        self.sessions = 0
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+def _request():
+    return QueryRequest(
+        user_question="¿Qué framework uso para APIs en Python?",
+        project_id=uuid4(),
+        user_id=uuid4(),
+        query_type=QueryType.CONTEXT_AWARE,
+        context_config=ContextConfig(top_k=3, similarity_threshold=0.5, max_context_length=2000)
+    )
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    """QueryService con embeddings y búsqueda simulados; crear un engine falla"""
+    if not settings.DATABASE_URL:
+        # El engine compartido se crea al importar app.core.database (sin conectar)
+        monkeypatch.setattr(settings, "DATABASE_URL", "postgresql+asyncpg://orquix@localhost/orquix")
+    from app.core import database
+
+    engines_created = []
+
+    def forbidden_engine(*args, **kwargs):
+        engines_created.append(args)
+        raise AssertionError("engine creado durante la búsqueda de contexto")
+
+    monkeypatch.setattr(sqlalchemy.ext.asyncio, "create_async_engine", forbidden_engine)
+    monkeypatch.setattr(sqlalchemy, "create_engine", forbidden_engine)
+    monkeypatch.setattr(sqlmodel, "create_engine", forbidden_engine)
+    monkeypatch.setattr(query_service_module, "create_engine", forbidden_engine, raising=False)
+
+    factory = FakeSessionFactory()
+    monkeypatch.setattr(database, "async_session_factory", factory)
+
+    searches = []
+
+    async def fake_find_similar_chunks(db, query_embedding, project_id, user_id=None, top_k=5, similarity_threshold=None):
+        searches.append(db)
+        await asyncio.sleep(DB_LATENCY)  # Consulta async: cede el loop
+        return [
+            SimpleNamespace(content_text=f"FastAPI es un framework web ({i})", content_embedding=[1.0, 0.0, 0.0],
+                            source_type="document")
+            for i in range(top_k)
+        ]
+
+    async def fake_enrich(self, query, project_id, user_id, enable_history=True, max_history_tokens=600):
+        return query
+
+    async def fake_embedding(self, text, tenant=None):
+        return [1.0, 0.0, 0.0]
+
+    monkeypatch.setattr(query_service_module, "find_similar_chunks", fake_find_similar_chunks)
+    monkeypatch.setattr(ContextManager, "enrich_query_with_history", fake_enrich)
+    monkeypatch.setattr(ContextManager, "generate_embedding", fake_embedding)
+
+    # Sin red no se puede descargar el tokenizer: ContextManager sin __init__
+    service = QueryService()
+    service.context_manager = ContextManager.__new__(ContextManager)
+    service.context_manager.db = None
+    service.context_manager.client = object()
+
+    return SimpleNamespace(
+        service=service, factory=factory, searches=searches, engines_created=engines_created
+    )
+
+
+class TestSharedEngineRetrieval:
+    """La búsqueda de contexto reutiliza el pool compartido"""
+
+    async def test_uses_pooled_session_not_new_engines(self, retrieval):
+        context_info, context_text = await retrieval.service._search_relevant_context(_request(), None)
+
+        assert context_info is not None and context_info.total_chunks == 3
+        assert "FastAPI" in context_text
+        assert retrieval.engines_created == []
+        assert retrieval.factory.sessions == 1
+        assert isinstance(retrieval.searches[0], FakeSession)
+
+    async def test_caller_session_is_reused(self, retrieval):
+        caller_session = sqlmodel.ext.asyncio.session.AsyncSession()
+
+        await retrieval.service._search_relevant_context(_request(), caller_session)
+
+        assert retrieval.searches == [caller_session]
+        assert retrieval.factory.sessions == 0
+
+    async def test_context_manager_shared_across_requests(self, retrieval):
+        shared = retrieval.service.context_manager
+
+        await retrieval.service._search_relevant_context(_request(), None)
+        await retrieval.service._search_relevant_context(_request(), None)
+
+        # Un solo ContextManager (y cliente de OpenAI); cada petición con su sesión
+        assert retrieval.service.context_manager is shared and shared.db is None
+        first, second = retrieval.searches
+        assert first is not second
+
+    async def test_concurrent_searches_do_not_block_loop(self, retrieval):
+        """Benchmark: 50 búsquedas concurrentes solapan su E/S y el loop no se bloquea"""
+        gc.collect()  # Que una pasada completa del GC no cuente como bloqueo
+        monitor = EventLoopLagMonitor(interval=0.005, warn_threshold_ms=50)
+        monitor.start()
+        await retrieval.service._search_relevant_context(_request(), None)  # Calentamiento
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            retrieval.service._search_relevant_context(_request(), None) for _ in range(50)
+        ))
+        elapsed = time.perf_counter() - start
+        await monitor.stop()
+
+        stats = monitor.get_stats()
+        print(f"\n50 búsquedas en {elapsed * 1000:.0f}ms, lag máximo {stats['max_lag_ms']}ms")
+        assert all(info is not None for info, _ in results)
+        assert retrieval.engines_created == []
+        assert retrieval.factory.sessions == 51
+        assert elapsed < 50 * DB_LATENCY / 2  # En paralelo, no 50 x 20ms
+        assert stats["max_lag_ms"] < 50
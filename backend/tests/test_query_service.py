@@ -69,7 +69,7 @@ async def test_full_query_pipeline():
         print("   → Construyendo prompts específicos...")
         print("   → Ejecutando consultas en paralelo...")
         
-        response = await query_service.process_query(query_request, session)
+        response = await query_service.process_query(query_request)
         
         print(f"   ✅ Consulta completada en {response.processing_time_ms}ms")
         
@@ -0,0 +1,214 @@
+"""
+Pruebas del enrutado de lecturas a la réplica
+Verificación de la ventana read-your-writes por usuario, de la elección de
+engine de las sesiones de lectura (una vez por sesión), del registro automático
+de escrituras tras el flush y en el write-behind, y (con dos PostgreSQL locales
+en DATABASE_URL y DATABASE_READ_URL) del enrutado real
+"""
+
+import os
+import pytest
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import read_routing
+from app.core.config import settings
+from app.core.read_routing import ReadRouter, set_current_user
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(read_routing.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def router():
+    router = ReadRouter(window_seconds=5.0)
+    router.replica_enabled = True
+    return router
+
+
+class TestReadYourWrites:
+    """Ventana de lectura desde el primario tras escribir"""
+
+    def test_without_replica_reads_primary(self):
+        router = ReadRouter()
+
+        assert router.use_replica("u1") is False
+        assert router.get_stats()["primary_reads"] == 1
+
+    def test_recent_writer_reads_primary_until_window_ends(self, router, clock):
+        router.mark_write("u1")
+
+        assert router.use_replica("u1") is False
+        assert router.use_replica("u2") is True  # Otros usuarios siguen en la réplica
+
+        clock.now += 5.1
+        assert router.use_replica("u1") is True
+        stats = router.get_stats()
+        assert (stats["sticky_reads"], stats["replica_reads"], stats["sticky_users"]) == (1, 2, 0)
+
+    def test_uuid_and_str_are_the_same_user(self, router, clock):
+        user_id = uuid4()
+        router.mark_write(user_id)
+
+        assert router.use_replica(str(user_id)) is False
+
+    def test_request_user_from_context(self, router, clock):
+        router.mark_write("u1")
+
+        set_current_user("u1")
+        try:
+            assert router.use_replica() is False
+        finally:
+            set_current_user(None)
+        assert router.use_replica() is True
+
+    def test_tracked_users_are_bounded(self, clock):
+        router = ReadRouter(window_seconds=5.0, max_tracked_users=3)
+        router.replica_enabled = True
+        for i in range(3):
+            router.mark_write(f"u{i}")
+            clock.now += 1
+
+        router.mark_write("u3")
+
+        # Se descarta la ventana que antes caduca
+        assert router.get_stats()["sticky_users"] == 3
+        assert router.recently_wrote("u0") is False
+        assert router.recently_wrote("u3") is True
+
+
+@pytest.fixture
+def database(monkeypatch, router):
+    """app.core.database con una réplica (sin conectar) y un enrutador de prueba"""
+    if not settings.DATABASE_URL:
+        # El engine compartido se crea al importar app.core.database (sin conectar)
+        monkeypatch.setattr(settings, "DATABASE_URL", "postgresql+asyncpg://orquix@localhost/orquix")
+    from app.core import database
+
+    monkeypatch.setattr(database, "read_router", router)
+    monkeypatch.setattr(database, "read_engine", create_async_engine("postgresql+asyncpg://orquix@localhost:5433/orquix"))
+    return database
+
+
+class TestRoutedSessions:
+    """Las sesiones de lectura eligen engine en su primera consulta"""
+
+    def test_replica_unless_user_wrote(self, database, router, clock):
+        replica = database.RoutedReadSession(info={"user_id": "u2"})
+        router.mark_write("u1")
+        primary = database.RoutedReadSession(info={"user_id": "u1"})
+
+        assert replica.get_bind() is database.read_engine.sync_engine
+        assert primary.get_bind() is database.engine.sync_engine
+
+    def test_choice_is_sticky_for_the_session(self, database, router, clock):
+        session = database.RoutedReadSession(info={"user_id": "u1"})
+        assert session.get_bind() is database.read_engine.sync_engine
+
+        router.mark_write("u1")
+
+        # Una misma sesión no mezcla réplica y primario
+        assert session.get_bind() is database.read_engine.sync_engine
+        assert router.get_stats()["replica_reads"] == 1
+
+    def test_flush_marks_writers(self, database, router, clock):
+        user_id = uuid4()
+        flushed = SimpleNamespace(
+            new=[SimpleNamespace(user_id=user_id), SimpleNamespace(content="sin usuario")],
+            dirty=[],
+            deleted=[]
+        )
+
+        database._mark_flushed_writes(flushed, None)
+
+        assert router.recently_wrote(user_id)
+        assert router.get_stats()["writes_marked"] == 1
+
+
+class FakeWriteSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows=None):
+        pass
+
+    async def commit(self):
+        pass
+
+
+async def test_write_behind_marks_writer_after_commit(monkeypatch, router, clock):
+    from app.crud import interaction as interaction_crud
+    from app.services import interaction_writer as writer_module
+
+    monkeypatch.setattr(writer_module, "read_router", router)
+    user_id = uuid4()
+    interaction = interaction_crud.build_interaction({
+        "id": str(uuid4()),
+        "project_id": str(uuid4()),
+        "user_id": str(user_id),
+        "user_prompt": "¿Qué es Python?",
+        "ai_responses": [],
+        "moderator_synthesis": {},
+        "context_used": False,
+        "processing_time_ms": 10,
+        "created_at": "2026-10-19T12:00:00"
+    })
+    marked_at_commit = []
+
+    class CommitProbe(FakeWriteSession):
+        async def commit(self):
+            marked_at_commit.append(router.recently_wrote(user_id))
+
+    writer = writer_module.InteractionWriteBehind(session_factory=CommitProbe, context_manager=SimpleNamespace())
+
+    await writer.submit(writer_module.PendingInteraction(interaction=interaction))
+
+    # La ventana empieza tras el commit del lote, no al encolar
+    assert marked_at_commit == [False]
+    assert router.use_replica(user_id) is False
+
+
+@pytest.mark.skipif(
+    not (os.getenv("DATABASE_URL") and os.getenv("DATABASE_READ_URL")),
+    reason="Requiere dos PostgreSQL locales en DATABASE_URL y DATABASE_READ_URL"
+)
+async def test_routing_against_two_databases():
+    """Con dos instancias locales: la réplica sirve a quien no ha escrito"""
+    from app.core import database
+    from app.core.read_routing import read_router
+
+    async def server_port(session):
+        return (await session.execute(text("SELECT current_setting('port')"))).scalar_one()
+
+    async with database.async_session_factory() as primary:
+        primary_port = await server_port(primary)
+    reader, writer = str(uuid4()), str(uuid4())
+    read_router.mark_write(writer)
+
+    async with database.read_session(reader) as session:
+        replica_port = await server_port(session)
+    async with database.read_session(writer) as session:
+        sticky_port = await server_port(session)
+
+    assert replica_port != primary_port
+    assert sticky_port == primary_port
+    await database.engine.dispose()
+    await database.read_engine.dispose()
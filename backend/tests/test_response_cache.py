@@ -0,0 +1,176 @@
+"""
+Pruebas de la caché de respuestas de proveedores de IA
+Verificación de claves exactas, modo semántico, TTL, LRU y flags de bypass
+"""
+
+import pytest
+import httpx
+
+import app.services.ai_adapters.base as base_module
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.response_cache import ResponseCache, CacheLookup
+from app.schemas.ai_response import AIRequest, AIResponseStatus, AIProviderEnum, StandardAIResponse
+
+
+def _openai_payload(text: str) -> dict:
+    return {
+        "choices": [{"message": {"content": text}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        "model": "gpt-4o-mini"
+    }
+
+
+class TestResponseCache:
+    """Pruebas de la caché en BaseAIAdapter.generate_response"""
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        """Caché aislada para cada prueba"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        monkeypatch.setattr(base_module, "response_cache", cache)
+        return cache
+
+    @pytest.fixture
+    def calls(self):
+        return []
+
+    @pytest.fixture
+    def adapter(self, calls):
+        """Adaptador OpenAI con transporte simulado que cuenta las llamadas"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(200, json=_openai_payload(f"respuesta {len(calls)}"))
+
+        adapter = OpenAIAdapter(api_key="sk-test", model="gpt-4o-mini")
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return adapter
+
+    async def test_identical_request_served_from_cache(self, cache, adapter, calls):
+        """Una solicitud idéntica no vuelve a salir al proveedor"""
+        request = AIRequest(prompt="¿Qué es Python?", temperature=0.2)
+
+        first = await adapter.generate_response(request)
+        second = await adapter.generate_response(request)
+
+        assert len(calls) == 1
+        assert second.status == AIResponseStatus.SUCCESS
+        assert second.response_text == first.response_text
+        assert second.provider_metadata["cache_hit"] is True
+        assert second.provider_metadata["cache_mode"] == "exact"
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    async def test_different_options_miss(self, cache, adapter, calls):
+        """Cambiar temperatura cambia la clave canónica"""
+        await adapter.generate_response(AIRequest(prompt="Hola", temperature=0.2))
+        await adapter.generate_response(AIRequest(prompt="Hola", temperature=0.9))
+        assert len(calls) == 2
+
+    async def test_bypass_and_refresh_flags(self, cache, adapter, calls):
+        """bypass_cache ignora la caché; refresh_cache la reescribe"""
+        request = AIRequest(prompt="Pregunta")
+        await adapter.generate_response(request)
+
+        bypassed = await adapter.generate_response(request.model_copy(update={"bypass_cache": True}))
+        assert len(calls) == 2
+        assert bypassed.response_text == "respuesta 2"
+
+        await adapter.generate_response(request.model_copy(update={"refresh_cache": True}))
+        assert len(calls) == 3
+
+        cached = await adapter.generate_response(request)
+        assert len(calls) == 3
+        assert cached.response_text == "respuesta 3"
+
+    async def test_errors_are_not_cached(self, cache, monkeypatch):
+        """Solo se guardan respuestas exitosas"""
+        adapter = OpenAIAdapter(api_key="sk-test", max_retries=1)
+        adapter.client = httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(401, json={}))
+        )
+        response = await adapter.generate_response(AIRequest(prompt="Hola"))
+        assert response.status == AIResponseStatus.AUTH_ERROR
+        assert cache.get_stats()["entries"] == 0
+
+    def test_lru_eviction_and_ttl(self):
+        """La caché respeta su tamaño máximo y el TTL"""
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        response = StandardAIResponse(
+            ia_provider_name=AIProviderEnum.OPENAI,
+            response_text="ok",
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=1
+        )
+        for key in ("a", "b", "c"):
+            cache.store(CacheLookup(key=key, options_key="o"), response)
+        assert cache.get_stats()["entries"] == 2
+        assert cache.get_stats()["evictions"] == 1
+        assert cache._get_fresh("a") is None
+
+        cache._entries["c"].expires_at = 0
+        assert cache._get_fresh("c") is None
+        assert cache.get_stats()["expirations"] == 1
+
+    async def test_semantic_mode(self, monkeypatch, adapter, calls):
+        """Prompts casi idénticos comparten respuesta en modo semántico"""
+        vectors = {
+            "¿Qué es Python?": [1.0, 0.0, 0.0],
+            "¿Que es Python ?": [0.99, 0.05, 0.0],
+            "Receta de paella": [0.0, 1.0, 0.0],
+        }
+
+        async def embedder(text):
+            return vectors[text]
+
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.95, embedder=embedder)
+        monkeypatch.setattr(base_module, "response_cache", cache)
+
+        await adapter.generate_response(AIRequest(prompt="¿Qué es Python?"))
+        similar = await adapter.generate_response(AIRequest(prompt="¿Que es Python ?"))
+        await adapter.generate_response(AIRequest(prompt="Receta de paella"))
+
+        assert len(calls) == 2
+        assert similar.provider_metadata["cache_mode"] == "semantic"
+        assert cache.get_stats()["semantic_hits"] == 1
+
+    async def test_semantic_mode_is_isolated_per_project(self, monkeypatch, adapter, calls):
+        """Prompts idénticos o casi idénticos de proyectos distintos no comparten respuesta"""
+        vectors = {
+            "¿Qué es Python?": [1.0, 0.0, 0.0],
+            "¿Que es Python ?": [0.99, 0.05, 0.0],
+        }
+
+        async def embedder(text):
+            return vectors[text]
+
+        cache = ResponseCache(max_entries=10, ttl_seconds=60, semantic_threshold=0.95, embedder=embedder)
+        monkeypatch.setattr(base_module, "response_cache", cache)
+
+        await adapter.generate_response(AIRequest(prompt="¿Qué es Python?", project_id="proyecto-a", user_id="ana"))
+        other = await adapter.generate_response(
+            AIRequest(prompt="¿Que es Python ?", project_id="proyecto-b", user_id="ana")
+        )
+        identical = await adapter.generate_response(
+            AIRequest(prompt="¿Qué es Python?", project_id="proyecto-c", user_id="ana")
+        )
+        same_project = await adapter.generate_response(
+            AIRequest(prompt="¿Que es Python ?", project_id="proyecto-a", user_id="ana")
+        )
+
+        assert len(calls) == 3
+        assert "cache_mode" not in (other.provider_metadata or {})
+        assert "cache_mode" not in (identical.provider_metadata or {})
+        assert same_project.provider_metadata["cache_mode"] == "semantic"
+
+    def test_structured_requests_have_their_own_options_key(self):
+        """El modo semántico no mezcla síntesis estructuradas y en Markdown"""
+        cache = ResponseCache()
+        schema = {"type": "object", "properties": {"summary": {"type": "string"}}}
+
+        markdown = cache.make_options_key(AIProviderEnum.OPENAI, AIRequest(prompt="Sintetiza"))
+        structured = cache.make_options_key(
+            AIProviderEnum.OPENAI,
+            AIRequest(prompt="Sintetiza", response_schema=schema, response_schema_name="meta_analysis")
+        )
+
+        assert markdown != structured
@@ -0,0 +1,117 @@
+"""
+Pruebas de la política de reintentos de los adaptadores de IA
+Verificación de jitter decorrelado, reglas por categoría, deadline y presupuesto
+"""
+
+import pytest
+import time
+import httpx
+
+import app.services.ai_adapters.base as base_module
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.ai_adapters.retry_policy import RetryPolicy, RetryBudget, RetryRule
+from app.services.response_cache import ResponseCache
+from app.schemas.ai_response import AIRequest, AIResponseStatus, ErrorCategory, ErrorDetail
+
+
+def _error(category: ErrorCategory, retry_after: int = None) -> ErrorDetail:
+    return ErrorDetail(category=category, message="error", retry_after=retry_after)
+
+
+class TestRetryPolicy:
+    """Pruebas de las decisiones de la política"""
+
+    @pytest.fixture
+    def policy(self):
+        return RetryPolicy(budget_ratio=0.2, budget_min_retries=100, min_attempt_seconds=1.0)
+
+    def test_non_retryable_categories(self, policy):
+        """Autenticación y cuota nunca se reintentan"""
+        for category in (ErrorCategory.AUTHENTICATION, ErrorCategory.QUOTA, ErrorCategory.VALIDATION):
+            delay, reason = policy.next_delay("openai", _error(category), 1, 3, 0.0)
+            assert delay is None
+            assert reason == "max_attempts"
+
+    def test_decorrelated_jitter_bounds(self, policy):
+        """La espera está entre la base y el triple de la anterior, acotada por el máximo"""
+        rule = policy.rule_for(ErrorCategory.EXTERNAL_API)
+        previous = rule.base_delay
+        for _ in range(50):
+            delay, _ = policy.next_delay("openai", _error(ErrorCategory.EXTERNAL_API), 1, 3, previous)
+            assert rule.base_delay <= delay <= min(rule.max_delay, previous * 3)
+            previous = delay
+
+    def test_retry_after_is_respected(self, policy):
+        """En rate limiting se respeta el retry-after del proveedor"""
+        delay, _ = policy.next_delay("openai", _error(ErrorCategory.RATE_LIMITING, retry_after=7), 1, 3, 0.0)
+        assert delay >= 7
+
+    def test_deadline_prevents_retry(self, policy):
+        """No se reintenta si la espera más un intento no caben en el deadline"""
+        deadline = time.monotonic() + 1.2
+        delay, reason = policy.next_delay(
+            "openai", _error(ErrorCategory.RATE_LIMITING, retry_after=5), 1, 3, 0.0, deadline
+        )
+        assert delay is None
+        assert reason == "deadline"
+
+    def test_retry_budget_limits_share_of_traffic(self):
+        """Los reintentos no superan la fracción configurada del tráfico"""
+        budget = RetryBudget(ratio=0.1, min_retries=1)
+        for _ in range(20):
+            budget.record_request()
+        spent = sum(1 for _ in range(10) if budget.try_spend())
+        assert spent == 3  # 1 mínimo + 10% de 20
+
+    def test_max_attempts_per_rule(self):
+        """Cada categoría tiene su propio número máximo de intentos"""
+        policy = RetryPolicy(
+            rules={ErrorCategory.NETWORK: RetryRule(max_attempts=2, base_delay=0.01, max_delay=0.01)},
+            budget_min_retries=100
+        )
+        assert policy.next_delay("openai", _error(ErrorCategory.NETWORK), 1, 5, 0.0)[0] is not None
+        assert policy.next_delay("openai", _error(ErrorCategory.NETWORK), 2, 5, 0.0)[0] is None
+
+
+class TestAdapterRetries:
+    """Pruebas de la integración de la política en generate_response"""
+
+    @pytest.fixture(autouse=True)
+    def isolated(self, monkeypatch):
+        monkeypatch.setattr(base_module, "response_cache", ResponseCache())
+        monkeypatch.setattr(base_module, "retry_policy", RetryPolicy(
+            rules={ErrorCategory.EXTERNAL_API: RetryRule(max_attempts=3, base_delay=0.01, max_delay=0.02)},
+            budget_min_retries=100
+        ))
+
+    def _adapter(self, statuses):
+        calls = []
+
+        def handler(request):
+            status = statuses[min(len(calls), len(statuses) - 1)]
+            calls.append(status)
+            if status == 200:
+                return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+            return httpx.Response(status, json={})
+
+        adapter = OpenAIAdapter(api_key="sk-test", max_retries=3)
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return adapter, calls
+
+    async def test_retries_server_errors_then_succeeds(self):
+        """Un 503 transitorio se reintenta con jitter y termina en éxito"""
+        adapter, calls = self._adapter([503, 503, 200])
+        response = await adapter.generate_response(AIRequest(prompt="Hola"))
+        assert response.status == AIResponseStatus.SUCCESS
+        assert len(calls) == 3
+        assert response.retry_info.successful_attempt == 3
+
+    async def test_expired_deadline_stops_retries(self):
+        """Con el deadline agotado no se hacen más intentos"""
+        adapter, calls = self._adapter([503, 200])
+        response = await adapter.generate_response(
+            AIRequest(prompt="Hola", deadline=time.monotonic() + 0.5)
+        )
+        assert response.status == AIResponseStatus.SERVICE_UNAVAILABLE
+        assert response.retry_info.stop_reason == "deadline"
+        assert len(calls) == 1
@@ -0,0 +1,113 @@
+"""
+Pruebas de la deduplicación single-flight de consultas idénticas
+"""
+
+import pytest
+import asyncio
+
+from app.core.single_flight import SingleFlight, make_flight_key, normalize_prompt
+
+
+class TestSingleFlight:
+    """Pruebas del agrupador single-flight"""
+
+    @pytest.fixture
+    def flight(self):
+        return SingleFlight(retention_seconds=0)
+
+    async def test_concurrent_duplicates_share_execution(self, flight):
+        """Las peticiones concurrentes con la misma clave ejecutan una sola vez"""
+        executions = 0
+
+        async def operation():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.01)
+            return "resultado"
+
+        results = await asyncio.gather(*(flight.run("k", operation) for _ in range(5)))
+
+        assert executions == 1
+        assert [result for result, _ in results] == ["resultado"] * 5
+        assert [shared for _, shared in results].count(False) == 1
+        assert flight.get_stats()["shared_in_flight"] == 4
+        assert flight.get_stats()["in_flight"] == 0
+
+    async def test_different_keys_run_independently(self, flight):
+        """Claves distintas no se agrupan"""
+        executions = []
+
+        async def operation(name):
+            executions.append(name)
+            return name
+
+        await asyncio.gather(
+            flight.run("a", lambda: operation("a")),
+            flight.run("b", lambda: operation("b")),
+        )
+        assert sorted(executions) == ["a", "b"]
+
+    async def test_retention_serves_immediate_repeats(self):
+        """Dentro de la ventana de retención se reutiliza el resultado"""
+        flight = SingleFlight(retention_seconds=60)
+        executions = 0
+
+        async def operation():
+            nonlocal executions
+            executions += 1
+            return executions
+
+        first, first_shared = await flight.run("k", operation)
+        second, second_shared = await flight.run("k", operation)
+
+        assert (first, first_shared) == (1, False)
+        assert (second, second_shared) == (1, True)
+        assert flight.get_stats()["shared_retained"] == 1
+
+    async def test_errors_propagate_and_are_not_retained(self):
+        """Un fallo llega a todos los que esperan y no se retiene"""
+        flight = SingleFlight(retention_seconds=60)
+        executions = 0
+
+        async def failing():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0)
+            raise ValueError("fallo")
+
+        results = await asyncio.gather(
+            flight.run("k", failing), flight.run("k", failing), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        assert executions == 1
+
+        with pytest.raises(ValueError):
+            await flight.run("k", failing)
+        assert executions == 2
+
+    async def test_cancelled_follower_does_not_cancel_leader(self, flight):
+        """Si un cliente se desconecta, el resto sigue recibiendo el resultado"""
+        started = asyncio.Event()
+
+        async def operation():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        leader = asyncio.create_task(flight.run("k", operation))
+        await started.wait()
+        follower = asyncio.create_task(flight.run("k", operation))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        result, shared = await follower
+        assert (result, shared) == ("ok", True)
+
+    def test_flight_key_normalization(self):
+        """El prompt normalizado ignora espacios y mayúsculas, pero no las opciones"""
+        assert normalize_prompt("  ¿Qué es   Python?\n") == "¿qué es python?"
+        key_a = make_flight_key("p", "u", normalize_prompt("Hola  Mundo"), temperature=0.7)
+        key_b = make_flight_key("p", "u", normalize_prompt("hola mundo"), temperature=0.7)
+        key_c = make_flight_key("p", "u", normalize_prompt("hola mundo"), temperature=0.2)
+        assert key_a == key_b
+        assert key_a != key_c
@@ -0,0 +1,289 @@
+"""
+Pruebas de la síntesis estructurada del moderador
+Verificación del esquema, el parseo único de la salida JSON, el renderizado a
+Markdown y la integración con los adaptadores (con un proveedor simulado local)
+"""
+
+import pytest
+import json
+from datetime import datetime
+
+import httpx
+
+import app.services.ai_adapters.base as base_module
+import app.services.ai_moderator as moderator_module
+from app.services.ai_moderator import AIModerator, SynthesisQuality
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
+from app.services.response_cache import ResponseCache
+from app.services.structured_synthesis import (
+    SYNTHESIS_JSON_SCHEMA,
+    SYNTHESIS_SCHEMA_NAME,
+    parse_structured_synthesis
+)
+from app.schemas.ai_response import AIRequest, StandardAIResponse, AIResponseStatus, AIProviderEnum
+
+
+STRUCTURED = {
+    "summary": "Python es un lenguaje versátil y fácil de aprender.",
+    "key_recommendation": "Evaluar pandas frente a Polars con datos reales.",
+    "key_themes": ["Versatilidad de Python"],
+    "claims_by_ai": [
+        {"ai": "OPENAI", "claims": ["Python tiene una gran biblioteca estándar."]},
+        {"ai": "ANTHROPIC", "claims": ["Django es el framework web más usado."]}
+    ],
+    "consensus": [{"point": "Python es popular en ciencia de datos", "supported_by": ["OPENAI", "ANTHROPIC"]}],
+    "contradictions": ["Año de creación: [AI_Modelo_OPENAI] afirma '1991', mientras que [AI_Modelo_ANTHROPIC] afirma '1989'"],
+    "emphasis_by_ai": [{"ai": "OPENAI", "focus": "El ecosistema de paquetes y la legibilidad"}],
+    "omissions": ["Rendimiento"],
+    "suggested_questions": ["¿Qué fuente confirma el año de creación?"],
+    "research_areas": ["Rendimiento frente a lenguajes compilados."],
+    "connections": [],
+    "self_validation": [{"check": f"Comprobación {i}", "passed": True} for i in range(6)]
+}
+
+
+def _responses():
+    return [
+        StandardAIResponse(
+            ia_provider_name=provider,
+            response_text="Python es un lenguaje versátil usado en ciencia de datos y desarrollo web.",
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=1000,
+            timestamp=datetime.utcnow()
+        )
+        for provider in (AIProviderEnum.OPENAI, AIProviderEnum.ANTHROPIC)
+    ]
+
+
+class FakeStructuredAdapter:
+    """Adaptador de síntesis simulado que devuelve salida estructurada"""
+
+    supports_structured_output = True
+    model = "gpt-4o-mini"
+
+    def __init__(self, structured_output=None, text=None):
+        self.structured_output = structured_output
+        self.text = text if text is not None else json.dumps(structured_output or {})
+        self.requests = []
+
+    async def generate_response(self, request: AIRequest) -> StandardAIResponse:
+        self.requests.append(request)
+        return StandardAIResponse(
+            ia_provider_name=AIProviderEnum.OPENAI,
+            response_text=self.text,
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=10,
+            structured_output=self.structured_output
+        )
+
+
+class TestStructuredSynthesisModel:
+    """Pruebas del esquema y del modelo de la síntesis estructurada"""
+
+    def test_schema_is_strict(self):
+        """Todos los objetos cierran propiedades y las declaran obligatorias"""
+        def objects(node):
+            if isinstance(node, dict):
+                if node.get("type") == "object":
+                    yield node
+                for value in node.values():
+                    yield from objects(value)
+            elif isinstance(node, list):
+                for item in node:
+                    yield from objects(item)
+
+        found = list(objects(SYNTHESIS_JSON_SCHEMA))
+        assert len(found) == 5
+        for node in found:
+            assert node["additionalProperties"] is False
+            assert set(node["required"]) == set(node["properties"])
+        assert "$defs" not in json.dumps(SYNTHESIS_JSON_SCHEMA)
+
+    def test_parse_from_text_and_dict(self):
+        from_dict = parse_structured_synthesis(STRUCTURED)
+        from_text = parse_structured_synthesis(json.dumps(STRUCTURED))
+        fenced = parse_structured_synthesis(f"```json\n{json.dumps(STRUCTURED)}\n```")
+        assert from_dict == from_text == fenced
+
+    def test_invalid_output_raises_value_error(self):
+        with pytest.raises(ValueError):
+            parse_structured_synthesis("no es json")
+        with pytest.raises(ValueError):
+            parse_structured_synthesis({"claims_by_ai": "no es una lista"})
+
+    def test_components_match_markdown_extraction(self):
+        """El Markdown renderizado produce los mismos componentes al parsearse"""
+        synthesis = parse_structured_synthesis(STRUCTURED)
+        components = synthesis.to_components()
+        extracted = AIModerator()._extract_synthesis_components(synthesis.to_markdown())
+
+        for key in ("contradictions", "consensus_areas", "suggested_questions",
+                    "research_areas", "source_references", "recommendations", "meta_analysis_quality"):
+            assert components[key] == extracted[key], key
+
+    def test_markdown_is_rendered_once(self):
+        synthesis = parse_structured_synthesis(STRUCTURED)
+        assert synthesis.to_markdown() is synthesis.to_markdown()
+
+
+class TestStructuredModerator:
+    """Pruebas del modo estructurado de AIModerator.synthesize_responses"""
+
+    @pytest.fixture(autouse=True)
+    def structured_mode(self, monkeypatch):
+        monkeypatch.setattr(moderator_module.settings, "STRUCTURED_SYNTHESIS_ENABLED", True)
+
+    async def test_structured_synthesis_skips_text_parsing(self, monkeypatch):
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeStructuredAdapter(STRUCTURED)
+
+        def no_text_parsing(*args, **kwargs):
+            raise AssertionError("El modo estructurado no debe parsear el Markdown")
+
+        monkeypatch.setattr(moderator, "_extract_synthesis_components", no_text_parsing)
+        monkeypatch.setattr(moderator, "_validate_synthesis_quality", no_text_parsing)
+
+        result = await moderator.synthesize_responses(_responses())
+
+        request = moderator.synthesis_adapter.requests[0]
+        assert request.response_schema == SYNTHESIS_JSON_SCHEMA
+        assert request.response_schema_name == SYNTHESIS_SCHEMA_NAME
+        assert not result.fallback_used
+        assert result.quality == SynthesisQuality.HIGH
+        assert result.suggested_questions == STRUCTURED["suggested_questions"]
+        assert result.synthesis_text.startswith("## 1. Resumen Conciso General")
+
+    async def test_json_text_without_structured_output(self):
+        """Si el adaptador no parseó la salida, se parsea el texto JSON una vez"""
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeStructuredAdapter(text=json.dumps(STRUCTURED))
+
+        result = await moderator.synthesize_responses(_responses())
+
+        assert not result.fallback_used
+        assert result.contradictions == STRUCTURED["contradictions"]
+
+    async def test_invalid_structured_output_falls_back(self):
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeStructuredAdapter(text="esto no es JSON")
+
+        result = await moderator.synthesize_responses(_responses())
+
+        assert result.fallback_used
+
+    async def test_empty_structured_output_falls_back(self):
+        moderator = AIModerator()
+        moderator.synthesis_adapter = FakeStructuredAdapter({"summary": "", "claims_by_ai": []})
+
+        result = await moderator.synthesize_responses(_responses())
+
+        assert result.fallback_used
+
+
+class TestOpenAIOnlyStructuredModerator:
+    """Modo estructurado sin clave de Anthropic: el adaptador principal es GPT-3.5-Turbo"""
+
+    @pytest.fixture(autouse=True)
+    def openai_only(self, monkeypatch):
+        monkeypatch.setattr(moderator_module.settings, "STRUCTURED_SYNTHESIS_ENABLED", True)
+        monkeypatch.setattr(moderator_module.settings, "ANTHROPIC_API_KEY", "")
+        monkeypatch.setattr(moderator_module.settings, "OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(base_module, "response_cache", ResponseCache())
+
+    @staticmethod
+    def _capture_payloads(moderator, content):
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+        for adapter in (moderator.synthesis_adapter, moderator.fast_synthesis_adapter):
+            if adapter:
+                adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return payloads
+
+    async def test_schema_goes_to_a_json_schema_model(self, monkeypatch):
+        monkeypatch.setattr(moderator_module.settings, "SYNTHESIS_FAST_MODEL", "gpt-4o-mini")
+        moderator = AIModerator()
+        payloads = self._capture_payloads(moderator, json.dumps(STRUCTURED))
+
+        result = await moderator.synthesize_responses(_responses())
+
+        assert moderator.synthesis_adapter.model == "gpt-3.5-turbo"
+        assert not moderator.synthesis_adapter.supports_structured_output
+        (payload,) = payloads
+        assert payload["model"] == "gpt-4o-mini"
+        assert payload["response_format"]["type"] == "json_schema"
+        assert not result.fallback_used
+        assert result.suggested_questions == STRUCTURED["suggested_questions"]
+
+    async def test_markdown_without_a_json_schema_model(self, monkeypatch):
+        monkeypatch.setattr(moderator_module.settings, "SYNTHESIS_FAST_MODEL", "gpt-3.5-turbo")
+        moderator = AIModerator()
+        markdown = parse_structured_synthesis(STRUCTURED).to_markdown()
+        payloads = self._capture_payloads(moderator, markdown)
+
+        result = await moderator.synthesize_responses(_responses())
+
+        (payload,) = payloads
+        assert payload["model"] == "gpt-3.5-turbo"
+        assert "response_format" not in payload
+        assert not result.fallback_used
+        assert result.synthesis_text == markdown
+
+
+class TestAdapterStructuredOutput:
+    """Pruebas del soporte de salida estructurada en los adaptadores"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_cache(self, monkeypatch):
+        monkeypatch.setattr(base_module, "response_cache", ResponseCache())
+
+    @staticmethod
+    def _request():
+        return AIRequest(prompt="Hola", response_schema=SYNTHESIS_JSON_SCHEMA, response_schema_name=SYNTHESIS_SCHEMA_NAME)
+
+    def test_openai_payload_uses_response_format(self):
+        payload = OpenAIAdapter(api_key="sk-test")._build_payload(self._request())
+        assert payload["response_format"]["type"] == "json_schema"
+        assert payload["response_format"]["json_schema"]["strict"] is True
+        assert payload["response_format"]["json_schema"]["schema"] == SYNTHESIS_JSON_SCHEMA
+
+    def test_anthropic_payload_forces_tool(self):
+        payload = AnthropicAdapter(api_key="sk-ant-test")._build_payload(self._request())
+        assert payload["tools"][0]["input_schema"] == SYNTHESIS_JSON_SCHEMA
+        assert payload["tool_choice"] == {"type": "tool", "name": SYNTHESIS_SCHEMA_NAME}
+
+    def test_supports_structured_output(self):
+        assert OpenAIAdapter(api_key="sk-test", model="gpt-4o-mini").supports_structured_output
+        assert not OpenAIAdapter(api_key="sk-test", model="gpt-3.5-turbo").supports_structured_output
+        assert AnthropicAdapter(api_key="sk-ant-test").supports_structured_output
+
+    def test_plain_requests_are_unchanged(self):
+        assert "response_format" not in OpenAIAdapter(api_key="sk-test")._build_payload(AIRequest(prompt="Hola"))
+        assert "tools" not in AnthropicAdapter(api_key="sk-ant-test")._build_payload(AIRequest(prompt="Hola"))
+
+    async def test_openai_structured_output_is_parsed(self):
+        adapter = OpenAIAdapter(api_key="sk-test")
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(
+            200, json={"choices": [{"message": {"content": json.dumps(STRUCTURED)}}]}
+        )))
+
+        response = await adapter.generate_response(self._request())
+
+        assert response.status == AIResponseStatus.SUCCESS
+        assert response.structured_output == STRUCTURED
+
+    async def test_anthropic_tool_use_is_parsed(self):
+        adapter = AnthropicAdapter(api_key="sk-ant-test")
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(
+            200, json={"content": [{"type": "tool_use", "name": SYNTHESIS_SCHEMA_NAME, "input": STRUCTURED}]}
+        )))
+
+        response = await adapter.generate_response(self._request())
+
+        assert response.status == AIResponseStatus.SUCCESS
+        assert response.structured_output == STRUCTURED
+        assert json.loads(response.response_text) == STRUCTURED
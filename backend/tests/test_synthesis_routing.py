@@ -0,0 +1,288 @@
+"""
+Pruebas del enrutado de la síntesis del moderador
+Verificación de la medida de acuerdo entre respuestas, el presupuesto de tokens,
+la omisión de la síntesis con respuestas concordantes, el modelo rápido y un
+benchmark sobre respuestas grabadas con proveedores simulados
+"""
+
+import pytest
+import asyncio
+import re
+import statistics
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+import app.services.ai_moderator as moderator_module
+from app.services.ai_moderator import AIModerator
+from app.services.synthesis_router import SynthesisRouter
+from app.schemas.ai_response import AIRequest, StandardAIResponse, AIResponseStatus, AIProviderEnum
+
+
+SYNTHESIS_TEXT = """## 1. Resumen Conciso General y Recomendación Clave
+- Ambas IAs coinciden en que Python es un lenguaje versátil y fácil de aprender para proyectos de datos.
+- **Recomendación Clave para Avanzar**: Evaluar pandas frente a Polars con un conjunto de datos real.
+
+## 2. Comparación Estructurada de Contribuciones de las IAs
+
+### 2.a. Afirmaciones Clave por IA:
+**[AI_Modelo_OPENAI] dice:**
+- Python tiene una gran biblioteca estándar.
+**[AI_Modelo_ANTHROPIC] dice:**
+- Django es el framework web más usado.
+
+### 2.b. Puntos de Consenso Directo:
+- Python es popular en ciencia de datos (Apoyado por: [AI_Modelo_OPENAI], [AI_Modelo_ANTHROPIC])
+
+### 2.c. Contradicciones Factuales Evidentes:
+- No se identificaron contradicciones factuales evidentes en los datos presentados.
+
+## 3. Puntos de Interés para Exploración (Accionables)
+
+### 3.a. Preguntas Sugeridas para Clarificación o Profundización:
+- Pregunta Sugerida 1: ¿Qué biblioteca encaja mejor con el volumen de datos del proyecto?
+
+### 3.b. Áreas Potenciales para Mayor Investigación:
+- Área de Exploración 1: Rendimiento de Python frente a lenguajes compilados.
+
+## 4. Auto-Validación Interna de esta Síntesis (Checklist):
+- Relevancia de Claims: sí.
+"""
+
+# Respuestas grabadas de los proveedores (OpenAI, Anthropic) para distintas consultas
+_PYTHON = (
+    "Python es un lenguaje de programación interpretado, de tipado dinámico y propósito general. "
+    "Destaca por su sintaxis legible, su gran biblioteca estándar y un ecosistema enorme de paquetes "
+    "para ciencia de datos como pandas, NumPy y scikit-learn."
+)
+RECORDED_RESPONSES = [
+    # Respuestas prácticamente idénticas
+    (_PYTHON, _PYTHON + " Es muy usado en ciencia de datos."),
+    (
+        "La capital de Francia es París, sede del gobierno y principal centro económico del país.",
+        "La capital de Francia es París, sede del gobierno y principal centro económico del país.",
+    ),
+    # Respuestas cortas con enfoques algo distintos
+    (
+        "Para invertir una lista en Python puedes usar lista.reverse(), que la modifica en el sitio.",
+        "Usa el slicing lista[::-1] para obtener una copia invertida sin modificar la original.",
+    ),
+    (
+        "Un índice B-tree acelera búsquedas por igualdad y rango en PostgreSQL.",
+        "Para búsquedas de texto completo conviene un índice GIN sobre un tsvector.",
+    ),
+    (
+        "Docker empaqueta la aplicación y sus dependencias en una imagen reproducible.",
+        "Una máquina virtual emula hardware completo; un contenedor comparte el kernel del host.",
+    ),
+    # Respuestas largas y divergentes
+    (
+        " ".join(["La arquitectura de microservicios permite escalar equipos y despliegues de forma independiente,"
+                  " aunque introduce complejidad operativa, observabilidad distribuida y consistencia eventual."] * 40),
+        " ".join(["Un monolito modular suele ser la mejor opción inicial: menos latencia de red, transacciones"
+                  " locales y un único despliegue, y se puede dividir más adelante si el dominio lo exige."] * 40),
+    ),
+    (
+        " ".join(["El aprendizaje por refuerzo optimiza una política mediante recompensas acumuladas en un entorno"
+                  " simulado, con métodos como PPO o Q-learning."] * 10),
+        " ".join(["El aprendizaje supervisado requiere datos etiquetados y minimiza una función de pérdida;"
+                  " es la opción habitual para clasificación y regresión."] * 10),
+    ),
+]
+
+
+def _responses(texts):
+    return [
+        StandardAIResponse(
+            ia_provider_name=provider,
+            response_text=text,
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=1000,
+            timestamp=datetime.utcnow()
+        )
+        for provider, text in zip((AIProviderEnum.OPENAI, AIProviderEnum.ANTHROPIC), texts)
+    ]
+
+
+async def hashing_embedder(texts):
+    """Embedder local determinista: bolsa de palabras proyectada por hash"""
+    vectors = np.zeros((len(texts), 512), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            vectors[row, zlib.crc32(word.encode()) % 512] += 1.0
+    return vectors.tolist()
+
+
+class SimulatedSynthesisAdapter:
+    """
+    Adaptador de síntesis simulado: la latencia es la del primer token más un
+    coste por token generado, y genera hasta ~1000 tokens si el presupuesto lo permite.
+    """
+
+    def __init__(self, ttft_ms: float, per_token_ms: float, time_scale: float = 0.00002):
+        self.ttft_ms = ttft_ms
+        self.per_token_ms = per_token_ms
+        self.time_scale = time_scale
+        self.requests = []
+        self.completion_tokens = 0
+
+    async def generate_response(self, request: AIRequest) -> StandardAIResponse:
+        self.requests.append(request)
+        tokens = min(request.max_tokens, 1000)
+        self.completion_tokens += tokens
+        latency_ms = self.ttft_ms + tokens * self.per_token_ms
+        await asyncio.sleep(latency_ms * self.time_scale)
+        return StandardAIResponse(
+            ia_provider_name=AIProviderEnum.OPENAI,
+            response_text=SYNTHESIS_TEXT,
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=int(latency_ms),
+            usage_info={"completion_tokens": tokens}
+        )
+
+
+@pytest.fixture
+def routing_enabled(monkeypatch):
+    monkeypatch.setattr(moderator_module.settings, "SYNTHESIS_ROUTING_ENABLED", True)
+
+
+@pytest.fixture
+def moderator():
+    moderator = AIModerator()
+    moderator.router = SynthesisRouter(embedder=hashing_embedder)
+    moderator.synthesis_adapter = SimulatedSynthesisAdapter(ttft_ms=600, per_token_ms=12)
+    moderator.fast_synthesis_adapter = SimulatedSynthesisAdapter(ttft_ms=300, per_token_ms=5)
+    return moderator
+
+
+class TestSynthesisRouter:
+    """Pruebas de SynthesisRouter"""
+
+    async def test_agreement_of_identical_and_orthogonal_responses(self):
+        vectors = {"a": [1.0, 0.0, 0.0], "b": [2.0, 0.0, 0.0], "c": [0.0, 1.0, 0.0]}
+
+        async def embedder(texts):
+            return [vectors[text] for text in texts]
+
+        router = SynthesisRouter(embedder=embedder)
+        assert await router.agreement(["a", "b"]) == pytest.approx((1.0, 1.0))
+        agreement_min, agreement_mean = await router.agreement(["a", "b", "c"])
+        assert agreement_min == pytest.approx(0.0)
+        assert agreement_mean == pytest.approx(1 / 3)
+
+    async def test_embedder_failure_means_unknown_agreement(self):
+        async def failing(texts):
+            raise RuntimeError("sin red")
+
+        router = SynthesisRouter(embedder=failing)
+        route = await router.route(_responses(RECORDED_RESPONSES[2]))
+
+        assert route.agreement_min is None
+        assert not route.skip
+
+    def test_budget_scales_with_content_and_divergence(self):
+        router = SynthesisRouter(min_tokens=400, max_tokens=1200, reference_tokens=3000)
+
+        assert router.budget(100, 0.95) < router.budget(100, 0.6) < router.budget(3000, 0.6)
+        assert router.budget(10_000, 0.0) == 1200
+        assert router.budget(0, 1.0) == 400
+        assert router.budget(3000, 0.95) < router.budget(3000, None) == 1200  # Sin medida se asume divergencia
+
+    async def test_routes(self):
+        router = SynthesisRouter(embedder=hashing_embedder)
+
+        assert (await router.route(_responses(RECORDED_RESPONSES[1]))).mode == "skip"
+        assert (await router.route(_responses(RECORDED_RESPONSES[2]))).mode == "fast"
+        assert (await router.route(_responses(RECORDED_RESPONSES[5]))).mode == "full"
+
+
+class TestRoutedModerator:
+    """Pruebas del enrutado en AIModerator"""
+
+    async def test_routing_disabled_keeps_full_synthesis(self, moderator):
+        result = await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[1]))
+
+        assert result.synthesis_route == "full"
+        assert moderator.synthesis_adapter.requests[0].max_tokens == 1200
+        assert moderator.fast_synthesis_adapter.requests == []
+
+    async def test_near_identical_responses_skip_llm(self, moderator, routing_enabled):
+        result = await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[1]))
+
+        assert result.synthesis_route == "skip"
+        assert not result.fallback_used
+        assert "París" in result.synthesis_text
+        assert set(result.source_references) == {"OPENAI", "ANTHROPIC"}
+        assert moderator.synthesis_adapter.requests == []
+        assert moderator.fast_synthesis_adapter.requests == []
+
+    async def test_small_synthesis_uses_fast_model(self, moderator, routing_enabled):
+        result = await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[2]))
+
+        assert result.synthesis_route == "fast"
+        assert moderator.synthesis_adapter.requests == []
+        assert moderator.fast_synthesis_adapter.requests[0].max_tokens < 1200
+
+    async def test_prompt_length_target_follows_budget(self, moderator, routing_enabled):
+        await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[2]))
+        await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[5]))
+
+        fast_request = moderator.fast_synthesis_adapter.requests[0]
+        full_request = moderator.synthesis_adapter.requests[0]
+        high = int(re.search(r"aproximadamente \d+-(\d+) tokens", fast_request.prompt).group(1))
+        # El reporte pedido cabe en el presupuesto y se acorta en la ruta rápida
+        assert high < fast_request.max_tokens
+        assert "omite las secciones" in fast_request.prompt
+        assert "aproximadamente 800-1000 tokens" in full_request.prompt
+        assert "omite las secciones" not in full_request.prompt
+
+    async def test_fast_route_without_fast_adapter(self, moderator, routing_enabled):
+        moderator.fast_synthesis_adapter = None
+
+        result = await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[2]))
+
+        assert result.synthesis_route == "fast"
+        assert moderator.synthesis_adapter.requests[0].max_tokens < 1200
+
+    async def test_router_error_falls_back_to_full(self, moderator, routing_enabled):
+        class BrokenRouter:
+            async def route(self, responses):
+                raise RuntimeError("boom")
+
+        moderator.router = BrokenRouter()
+        result = await moderator.synthesize_responses(_responses(RECORDED_RESPONSES[2]))
+
+        assert result.synthesis_route == "full"
+        assert moderator.synthesis_adapter.requests[0].max_tokens == 1200
+
+
+class TestSynthesisRoutingBenchmark:
+    """Benchmark sobre respuestas grabadas: latencia p50 y tokens de síntesis"""
+
+    @staticmethod
+    async def _run(moderator):
+        latencies = []
+        for texts in RECORDED_RESPONSES:
+            start = time.perf_counter()
+            result = await moderator.synthesize_responses(_responses(texts))
+            latencies.append(time.perf_counter() - start)
+            assert not result.fallback_used
+        tokens = moderator.synthesis_adapter.completion_tokens + moderator.fast_synthesis_adapter.completion_tokens
+        return statistics.median(latencies), tokens
+
+    async def test_routing_reduces_p50_latency_and_tokens(self, moderator, monkeypatch):
+        baseline_p50, baseline_tokens = await self._run(moderator)
+
+        monkeypatch.setattr(moderator_module.settings, "SYNTHESIS_ROUTING_ENABLED", True)
+        moderator.synthesis_adapter.completion_tokens = 0
+        moderator.fast_synthesis_adapter.completion_tokens = 0
+        routed_p50, routed_tokens = await self._run(moderator)
+
+        print(
+            f"\nSíntesis p50: {baseline_p50 * 1000:.0f}ms -> {routed_p50 * 1000:.0f}ms, "
+            f"tokens: {baseline_tokens} -> {routed_tokens}"
+        )
+        assert routed_p50 < baseline_p50 * 0.7
+        assert routed_tokens < baseline_tokens * 0.7
@@ -0,0 +1,226 @@
+"""
+Pruebas de la síntesis del moderador en streaming
+Verificación del parser incremental de secciones, los eventos emitidos y el
+streaming SSE de los adaptadores (con un proveedor simulado local)
+"""
+
+import pytest
+import asyncio
+import json
+import random
+from datetime import datetime
+
+import httpx
+
+from app.services.ai_moderator import AIModerator, SynthesisStreamParser, SynthesisQuality
+from app.services.ai_adapters.openai_adapter import OpenAIAdapter
+from app.services.ai_adapters.anthropic_adapter import AnthropicAdapter
+from app.schemas.ai_response import AIRequest, StandardAIResponse, AIResponseStatus, AIProviderEnum
+
+
+SYNTHESIS_TEXT = """## 1. Resumen Conciso General y Recomendación Clave
+- Ambas IAs coinciden en que Python es un lenguaje versátil y fácil de aprender para proyectos de datos.
+- **Recomendación Clave para Avanzar:** Evaluar pandas frente a Polars con un conjunto de datos real.
+
+## 2. Comparación Estructurada de Contribuciones de las IAs
+
+### 2.a. Afirmaciones Clave por IA:
+**[AI_Modelo_OPENAI] dice:**
+- Python tiene una gran biblioteca estándar.
+**[AI_Modelo_ANTHROPIC] dice:**
+- Django es el framework web más usado.
+
+### 2.b. Puntos de Consenso Directo (Acuerdo entre ≥2 IAs):
+- Python es popular en ciencia de datos (Apoyado por: [AI_Modelo_OPENAI], [AI_Modelo_ANTHROPIC])
+
+### 2.c. Contradicciones Factuales Evidentes:
+- Año de creación: [AI_Modelo_OPENAI] afirma '1991', mientras que [AI_Modelo_ANTHROPIC] afirma '1989'
+
+### 2.d. Mapeo de Énfasis y Cobertura Temática Diferencial:
+- OpenAI se centró en el ecosistema de paquetes y la legibilidad.
+
+## 3. Puntos de Interés para Exploración (Accionables)
+
+### 3.a. Preguntas Sugeridas para Clarificación o Profundización:
+- Pregunta Sugerida 1: ¿Qué fuente primaria confirma el año de creación de Python?
+
+### 3.b. Áreas Potenciales para Mayor Investigación:
+- Área de Exploración 1: Rendimiento de Python frente a lenguajes compilados.
+
+## 4. Auto-Validación Interna de esta Síntesis (Checklist):
+- Relevancia de Claims: sí.
+- Consenso Genuino: sí.
+- Contradicciones Claras: sí.
+- Accionabilidad de Preguntas: sí.
+- Síntesis General: sí.
+- Adherencia a Límites: sí.
+"""
+
+
+def _chunks(text: str, seed: int = 0):
+    """Trocea el texto en fragmentos de tamaño aleatorio, como llegan los tokens"""
+    rng = random.Random(seed)
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        yield text[position:position + size]
+        position += size
+
+
+def _responses():
+    return [
+        StandardAIResponse(
+            ia_provider_name=provider,
+            response_text="Python es un lenguaje versátil usado en ciencia de datos y desarrollo web.",
+            status=AIResponseStatus.SUCCESS,
+            latency_ms=1000,
+            timestamp=datetime.utcnow()
+        )
+        for provider in (AIProviderEnum.OPENAI, AIProviderEnum.ANTHROPIC)
+    ]
+
+
+class FakeStreamingAdapter:
+    """Adaptador de síntesis simulado que emite el texto en fragmentos"""
+
+    def __init__(self, text: str, fail_after: int = None, delay: float = 0.0):
+        self.text = text
+        self.fail_after = fail_after
+        self.delay = delay
+
+    async def stream_response(self, request: AIRequest):
+        for index, chunk in enumerate(_chunks(self.text)):
+            if self.fail_after is not None and index >= self.fail_after:
+                raise httpx.NetworkError("conexión cortada")
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+
+class TestSynthesisStreamParser:
+    """Pruebas del parser incremental de secciones"""
+
+    def test_incremental_matches_batch_extraction(self):
+        """Troceado arbitrario produce los mismos componentes que el parser por lotes"""
+        moderator = AIModerator()
+        parser = SynthesisStreamParser()
+        components = moderator._empty_synthesis_components()
+
+        sections = []
+        for chunk in _chunks(SYNTHESIS_TEXT, seed=42):
+            sections.extend(parser.feed(chunk))
+        sections.extend(parser.close())
+        for section in sections:
+            moderator._parse_synthesis_section(section, components)
+
+        assert components == moderator._extract_synthesis_components(SYNTHESIS_TEXT)
+
+    def test_section_closes_on_next_header(self):
+        """Una sección se emite en cuanto empieza la siguiente, no al final"""
+        parser = SynthesisStreamParser()
+        assert parser.feed("## 3.a. Preguntas Sugeridas\n- Pregunta Sugerida 1: ¿Por qué?\n") == []
+        assert parser.feed("#") == []
+        closed = parser.feed("# 3.b. Áreas")
+        assert len(closed) == 1
+        assert closed[0].startswith("3.a. Preguntas Sugeridas")
+        assert parser.close() == ["3.b. Áreas"]
+
+
+class TestStreamingSynthesis:
+    """Pruebas de AIModerator.stream_synthesis"""
+
+    @pytest.fixture
+    def moderator(self):
+        return AIModerator()
+
+    async def test_emits_tokens_sections_and_final(self, moderator):
+        moderator.synthesis_adapter = FakeStreamingAdapter(SYNTHESIS_TEXT)
+
+        events = [event async for event in moderator.stream_synthesis(_responses())]
+        kinds = [event.event for event in events]
+
+        assert kinds[-1] == "final"
+        assert "".join(event.text for event in events if event.event == "token") == SYNTHESIS_TEXT
+
+        sections = {event.section: event.components for event in events if event.event == "section"}
+        contradictions = next(c for title, c in sections.items() if title.startswith("2.c."))
+        assert contradictions["contradictions"][0].startswith("Año de creación")
+        questions = next(c for title, c in sections.items() if title.startswith("3.a."))
+        assert questions["suggested_questions"] == ["¿Qué fuente primaria confirma el año de creación de Python?"]
+
+        final = events[-1].result
+        assert not final.fallback_used
+        assert final.quality != SynthesisQuality.FAILED
+        assert final.suggested_questions == questions["suggested_questions"]
+
+    async def test_sections_arrive_before_stream_ends(self, moderator):
+        """Las primeras secciones llegan mientras el LLM sigue generando"""
+        moderator.synthesis_adapter = FakeStreamingAdapter(SYNTHESIS_TEXT)
+
+        kinds = [event.event async for event in moderator.stream_synthesis(_responses())]
+        first_section = kinds.index("section")
+        assert "token" in kinds[first_section:]
+
+    async def test_stream_failure_falls_back(self, moderator):
+        """Si el flujo se corta, el evento final es la mejor respuesta individual"""
+        moderator.synthesis_adapter = FakeStreamingAdapter(SYNTHESIS_TEXT, fail_after=5)
+
+        events = [event async for event in moderator.stream_synthesis(_responses())]
+
+        assert events[-1].event == "final"
+        assert events[-1].result.fallback_used
+
+    async def test_single_response_only_emits_final(self, moderator):
+        moderator.synthesis_adapter = FakeStreamingAdapter(SYNTHESIS_TEXT)
+
+        events = [event async for event in moderator.stream_synthesis(_responses()[:1])]
+
+        assert [event.event for event in events] == ["final"]
+
+
+class TestAdapterStreaming:
+    """Pruebas del parseo SSE de cada proveedor"""
+
+    @staticmethod
+    def _sse(events):
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        return httpx.MockTransport(
+            lambda request: httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        )
+
+    async def test_openai_stream(self):
+        adapter = OpenAIAdapter(api_key="sk-test")
+        adapter.client = httpx.AsyncClient(transport=self._sse([
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": "Hola"}}]},
+            {"choices": [{"delta": {"content": " mundo"}}]},
+            {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}},
+        ]))
+
+        chunks = [chunk async for chunk in adapter.stream_response(AIRequest(prompt="Hola"))]
+
+        assert chunks == ["Hola", " mundo"]
+        assert adapter.get_health_info().consecutive_failures == 0
+
+    async def test_anthropic_stream(self):
+        adapter = AnthropicAdapter(api_key="sk-ant-test")
+        adapter.client = httpx.AsyncClient(transport=self._sse([
+            {"type": "message_start", "message": {"usage": {"input_tokens": 5}}},
+            {"type": "content_block_start", "content_block": {"type": "text", "text": ""}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hola"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": " mundo"}},
+            {"type": "message_delta", "usage": {"output_tokens": 2}},
+            {"type": "message_stop"},
+        ]))
+
+        chunks = [chunk async for chunk in adapter.stream_response(AIRequest(prompt="Hola"))]
+
+        assert chunks == ["Hola", " mundo"]
+
+    async def test_stream_http_error_is_raised(self):
+        adapter = OpenAIAdapter(api_key="sk-test")
+        adapter.client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+
+        with pytest.raises(httpx.HTTPStatusError):
+            async for _ in adapter.stream_response(AIRequest(prompt="Hola")):
+                pass
+        assert adapter.get_health_info().consecutive_failures == 1